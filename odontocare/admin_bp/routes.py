@@ -1,25 +1,25 @@
-from flask import request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+import json
+from flask import request, jsonify, current_app
+from sqlalchemy.exc import IntegrityError
 from extensions import db
+from decoradores import role_required
+from idempotencia import idempotente, registro_idempotencia
+from auditoria import registrar_evento
+from catalogo import invalidar_centro, invalidar_doctor, invalidar_catalogo, cache_catalogo
+from busqueda import buscar
+from paginacion import leer_limite
+from servicios.carga_masiva import importar_centros, importar_doctores, importar_pacientes
+from servicios.usuarios import crear_usuario, UsernameEnUso
 from models.centro import Centro
-from models.usuario import Usuario
-from models.doctor import Doctor
-from models.paciente import Paciente
 
 # Importar el Blueprint definido en __init__.py
 from . import admin_bp
 
 """Endpoint para crear Usuarios: : POST /admin/usuario (solo para rol Admin)"""
 @admin_bp.route("/usuario", methods=["POST"])
-@jwt_required()  # Decorador de la librería flask_jwt_extended. Se coloca en el Endpoint para protegerlo pidiendo a los usuarios que quieran acceder un token JWT válido
+@role_required("admin", mensaje="No tienes permisos para registrar usuarios")  # Decorador definido en decoradores.py. Pide un token JWT válido y comprueba con el rol guardado en el token que el usuario es admin, si no, devuelve error 403
+@idempotente  # Con cabecera Idempotency-Key, los reintentos reciben la respuesta guardada (idempotencia.py)
 def register_user():
-    
-    # Obtener la identidad del usuario desde el JWT (para verificar si es admin), si no, devolver error 403
-    current_user_id = get_jwt_identity() # Esta función de la librería flask_jwt_extended permite obtener el ID de usuario desde el token JWT
-    current_user = Usuario.query.get(current_user_id) # Buscar filtrando en la base de datos mediante función query
-
-    if not current_user or current_user.rol != "admin":
-        return jsonify({"error": "No tienes permisos para registrar usuarios"}), 403
 
     # Leer el JSON del body de la petición HTTP que hace el cliente para crear un usuario. Si falta alguno de ellos, devolver error 400
     username = request.json.get("username", None)
@@ -33,19 +33,18 @@ def register_user():
     if rol not in ["admin", "secretaria"]:
         return jsonify({"error": "rol invalido","roles_validos": ["admin", "secretaria"]}), 400
 
-    # Verificar si el usuario ya existe y devolver error 409 en ese caso
-    existing_user = Usuario.query.filter_by(username=username).first() # Buscar usuario filtrando por nombre en la base de datos
-    if existing_user:
+    # Crear el nuevo usuario con el servicio de usuarios (servicios/usuarios.py) y guardarlo en la base de datos
+    # La contraseña se guarda cifrada (hash). No se consulta antes si el username existe: si ya existe, el índice único
+    # hace fallar el INSERT y se devuelve error 409
+    try:
+        usuario, _ = crear_usuario({"username": username, "password": password}, rol)
+        db.session.commit()
+    except UsernameEnUso:
+        db.session.rollback()
         return jsonify({"error": "El nombre de usuario ya esta en uso"}), 409
 
-    # Crear el nuevo usuario
-    # La función set_password cifra la contraseña (hash). Se utiliza para no guardar la contraseña directamente en la base de datos (seguridad)
-    new_user = Usuario(username=username, rol=rol)
-    new_user.set_password(password)
-
-    # Guardar el nuevo usuario en la base de datos
-    db.session.add(new_user)
-    db.session.commit()
+    # Dejar constancia en la auditoría (auditoria.py) de quién ha creado el usuario. Nunca se guarda la contraseña
+    registrar_evento("usuario_creado", "usuario", usuario.id_usuario, {"username": username, "rol": rol})
 
     # Devolver mensaje para confirmar registro OK
     return jsonify({"msg": "Usuario registrado exitosamente"}), 201
@@ -54,17 +53,10 @@ def register_user():
 """Endpoint para crear Centro Médico: POST /admin/centros (solo para rol Admin)"""
 
 @admin_bp.route("/centros", methods=["POST"])
-@jwt_required()     # Obliga a estar autenticado con token. Se usa el decorador de la librería flask_jwt_extended y solicita a los usuarios que quieran acceder un token JWT válido
+@role_required("admin", mensaje="No tienes permisos para crear centros medicos")     # Obliga a estar autenticado con token y a tener rol admin (leído del propio token, sin consultar la base de datos)
+@idempotente
 def crear_centro():
     
-    # Obtener datos de usuario autenticado y buscar en la base de datos
-    current_user_id = get_jwt_identity()
-    current_user = Usuario.query.get(current_user_id)
-
-    # Verificar que el usuario exista y que sea admin, si no, devolver error 403
-    if not current_user or current_user.rol != "admin":
-        return jsonify({"error": "No tienes permisos para crear centros medicos"}), 403
-    
     # Leer el JSON del body de la petición HTTP que hace el cliente. request.get_json() convierte ese JSON en un diccionario de Python.
     data = request.get_json()
 
@@ -90,23 +82,19 @@ def crear_centro():
     db.session.add(centro)
     db.session.commit()
 
+    # Invalidar la caché del catálogo (por si se había guardado que este id no existía)
+    invalidar_centro(centro.id_centro)
+
     # Devolver mensaje en JSON para confirmar el centro creado
     return jsonify({"msg": "Centro creado correctamente", "centro": centro.to_dict()}), 201
 
 """Endpoint para crear Doctor: POST /admin/doctores (solo para rol Admin)"""
 
 @admin_bp.route("/doctores", methods=["POST"])
-@jwt_required()     # Obliga a estar autenticado con token. Se usa el decorador de la librería flask_jwt_extended y solicita a los usuarios que quieran acceder un token JWT válido
+@role_required("admin", mensaje="No tienes permisos para crear doctores")     # Obliga a estar autenticado con token y a tener rol admin (leído del propio token, sin consultar la base de datos)
+@idempotente
 def crear_doctor():
 
-    # Obtener datos de usuario autenticado y buscar en la base de datos
-    current_user_id = get_jwt_identity()
-    current_user = Usuario.query.get(current_user_id)
-
-    # Verificar que el usuario exista y que sea admin, si no, devolver error 403
-    if not current_user or current_user.rol != "admin":
-        return jsonify({"error": "No tienes permisos para crear doctores"}), 403
-
     # Leer el JSON del body de la petición HTTP que hace el cliente. request.get_json() convierte ese JSON en un diccionario de Python.
     data = request.get_json()
     
@@ -124,24 +112,22 @@ def crear_doctor():
     if not nombre or not especialidad or not username or not password:
         return jsonify({"error": "Faltan datos", "required": ["nombre", "especialidad", "username", "password"]}), 400
 
-    # Verificar si el usuario ya existe y devolver error 409 en ese caso
-    existe = Usuario.query.filter_by(username=username).first() # Buscar usuario filtrando por nombre en la base de datos
-    if existe:
+    # Crear el usuario del doctor (rol "medico") y el doctor asociado en una única transacción (servicios/usuarios.py):
+    # flush del usuario para obtener su ID, doctor con ese ID y un solo commit. Si el username ya existe, el índice único
+    # hace fallar el INSERT y se devuelve error 409 (sin usuarios sin doctor)
+    try:
+        user_medico, doctor = crear_usuario(data, "medico")
+        db.session.commit()
+    except UsernameEnUso:
+        db.session.rollback()
         return jsonify({"error": "El nombre de usuario ya esta en uso"}), 409
 
-    # Crear el usuario del doctor forzando el rol a "medico"
-    user_medico = Usuario(username=username, rol="medico")
-    user_medico.set_password(password)
-    
-    # Guardar usuario en la base de datos para obtener de antemano el ID de usuario
-    db.session.add(user_medico)
-    db.session.commit()
+    # Invalidar la caché del catálogo (por si se había guardado que este id no existía)
+    invalidar_doctor(doctor.id_doctor)
 
-    # Crear el doctor asociado al usuario recién creado
-    doctor = Doctor(nombre=nombre, especialidad=especialidad, id_usuario=user_medico.id_usuario)
-    # Guardar todo en la base de datos
-    db.session.add(doctor)
-    db.session.commit()
+    # Dejar constancia en la auditoría del usuario y el doctor creados
+    registrar_evento("usuario_creado", "usuario", user_medico.id_usuario,
+                     {"username": user_medico.username, "rol": "medico", "id_doctor": doctor.id_doctor})
 
     # Devolver mensaje en JSON para confirmar el doctor creado
     return jsonify({"msg": "Doctor creado correctamente", "doctor": doctor.to_dict(), "usuario": user_medico.to_dict()}), 201
@@ -149,17 +135,10 @@ def crear_doctor():
 """Endpoint para crear Pacientes: POST /admin/pacientes (solo para rol Admin)"""
 
 @admin_bp.route("/pacientes", methods=["POST"])
-@jwt_required()
+@role_required("admin", mensaje="No tienes permisos para crear pacientes")     # Obliga a estar autenticado con token y a tener rol admin (leído del propio token, sin consultar la base de datos)
+@idempotente
 def crear_paciente():
 
-    # Obtener datos de usuario autenticado y buscar en la base de datos
-    current_user_id = get_jwt_identity()
-    current_user = Usuario.query.get(current_user_id)
-
-    # Verificar que el usuario exista y que sea admin, si no, devolver error 403
-    if not current_user or current_user.rol != "admin":
-        return jsonify({"error": "No tienes permisos para crear pacientes"}), 403
-
     # Leer el JSON del body de la petición HTTP que hace el cliente. request.get_json() convierte ese JSON en un diccionario de Python.
     data = request.get_json()
     
@@ -178,30 +157,147 @@ def crear_paciente():
     if not nombre or not telefono or not username or not password:
         return jsonify({"error": "Faltan datos", "required": ["nombre", "telefono", "username", "password"], "optional": ["estado"]}), 400
 
-    # Validar estado (ACTIVO o INACTIVO). Pasar a mayúsculas para evitar problemas.
-    estado = str(estado).upper()
-    if estado and estado not in ["ACTIVO", "INACTIVO"]:
+    # Validar estado (ACTIVO o INACTIVO). Pasar a mayúsculas para evitar problemas. Si no se envía, ACTIVO
+    estado = str(estado or "ACTIVO").upper()
+    if estado not in ["ACTIVO", "INACTIVO"]:
         return jsonify({"error": "Estado invalido", "estados_validos": ["ACTIVO", "INACTIVO"]}), 400
 
-    # Verificar si el usuario ya existe y devolver error 409 en ese caso
-    existe = Usuario.query.filter_by(username=username).first()
-    if existe:
+    # Crear el usuario del paciente (rol "paciente") y el paciente asociado en una única transacción (servicios/usuarios.py):
+    # flush del usuario para obtener su ID, paciente con ese ID y un solo commit. Si el username ya existe, el índice único
+    # hace fallar el INSERT y se devuelve error 409 (sin usuarios sin paciente)
+    try:
+        user_paciente, paciente = crear_usuario({**data, "estado": estado}, "paciente")
+        db.session.commit()
+    except UsernameEnUso:
+        db.session.rollback()
         return jsonify({"error": "El nombre de usuario ya esta en uso"}), 409
 
-    # Crear el usuario del paciente forzando el rol a "paciente"
-    user_paciente = Usuario(username=username, rol="paciente")
-    user_paciente.set_password(password)
+    # Dejar constancia en la auditoría del usuario y el paciente creados
+    registrar_evento("usuario_creado", "usuario", user_paciente.id_usuario,
+                     {"username": user_paciente.username, "rol": "paciente", "id_paciente": paciente.id_paciente})
 
-    # Guardar usuario en la base de datos para obtener de antemano el ID de usuario
-    db.session.add(user_paciente)
-    db.session.commit() 
+    # Devolver mensaje en JSON para confirmar el paciente creado
+    return jsonify({"msg": "Paciente creado correctamente", "paciente": paciente.to_dict(), "usuario": user_paciente.to_dict()}), 201
+
+
+"""Endpoints de búsqueda: GET /admin/pacientes/buscar?q=...&limit=... y GET /admin/doctores/buscar?q=...&limit=... (rol Admin o Secretaria)
+    - Busca en nombre y teléfono (pacientes) o en nombre y especialidad (doctores) con el índice de texto de busqueda.py
+    - Sin distinguir acentos ni mayúsculas y por prefijo: "mar gom" encuentra "María Gómez"
+    - Devuelve una lista con los más relevantes primero (como mucho limit, por defecto BUSQUEDA_LIMITE): los nombres iguales
+      a lo buscado y después los mejores entre las primeras BUSQUEDA_CANDIDATOS coincidencias en orden de id
+"""
+
+@admin_bp.route("/pacientes/buscar", methods=["GET"])
+@role_required("admin", "secretaria", mensaje="No tienes permisos para buscar pacientes")
+def buscar_pacientes():
+    return responder_busqueda("pacientes")
+
+@admin_bp.route("/doctores/buscar", methods=["GET"])
+@role_required("admin", "secretaria", mensaje="No tienes permisos para buscar doctores")
+def buscar_doctores():
+    return responder_busqueda("doctores")
+
+
+"""Función común a los dos endpoints de búsqueda: leer q y limit, buscar y devolver los resultados"""
+def responder_busqueda(tipo):
+    texto = (request.args.get("q") or "").strip()
+    if not texto:
+        return jsonify({"error": "Falta el texto a buscar (parametro q)"}), 400
+
+    # Con una sola letra coinciden casi todas las filas: se pide al menos 2 (el índice tiene precalculados los prefijos de 2 y 3)
+    if len(texto) < 2:
+        return jsonify({"error": "El texto a buscar debe tener al menos 2 caracteres"}), 400
+
+    config = current_app.config
+    try:
+        limite = leer_limite(request.args.get("limit"), config["BUSQUEDA_LIMITE"], config["BUSQUEDA_LIMITE_MAX"])
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    return jsonify([registro.to_dict() for registro in buscar(tipo, texto, limite)]), 200
+
+
+"""Endpoints de carga masiva: POST /admin/bulk/centros, POST /admin/bulk/doctores y POST /admin/bulk/pacientes (solo para rol Admin)
+    - El body puede ser un array JSON de registros o NDJSON (un registro JSON por línea, Content-Type: application/x-ndjson)
+    - Cada registro tiene los mismos campos que el endpoint de creación individual
+    - Todos los registros se validan de una vez y se insertan en una única transacción con INSERT masivos
+    - Por defecto es todo o nada: si algún registro no es válido no se inserta ninguno (error 400 con la lista de errores)
+    - Con ?parcial=true se insertan los registros válidos y se devuelven los errores del resto
+"""
+
+# Función de importación de cada tipo de registro (definidas en servicios/carga_masiva.py)
+IMPORTADORES = {"centros": importar_centros, "doctores": importar_doctores, "pacientes": importar_pacientes}
+
+@admin_bp.route("/bulk/<tipo>", methods=["POST"])
+@role_required("admin", mensaje="No tienes permisos para realizar cargas masivas")
+@idempotente
+def carga_masiva(tipo):
+
+    # Verificar que el tipo de registro es válido
+    if tipo not in IMPORTADORES:
+        return jsonify({"error": "Tipo de carga invalido", "tipos_validos": list(IMPORTADORES)}), 404
+
+    # Leer los registros: NDJSON (una línea por registro) o array JSON
+    if request.mimetype == "application/x-ndjson":
+        registros = []
+        for numero, linea in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not linea.strip():
+                continue
+            try:
+                registros.append(json.loads(linea))
+            except ValueError:
+                return jsonify({"error": f"Linea {numero} no es un JSON valido"}), 400
+    else:
+        registros = request.get_json(silent=True)
+        if not isinstance(registros, list):
+            return jsonify({"error": "Se esperaba un array JSON de registros o NDJSON"}), 400
+
+    if not registros:
+        return jsonify({"error": "No se han enviado datos"}), 400
 
-    # Crear el paciente asociado al usuario recién creado
-    paciente = Paciente(nombre=nombre, telefono=telefono, estado=estado, id_usuario=user_paciente.id_usuario)
+    # Limitar el tamaño del lote para no agotar la memoria del servidor
+    maximo = current_app.config["BULK_MAX_REGISTROS"]
+    if len(registros) > maximo:
+        return jsonify({"error": f"Demasiados registros en una sola carga (maximo {maximo})"}), 413
 
-    # Guardar todo en la base de datos
-    db.session.add(paciente)
-    db.session.commit()
+    parcial = request.args.get("parcial", "false").lower() in ["1", "true", "si"]
 
-    # Devolver mensaje en JSON para confirmar el paciente creado
-    return jsonify({"msg": "Paciente creado correctamente", "paciente": paciente.to_dict(), "usuario": user_paciente.to_dict()}), 201
\ No newline at end of file
+    # Validar e insertar en una única transacción
+    try:
+        resultado = IMPORTADORES[tipo](registros, parcial=parcial)
+        db.session.commit()
+    except IntegrityError:
+        # Otra petición ha creado a la vez un registro con el mismo nombre o username
+        db.session.rollback()
+        return jsonify({"error": "Conflicto: algun registro se ha creado a la vez desde otra peticion. Reintenta la carga"}), 409
+
+    # Los centros y doctores nuevos pueden estar guardados en la caché del catálogo como inexistentes
+    if tipo in ["centros", "doctores"] and resultado["creados"]:
+        invalidar_catalogo()
+
+    # Un solo evento de auditoría por carga, con los IDs creados (de doctores y pacientes, los de su perfil)
+    if resultado["creados"]:
+        registrar_evento("carga_masiva", tipo, None, {"creados": resultado["creados"], "ids": resultado["ids"]})
+
+    # Si hay errores y no se ha insertado nada, devolver error 400 con el detalle de cada registro
+    if resultado["errores"] and not resultado["creados"]:
+        return jsonify({"error": "Datos invalidos", **resultado}), 400
+
+    # Devolver el resumen de la carga
+    return jsonify({"msg": f"Carga de {tipo} completada", **resultado}), 201
+
+
+"""Endpoint para consultar el uso de la caché del catálogo: GET /admin/cache (solo para rol Admin)
+    Devuelve los aciertos, fallos y tamaño de la caché para poder ajustar CATALOGO_CACHE_SIZE y CATALOGO_CACHE_TTL
+"""
+
+@admin_bp.route("/cache", methods=["GET"])
+@role_required("admin", mensaje="No tienes permisos para consultar la cache")
+def estadisticas_cache():
+    caches = {"catalogo": cache_catalogo().estadisticas(), "idempotencia": registro_idempotencia().estadisticas()}
+
+    # La caché de tokens revocados solo se usa con JWT_REVOCATION_CHECK
+    if current_app.config["JWT_REVOCATION_CHECK"]:
+        caches["revocacion"] = current_app.extensions["cache_revocacion"].estadisticas()
+
+    return jsonify(caches), 200
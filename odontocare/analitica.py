@@ -0,0 +1,214 @@
+"""Exportación analítica de las citas con pandas/NumPy.
+
+Lee citas (también las archivadas en citas_archivo), doctores, centros y pacientes por trozos (pd.read_sql con chunksize) en DataFrames con tipos compactos
+(ids int32, salvo id_cita en int64 porque las particiones reparten ids desde k * 10**12; textos repetidos como category,
+fechas datetime64). Con CITAS_PARTICIONES las citas se leen de la base de datos principal y de todas las particiones. Calcula las métricas con groupby vectorizados y guarda
+todo como archivos Parquet o Feather. Los analistas consultan esos archivos en lugar de la base de datos de la aplicación.
+
+Métricas:
+    - utilizacion_doctor_dia / utilizacion_doctor: minutos reservados (citas no canceladas x DURACION_CITA_MINUTOS)
+      sobre los minutos del horario de trabajo (HORARIO_INICIO a HORARIO_FIN en DIAS_LABORABLES)
+    - cancelaciones_doctor / cancelaciones_centro: citas, canceladas y tasa de cancelación
+    - no_presentados_doctor / no_presentados_centro: aproximación a las ausencias. La aplicación no registra si el paciente
+      acudió, así que se cuentan las citas ya pasadas que siguen en estado "Activa" (es un máximo, no una cifra exacta)
+    - horas_punta: citas no canceladas por día de la semana y hora
+Por privacidad, de los pacientes solo se exportan el id y el estado.
+
+Requiere pyarrow para escribir Parquet o Feather (pip install pyarrow).
+
+Uso (desde la carpeta odontocare):
+    python analitica.py --salida analitica --formato parquet
+    python analitica.py --desde 2025-01-01 --hasta 2025-12-31 --formato feather
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from archivo import fuente_citas
+from extensions import db
+from fechas import fin_periodo
+from particiones import en_todas, particiones
+from models.doctor import Doctor
+from models.centro import Centro
+from models.paciente import Paciente
+
+# Tamaño por defecto de cada trozo leído de la base de datos
+TAMANO_TROZO = 50_000
+
+
+"""Función para leer una consulta por trozos en una o varias conexiones (la principal y las particiones) y convertir cada
+    trozo a tipos compactos antes de unirlos.
+    tipos: diccionario columna -> tipo de pandas ("int32", "category", "datetime64[ns]"...)"""
+def leer_tabla(conexiones, consulta, tipos, tamano_trozo=TAMANO_TROZO):
+    trozos = []
+    for conexion in conexiones:
+        for trozo in pd.read_sql(consulta, conexion, chunksize=tamano_trozo):
+            trozos.append(trozo.astype({columna: tipo for columna, tipo in tipos.items() if tipo != "category"}))
+    if not trozos:
+        return pd.DataFrame({columna: pd.Series(dtype=tipo) for columna, tipo in tipos.items()})
+
+    tabla = pd.concat(trozos, ignore_index=True)
+    # Las categorías se crean al final para que todos los trozos compartan las mismas
+    categorias = [columna for columna, tipo in tipos.items() if tipo == "category"]
+    return tabla.astype({columna: "category" for columna in categorias})
+
+
+"""Función para leer la foto (snapshot) de las tablas. desde y hasta filtran las citas por fecha ([desde, hasta)).
+    Con particiones, las citas se leen de la base de datos principal (las que aún no se han movido con
+    particionar-citas) y de cada partición"""
+def leer_snapshot(conexion, desde=None, hasta=None, tamano_trozo=TAMANO_TROZO):
+    # Las citas archivadas (citas_archivo) también forman parte del histórico que se analiza
+    citas = fuente_citas(incluir_historico=True)
+    consulta_citas = select(citas.id_cita, citas.fecha, citas.motivo, citas.estado, citas.id_paciente, citas.id_doctor, citas.id_centro)
+    if desde is not None:
+        consulta_citas = consulta_citas.where(citas.fecha >= desde)
+    if hasta is not None:
+        consulta_citas = consulta_citas.where(citas.fecha < hasta)
+
+    conexiones_citas = [conexion]
+    if particiones() is not None:
+        conexiones_citas += en_todas(lambda sesion: sesion.connection())
+    tabla_citas = leer_tabla(conexiones_citas, consulta_citas.order_by(citas.fecha, citas.id_cita),
+                             {"id_cita": "int64", "fecha": "datetime64[ns]", "motivo": "category", "estado": "category",
+                              "id_paciente": "int32", "id_doctor": "int32", "id_centro": "int32"}, tamano_trozo)
+    # Si particionar-citas se interrumpió entre la copia de un lote y su borrado, esas citas están repetidas (filas
+    # idénticas) en la principal y en la partición: se cuentan una vez. Después se ordena la unión de todas las fuentes
+    tabla_citas = (tabla_citas.drop_duplicates()
+                   .sort_values(["fecha", "id_cita"], kind="stable", ignore_index=True))
+
+    return {
+        "citas": tabla_citas,
+        "doctores": leer_tabla([conexion], select(Doctor.id_doctor, Doctor.nombre, Doctor.especialidad),
+                               {"id_doctor": "int32", "nombre": "object", "especialidad": "category"}, tamano_trozo),
+        "centros": leer_tabla([conexion], select(Centro.id_centro, Centro.nombre, Centro.direccion),
+                              {"id_centro": "int32", "nombre": "object", "direccion": "object"}, tamano_trozo),
+        "pacientes": leer_tabla([conexion], select(Paciente.id_paciente, Paciente.estado),
+                                {"id_paciente": "int32", "estado": "category"}, tamano_trozo),
+    }
+
+
+"""Función para calcular la tasa de cancelación agrupando por la columna indicada"""
+def tasa_cancelacion(citas, columna):
+    tabla = (citas.assign(cancelada=citas["estado"] == "Cancelada")
+             .groupby(columna, observed=True)
+             .agg(citas=("id_cita", "size"), canceladas=("cancelada", "sum"))
+             .reset_index())
+    tabla["tasa_cancelacion"] = (tabla["canceladas"] / tabla["citas"]).round(4)
+    return tabla
+
+
+"""Función para calcular la aproximación de ausencias (citas pasadas que siguen activas) agrupando por la columna indicada"""
+def no_presentados(citas, columna, ahora):
+    pasadas = citas[citas["fecha"] < ahora]
+    tabla = (pasadas.assign(sin_cerrar=pasadas["estado"] == "Activa")
+             .groupby(columna, observed=True)
+             .agg(citas_pasadas=("id_cita", "size"), activas_pasadas=("sin_cerrar", "sum"))
+             .reset_index())
+    tabla["tasa_no_presentados"] = (tabla["activas_pasadas"] / tabla["citas_pasadas"]).round(4)
+    return tabla
+
+
+"""Función para calcular todas las métricas a partir del snapshot
+    config: configuración de la app (horario, días laborables y duración de las citas); ahora: fecha de referencia"""
+def calcular_metricas(snapshot, config, ahora):
+    citas = snapshot["citas"]
+    activas = citas[citas["estado"] != "Cancelada"]
+
+    # Minutos de trabajo por día y semana laborable para np.busday_count (1 = día laborable, empezando en lunes)
+    inicio = datetime.strptime(config["HORARIO_INICIO"], "%H:%M")
+    fin = datetime.strptime(config["HORARIO_FIN"], "%H:%M")
+    minutos_jornada = (fin - inicio).total_seconds() / 60
+    semana = [1 if dia in config["DIAS_LABORABLES"] else 0 for dia in range(7)]
+    duracion = config["DURACION_CITA_MINUTOS"]
+
+    # Utilización por doctor y día
+    por_dia = (activas.assign(dia=activas["fecha"].dt.normalize())
+               .groupby(["id_doctor", "dia"], observed=True).size().rename("citas").reset_index())
+    por_dia["minutos_reservados"] = por_dia["citas"] * duracion
+    por_dia["utilizacion"] = (por_dia["minutos_reservados"] / minutos_jornada).round(4)
+
+    # Utilización por doctor en todo el periodo (días laborables entre la primera y la última cita)
+    if len(citas):
+        primer_dia = citas["fecha"].min().normalize().to_datetime64().astype("datetime64[D]")
+        ultimo_dia = citas["fecha"].max().normalize().to_datetime64().astype("datetime64[D]")
+        dias_laborables = int(np.busday_count(primer_dia, ultimo_dia + np.timedelta64(1, "D"), weekmask=semana))
+    else:
+        dias_laborables = 0
+    por_doctor = por_dia.groupby("id_doctor", observed=True).agg(citas=("citas", "sum"), dias_con_citas=("dia", "nunique")).reset_index()
+    por_doctor["minutos_reservados"] = por_doctor["citas"] * duracion
+    minutos_disponibles = dias_laborables * minutos_jornada
+    por_doctor["utilizacion"] = (por_doctor["minutos_reservados"] / minutos_disponibles).round(4) if minutos_disponibles else np.nan
+    por_doctor = por_doctor.merge(snapshot["doctores"][["id_doctor", "nombre", "especialidad"]], on="id_doctor", how="left")
+
+    # Horas punta: citas no canceladas por día de la semana (0 = lunes) y hora
+    horas_punta = (activas.assign(dia_semana=activas["fecha"].dt.dayofweek.astype("int8"), hora=activas["fecha"].dt.hour.astype("int8"))
+                   .groupby(["dia_semana", "hora"]).size().rename("citas").reset_index()
+                   .sort_values("citas", ascending=False, kind="stable", ignore_index=True))
+
+    return {
+        "utilizacion_doctor_dia": por_dia,
+        "utilizacion_doctor": por_doctor,
+        "cancelaciones_doctor": tasa_cancelacion(citas, "id_doctor"),
+        "cancelaciones_centro": tasa_cancelacion(citas, "id_centro"),
+        "no_presentados_doctor": no_presentados(citas, "id_doctor", ahora),
+        "no_presentados_centro": no_presentados(citas, "id_centro", ahora),
+        "horas_punta": horas_punta,
+    }
+
+
+"""Función para guardar cada DataFrame como <carpeta>/<nombre>.parquet o .feather"""
+def escribir(tablas, carpeta, formato="parquet"):
+    os.makedirs(carpeta, exist_ok=True)
+    rutas = {}
+    for nombre, tabla in tablas.items():
+        ruta = os.path.join(carpeta, f"{nombre}.{formato}")
+        if formato == "parquet":
+            tabla.to_parquet(ruta, index=False, compression="zstd")
+        else:
+            tabla.reset_index(drop=True).to_feather(ruta, compression="zstd")
+        rutas[nombre] = ruta
+    return rutas
+
+
+"""Función principal: leer el snapshot, calcular las métricas y guardar los archivos. Se debe llamar dentro del contexto de la app"""
+def exportar(carpeta, formato="parquet", desde=None, hasta=None, tamano_trozo=TAMANO_TROZO, config=None, ahora=None):
+    with db.engine.connect() as conexion:
+        snapshot = leer_snapshot(conexion, desde, hasta, tamano_trozo)
+    metricas = calcular_metricas(snapshot, config, ahora or datetime.now())
+    rutas = escribir({**snapshot, **metricas}, carpeta, formato)
+    return {nombre: {"filas": len(tabla), "archivo": rutas[nombre]} for nombre, tabla in {**snapshot, **metricas}.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar citas y métricas a Parquet/Feather para análisis")
+    parser.add_argument("--salida", default="analitica", help="Carpeta donde se guardan los archivos")
+    parser.add_argument("--formato", default="parquet", choices=["parquet", "feather"], help="Formato de los archivos")
+    parser.add_argument("--desde", help="Exportar solo citas desde este día (YYYY-MM-DD)")
+    parser.add_argument("--hasta", help="Exportar solo citas hasta este día incluido (YYYY-MM-DD)")
+    parser.add_argument("--trozo", type=int, default=TAMANO_TROZO, help="Filas leídas de la base de datos en cada trozo")
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("pyarrow") is None:
+        parser.error("Para escribir Parquet o Feather hace falta pyarrow: pip install pyarrow")
+
+    from app import create_app
+
+    desde = datetime.strptime(args.desde, "%Y-%m-%d") if args.desde else None
+    hasta = fin_periodo(args.hasta) if args.hasta else None
+
+    app = create_app()
+    with app.app_context():
+        resumen = exportar(args.salida, args.formato, desde, hasta, args.trozo, app.config)
+    print(json.dumps(resumen, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
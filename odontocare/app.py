@@ -1,22 +1,71 @@
 from flask import Flask
-from extensions import db, jwt
+from extensions import db, jwt, init_sqlite_pragmas
+from config import Config, opciones_motor
+from decoradores import init_revocacion
+from hashing import init_hashing
+from catalogo import init_catalogo
+from instrumentacion import init_instrumentacion
+from comandos import init_comandos
+from eventos import init_eventos
+from idempotencia import init_idempotencia
+from auditoria import init_auditoria
+from particiones import configurar_particiones, init_particiones
 from auth_bp import auth_bp  # Importa el Blueprint auth_bp
 from admin_bp import admin_bp  # Importa el Blueprint admin_bp
 from citas_bp import citas_bp # Importa el Blueprint citas_bp
 
-"""Crear y configurar instancia de Flask"""
-def create_app():
+"""Crear y configurar instancia de Flask
+    config_extra: diccionario opcional para sobrescribir la configuración (por ejemplo usar otra base de datos en los benchmarks)"""
+def create_app(config_extra=None):
     app = Flask(__name__)
 
-    # Configuración de la base de datos
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///odontocare.db" # Configurar la base de datos llamada odontocare.db en SQLite
-    app.config["SECRET_KEY"] = "secret"  # Clave secreta de Flask para firmar sesiones
-    app.config["JWT_SECRET_KEY"] = "jwtsecretkey"  # Clave secreta de Flask para firmar tokens JWT
+    # Cargar la configuración definida en config.py (base de datos, claves secretas, pool de conexiones...). Se puede cambiar con variables de entorno
+    app.config.from_object(Config)
+
+    # Sobrescribir la configuración si se ha indicado
+    if config_extra:
+        app.config.update(config_extra)
+
+    # Opciones del motor de base de datos (pool de conexiones). Las opciones indicadas a mano en SQLALCHEMY_ENGINE_OPTIONS tienen prioridad
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {**opciones_motor(app.config), **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})}
+
+    # Bases de datos de las particiones de citas (CITAS_PARTICIONES): se añaden a SQLALCHEMY_BINDS antes de inicializar la base de datos
+    configurar_particiones(app)
 
     # Inicializar la base de datos y JWT con la app Flask
     db.init_app(app)
     jwt.init_app(app)
 
+    # Configurar SQLite (WAL, synchronous y busy_timeout) en cada conexión
+    init_sqlite_pragmas(app)
+
+    # Particiones de citas por centro (sesiones por petición y PRAGMA de SQLite de cada partición)
+    init_particiones(app)
+
+    # Comprobación opcional de tokens revocados (JWT_REVOCATION_CHECK) con su caché
+    init_revocacion(app)
+
+    # Servicio de hash de contraseñas en un pool de procesos con límites de concurrencia
+    init_hashing(app)
+
+    # Caché de lectura de centros y doctores
+    init_catalogo(app)
+
+    # Bus de eventos de citas para GET /citas/stream
+    init_eventos(app)
+
+    # Respuestas guardadas de los POST con cabecera Idempotency-Key
+    init_idempotencia(app)
+
+    # Registro de auditoría con escritura diferida por lotes (AUDITORIA_DESTINO)
+    init_auditoria(app)
+
+    # Instrumentación opcional (INSTRUMENTACION): métricas por endpoint, consultas SQL, /metrics y Server-Timing
+    init_instrumentacion(app)
+
+    # Comandos de Flask CLI (por ejemplo flask --app run reconstruir-estadisticas)
+    init_comandos(app)
+
     # Registrar los Blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
@@ -0,0 +1,105 @@
+"""Archivo de citas antiguas (tabla citas_archivo).
+
+La tabla citas solo crece: las citas pasadas y canceladas se quedan en la misma tabla que recorren la comprobación
+de conflictos al agendar y listar_citas. archivar_citas() mueve las citas anteriores a un horizonte
+(ARCHIVO_HORIZONTE_DIAS días antes de hoy) a citas_archivo, así la tabla citas y sus índices se mantienen pequeños.
+
+- Se mueven por lotes de ARCHIVO_LOTE citas: cada lote es una transacción corta (INSERT ... SELECT + DELETE),
+  así el bloqueo de escritura de SQLite dura milisegundos y las reservas no esperan a que termine todo el archivo.
+  Entre lotes se espera ARCHIVO_PAUSA_SEGUNDOS para dejar pasar a otras escrituras.
+- Cada lote incrementa la versión de "citas" (los ETag de los listados cambian).
+- Las estadísticas (estadisticas_citas) no cambian: las citas archivadas se siguen contando.
+- Las citas archivadas siguen ocupando su hueco: al agendar se buscan también en citas_archivo (ocupados_en_archivo),
+  porque el índice único de conflictos solo está en la tabla citas.
+- Nunca se archiva la cita con el id_cita más alto: SQLite reutilizaría ese id para la siguiente cita nueva.
+- listar_citas con incluir_historico=true devuelve también las citas archivadas (fuente_citas).
+
+Se ejecuta periódicamente (por ejemplo con cron) con el comando: flask --app run archivar-citas"""
+
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, literal, select, tuple_, union_all
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models.cita import Cita
+from models.cita_archivada import CitaArchivada
+from particiones import en_todas
+from versiones import incrementar_version
+
+# Columnas que se copian de citas a citas_archivo
+COLUMNAS = ["id_cita", "fecha", "motivo", "estado", "id_paciente", "id_doctor", "id_centro", "id_usuario_registra"]
+
+# Valores del query param incluir_historico que se consideran verdaderos
+VALORES_SI = ["1", "true", "si", "sí", "yes"]
+
+
+"""Función para mover a citas_archivo las citas anteriores a 'antes_de', por lotes (cada lote con su propio commit).
+    sesion: la sesión de las citas (por defecto db.session; con particiones se llama una vez con la de cada partición).
+    Devuelve el número de citas archivadas"""
+def archivar_citas(antes_de, lote=1000, pausa=0.0, sesion=None):
+    sesion = sesion or db.session
+    antes_de = min(antes_de, datetime.now())  # Nunca citas futuras: ocupados_en_archivo solo mira las fechas pasadas
+    id_maximo = sesion.scalar(select(func.max(Cita.id_cita)))
+    if id_maximo is None:
+        return 0
+
+    total = 0
+    while True:
+        # Ids del siguiente lote (usa el índice de fecha)
+        ids = sesion.scalars(select(Cita.id_cita)
+                             .where(Cita.fecha < antes_de, Cita.id_cita < id_maximo)
+                             .order_by(Cita.fecha, Cita.id_cita).limit(lote)).all()
+        if not ids:
+            break
+
+        # Copiar y borrar en la misma transacción: una cita nunca está en las dos tablas ni en ninguna
+        origen = select(*[getattr(Cita, columna) for columna in COLUMNAS], literal(datetime.now()).label("archivada_en"))
+        sesion.execute(insert(CitaArchivada).from_select(COLUMNAS + ["archivada_en"], origen.where(Cita.id_cita.in_(ids))))
+        sesion.execute(delete(Cita).where(Cita.id_cita.in_(ids)), execution_options={"synchronize_session": False})
+        incrementar_version(sesion.connection(), "citas")
+        sesion.commit()
+
+        total += len(ids)
+        if len(ids) < lote:
+            break
+        if pausa:
+            time.sleep(pausa)
+    return total
+
+
+"""Función para buscar qué pares (id_doctor, fecha) de 'claves' están ocupados por citas archivadas no canceladas.
+    Solo se consulta el archivo para las fechas pasadas (archivar-citas nunca mueve citas posteriores a ahora), así que
+    las reservas normales, en el futuro, no hacen ninguna consulta más. Con particiones se busca en todas"""
+def ocupados_en_archivo(claves, ahora=None):
+    ahora = ahora or datetime.now()
+    pasadas = {(id_doctor, fecha) for id_doctor, fecha in claves if fecha < ahora}
+    if not pasadas:
+        return set()
+
+    consulta = (select(CitaArchivada.id_doctor, CitaArchivada.fecha)
+                .where(tuple_(CitaArchivada.id_doctor, CitaArchivada.fecha).in_(pasadas))
+                .where(CitaArchivada.estado != "Cancelada"))
+    return {tuple(fila) for filas in en_todas(lambda sesion: sesion.execute(consulta).all()) for fila in filas}
+
+
+"""Función para calcular la fecha límite del archivo a partir del horizonte en días"""
+def limite_archivo(dias, ahora=None):
+    return (ahora or datetime.now()) - timedelta(days=dias)
+
+
+"""Función para interpretar el query param incluir_historico"""
+def leer_incluir_historico(valor):
+    return str(valor or "").strip().lower() in VALORES_SI
+
+
+"""Función para obtener la entidad sobre la que se consultan las citas.
+    Sin histórico es Cita. Con histórico es Cita sobre la unión (UNION ALL) de citas y citas_archivo: las consultas,
+    filtros, orden y paginación se escriben igual y devuelven objetos Cita con el mismo to_dict"""
+def fuente_citas(incluir_historico=False):
+    if not incluir_historico:
+        return Cita
+    columnas_archivo = [getattr(CitaArchivada, columna).label(columna) for columna in COLUMNAS]
+    union = union_all(select(*[getattr(Cita, columna) for columna in COLUMNAS]), select(*columnas_archivo)).subquery("citas_todas")
+    return aliased(Cita, union)
@@ -0,0 +1,96 @@
+"""Punto de entrada ASGI de la API (alternativa a run.py / WSGI para muchos clientes simultáneos).
+
+- GET /citas/citas se atiende con la variante asíncrona (citas_bp/asincrono.py) sobre el motor asíncrono de asincrono.py:
+  miles de clientes pueden consultar el listado a la vez sin ocupar un hilo cada uno mientras esperan a la base de datos.
+- GET /citas/stream (Server-Sent Events) también es asíncrono: cada conexión abierta es una corrutina que espera eventos
+  del bus y se cierra al recibir "http.disconnect". Por el pool de hilos WSGI cada conexión ocuparía un hilo mientras
+  está abierta y la desconexión del cliente no se notaría nunca.
+- El resto de endpoints (y listar citas en formato NDJSON) los atiende la misma app Flask de create_app, adaptada a ASGI
+  con asgiref (WsgiToAsgi) en un pool de ASGI_HILOS_WSGI hilos. Los Blueprints, la configuración y las reglas son las mismas.
+
+Uso (desde la carpeta odontocare, hace falta pip install uvicorn aiosqlite asgiref):
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async, SyncToAsync
+from asgiref.wsgi import WsgiToAsgiInstance
+
+from app import create_app
+from asincrono import init_asincrono, PeticionASGI
+from citas_bp.asincrono import listar_citas_async, stream_citas_async
+
+# asgiref no permite elegir el pool de hilos de WsgiToAsgi: InstanciaWsgi ejecuta la función síncrona que envuelve
+# WsgiToAsgiInstance.run_wsgi_app (detalle interno de asgiref, por eso la versión está fijada en requirements.txt).
+# Si otra versión lo cambia, fallar al arrancar en lugar de en la primera petición
+if not isinstance(WsgiToAsgiInstance.__dict__.get("run_wsgi_app"), SyncToAsync):
+    raise ImportError("Versión de asgiref no compatible con asgi.py: instala la versión de requirements.txt")
+
+
+class InstanciaWsgi(WsgiToAsgiInstance):
+    """
+    Adaptador WSGI -> ASGI de asgiref que ejecuta la app Flask en un pool de hilos propio.
+    WsgiToAsgi por defecto ejecuta todas las peticiones WSGI en un único hilo (thread_sensitive), una detrás de otra
+    """
+
+    def __init__(self, app_wsgi, hilos):
+        super().__init__(app_wsgi)
+        self.hilos = hilos
+
+    async def run_wsgi_app(self, body):
+        ejecutar = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+        await sync_to_async(ejecutar, thread_sensitive=False, executor=self.hilos)(self, body)
+
+
+class AppASGI:
+    """
+    App ASGI: endpoints asíncronos para las rutas de lectura más consultadas y la app Flask para todo lo demás
+    """
+
+    def __init__(self, app_flask):
+        self.app_flask = app_flask
+        self.base = init_asincrono(app_flask)
+        self.hilos = ThreadPoolExecutor(max_workers=app_flask.config["ASGI_HILOS_WSGI"], thread_name_prefix="wsgi")
+
+        # (método, ruta) -> endpoint asíncrono. Si el endpoint devuelve None la petición pasa a la app Flask
+        self.rutas = {("GET", "/citas/citas"): listar_citas_async, ("GET", "/citas/stream"): stream_citas_async}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.ciclo_de_vida(receive, send)
+            return
+        if scope["type"] != "http":
+            # La API no usa websockets
+            await send({"type": "websocket.close", "code": 1000})
+            return
+
+        endpoint = self.rutas.get((scope["method"], scope["path"]))
+        if endpoint is not None:
+            respuesta = await endpoint(self.app_flask, PeticionASGI(scope))
+            if respuesta is not None:
+                await respuesta.enviar(send, receive)
+                return
+
+        await InstanciaWsgi(self.app_flask, self.hilos)(scope, receive, send)
+
+    """Método para los mensajes de arranque y parada del servidor: al parar se cierran las conexiones del motor asíncrono"""
+    async def ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                await self.base.cerrar()
+                self.hilos.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+"""Crear la app ASGI. config_extra: igual que en create_app"""
+def crear_app_asgi(config_extra=None):
+    return AppASGI(create_app(config_extra))
+
+
+"""Creación de la API en modo ASGI (uvicorn asgi:app)"""
+app = crear_app_asgi()
@@ -0,0 +1,233 @@
+"""Acceso asíncrono a la base de datos y comprobación del token para el modo ASGI (asgi.py).
+
+En el modo WSGI cada petición ocupa un hilo mientras espera a la base de datos. Con muchos clientes consultando
+el listado de citas cada pocos segundos los hilos se agotan aunque casi todo el tiempo sea espera.
+En el modo ASGI los endpoints de lectura más consultados (citas_bp/asincrono.py) se atienden con corrutinas sobre
+un motor asíncrono de SQLAlchemy (aiosqlite en local, asyncpg con PostgreSQL): mientras esperan a la base de datos
+el bucle de eventos atiende otras conexiones.
+
+La comprobación del token hace lo mismo que @jwt_required() + usuario_actual() (decoradores.py), pero sin bloquear:
+    - Valida firma, caducidad y tipo del token con la configuración de flask_jwt_extended
+    - Si JWT_REVOCATION_CHECK está activo, usa la misma caché de revocación y consulta el usuario con el motor asíncrono
+    - Los tokens antiguos sin rol se completan consultando el usuario y su perfil"""
+
+import asyncio
+from urllib.parse import parse_qsl
+
+import jwt as pyjwt
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.datastructures import Headers, MultiDict
+
+from cache import NO_ENCONTRADO
+from extensions import db, escuchar_pragmas_sqlite
+from models.usuario import Usuario
+from models.doctor import Doctor
+from models.paciente import Paciente
+
+# Driver asíncrono para cada base de datos
+DRIVERS_ASYNC = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "mysql": "mysql+aiomysql"}
+
+
+class ErrorAutenticacion(Exception):
+    """
+    Error al comprobar el token. Lleva el cuerpo y el código de la respuesta (los mismos que devuelve flask_jwt_extended)
+    """
+
+    def __init__(self, mensaje, codigo):
+        super().__init__(mensaje)
+        self.cuerpo = {"msg": mensaje}
+        self.codigo = codigo
+
+
+class PeticionASGI:
+    """
+    Datos de una petición HTTP ASGI que necesitan los endpoints asíncronos (ruta, query params y cabeceras)
+    """
+
+    def __init__(self, scope):
+        self.metodo = scope["method"]
+        self.ruta = scope["path"]
+        self.args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+        self.cabeceras = Headers([(nombre.decode("latin-1"), valor.decode("latin-1")) for nombre, valor in scope["headers"]])
+
+
+class RespuestaASGI:
+    """
+    Respuesta de un endpoint asíncrono: código, cuerpo en bytes y cabeceras
+    """
+
+    def __init__(self, estado, cuerpo=b"", cabeceras=None):
+        self.estado = estado
+        self.cuerpo = cuerpo
+        self.cabeceras = cabeceras or {}
+
+    """Método para enviar la respuesta por el canal 'send' de ASGI ('receive' solo lo usan las respuestas en streaming)"""
+    async def enviar(self, send, receive=None):
+        cabeceras = [(nombre.lower().encode("latin-1"), str(valor).encode("latin-1")) for nombre, valor in self.cabeceras.items()]
+        cabeceras.append((b"content-length", str(len(self.cuerpo)).encode()))
+        await send({"type": "http.response.start", "status": self.estado, "headers": cabeceras})
+        await send({"type": "http.response.body", "body": self.cuerpo})
+
+
+class RespuestaSSE:
+    """
+    Respuesta en streaming de Server-Sent Events para una suscripción del bus de eventos (eventos.py) creada con el bucle
+    de eventos. Mientras espera eventos no ocupa ningún hilo y escucha 'receive': en cuanto llega "http.disconnect" deja
+    de enviar y cierra la suscripción (en el modo WSGI la desconexión solo se nota al fallar una escritura)
+    - filtro: función que recibe la cita en diccionario y devuelve True si el evento se envía a este cliente
+    - latido: segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+    - formatear: función que convierte un evento al texto SSE
+    """
+
+    def __init__(self, suscripcion, filtro, latido, formatear):
+        self.suscripcion = suscripcion
+        self.filtro = filtro
+        self.latido = latido
+        self.formatear = formatear
+
+    """Método para enviar el stream hasta que el cliente se desconecta o su cola se desborda"""
+    async def enviar(self, send, receive):
+        desconexion = asyncio.ensure_future(esperar_desconexion(receive))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]})
+            await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+
+            while not self.suscripcion.desbordada:
+                siguiente = asyncio.ensure_future(self.suscripcion.siguiente_async(self.latido))
+                await asyncio.wait([siguiente, desconexion], return_when=asyncio.FIRST_COMPLETED)
+                if desconexion.done():
+                    siguiente.cancel()
+                    return
+                evento = siguiente.result()
+                if evento is None:
+                    await send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True})
+                elif self.filtro(evento["datos"]):
+                    await send({"type": "http.response.body", "body": self.formatear(evento).encode(), "more_body": True})
+
+            # Cola desbordada: se termina la respuesta para que el cliente se reconecte con Last-Event-ID
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            desconexion.cancel()
+            self.suscripcion.cerrar()
+
+
+"""Función para esperar a que el cliente cierre la conexión (mensaje "http.disconnect" de ASGI)"""
+async def esperar_desconexion(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+"""Función para crear una respuesta JSON igual que jsonify (mismo formato y orden de claves)"""
+def respuesta_json(app, datos, estado=200, cabeceras=None):
+    cuerpo = app.json.response(datos).get_data()
+    return RespuestaASGI(estado, cuerpo, {"Content-Type": "application/json", **(cabeceras or {})})
+
+
+class BaseDatosAsync:
+    """
+    Motor asíncrono de SQLAlchemy sobre la misma base de datos que db.engine y su fábrica de sesiones
+    """
+
+    def __init__(self, motor):
+        self.motor = motor
+        self.sesiones = async_sessionmaker(motor, expire_on_commit=False)
+
+    """Método para abrir una sesión asíncrona. Uso: async with base.sesion() as sesion: ..."""
+    def sesion(self):
+        return self.sesiones()
+
+    """Método para cerrar las conexiones del pool (al apagar el servidor ASGI)"""
+    async def cerrar(self):
+        await self.motor.dispose()
+
+
+"""Función para convertir la URL de la base de datos (la de db.engine, con la ruta de SQLite ya resuelta) al driver asíncrono"""
+def url_async(url):
+    if url.drivername in DRIVERS_ASYNC.values():
+        return url
+    backend = url.get_backend_name()
+    if backend not in DRIVERS_ASYNC:
+        raise ValueError(f"No hay driver asíncrono configurado para {backend}")
+    return url.set(drivername=DRIVERS_ASYNC[backend])
+
+
+"""Función para crear el motor asíncrono de la app (se llama desde asgi.py, el modo WSGI no lo necesita)"""
+def init_asincrono(app):
+    with app.app_context():
+        url = url_async(db.engine.url)
+
+    # Mismas opciones de pool que el motor síncrono (SQLALCHEMY_ENGINE_OPTIONS)
+    motor = create_async_engine(url, **app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+    if url.get_backend_name() == "sqlite":
+        escuchar_pragmas_sqlite(motor.sync_engine, app.config)
+
+    base = BaseDatosAsync(motor)
+    app.extensions["asincrono"] = base
+    return base
+
+
+"""Función para obtener la base de datos asíncrona de una app"""
+def base_datos_async(app):
+    return app.extensions["asincrono"]
+
+
+"""Función para obtener los claims de rol de un usuario con la sesión asíncrona (igual que claims_usuario de decoradores.py)"""
+async def claims_usuario_async(sesion, usuario):
+    claims = {"rol": usuario.rol, "id_doctor": None, "id_paciente": None}
+    if usuario.rol == "medico":
+        claims["id_doctor"] = await sesion.scalar(select(Doctor.id_doctor).where(Doctor.id_usuario == usuario.id_usuario).limit(1))
+    elif usuario.rol == "paciente":
+        claims["id_paciente"] = await sesion.scalar(select(Paciente.id_paciente).where(Paciente.id_usuario == usuario.id_usuario).limit(1))
+    return claims
+
+
+"""Función para comprobar el token de la cabecera Authorization sin bloquear el bucle de eventos.
+    Devuelve el usuario (id_usuario, rol, id_doctor, id_paciente) como usuario_actual(), o None si el usuario del token ya no existe.
+    Lanza ErrorAutenticacion si falta el token, no es válido, ha caducado o está revocado"""
+async def autenticar(app, cabecera):
+    if not cabecera:
+        raise ErrorAutenticacion("Missing Authorization Header", 401)
+    partes = cabecera.split()
+    if len(partes) != 2 or partes[0] != "Bearer":
+        raise ErrorAutenticacion("Missing 'Bearer' type in 'Authorization' header. Expected 'Authorization: Bearer <JWT>'", 422)
+
+    # Decodificar el token con la configuración de flask_jwt_extended (clave, algoritmo, caducidad...). Es CPU, no espera
+    try:
+        with app.app_context():
+            claims = decode_token(partes[1])
+    except pyjwt.ExpiredSignatureError:
+        raise ErrorAutenticacion("Token has expired", 401) from None
+    except (pyjwt.InvalidTokenError, JWTExtendedException) as error:
+        raise ErrorAutenticacion(str(error), 422) from None
+    if claims.get("type") != "access":
+        raise ErrorAutenticacion("Only non-refresh tokens are allowed", 422)
+
+    id_usuario = int(claims["sub"])
+    base = base_datos_async(app)
+
+    # Revocación (JWT_REVOCATION_CHECK): misma caché y misma regla que token_revocado en decoradores.py
+    if app.config["JWT_REVOCATION_CHECK"]:
+        cache = app.extensions["cache_revocacion"]
+        clave = (claims["sub"], claims.get("rol"))
+        revocado = cache.get(clave)
+        if revocado is NO_ENCONTRADO:
+            async with base.sesion() as sesion:
+                registro = await sesion.get(Usuario, id_usuario)
+            revocado = registro is None or ("rol" in claims and registro.rol != claims["rol"])
+            cache.set(clave, revocado)
+        if revocado:
+            raise ErrorAutenticacion("Token has been revoked", 401)
+
+    if "rol" in claims:
+        return {"id_usuario": id_usuario, "rol": claims["rol"], "id_doctor": claims.get("id_doctor"), "id_paciente": claims.get("id_paciente")}
+
+    # Token antiguo sin rol: buscar el usuario y su perfil en la base de datos
+    async with base.sesion() as sesion:
+        registro = await sesion.get(Usuario, id_usuario)
+        if registro is None:
+            return None
+        return {"id_usuario": id_usuario, **await claims_usuario_async(sesion, registro)}
@@ -0,0 +1,310 @@
+"""Registro de auditoría con escritura diferida (write-behind): quién agendó, canceló o creó cada cosa y cuándo.
+
+Hasta ahora la única traza era id_usuario_registra de cada cita, y las cancelaciones no dejaban ningún rastro.
+Guardar cada evento con un INSERT y un commit más en la misma petición duplicaría el coste de cada escritura
+(con SQLITE_SYNCHRONOUS=FULL, un fsync más por reserva). En su lugar:
+    - Los endpoints registran el evento DESPUÉS de su commit (registrar_evento): se añade a una cola en memoria y se vuelve
+      enseguida, sin tocar la base de datos
+    - Un hilo escribe los eventos por lotes: espera como mucho AUDITORIA_INTERVALO_SEGUNDOS desde el primer evento o hasta
+      tener AUDITORIA_LOTE, y los guarda con un solo INSERT (o una sola escritura y fsync del archivo)
+    - La cola está limitada (AUDITORIA_COLA_MAX). Si se llena porque el destino no da abasto, la petición espera hasta
+      AUDITORIA_ESPERA_SEGUNDOS a que haya sitio (contrapresión) y, si sigue llena, escribe su evento ella misma:
+      las peticiones se frenan, pero no se pierden eventos ni crece la memoria
+    - Si el destino falla (base de datos bloqueada, disco lleno) el hilo reintenta el mismo lote y mientras tanto no saca
+      más eventos de la cola, así que la contrapresión llega también a las peticiones
+    - Si falla la escritura que hace la propia petición, el evento se descarta (se anota en el log y en 'perdidos'):
+      la petición ya ha hecho su commit y no debe responder con error
+    - Al parar el proceso (atexit) se escriben los eventos que quedan en la cola antes de salir
+Destinos (AUDITORIA_DESTINO):
+    - "tabla": tabla auditoria de la base de datos principal (models/evento_auditoria.py), de solo escritura
+    - una ruta terminada en .jsonl: una línea JSON por evento, con rotación al pasar de AUDITORIA_ROTAR_BYTES
+      (archivo.jsonl.1, .2 ... hasta AUDITORIA_COPIAS). Pensado para un solo proceso: con varios workers, usar la tabla
+    - "" o "off": sin auditoría
+Con AUDITORIA_COLA_MAX = 0 no hay cola ni hilo: cada evento se escribe en la propia petición con su propio commit
+(es el coste que se evita; sirve para compararlo en benchmarks/bench_auditoria.py).
+Los eventos de la cola que no se han escrito se pierden si el proceso muere sin terminar (kill -9, corte de luz)."""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+
+from extensions import db
+from decoradores import usuario_actual
+from models.evento_auditoria import EventoAuditoria
+
+logger = logging.getLogger(__name__)
+
+# Reintentos de un lote que falla una vez pedido el cierre (después se descarta y se deja constancia en el log)
+INTENTOS_AL_CERRAR = 3
+
+# Triggers de SQLite que impiden modificar o borrar el registro de auditoría
+TRIGGERS_SOLO_ESCRITURA = [
+    "CREATE TRIGGER IF NOT EXISTS auditoria_sin_update BEFORE UPDATE ON auditoria BEGIN SELECT RAISE(ABORT, 'auditoria es de solo escritura'); END",
+    "CREATE TRIGGER IF NOT EXISTS auditoria_sin_delete BEFORE DELETE ON auditoria BEGIN SELECT RAISE(ABORT, 'auditoria es de solo escritura'); END",
+]
+
+
+"""Función que crea los triggers de solo escritura cuando db.create_all() crea la tabla auditoria (solo SQLite)"""
+def al_crear_tabla(tabla, conexion, **kw):
+    if conexion.dialect.name == "sqlite":
+        for sentencia in TRIGGERS_SOLO_ESCRITURA:
+            conexion.exec_driver_sql(sentencia)
+
+
+event.listen(EventoAuditoria.__table__, "after_create", al_crear_tabla)
+
+
+class DestinoTabla:
+    """
+    Destino de los eventos: tabla auditoria de la base de datos principal. Cada lote es un INSERT masivo y un commit
+    en una conexión propia (no usa la sesión de ninguna petición)
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._motor = None
+
+    """Método para guardar un lote de eventos"""
+    def escribir(self, eventos):
+        # El motor de la base de datos se obtiene una vez (el hilo escritor no tiene contexto de la app)
+        if self._motor is None:
+            with self.app.app_context():
+                self._motor = db.engine
+        filas = [{**evento, "fecha": datetime.fromisoformat(evento["fecha"]),
+                  "datos": json.dumps(evento["datos"], ensure_ascii=False) if evento["datos"] is not None else None}
+                 for evento in eventos]
+        with self._motor.begin() as conexion:
+            conexion.execute(EventoAuditoria.__table__.insert(), filas)
+
+
+class DestinoJSONL:
+    """
+    Destino de los eventos: archivo JSON Lines que se rota al pasar de 'max_bytes' (se guardan 'copias' archivos antiguos).
+    Cada lote se escribe de una vez y se fuerza a disco con un solo fsync
+    """
+
+    def __init__(self, ruta, max_bytes, copias):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.copias = max(copias, 1)
+
+    """Método para rotar el archivo si ha llegado al tamaño máximo: archivo.jsonl -> archivo.jsonl.1 -> .2 ..."""
+    def rotar(self):
+        if not os.path.exists(self.ruta) or os.path.getsize(self.ruta) < self.max_bytes:
+            return
+        for numero in range(self.copias - 1, 0, -1):
+            if os.path.exists(f"{self.ruta}.{numero}"):
+                os.replace(f"{self.ruta}.{numero}", f"{self.ruta}.{numero + 1}")
+        os.replace(self.ruta, f"{self.ruta}.1")
+
+    """Método para guardar un lote de eventos"""
+    def escribir(self, eventos):
+        self.rotar()
+        lineas = "".join(json.dumps(evento, ensure_ascii=False, separators=(",", ":")) + "\n" for evento in eventos)
+        with open(self.ruta, "a", encoding="utf-8") as archivo:
+            archivo.write(lineas)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+
+class ColaAuditoria:
+    """
+    Cola limitada de eventos de auditoría y el hilo que los escribe por lotes en el destino.
+    Con cola_max = 0 los eventos se escriben en el hilo que los registra
+    """
+
+    def __init__(self, destino, cola_max, lote, intervalo, espera, cierre=10):
+        self.destino = destino
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera = espera
+        self.cierre = cierre
+        self.cola = queue.Queue(maxsize=cola_max) if cola_max > 0 else None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()            # Arranque del hilo
+        self._lock_destino = threading.Lock()    # El hilo y las peticiones con la cola llena no escriben a la vez
+        self._hilo = None
+
+        # Contadores de uso
+        self.escritos = 0
+        self.lotes = 0
+        self.sincronos = 0
+        self.perdidos = 0
+
+    """Método para arrancar el hilo escritor la primera vez que se registra un evento (y en cada proceso: con gunicorn
+        --preload la app se crea antes del fork y los hilos no pasan a los workers)"""
+    def _arrancar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._escribir_en_segundo_plano, name="auditoria", daemon=True)
+                self._hilo.start()
+
+    """Método para registrar un evento. No espera a que se escriba salvo que la cola esté llena"""
+    def registrar(self, evento):
+        if self.cola is None or self._parar.is_set():
+            self._escribir_ahora(evento)
+            return
+        self._arrancar()
+        try:
+            self.cola.put(evento, timeout=self.espera)
+        except queue.Full:
+            # Contrapresión: el destino no da abasto. La petición escribe su propio evento (más lenta, pero sin perderlo)
+            self._escribir_ahora(evento)
+
+    """Método para escribir un evento en el hilo que lo registra (sin cola o con la cola llena).
+        Si el destino falla el evento se pierde: la petición ya ha hecho su commit y no debe fallar por la auditoría"""
+    def _escribir_ahora(self, evento):
+        try:
+            with self._lock_destino:
+                self.destino.escribir([evento])
+        except Exception:
+            self.perdidos += 1
+            logger.exception("No se ha podido escribir el evento de auditoria %s de %s %s", evento["tipo"], evento["objeto"], evento["id_objeto"])
+            return
+        self.sincronos += 1
+
+    """Método para sacar de la cola el siguiente lote: espera el primer evento y después sigue recogiendo hasta tener
+        'lote' eventos o hasta que pasen 'intervalo' segundos. Deja de esperar si recibe el aviso de cierre (None).
+        Devuelve [] si no llega ningún evento"""
+    def _siguiente_lote(self):
+        eventos = []
+        limite = time.monotonic() + self.intervalo
+        while len(eventos) < self.lote:
+            try:
+                evento = self.cola.get(timeout=self.intervalo if not eventos else max(limite - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if evento is None:
+                self.cola.task_done()
+                break
+            if not eventos:
+                limite = time.monotonic() + self.intervalo
+            eventos.append(evento)
+        return eventos
+
+    """Método para guardar un lote. Si el destino falla se reintenta el mismo lote (sin sacar más eventos de la cola)"""
+    def _guardar(self, eventos):
+        intentos = 0
+        try:
+            while True:
+                try:
+                    with self._lock_destino:
+                        self.destino.escribir(eventos)
+                    self.escritos += len(eventos)
+                    self.lotes += 1
+                    return
+                except Exception:
+                    intentos += 1
+                    logger.exception("No se han podido escribir %d eventos de auditoria (intento %d)", len(eventos), intentos)
+                    if self._parar.is_set() and intentos >= INTENTOS_AL_CERRAR:
+                        self.perdidos += len(eventos)
+                        logger.error("Se descartan %d eventos de auditoria al cerrar", len(eventos))
+                        return
+                    time.sleep(min(self.intervalo * intentos, 30))
+        finally:
+            for _ in eventos:
+                self.cola.task_done()
+
+    """Método del hilo escritor: guardar lotes hasta que se pida el cierre y la cola quede vacía"""
+    def _escribir_en_segundo_plano(self):
+        while True:
+            eventos = self._siguiente_lote()
+            if eventos:
+                self._guardar(eventos)
+            if self._parar.is_set() and self.cola.empty():
+                return
+
+    """Método para esperar a que se escriban todos los eventos registrados hasta ahora"""
+    def vaciar(self):
+        if self.cola is not None:
+            self.cola.join()
+
+    """Método para cerrar: el hilo escribe lo que queda en la cola y termina (se llama al parar el proceso).
+        Espera como mucho 'timeout' segundos (por defecto los de la cola). Los eventos registrados después se escriben directamente"""
+    def cerrar(self, timeout=None):
+        timeout = self.cierre if timeout is None else timeout
+        self._parar.set()
+        if self._hilo is not None:
+            # Aviso para que el hilo no espere a completar el lote actual (si la cola está llena no hace falta: no va a esperar)
+            try:
+                self.cola.put_nowait(None)
+            except queue.Full:
+                pass
+            self._hilo.join(timeout)
+            if self._hilo.is_alive():
+                logger.error("El hilo de auditoria no ha terminado en %s s: quedan %d eventos sin escribir", timeout, self.cola.qsize())
+
+    """Método para devolver los contadores de uso"""
+    def estadisticas(self):
+        return {"pendientes": self.cola.qsize() if self.cola is not None else 0, "escritos": self.escritos, "lotes": self.lotes,
+                "sincronos": self.sincronos, "perdidos": self.perdidos}
+
+
+"""Colas de auditoría creadas en el proceso (una por app). Al parar el proceso se cierran todas con un solo atexit
+    registrado al importar el módulo, como los servicios de hash (hashing.py) y los brokers de eventos (eventos.py)"""
+colas_abiertas = weakref.WeakSet()
+
+
+"""Función para escribir los eventos pendientes de todas las colas de auditoría del proceso (se ejecuta al salir)"""
+def cerrar_colas():
+    for cola in list(colas_abiertas):
+        cola.cerrar()
+
+
+atexit.register(cerrar_colas)
+
+
+"""Función para obtener la cola de auditoría de la app actual (None si la auditoría está desactivada)"""
+def cola_auditoria():
+    return current_app.extensions.get("auditoria")
+
+
+"""Función para registrar un evento de auditoría. Se llama DESPUÉS del commit (si la transacción falla no hay evento).
+    El usuario y la IP se toman de la petición actual (fuera de una petición, por ejemplo en un comando, quedan vacíos).
+    - tipo: "cita_creada", "cita_cancelada", "usuario_creado"...
+    - objeto e id_objeto: sobre qué se ha hecho la acción ("cita" y su id...)
+    - datos: diccionario con el detalle (nunca contraseñas ni hashes)"""
+def registrar_evento(tipo, objeto, id_objeto, datos=None):
+    cola = cola_auditoria()
+    if cola is None:
+        return
+    usuario = (usuario_actual() or {}) if has_request_context() else {}
+    cola.registrar({
+        "fecha": datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+        "tipo": tipo,
+        "id_usuario": usuario.get("id_usuario"),
+        "rol": usuario.get("rol"),
+        "ip": request.remote_addr if has_request_context() else None,
+        "objeto": objeto,
+        "id_objeto": id_objeto,
+        "datos": datos,
+    })
+
+
+"""Función para crear la cola de auditoría de la app (se llama desde create_app)"""
+def init_auditoria(app):
+    config = app.config
+    destino = config["AUDITORIA_DESTINO"]
+    if destino in [None, "", "off"]:
+        app.extensions["auditoria"] = None
+        return
+
+    if destino == "tabla":
+        escritor = DestinoTabla(app)
+    else:
+        escritor = DestinoJSONL(destino, config["AUDITORIA_ROTAR_BYTES"], config["AUDITORIA_COPIAS"])
+
+    cola = ColaAuditoria(escritor, cola_max=config["AUDITORIA_COLA_MAX"], lote=config["AUDITORIA_LOTE"],
+                         intervalo=config["AUDITORIA_INTERVALO_SEGUNDOS"], espera=config["AUDITORIA_ESPERA_SEGUNDOS"],
+                         cierre=config["AUDITORIA_CIERRE_SEGUNDOS"])
+    app.extensions["auditoria"] = cola
+    colas_abiertas.add(cola)
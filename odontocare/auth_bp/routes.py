@@ -1,7 +1,8 @@
-from flask import request, jsonify
-from werkzeug.security import check_password_hash
+from flask import request, jsonify, current_app
 from extensions import db, jwt
 from models.usuario import Usuario
+from decoradores import claims_usuario
+from hashing import servicio_hash, necesita_rehash
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 
 # Importar el Blueprint definido en __init__.py
@@ -23,11 +24,19 @@ def login():
     usuario = Usuario.query.filter_by(username=username).first()
 
     # Verificar que el usuario exista y que la contraseña sea correcta, si no, responder con error 401
-    if not usuario or not usuario.check_password(password): #check_password compara el hash almacenado al crear usuario (en admin_bp) con la contraseña ingresada
+    # La comparación con el hash almacenado al crear el usuario (en admin_bp) se hace en el pool de procesos del servicio de hash,
+    # con límite de intentos simultáneos por username y por IP (si se supera, se responde 429)
+    if not usuario or not servicio_hash().verificar(usuario.password, password, username=username, ip=request.remote_addr):
         return jsonify({"error": "Credenciales incorrectas"}), 401
 
+    # Si el hash se generó con otros parámetros (PASSWORD_HASH_METHOD ha cambiado), recalcularlo ahora que se conoce la contraseña
+    if necesita_rehash(usuario.password):
+        usuario.password = servicio_hash().generar(password, current_app.config.get("PASSWORD_HASH_METHOD"), ip=request.remote_addr)
+        db.session.commit()
+
     # Si todo es correcto, generar un JWT
-    access_token = create_access_token(identity=str(usuario.id_usuario))
+    # En el token se añaden el rol y los IDs de doctor/paciente asociados (additional_claims) para que los endpoints protegidos no tengan que consultarlos en la base de datos
+    access_token = create_access_token(identity=str(usuario.id_usuario), additional_claims=claims_usuario(usuario))
 
     # Devolver el token al usuario en formato json y con mensaje 200
     return jsonify({"access_token": access_token}), 200
\ No newline at end of file
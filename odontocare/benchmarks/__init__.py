@@ -0,0 +1,5 @@
+"""Scripts de benchmark de OdontoCare.
+
+Cada script se ejecuta desde la carpeta odontocare, por ejemplo:
+    python -m benchmarks.bench_citas --citas 1000000
+"""
@@ -0,0 +1,199 @@
+"""Benchmark de concurrencia: modo WSGI (werkzeug multihilo, como run.py) frente a modo ASGI (uvicorn asgi:app).
+
+Simula muchos paneles que consultan el listado de citas cada pocos segundos: abre N conexiones keep-alive a la vez
+(por defecto 1000), todas empiezan al mismo tiempo y cada una hace varias consultas GET /citas/citas. A partir de la
+segunda consulta se envía If-None-Match, como haría un navegador, así que la mayoría de respuestas son 304.
+Cada servidor se arranca en un proceso aparte sobre la misma base de datos temporal. Muestra, para cada modo,
+las conexiones que no se pudieron abrir, los errores, p50/p95/p99 y peticiones por segundo.
+
+Uso (desde la carpeta odontocare, hace falta pip install uvicorn aiosqlite asgiref):
+    python -m benchmarks.bench_asgi --conexiones 1000 --peticiones 5 --pausa 0.5
+    python -m benchmarks.bench_asgi --modos asgi --ruta "/citas/citas?limit=50"
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, sembrar_citas, headers_admin, resumen_latencias
+
+
+"""Función para subir el límite de archivos abiertos (cada conexión es un descriptor en el cliente y en el servidor)"""
+def subir_limite_archivos():
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if duro == resource.RLIM_INFINITY or blando < duro:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (duro, duro))
+
+
+"""Función para arrancar el servidor del modo indicado en este proceso (se llama con --servir desde el benchmark)"""
+def servir(modo, puerto):
+    subir_limite_archivos()
+    if modo == "wsgi":
+        from werkzeug.serving import make_server
+        from app import create_app
+        from benchmarks.suite import ManejadorSilencioso
+
+        # Conexiones keep-alive (HTTP/1.1) igual que el cliente: un hilo por conexión abierta
+        class Manejador(ManejadorSilencioso):
+            protocol_version = "HTTP/1.1"
+
+        make_server("127.0.0.1", puerto, create_app(), threaded=True, request_handler=Manejador).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.run("asgi:app", host="127.0.0.1", port=puerto, log_level="warning", access_log=False, backlog=4096)
+
+
+"""Función para lanzar el servidor en otro proceso con la base de datos del benchmark y esperar a que acepte conexiones"""
+def lanzar_servidor(modo, uri, espera=30):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        puerto = s.getsockname()[1]
+
+    entorno = {**os.environ, "DATABASE_URL": uri}
+    proceso = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_asgi", "--servir", modo, "--puerto", str(puerto)], env=entorno)
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El servidor {modo} ha terminado con código {proceso.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=0.5).close()
+            return proceso, puerto
+        except OSError:
+            time.sleep(0.1)
+    proceso.kill()
+    raise RuntimeError(f"El servidor {modo} no ha arrancado en {espera}s")
+
+
+"""Función para leer una respuesta HTTP/1.1 (cabeceras y cuerpo con Content-Length o chunked). Devuelve (código, cabeceras)"""
+async def leer_respuesta(lector):
+    cabecera = await lector.readuntil(b"\r\n\r\n")
+    lineas = cabecera.decode("latin-1").split("\r\n")
+    estado = int(lineas[0].split()[1])
+    cabeceras = {}
+    for linea in lineas[1:]:
+        if ":" in linea:
+            nombre, valor = linea.split(":", 1)
+            cabeceras[nombre.strip().lower()] = valor.strip()
+
+    if "content-length" in cabeceras:
+        await lector.readexactly(int(cabeceras["content-length"]))
+    elif cabeceras.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            tamano = int((await lector.readuntil(b"\r\n")).split(b";")[0], 16)
+            await lector.readexactly(tamano + 2)
+            if tamano == 0:
+                break
+    return estado, cabeceras
+
+
+"""Función para simular un cliente: una conexión keep-alive que consulta la ruta varias veces con If-None-Match"""
+async def cliente(puerto, ruta, token, peticiones, pausa, timeout, inicio, tiempos, codigos, errores, abiertas):
+    try:
+        lector, escritor = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", puerto), timeout)
+    except (OSError, asyncio.TimeoutError):
+        errores["conexion"] += 1
+        return
+    abiertas["n"] += 1
+
+    # Esperar a que todas las conexiones estén abiertas para empezar a la vez
+    await inicio.wait()
+    etag = None
+    try:
+        for _ in range(peticiones):
+            cabeceras = f"GET {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: {token}\r\nAccept-Encoding: gzip\r\n"
+            if etag:
+                cabeceras += f"If-None-Match: {etag}\r\n"
+            t0 = time.perf_counter()
+            escritor.write((cabeceras + "\r\n").encode("latin-1"))
+            await escritor.drain()
+            estado, respuesta = await asyncio.wait_for(leer_respuesta(lector), timeout)
+            tiempos.append((time.perf_counter() - t0) * 1000)
+            codigos[estado] += 1
+            etag = respuesta.get("etag", etag)
+            if respuesta.get("connection", "").lower() == "close":
+                # El servidor no mantiene la conexión: volver a conectar para la siguiente consulta
+                errores["reconexiones"] += 1
+                escritor.close()
+                lector, escritor = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", puerto), timeout)
+            if pausa:
+                await asyncio.sleep(pausa)
+    except asyncio.TimeoutError:
+        errores["timeout"] += 1
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        errores["conexion_perdida"] += 1
+    finally:
+        escritor.close()
+
+
+"""Función para lanzar todos los clientes a la vez contra un servidor y resumir los resultados"""
+async def medir_modo(puerto, args, token):
+    tiempos, codigos, errores, abiertas = [], Counter(), Counter(), Counter()
+    inicio = asyncio.Event()
+    tareas = [asyncio.create_task(cliente(puerto, args.ruta, token, args.peticiones, args.pausa, args.timeout,
+                                          inicio, tiempos, codigos, errores, abiertas))
+              for _ in range(args.conexiones)]
+
+    # Esperar a que se abran todas las conexiones (las que no se puedan abrir cuentan como error)
+    t_conexion = time.perf_counter()
+    while abiertas["n"] + errores["conexion"] < args.conexiones and time.perf_counter() - t_conexion < args.timeout:
+        await asyncio.sleep(0.05)
+    segundos_conexion = time.perf_counter() - t_conexion
+    t0 = time.perf_counter()
+    inicio.set()
+    await asyncio.gather(*tareas)
+    duracion = time.perf_counter() - t0
+
+    resumen = resumen_latencias(tiempos)
+    resumen.update({"conexion_s": round(segundos_conexion, 2), "duracion_s": round(duracion, 2),
+                    "peticiones_por_segundo": round(len(tiempos) / duracion, 1) if duracion else None, "codigos": dict(codigos), "errores": dict(errores)})
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrencia del listado de citas: WSGI frente a ASGI")
+    parser.add_argument("--conexiones", type=int, default=1000, help="Conexiones simultáneas")
+    parser.add_argument("--peticiones", type=int, default=5, help="Consultas por conexión")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Segundos entre consultas de cada conexión")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Segundos máximos por petición")
+    parser.add_argument("--ruta", default="/citas/citas?limit=50", help="Ruta consultada")
+    parser.add_argument("--citas", type=int, default=5000, help="Citas sembradas")
+    parser.add_argument("--modos", default="wsgi,asgi", help="Modos a medir separados por comas")
+    parser.add_argument("--servir", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--puerto", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        servir(args.servir, args.puerto)
+        return
+
+    subir_limite_archivos()
+    app = crear_app_temporal()
+    with app.app_context():
+        id_admin = sembrar_catalogo()
+        sembrar_citas(args.citas, id_admin)
+    token = headers_admin(app.test_client())["Authorization"]
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+
+    resultados = {}
+    for modo in args.modos.split(","):
+        proceso, puerto = lanzar_servidor(modo, uri)
+        try:
+            resultados[modo] = asyncio.run(medir_modo(puerto, args, token))
+        finally:
+            proceso.terminate()
+            proceso.wait()
+        print(f"{modo}: {json.dumps(resultados[modo])}")
+
+    print(json.dumps({"conexiones": args.conexiones, "peticiones": args.peticiones, "ruta": args.ruta, "resultados": resultados}, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
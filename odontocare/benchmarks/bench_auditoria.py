@@ -0,0 +1,85 @@
+"""Benchmark del registro de auditoría (auditoria.py): coste por reserva según cómo se escriben los eventos.
+
+Mide, para cada modo, la latencia de POST /citas/citas, los commits que llegan a la base de datos por reserva
+(contados con el evento "commit" del motor de SQLAlchemy, incluidos los del hilo escritor) y que no se pierde ningún evento:
+    - sin_auditoria: AUDITORIA_DESTINO vacío (el coste de referencia)
+    - sincrona: AUDITORIA_COLA_MAX=0, cada reserva escribe su evento con un INSERT y un commit propios
+    - diferida: cola en memoria y un hilo que escribe los eventos por lotes en la tabla auditoria
+    - jsonl: cola en memoria y un hilo que escribe los eventos por lotes en un archivo JSON Lines (un fsync por lote)
+Con SQLITE_SYNCHRONOUS=FULL (por defecto en este benchmark) cada commit es un fsync del WAL.
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.bench_auditoria --reservas 500
+    python -m benchmarks.bench_auditoria --reservas 500 --synchronous NORMAL
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+from sqlalchemy import event, func, select
+
+from extensions import db
+from auditoria import cola_auditoria
+from models.evento_auditoria import EventoAuditoria
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, headers_admin, medir, FECHA_INICIO
+
+
+"""Función para contar los eventos guardados en el destino de un modo"""
+def contar_eventos(app, ruta_jsonl):
+    if ruta_jsonl:
+        with open(ruta_jsonl, encoding="utf-8") as archivo:
+            return sum(1 for _ in archivo)
+    with app.app_context():
+        return db.session.scalar(select(func.count()).select_from(EventoAuditoria))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste de la auditoría por reserva: síncrona frente a escritura diferida por lotes")
+    parser.add_argument("--reservas", type=int, default=500, help="Reservas en cada modo")
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous de SQLite (FULL = un fsync por commit)")
+    args = parser.parse_args()
+
+    ruta_jsonl = os.path.join(tempfile.mkdtemp(prefix="odontocare_bench_"), "auditoria.jsonl")
+    modos = {
+        "sin_auditoria": {"AUDITORIA_DESTINO": ""},
+        "sincrona": {"AUDITORIA_DESTINO": "tabla", "AUDITORIA_COLA_MAX": 0},
+        "diferida": {"AUDITORIA_DESTINO": "tabla"},
+        "jsonl": {"AUDITORIA_DESTINO": ruta_jsonl},
+    }
+
+    resultados = {}
+    for modo, config in modos.items():
+        app = crear_app_temporal({**config, "SQLITE_SYNCHRONOUS": args.synchronous})
+        with app.app_context():
+            sembrar_catalogo(1, 1, 1)
+            commits = [0]
+            event.listen(db.engine, "commit", lambda conexion: commits.__setitem__(0, commits[0] + 1))
+        cliente = app.test_client()
+        headers = headers_admin(cliente)
+
+        def reservar(i):
+            cita = {"fecha": (FECHA_INICIO + timedelta(minutes=30 * i)).strftime("%Y-%m-%d %H:%M"), "motivo": "Bench",
+                    "id_doctor": 1, "id_centro": 1, "id_paciente": 1}
+            assert cliente.post("/citas/citas", json=cita, headers=headers).status_code == 201
+
+        resultados[modo] = medir(reservar, args.reservas)
+
+        # Esperar a que el hilo escriba los eventos pendientes antes de contar commits y eventos
+        with app.app_context():
+            cola = cola_auditoria()
+            if cola is not None:
+                cola.vaciar()
+                resultados[modo]["auditoria"] = cola.estadisticas()
+                resultados[modo]["eventos_guardados"] = contar_eventos(app, ruta_jsonl if modo == "jsonl" else None)
+        resultados[modo]["commits_por_reserva"] = round(commits[0] / args.reservas, 2)
+        print(f"{modo}: {json.dumps(resultados[modo])}")
+
+    print(json.dumps({"reservas": args.reservas, "synchronous": args.synchronous, "resultados": resultados}, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark de la búsqueda de pacientes (busqueda.py): índice FTS5 frente a bm25 y LIKE sobre la tabla.
+
+Siembra N pacientes (1.000.000 por defecto) con nombres y apellidos españoles con acentos y teléfonos aleatorios
+y mide, para varias búsquedas típicas de recepción (nombre completo, prefijos, sin acentos, teléfono):
+    - fts: busqueda.buscar() con el índice FTS5 y ranking (lo que usa GET /admin/pacientes/buscar)
+    - fts_bm25: la misma consulta FTS5 ordenada por rank (bm25) en SQLite, para comparar
+    - like: nombre LIKE '%texto%' OR telefono LIKE '%texto%' (recorre toda la tabla; se mide con menos repeticiones)
+    - endpoint: GET /admin/pacientes/buscar completo (token, consulta y JSON)
+El tiempo de siembra incluye el mantenimiento del índice con los triggers.
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.bench_busqueda --pacientes 1000000 --repeticiones 200
+"""
+
+import argparse
+import json
+import random
+import time
+
+from sqlalchemy import insert, or_, select, text
+
+from busqueda import buscar, consulta_fts, palabras
+from extensions import db
+from models.paciente import Paciente
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, headers_admin, medir
+
+NOMBRES = ["María", "José", "Lucía", "Javier", "Begoña", "Íñigo", "Sofía", "Álvaro", "Carmen", "Raúl", "Nuria", "Andrés",
+           "Inés", "Jesús", "Ángela", "Martín", "Elena", "Óscar", "Pilar", "Adrián"]
+APELLIDOS = ["García", "Fernández", "González", "Rodríguez", "López", "Martínez", "Sánchez", "Pérez", "Gómez", "Martín",
+             "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno", "Muñoz", "Álvarez", "Romero", "Núñez", "Iglesias",
+             "Castaño", "Ibáñez", "Peña", "Calderón", "Echeverría", "Zubizarreta", "Olaizola", "Arrieta", "Goñi", "Ordóñez"]
+
+# Búsquedas medidas: (descripción, texto)
+BUSQUEDAS = [
+    ("nombre_completo", "Begoña Zubizarreta Goñi"),
+    ("sin_acentos", "inigo nunez ibanez"),
+    ("prefijos", "alv echev"),
+    ("prefijo_corto", "ma"),
+    ("telefono_completo", "612 345 678"),
+    ("telefono_prefijo", "61234"),
+]
+
+
+"""Función para sembrar n pacientes con nombres aleatorios por lotes"""
+def sembrar_pacientes(n, lote=50000):
+    semilla = random.Random(7)
+    for inicio in range(0, n, lote):
+        filas = [{"nombre": f"{semilla.choice(NOMBRES)} {semilla.choice(APELLIDOS)} {semilla.choice(APELLIDOS)}",
+                  "telefono": f"6{semilla.randrange(10**8):08d}", "estado": "ACTIVO"}
+                 for _ in range(inicio, min(inicio + lote, n))]
+        db.session.execute(insert(Paciente), filas)
+        db.session.commit()
+
+
+"""Función para buscar con LIKE en nombre y teléfono (sin índice)"""
+def buscar_like(texto, limite):
+    patron = f"%{texto}%"
+    return db.session.scalars(select(Paciente).where(or_(Paciente.nombre.like(patron), Paciente.telefono.like(patron))).limit(limite)).all()
+
+
+"""Función para buscar con FTS5 ordenando por bm25 (rank) en SQLite"""
+def buscar_bm25(texto, limite):
+    sentencia = text("SELECT p.* FROM pacientes_fts JOIN pacientes p ON p.id_paciente = pacientes_fts.rowid "
+                     "WHERE pacientes_fts MATCH :consulta ORDER BY rank LIMIT :limite")
+    return db.session.execute(sentencia, {"consulta": consulta_fts(palabras(texto)), "limite": limite}).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Búsqueda de pacientes: FTS5 frente a bm25 y LIKE")
+    parser.add_argument("--pacientes", type=int, default=1_000_000, help="Pacientes sembrados")
+    parser.add_argument("--repeticiones", type=int, default=200, help="Repeticiones de cada búsqueda con el índice")
+    parser.add_argument("--limit", type=int, default=20, help="Resultados por búsqueda")
+    args = parser.parse_args()
+
+    app = crear_app_temporal()
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+        t0 = time.perf_counter()
+        sembrar_pacientes(args.pacientes)
+        segundos_siembra = time.perf_counter() - t0
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+
+    resultados = {}
+    with app.app_context():
+        for nombre, texto in BUSQUEDAS:
+            encontrados = len(buscar("pacientes", texto, args.limit))
+            resultados[nombre] = {
+                "q": texto,
+                "resultados": encontrados,
+                "fts": medir(lambda i: buscar("pacientes", texto, args.limit), args.repeticiones),
+                "fts_bm25": medir(lambda i: buscar_bm25(texto, args.limit), max(args.repeticiones // 20, 3)),
+                "like": medir(lambda i: buscar_like(texto, args.limit), max(args.repeticiones // 20, 3)),
+            }
+    for nombre, texto in BUSQUEDAS:
+        resultados[nombre]["endpoint"] = medir(lambda i: cliente.get("/admin/pacientes/buscar", query_string={"q": texto, "limit": args.limit},
+                                                                     headers=headers), args.repeticiones)
+        print(f"{nombre}: {json.dumps(resultados[nombre])}")
+
+    print(json.dumps({"pacientes": args.pacientes, "siembra_s": round(segundos_siembra, 1), "resultados": resultados}, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
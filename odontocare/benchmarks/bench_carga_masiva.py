@@ -0,0 +1,75 @@
+"""Benchmark de la carga de pacientes: fila a fila por HTTP vs carga masiva (HTTP NDJSON y en proceso).
+
+Genera N pacientes sintéticos con el esquema de data/datos.csv y mide:
+    - fila_a_fila: POST /admin/pacientes por cada fila (se mide una muestra y se extrapola a N)
+    - bulk_http: un único POST /admin/bulk/pacientes con NDJSON
+    - bulk_directo: servicios.carga_masiva.importar_pacientes dentro del proceso (lo que usa carga_inicial.py --directo)
+
+El coste del hash de contraseñas domina en cualquier modo. Por defecto se usa un hash barato
+(--hash pbkdf2:sha256:1000) para medir el resto de la ruta; con --hash "" se usa el de Werkzeug por defecto.
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.bench_carga_masiva --filas 100000
+"""
+
+import argparse
+import json
+import time
+
+from extensions import db
+from servicios.carga_masiva import importar_pacientes
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, headers_admin
+
+
+"""Función para generar pacientes sintéticos con las columnas de data/datos.csv"""
+def generar_pacientes(n, prefijo):
+    return [{"nombre": f"Paciente {prefijo}{i}", "telefono": f"6{i:08d}", "username": f"{prefijo}{i}", "password": f"pass{i}", "estado": "ACTIVO"}
+            for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga masiva de pacientes")
+    parser.add_argument("--filas", type=int, default=100_000, help="Número de pacientes a importar")
+    parser.add_argument("--muestra", type=int, default=500, help="Filas a cargar una a una para estimar el modo fila a fila")
+    parser.add_argument("--hash", default="pbkdf2:sha256:1000", help="Método de hash de contraseñas (vacío = por defecto de Werkzeug)")
+    args = parser.parse_args()
+
+    app = crear_app_temporal({"PASSWORD_HASH_METHOD": args.hash or None, "BULK_MAX_REGISTROS": max(args.filas, 100000)})
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+    resultados = {"filas": args.filas, "hash": args.hash or "werkzeug"}
+
+    # Modo fila a fila (como carga_inicial.py sin --directo): se mide una muestra y se extrapola
+    muestra = generar_pacientes(args.muestra, "fila")
+    inicio = time.perf_counter()
+    for paciente in muestra:
+        assert cliente.post("/admin/pacientes", json=paciente, headers=headers).status_code == 201
+    por_fila = (time.perf_counter() - inicio) / args.muestra
+    resultados["fila_a_fila"] = {"segundos_estimados": round(por_fila * args.filas, 2), "filas_por_segundo": round(1 / por_fila)}
+
+    # Modo bulk por HTTP con NDJSON
+    cuerpo = "\n".join(json.dumps(p) for p in generar_pacientes(args.filas, "http"))
+    inicio = time.perf_counter()
+    respuesta = cliente.post("/admin/bulk/pacientes", data=cuerpo, content_type="application/x-ndjson", headers=headers)
+    duracion = time.perf_counter() - inicio
+    assert respuesta.status_code == 201, respuesta.get_json()
+    resultados["bulk_http"] = {"segundos": round(duracion, 2), "filas_por_segundo": round(args.filas / duracion)}
+
+    # Modo bulk en proceso (sin HTTP)
+    registros = generar_pacientes(args.filas, "directo")
+    with app.app_context():
+        inicio = time.perf_counter()
+        resultado = importar_pacientes(registros)
+        db.session.commit()
+        duracion = time.perf_counter() - inicio
+    assert resultado["creados"] == args.filas
+    resultados["bulk_directo"] = {"segundos": round(duracion, 2), "filas_por_segundo": round(args.filas / duracion)}
+
+    print(json.dumps(resultados, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark de la ruta crítica de citas: agendar (comprobación de conflicto) y listar con filtros.
+
+Siembra N citas (1M por defecto) y mide la latencia de POST /citas/citas y GET /citas/citas
+primero SIN los índices de la tabla citas (situación anterior) y después CON ellos.
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.bench_citas --citas 1000000 --repeticiones 200
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from extensions import db
+from models.cita import Cita
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, sembrar_citas, headers_admin, medir
+
+N_CENTROS = 10
+N_DOCTORES = 100
+N_PACIENTES = 1000
+
+
+"""Función para medir agendar y listar con el estado actual de los índices"""
+def medir_endpoints(app, headers, repeticiones, desplazamiento):
+    cliente = app.test_client()
+
+    # Cada reserva usa un doctor y una franja libres (años después de las citas sembradas) para que todas lleguen al INSERT
+    def agendar(i):
+        fecha = datetime(2090 + desplazamiento, 1, 1) + timedelta(minutes=i)
+        cita = {"fecha": fecha.strftime("%Y-%m-%d %H:%M"), "motivo": "Bench",
+                "id_doctor": i % N_DOCTORES + 1, "id_centro": 1, "id_paciente": 1}
+        respuesta = cliente.post("/citas/citas", json=cita, headers=headers)
+        assert respuesta.status_code == 201, respuesta.get_json()
+
+    def listar_doctor(i):
+        respuesta = cliente.get(f"/citas/citas?id_doctor={i % N_DOCTORES + 1}&fecha=2024-01-0{i % 9 + 1}", headers=headers)
+        assert respuesta.status_code == 200
+
+    def listar_centro(i):
+        respuesta = cliente.get(f"/citas/citas?id_centro={i % N_CENTROS + 1}&fecha=2024-01-0{i % 9 + 1}", headers=headers)
+        assert respuesta.status_code == 200
+
+    return {
+        "agendar": medir(agendar, repeticiones),
+        "listar_por_doctor_y_fecha": medir(listar_doctor, repeticiones),
+        "listar_por_centro_y_fecha": medir(listar_centro, repeticiones),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de agendar y listar citas con y sin índices")
+    parser.add_argument("--citas", type=int, default=1_000_000, help="Número de citas a sembrar")
+    parser.add_argument("--repeticiones", type=int, default=200, help="Peticiones por medición")
+    args = parser.parse_args()
+
+    app = crear_app_temporal()
+    with app.app_context():
+        print(f"Sembrando {args.citas} citas...")
+        inicio = time.perf_counter()
+        id_admin = sembrar_catalogo(N_CENTROS, N_DOCTORES, N_PACIENTES)
+        sembrar_citas(args.citas, id_admin, N_CENTROS, N_DOCTORES, N_PACIENTES)
+        print(f"Citas sembradas en {time.perf_counter() - inicio:.1f}s")
+
+        headers = headers_admin(app.test_client())
+
+        # Situación anterior: sin índices sobre la tabla citas
+        for indice in Cita.__table__.indexes:
+            db.session.execute(text(f"DROP INDEX IF EXISTS {indice.name}"))
+        db.session.commit()
+        sin_indices = medir_endpoints(app, headers, args.repeticiones, 0)
+
+        # Situación actual: con los índices compuestos
+        for indice in Cita.__table__.indexes:
+            indice.create(db.engine)
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+        con_indices = medir_endpoints(app, headers, args.repeticiones, 1)
+
+    print(json.dumps({"citas": args.citas, "sin_indices": sin_indices, "con_indices": con_indices}, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark de la carga de una exportación grande: carga_inicial.py --directo (archivo entero en memoria)
+frente a la ingesta por trozos (ingesta.py).
+
+Genera un CSV con el formato de data/datos.csv (por defecto 200.000 filas, casi todas pacientes, con un 1% de filas
+inválidas y un 1% de usernames repetidos) y carga el mismo archivo con cada modo, cada uno en un proceso aparte y con
+su propia base de datos temporal. Muestra, para cada modo, el tiempo, la memoria máxima del proceso (ru_maxrss)
+y los registros creados. Con --filas mayores la memoria de carga_directa crece con el archivo y la de la ingesta no.
+
+El hash de contraseñas domina el tiempo. Por defecto se usa un hash barato (--hash pbkdf2:sha256:1000);
+con --hash "" se usa el de Werkzeug por defecto.
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.bench_ingesta --filas 200000
+    python -m benchmarks.bench_ingesta --filas 1000000 --modos ingesta --trozo 10000 --procesos 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import func, select
+
+from app import create_app
+from extensions import db
+from migraciones import migrar_base_datos
+from models.usuario import Usuario
+from models.centro import Centro
+
+# Columnas de data/datos.csv
+COLUMNAS = ["tipo", "nombre", "telefono", "especialidad", "direccion", "username", "password", "estado"]
+
+
+"""Función para escribir el CSV sintético fila a fila (sin tenerlo entero en memoria)"""
+def generar_csv(ruta, filas):
+    with open(ruta, "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.writer(archivo, delimiter=";")
+        escritor.writerow(COLUMNAS)
+        n_centros = max(filas // 10000, 1)
+        n_doctores = max(filas // 100, 1)
+        for i in range(1, n_centros + 1):
+            escritor.writerow(["centro", f"Clinica {i}", "", "", f"Calle Falsa {i}", "", "", ""])
+        for i in range(1, n_doctores + 1):
+            escritor.writerow(["doctor", f"Dr. {i}", "", "General", "", f"doctor{i}", f"pass{i}", ""])
+        for i in range(1, filas - n_centros - n_doctores + 1):
+            if i % 100 == 0:
+                escritor.writerow(["paciente", "", f"6{i:08d}", "", "", f"paciente{i}", f"pass{i}", "ACTIVO"])  # Sin nombre: inválida
+            elif i % 100 == 50:
+                escritor.writerow(["paciente", f"Paciente {i}", f"6{i:08d}", "", "", f"paciente{i - 1}", f"pass{i}", "ACTIVO"])  # Repetido
+            else:
+                escritor.writerow(["paciente", f"Paciente {i}", f"6{i:08d}", "", "", f"paciente{i}", f"pass{i}", "ACTIVO"])
+
+
+"""Función que carga el archivo con un modo dentro de este proceso (se llama con --ejecutar desde el benchmark)"""
+def ejecutar(modo, archivo, trozo, procesos):
+    app = create_app()
+    with app.app_context():
+        migrar_base_datos()
+        t0 = time.perf_counter()
+        if modo == "directo":
+            from carga_inicial import carga_directa
+            carga_directa(archivo)
+        else:
+            from ingesta import ingestar
+            ingestar(archivo, archivo + ".rechazos.jsonl", trozo, procesos)
+        segundos = time.perf_counter() - t0
+        usuarios = db.session.scalar(select(func.count()).select_from(Usuario))
+        centros = db.session.scalar(select(func.count()).select_from(Centro))
+    print(json.dumps({"segundos": round(segundos, 2), "usuarios": usuarios, "centros": centros}))
+
+
+"""Función para lanzar un modo en otro proceso con su propia base de datos. Devuelve el resultado y la memoria máxima en MB"""
+def medir_modo(modo, archivo, args, carpeta):
+    entorno = {**os.environ, "DATABASE_URL": "sqlite:///" + os.path.join(carpeta, f"{modo}.db"), "PASSWORD_HASH_METHOD": args.hash}
+    comando = [sys.executable, "-m", "benchmarks.bench_ingesta", "--ejecutar", modo, "--archivo", archivo,
+               "--trozo", str(args.trozo), "--procesos", str(args.procesos)]
+    proceso = subprocess.Popen(comando, env=entorno, stdout=subprocess.PIPE, text=True)
+    salida = proceso.stdout.read()
+    # wait4 devuelve el uso de recursos de ese proceso (ru_maxrss en KB en Linux). Los procesos del pool no se suman
+    _, estado, uso = os.wait4(proceso.pid, 0)
+    if estado != 0:
+        raise RuntimeError(f"El modo {modo} ha terminado con error")
+    resultado = json.loads(salida.strip().splitlines()[-1])
+    resultado["memoria_max_mb"] = round(uso.ru_maxrss / 1024, 1)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga de una exportación grande: archivo entero frente a ingesta por trozos")
+    parser.add_argument("--filas", type=int, default=200_000, help="Filas del CSV generado")
+    parser.add_argument("--modos", default="directo,ingesta", help="Modos a medir separados por comas")
+    parser.add_argument("--trozo", type=int, default=5000, help="Filas por trozo de la ingesta")
+    parser.add_argument("--procesos", type=int, default=0, help="Procesos de la ingesta (0 = uno por núcleo)")
+    parser.add_argument("--hash", default="pbkdf2:sha256:1000", help="Método de hash de contraseñas (vacío = por defecto de Werkzeug)")
+    parser.add_argument("--ejecutar", choices=["directo", "ingesta"], help=argparse.SUPPRESS)
+    parser.add_argument("--archivo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ejecutar:
+        ejecutar(args.ejecutar, args.archivo, args.trozo, args.procesos)
+        return
+
+    carpeta = tempfile.mkdtemp(prefix="odontocare_bench_")
+    archivo = os.path.join(carpeta, "exportacion.csv")
+    generar_csv(archivo, args.filas)
+
+    resultados = {}
+    for modo in args.modos.split(","):
+        resultados[modo] = medir_modo(modo, archivo, args, carpeta)
+        print(f"{modo}: {json.dumps(resultados[modo])}")
+
+    print(json.dumps({"filas": args.filas, "archivo_mb": round(os.path.getsize(archivo) / 2**20, 1), "resultados": resultados}, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Prueba de carga: latencia de agendar citas durante una avalancha de logins.
+
+Mide la latencia de POST /citas/citas sin carga y mientras varios hilos hacen login sin parar
+(desde varias IPs y con varios usuarios). Con el servicio de hash (pool de procesos + límites por
+usuario/IP) el p99 de agendar debe mantenerse estable; con --workers 0 --sin-limites se reproduce
+el comportamiento anterior (hash en el hilo de la petición y sin límites).
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.bench_login --hilos-login 16 --reservas 300
+"""
+
+import argparse
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from extensions import db
+from models.usuario import Usuario
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, headers_admin, medir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de agendar durante una avalancha de logins")
+    parser.add_argument("--hilos-login", type=int, default=16, help="Hilos haciendo login continuamente")
+    parser.add_argument("--usuarios", type=int, default=50, help="Usuarios distintos que hacen login")
+    parser.add_argument("--reservas", type=int, default=300, help="Reservas medidas en cada fase")
+    parser.add_argument("--workers", type=int, default=2, help="HASH_WORKERS (0 = hash en el hilo de la petición)")
+    parser.add_argument("--sin-limites", action="store_true", help="Desactivar la cola y los límites por usuario/IP")
+    args = parser.parse_args()
+
+    config = {"HASH_WORKERS": args.workers}
+    if args.sin_limites:
+        config.update({"HASH_COLA_MAX": 10**6, "HASH_MAX_POR_USUARIO": 10**6, "HASH_MAX_POR_IP": 10**6})
+    app = crear_app_temporal(config)
+
+    with app.app_context():
+        sembrar_catalogo(1, 10, 10)
+        for i in range(args.usuarios):
+            usuario = Usuario(username=f"login{i}", rol="secretaria")
+            usuario.set_password("pass")
+            db.session.add(usuario)
+        db.session.commit()
+
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+
+    def fase(desplazamiento):
+        def agendar(i):
+            fecha = datetime(2040 + desplazamiento, 1, 1) + timedelta(minutes=i)
+            cita = {"fecha": fecha.strftime("%Y-%m-%d %H:%M"), "motivo": "Bench", "id_doctor": i % 10 + 1, "id_centro": 1, "id_paciente": 1}
+            assert cliente.post("/citas/citas", json=cita, headers=headers).status_code == 201
+        return medir(agendar, args.reservas)
+
+    # Fase 1: agendar sin carga de login
+    sin_carga = fase(0)
+
+    # Fase 2: agendar mientras los hilos de login no paran
+    parar = threading.Event()
+    codigos = Counter()
+    lock = threading.Lock()
+
+    def tormenta(n):
+        cliente_login = app.test_client()
+        i = 0
+        while not parar.is_set():
+            respuesta = cliente_login.post("/auth/login", json={"username": f"login{(n + i) % args.usuarios}", "password": "pass"},
+                                           environ_base={"REMOTE_ADDR": f"10.0.{n}.{i % 250}"})
+            with lock:
+                codigos[respuesta.status_code] += 1
+            i += 1
+
+    hilos = [threading.Thread(target=tormenta, args=(n,)) for n in range(args.hilos_login)]
+    for hilo in hilos:
+        hilo.start()
+    con_carga = fase(1)
+    parar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    print(json.dumps({"config": vars(args), "agendar_sin_carga": sin_carga, "agendar_durante_logins": con_carga,
+                      "logins": dict(codigos)}, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
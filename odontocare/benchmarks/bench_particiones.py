@@ -0,0 +1,97 @@
+"""Benchmark de reservas desde varios procesos con y sin particiones de citas (CITAS_PARTICIONES, particiones.py).
+
+Cada modo crea una base de datos temporal con el número de particiones indicado (0 = todas las citas en la base de
+datos principal) y lanza P procesos (como P workers de gunicorn) que hacen POST /citas/citas a la vez. Cada proceso
+reserva con su propio doctor en su propio centro, así no hay conflictos y solo se mide la espera por el bloqueo de
+escritura de SQLite: sin particiones todas las reservas se esperan entre sí; con N particiones solo las de doctores
+de la misma partición.
+Con SQLITE_SYNCHRONOUS=FULL (por defecto en este benchmark) cada commit hace un fsync del WAL mientras tiene el bloqueo,
+que es el caso en el que más se nota el reparto.
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.bench_particiones --procesos 4 --reservas 200
+    python -m benchmarks.bench_particiones --particiones 0,2,4 --synchronous NORMAL
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+from datetime import timedelta
+
+from app import create_app
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, headers_admin, resumen_latencias, FECHA_INICIO
+
+
+"""Función que ejecuta cada proceso: crea su propia app sobre las mismas bases de datos, espera la señal de inicio y
+    hace sus reservas. Devuelve las latencias en ms por la cola"""
+def reservar(config, proceso, n_centros, reservas, inicio, cola):
+    app = create_app(config)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+    id_centro = proceso % n_centros + 1
+    tiempos = []
+
+    inicio.wait()
+    for i in range(reservas):
+        cita = {"fecha": (FECHA_INICIO + timedelta(minutes=30 * i)).strftime("%Y-%m-%d %H:%M"), "motivo": "Bench",
+                "id_doctor": proceso + 1, "id_centro": id_centro, "id_paciente": 1}
+        inicio_peticion = time.perf_counter()
+        respuesta = cliente.post("/citas/citas", json=cita, headers=headers)
+        tiempos.append((time.perf_counter() - inicio_peticion) * 1000)
+        assert respuesta.status_code == 201, respuesta.get_data(as_text=True)
+    cola.put(tiempos)
+
+
+"""Función para medir un modo: P procesos reservando a la vez con 'particiones' particiones"""
+def medir_modo(particiones, procesos, reservas, synchronous):
+    # timeout de SQLite alto para que los procesos esperen el bloqueo de escritura en lugar de fallar con "database is locked".
+    # HASH_WORKERS=0: el único login de cada proceso se hace en su hilo, sin un pool de hash que lo retenga al terminar
+    config = {"CITAS_PARTICIONES": particiones, "SQLITE_SYNCHRONOUS": synchronous, "HASH_WORKERS": 0,
+              "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 60}}}
+    app = crear_app_temporal(config)
+    with app.app_context():
+        sembrar_catalogo(procesos, procesos, 1)
+    config["SQLALCHEMY_DATABASE_URI"] = app.config["SQLALCHEMY_DATABASE_URI"]
+
+    # Procesos nuevos (spawn) para que ninguno herede las conexiones abiertas del proceso principal
+    contexto = multiprocessing.get_context("spawn")
+    inicio = contexto.Event()
+    cola = contexto.Queue()
+    hijos = [contexto.Process(target=reservar, args=(config, proceso, procesos, reservas, inicio, cola)) for proceso in range(procesos)]
+    for hijo in hijos:
+        hijo.start()
+    time.sleep(2)  # Dar tiempo a que todos los procesos creen su app antes de empezar
+
+    comienzo = time.perf_counter()
+    inicio.set()
+    tiempos = [tiempo for _ in hijos for tiempo in cola.get()]
+    total = time.perf_counter() - comienzo
+    for hijo in hijos:
+        hijo.join()
+
+    resumen = resumen_latencias(tiempos)
+    resumen["reservas_por_segundo"] = round(len(tiempos) / total, 1)
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reservas desde varios procesos con y sin particiones de citas")
+    parser.add_argument("--procesos", type=int, default=4, help="Procesos que reservan a la vez (cada uno con su doctor y su centro)")
+    parser.add_argument("--reservas", type=int, default=200, help="Reservas por proceso")
+    parser.add_argument("--particiones", default="0,1,2,4", help="Números de particiones a comparar (0 = sin particiones)")
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous de SQLite (FULL = un fsync por commit)")
+    args = parser.parse_args()
+
+    resultados = {}
+    for particiones in [int(numero) for numero in args.particiones.split(",")]:
+        resultados[f"particiones_{particiones}"] = medir_modo(particiones, args.procesos, args.reservas, args.synchronous)
+        print(f"particiones_{particiones}: {json.dumps(resultados[f'particiones_{particiones}'])}")
+
+    print(json.dumps({"procesos": args.procesos, "reservas": args.reservas, "synchronous": args.synchronous,
+                      "resultados": resultados}, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Micro-benchmark de la serialización del listado de citas: to_dict + jsonify frente a DTO + orjson (serializacion.py).
+
+Siembra N citas (50.000 por defecto) y mide, con la lista completa:
+    - orm_to_dict_jsonify: objetos del ORM + to_dict() + jsonify (camino normal)
+    - dto_orjson: solo columnas + CitaDTO + orjson (camino rápido)
+    - dto_json: solo columnas + CitaDTO + json de la librería estándar (camino rápido sin orjson)
+    - endpoint_normal / endpoint_rapido: GET /citas/citas completo con SERIALIZACION_RAPIDA desactivado y activado
+Comprueba además que los dos caminos devuelven el mismo JSON.
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.bench_serializacion --citas 50000 --repeticiones 10
+"""
+
+import argparse
+import json
+
+from flask import jsonify
+
+import serializacion
+from extensions import db
+from models.cita import Cita
+from serializacion import columnas_cita, filas_a_dto, respuesta_rapida
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, sembrar_citas, headers_admin, medir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialización del listado de citas: ORM + to_dict frente a DTO + orjson")
+    parser.add_argument("--citas", type=int, default=50000, help="Número de citas sembradas")
+    parser.add_argument("--repeticiones", type=int, default=10, help="Repeticiones de cada medida")
+    args = parser.parse_args()
+
+    app = crear_app_temporal()
+    with app.app_context():
+        id_admin = sembrar_catalogo()
+        sembrar_citas(args.citas, id_admin)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+    orjson = serializacion.orjson
+
+    def orm_to_dict_jsonify(i):
+        db.session.expunge_all()  # Cada petición empieza con la sesión vacía, como en la app
+        return jsonify([cita.to_dict() for cita in Cita.query.all()]).get_data()
+
+    def dto(i):
+        db.session.expunge_all()
+        return respuesta_rapida(filas_a_dto(db.session.query(*columnas_cita(Cita)).all())).get_data()
+
+    def dto_json(i):
+        serializacion.orjson = None
+        try:
+            return dto(i)
+        finally:
+            serializacion.orjson = orjson
+
+    def endpoint(rapida):
+        def peticion(i):
+            app.config["SERIALIZACION_RAPIDA"] = "citas_bp.listar_citas" if rapida else ""
+            respuesta = cliente.get("/citas/citas", headers=headers)
+            assert respuesta.status_code == 200
+        return peticion
+
+    resultados = {}
+    with app.test_request_context():
+        assert json.loads(orm_to_dict_jsonify(0)) == json.loads(dto(0)) == json.loads(dto_json(0)), "Los dos caminos devuelven JSON distinto"
+        resultados["orm_to_dict_jsonify"] = medir(orm_to_dict_jsonify, args.repeticiones)
+        if orjson is not None:
+            resultados["dto_orjson"] = medir(dto, args.repeticiones)
+        resultados["dto_json"] = medir(dto_json, args.repeticiones)
+    resultados["endpoint_normal"] = medir(endpoint(False), args.repeticiones)
+    resultados["endpoint_rapido"] = medir(endpoint(True), args.repeticiones)
+
+    # Aceleración respecto al camino normal (la serialización sola o el endpoint completo)
+    for nombre, resumen in resultados.items():
+        base = resultados["endpoint_normal" if nombre.startswith("endpoint") else "orm_to_dict_jsonify"]["media_ms"]
+        resumen["aceleracion"] = round(base / resumen["media_ms"], 2)
+        print(f"{nombre}: {json.dumps(resumen)}")
+
+    print(json.dumps({"citas": args.citas, "orjson": orjson is not None, "resultados": resultados}, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark del alta de doctores y pacientes: dos commits frente a una única transacción (servicios/usuarios.py).
+
+Mide, para cada modo, la latencia de crear un paciente con su usuario y los commits que llegan a la base de datos
+(contados con el evento "commit" del motor de SQLAlchemy):
+    - dos_commits: el flujo anterior de crear_paciente (consulta del username, commit del usuario y commit del paciente)
+    - servicio: crear_usuario() con flush y un solo commit, sin consulta previa
+    - endpoint: POST /admin/pacientes completo (token, validación, servicio y JSON)
+    - duplicado: POST /admin/pacientes con un username que ya existe (409 por el índice único)
+Con SQLITE_SYNCHRONOUS=FULL (por defecto en este benchmark) SQLite hace un fsync del WAL en cada commit, así que
+los fsyncs son los commits; con NORMAL los fsyncs se agrupan en los checkpoints y la diferencia está en los commits.
+El hash de contraseñas es barato (pbkdf2:sha256:1000) para que no oculte el coste de las escrituras.
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.bench_usuarios --altas 500
+    python -m benchmarks.bench_usuarios --altas 500 --synchronous NORMAL
+"""
+
+import argparse
+import json
+
+from sqlalchemy import event
+
+from extensions import db
+from models.usuario import Usuario
+from models.paciente import Paciente
+from servicios.usuarios import crear_usuario
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, headers_admin, medir
+
+
+"""Función con el flujo anterior de crear_paciente: consulta del username y un commit para el usuario y otro para el paciente"""
+def crear_paciente_dos_commits(datos):
+    if Usuario.query.filter_by(username=datos["username"]).first():
+        return None
+    usuario = Usuario(username=datos["username"], rol="paciente")
+    usuario.set_password(datos["password"])
+    db.session.add(usuario)
+    db.session.commit()
+    paciente = Paciente(nombre=datos["nombre"], telefono=datos["telefono"], estado="ACTIVO", id_usuario=usuario.id_usuario)
+    db.session.add(paciente)
+    db.session.commit()
+    return paciente
+
+
+"""Función para generar los datos de un paciente nuevo"""
+def datos_paciente(modo, i):
+    return {"nombre": f"Paciente {modo} {i}", "telefono": f"6{i:08d}", "username": f"{modo}{i}", "password": f"pass{i}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alta de pacientes: dos commits frente a una única transacción")
+    parser.add_argument("--altas", type=int, default=500, help="Pacientes creados en cada modo")
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous de SQLite (FULL = un fsync por commit)")
+    parser.add_argument("--hash", default="pbkdf2:sha256:1000", help="Método de hash de contraseñas (vacío = por defecto de Werkzeug)")
+    args = parser.parse_args()
+
+    app = crear_app_temporal({"SQLITE_SYNCHRONOUS": args.synchronous, "PASSWORD_HASH_METHOD": args.hash or None})
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+        commits = [0]
+        event.listen(db.engine, "commit", lambda conexion: commits.__setitem__(0, commits[0] + 1))
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+
+    def servicio(datos):
+        crear_usuario(datos, "paciente")
+        db.session.commit()
+
+    def endpoint(datos):
+        assert cliente.post("/admin/pacientes", json=datos, headers=headers).status_code == 201
+
+    def duplicado(datos):
+        assert cliente.post("/admin/pacientes", json={**datos, "username": "endpoint0"}, headers=headers).status_code == 409
+
+    modos = {"dos_commits": crear_paciente_dos_commits, "servicio": servicio, "endpoint": endpoint, "duplicado": duplicado}
+    resultados = {}
+    for modo, funcion in modos.items():
+        with app.app_context():
+            commits[0] = 0
+            resultados[modo] = medir(lambda i: funcion(datos_paciente(modo, i)), args.altas)
+            resultados[modo]["commits_por_alta"] = round(commits[0] / args.altas, 2)
+            if args.synchronous.upper() == "FULL":
+                resultados[modo]["fsyncs_por_alta"] = resultados[modo]["commits_por_alta"]
+        print(f"{modo}: {json.dumps(resultados[modo])}")
+
+    print(json.dumps({"altas": args.altas, "synchronous": args.synchronous, "resultados": resultados}, indent=2))
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Funciones comunes a todos los benchmarks: crear una app con base de datos temporal,
+sembrar datos sintéticos de forma masiva y medir latencias."""
+
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app
+from extensions import db
+from migraciones import migrar_base_datos
+from models.usuario import Usuario
+from models.centro import Centro
+from models.doctor import Doctor
+from models.paciente import Paciente
+from models.cita import Cita
+from servicios.carga_masiva import importar_centros, importar_doctores, importar_pacientes
+
+# Credenciales del admin que se crea en la base de datos temporal
+ADMIN_USERNAME = "admin_bench"
+ADMIN_PASSWORD = "admin_bench"
+
+# Primera fecha de las citas sintéticas. Las citas se reparten en franjas de 30 minutos a partir de aquí
+FECHA_INICIO = datetime(2024, 1, 1, 9, 0)
+
+
+"""Función para crear una app con una base de datos SQLite temporal (fichero) con todas las tablas e índices"""
+def crear_app_temporal(config_extra=None):
+    carpeta = tempfile.mkdtemp(prefix="odontocare_bench_")
+    config = {"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(carpeta, "bench.db")}
+    if config_extra:
+        config.update(config_extra)
+
+    app = create_app(config)
+    with app.app_context():
+        migrar_base_datos()
+    return app
+
+
+"""Función para crear el usuario admin de los benchmarks (sin commit)"""
+def crear_admin():
+    admin = Usuario(username=ADMIN_USERNAME, rol="admin")
+    admin.set_password(ADMIN_PASSWORD)
+    db.session.add(admin)
+    db.session.flush()
+    return admin
+
+
+"""Función para crear el admin y los catálogos (centros, doctores y pacientes) con inserciones masivas.
+    Devuelve el id del admin"""
+def sembrar_catalogo(n_centros=10, n_doctores=100, n_pacientes=1000):
+    admin = crear_admin()
+
+    db.session.execute(insert(Centro), [{"id_centro": i, "nombre": f"Centro {i}", "direccion": f"Calle {i}"} for i in range(1, n_centros + 1)])
+    db.session.execute(insert(Doctor), [{"id_doctor": i, "nombre": f"Doctor {i}", "especialidad": "General"} for i in range(1, n_doctores + 1)])
+    db.session.execute(insert(Paciente), [{"id_paciente": i, "nombre": f"Paciente {i}", "telefono": "600000000", "estado": "ACTIVO"} for i in range(1, n_pacientes + 1)])
+    db.session.commit()
+    return admin.id_usuario
+
+
+"""Función para generar filas sintéticas con las columnas de data/datos.csv
+    (tipo;nombre;telefono;especialidad;direccion;username;password;estado).
+    Los doctores y pacientes tienen username doctor{i} / paciente{i} y contraseña pass{i}"""
+def generar_filas_datos(n_centros=10, n_doctores=100, n_pacientes=1000, prefijo=""):
+    vacia = {"nombre": None, "telefono": None, "especialidad": None, "direccion": None, "username": None, "password": None, "estado": None}
+    especialidades = ["Ortodoncia", "Endodoncia", "Periodoncia", "General"]
+    filas = []
+    for i in range(1, n_centros + 1):
+        filas.append({**vacia, "tipo": "centro", "nombre": f"Clinica {prefijo}{i}", "direccion": f"Calle Falsa {i}"})
+    for i in range(1, n_doctores + 1):
+        filas.append({**vacia, "tipo": "doctor", "nombre": f"Dr. {prefijo}{i}", "especialidad": especialidades[i % len(especialidades)],
+                      "username": f"{prefijo}doctor{i}", "password": f"pass{i}"})
+    for i in range(1, n_pacientes + 1):
+        filas.append({**vacia, "tipo": "paciente", "nombre": f"Paciente {prefijo}{i}", "telefono": f"6{i:08d}",
+                      "username": f"{prefijo}paciente{i}", "password": f"pass{i}", "estado": "ACTIVO"})
+    return filas
+
+
+"""Función para cargar las filas de generar_filas_datos con los servicios de carga masiva (la misma ruta que carga_inicial.py --directo)"""
+def sembrar_desde_filas(filas):
+    campos = {"centro": ["nombre", "direccion"], "doctor": ["nombre", "especialidad", "username", "password"],
+              "paciente": ["nombre", "telefono", "username", "password", "estado"]}
+    for tipo, importar in [("centro", importar_centros), ("doctor", importar_doctores), ("paciente", importar_pacientes)]:
+        registros = [{campo: fila[campo] for campo in campos[tipo]} for fila in filas if fila["tipo"] == tipo]
+        if registros:
+            importar(registros)
+    db.session.commit()
+
+
+"""Función para sembrar n citas sintéticas en lotes. Cada doctor tiene como mucho una cita por franja de 30 minutos,
+    así que no hay conflictos entre las citas sembradas"""
+def sembrar_citas(n, id_admin, n_centros=10, n_doctores=100, n_pacientes=1000, lote=50000):
+    semilla = random.Random(42)
+    pendientes = []
+    for i in range(n):
+        franja = i // n_doctores
+        pendientes.append({
+            "fecha": FECHA_INICIO + timedelta(minutes=30 * franja),
+            "motivo": "Revision",
+            "estado": "Cancelada" if semilla.random() < 0.1 else "Activa",
+            "id_paciente": semilla.randint(1, n_pacientes),
+            "id_doctor": i % n_doctores + 1,
+            "id_centro": semilla.randint(1, n_centros),
+            "id_usuario_registra": id_admin,
+        })
+        if len(pendientes) >= lote:
+            db.session.execute(insert(Cita), pendientes)
+            db.session.commit()
+            pendientes = []
+    if pendientes:
+        db.session.execute(insert(Cita), pendientes)
+        db.session.commit()
+
+
+"""Función para hacer login con el cliente de pruebas de Flask y devolver los headers con el token"""
+def headers_admin(cliente):
+    respuesta = cliente.post("/auth/login", json={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+    return {"Authorization": f"Bearer {respuesta.get_json()['access_token']}"}
+
+
+"""Función para ejecutar una función varias veces y devolver las estadísticas de latencia en milisegundos"""
+def medir(funcion, repeticiones):
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(i)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return resumen_latencias(tiempos)
+
+
+"""Función para ejecutar una función varias veces desde varios hilos a la vez.
+    Devuelve las estadísticas de latencia y el rendimiento (peticiones por segundo) medido con el tiempo total"""
+def medir_concurrente(funcion, repeticiones, hilos=1):
+    if hilos <= 1:
+        inicio = time.perf_counter()
+        resumen = medir(funcion, repeticiones)
+        total = time.perf_counter() - inicio
+    else:
+        tiempos = []
+        lock = threading.Lock()
+
+        def ejecutar(i):
+            inicio_peticion = time.perf_counter()
+            funcion(i)
+            with lock:
+                tiempos.append((time.perf_counter() - inicio_peticion) * 1000)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            list(pool.map(ejecutar, range(repeticiones)))
+        total = time.perf_counter() - inicio
+        resumen = resumen_latencias(tiempos)
+
+    resumen["peticiones_por_segundo"] = round(repeticiones / total, 1) if total > 0 else None
+    return resumen
+
+
+"""Función para resumir una lista de latencias (ms) en media y percentiles"""
+def resumen_latencias(tiempos):
+    tiempos = sorted(tiempos)
+    if not tiempos:
+        return {"n": 0}
+
+    def percentil(p):
+        return tiempos[min(len(tiempos) - 1, int(round(p / 100 * (len(tiempos) - 1))))]
+
+    return {
+        "n": len(tiempos),
+        "media_ms": round(statistics.fmean(tiempos), 3),
+        "p50_ms": round(percentil(50), 3),
+        "p95_ms": round(percentil(95), 3),
+        "p99_ms": round(percentil(99), 3),
+    }
@@ -0,0 +1,61 @@
+"""Prueba de estrés de la doble reserva.
+
+Lanza miles de peticiones POST /citas/citas simultáneas (desde varios hilos) para el mismo doctor
+y la misma fecha/hora, y comprueba que exactamente una termina en 201 y el resto en 409.
+Si no se cumple, el script termina con código de error 1.
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.stress_reservas --peticiones 2000 --hilos 32
+"""
+
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.comun import crear_app_temporal, sembrar_catalogo, headers_admin
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reservas concurrentes del mismo hueco: solo una debe tener éxito")
+    parser.add_argument("--peticiones", type=int, default=2000, help="Número total de reservas a lanzar")
+    parser.add_argument("--hilos", type=int, default=32, help="Número de hilos concurrentes")
+    args = parser.parse_args()
+    args.hilos = min(args.hilos, args.peticiones)
+
+    # timeout de SQLite alto para que los hilos esperen el bloqueo de escritura en lugar de fallar con "database is locked"
+    app = crear_app_temporal({"SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 60}}})
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    headers = headers_admin(app.test_client())
+
+    cita = {"fecha": "2030-01-01 10:00", "motivo": "Stress", "id_doctor": 1, "id_centro": 1, "id_paciente": 1}
+
+    # Barrera para que todos los hilos empiecen a la vez y maximizar la concurrencia
+    barrera = threading.Barrier(args.hilos)
+    clientes = threading.local()
+
+    def reservar(i):
+        if not hasattr(clientes, "cliente"):
+            clientes.cliente = app.test_client()
+            barrera.wait()
+        return clientes.cliente.post("/citas/citas", json=cita, headers=headers).status_code
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+        codigos = Counter(pool.map(reservar, range(args.peticiones)))
+    duracion = time.perf_counter() - inicio
+
+    print(f"{args.peticiones} reservas en {duracion:.2f}s ({args.peticiones / duracion:.0f} req/s): {dict(codigos)}")
+
+    if codigos.get(201) != 1 or codigos.get(409) != args.peticiones - 1:
+        print("ERROR: se esperaba exactamente una reserva correcta y el resto con conflicto 409")
+        sys.exit(1)
+    print("OK: exactamente una reserva correcta")
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Suite de benchmarks de todos los endpoints (auth, admin y citas) con comparación contra una línea base.
+
+Genera un conjunto de datos sintético con el esquema de data/datos.csv (tamaño configurable), lo carga con los
+servicios de carga masiva, siembra citas y mide cada endpoint con el cliente de pruebas de Flask o, con --servidor,
+contra un servidor WSGI real (werkzeug) por HTTP. Para cada endpoint muestra n, media, p50, p95, p99 y peticiones por segundo.
+
+    - --guardar FICHERO: guarda los resultados como línea base (JSON)
+    - --baseline FICHERO: compara con una línea base y termina con código 1 si algún endpoint empeora más del umbral
+      (por defecto p95 un 25% peor y al menos 2 ms más lento, para no fallar por ruido en endpoints muy rápidos)
+    - --rapido: conjunto de datos y repeticiones mínimos (unos segundos) para comprobar que la suite funciona
+      (lo usa tests/test_suite_benchmarks.py); los valores indicados explícitamente tienen prioridad
+
+Uso (desde la carpeta odontocare):
+    python -m benchmarks.suite --guardar benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --umbral 0.25
+    python -m benchmarks.suite --servidor --hilos 8 --solo citas_
+    python -m benchmarks.suite --rapido
+"""
+
+import argparse
+import json
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+from benchmarks.comun import (crear_app_temporal, crear_admin, generar_filas_datos, sembrar_desde_filas, sembrar_citas,
+                              headers_admin, medir_concurrente, ADMIN_USERNAME, ADMIN_PASSWORD)
+
+# Valores por defecto con --rapido: lo mínimo para ejecutar todos los escenarios
+MODO_RAPIDO = {"centros": 2, "doctores": 4, "pacientes": 20, "citas": 200, "repeticiones": 5, "lote": 5}
+
+
+class RespuestaHTTP:
+    """
+    Respuesta de requests con la misma interfaz que usan los escenarios del cliente de pruebas de Flask (status_code y get_json)
+    """
+
+    def __init__(self, respuesta):
+        self.status_code = respuesta.status_code
+        self._respuesta = respuesta
+
+    def get_json(self):
+        return self._respuesta.json()
+
+
+class ClienteHTTP:
+    """
+    Cliente HTTP contra un servidor real con la misma interfaz que app.test_client() (get, post y put).
+    Cada hilo usa su propia sesión de requests (conexiones keep-alive)
+    """
+
+    def __init__(self, url_base):
+        self.url_base = url_base
+        self._local = threading.local()
+
+    def _sesion(self):
+        if not hasattr(self._local, "sesion"):
+            self._local.sesion = requests.Session()
+        return self._local.sesion
+
+    def _peticion(self, metodo, ruta, json=None, headers=None, data=None, content_type=None):
+        headers = dict(headers or {})
+        if content_type:
+            headers["Content-Type"] = content_type
+        return RespuestaHTTP(self._sesion().request(metodo, self.url_base + ruta, json=json, data=data, headers=headers))
+
+    def get(self, ruta, **kwargs):
+        return self._peticion("GET", ruta, **kwargs)
+
+    def post(self, ruta, **kwargs):
+        return self._peticion("POST", ruta, **kwargs)
+
+    def put(self, ruta, **kwargs):
+        return self._peticion("PUT", ruta, **kwargs)
+
+
+class ManejadorSilencioso(WSGIRequestHandler):
+    """
+    Manejador de peticiones de werkzeug que no escribe una línea de log por petición (falsearía las medidas)
+    """
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+"""Función para arrancar un servidor WSGI real (werkzeug, multihilo) en segundo plano. Devuelve el servidor y su URL"""
+def arrancar_servidor(app):
+    servidor = make_server("127.0.0.1", 0, app, threaded=True, request_handler=ManejadorSilencioso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}"
+
+
+"""Función para comprobar el código de estado de una respuesta dentro de un escenario"""
+def esperar(respuesta, codigo):
+    assert respuesta.status_code == codigo, f"esperado {codigo}, recibido {respuesta.status_code}: {respuesta.get_json()}"
+    return respuesta
+
+
+"""Función para hacer login y devolver los headers con el token"""
+def headers_login(cliente, username, password):
+    respuesta = esperar(cliente.post("/auth/login", json={"username": username, "password": password}), 200)
+    return {"Authorization": f"Bearer {respuesta.get_json()['access_token']}"}
+
+
+"""Función para definir los escenarios: nombre -> función que hace UNA petición (recibe el número de repetición).
+    Las escrituras usan nombres y fechas únicos para que todas lleguen hasta el INSERT"""
+def escenarios(cliente, args):
+    admin = headers_admin(cliente)
+    medico = headers_login(cliente, "doctor1", "pass1")
+    secretaria = headers_login(cliente, "secretaria_bench", "secretaria_bench")
+    citas_creadas = []
+    lock = threading.Lock()
+
+    # Fechas libres: años después de las citas sembradas. Cada escenario usa su propio año
+    def fecha_libre(anio, i):
+        return (datetime(anio, 1, 1, 9, 0) + timedelta(minutes=30 * (i // args.doctores))).strftime("%Y-%m-%d %H:%M")
+
+    def login(i):
+        n = i % args.pacientes + 1
+        esperar(cliente.post("/auth/login", json={"username": f"paciente{n}", "password": f"pass{n}"}), 200)
+
+    def admin_usuario(i):
+        esperar(cliente.post("/admin/usuario", json={"username": f"suite_usuario{i}", "password": "pass", "rol": "secretaria"}, headers=admin), 201)
+
+    def admin_centros(i):
+        esperar(cliente.post("/admin/centros", json={"nombre": f"Suite centro {i}", "direccion": "Calle"}, headers=admin), 201)
+
+    def admin_doctores(i):
+        esperar(cliente.post("/admin/doctores", json={"nombre": f"Suite doctor {i}", "especialidad": "General",
+                                                      "username": f"suite_doctor{i}", "password": "pass"}, headers=admin), 201)
+
+    def admin_pacientes(i):
+        esperar(cliente.post("/admin/pacientes", json={"nombre": f"Suite paciente {i}", "telefono": "600000000", "estado": "ACTIVO",
+                                                       "username": f"suite_paciente{i}", "password": "pass"}, headers=admin), 201)
+
+    def admin_bulk_pacientes(i):
+        cuerpo = "\n".join(json.dumps({"nombre": f"Bulk {i}-{j}", "telefono": "600000000", "username": f"suite_bulk{i}_{j}", "password": "pass"})
+                           for j in range(args.lote))
+        esperar(cliente.post("/admin/bulk/pacientes", data=cuerpo, content_type="application/x-ndjson", headers=admin), 201)
+
+    def admin_cache(i):
+        esperar(cliente.get("/admin/cache", headers=admin), 200)
+
+    def citas_agendar(i):
+        cita = {"fecha": fecha_libre(2090, i), "motivo": "Suite", "id_doctor": i % args.doctores + 1,
+                "id_centro": i % args.centros + 1, "id_paciente": i % args.pacientes + 1}
+        respuesta = esperar(cliente.post("/citas/citas", json=cita, headers=admin), 201)
+        with lock:
+            citas_creadas.append(respuesta.get_json()["Cita"]["id_cita"])
+
+    def citas_batch(i):
+        # Un paciente reserva 10 revisiones semanales con el mismo doctor
+        inicio = datetime(2091, 1, 1, 9, 0) + timedelta(minutes=30 * (i // args.doctores))
+        citas = [{"fecha": (inicio + timedelta(weeks=semana)).strftime("%Y-%m-%d %H:%M"), "motivo": "Revision",
+                  "id_doctor": i % args.doctores + 1, "id_centro": 1} for semana in range(10)]
+        esperar(cliente.post("/citas/citas/batch", json={"id_paciente": i % args.pacientes + 1, "citas": citas}, headers=admin), 201)
+
+    def citas_listar_admin(i):
+        esperar(cliente.get(f"/citas/citas?id_doctor={i % args.doctores + 1}&fecha=2024-01-0{i % 9 + 1}", headers=admin), 200)
+
+    def citas_listar_secretaria(i):
+        esperar(cliente.get(f"/citas/citas?fecha=2024-01-0{i % 9 + 1}&limit=100", headers=secretaria), 200)
+
+    def citas_listar_medico(i):
+        esperar(cliente.get("/citas/citas?limit=100", headers=medico), 200)
+
+    def citas_disponibilidad(i):
+        esperar(cliente.get(f"/citas/disponibilidad?id_doctor={i % args.doctores + 1}&desde=2024-01-0{i % 9 + 1}&hasta=2024-01-15",
+                            headers=admin), 200)
+
+    def citas_cancelar(i):
+        with lock:
+            id_cita = citas_creadas.pop()
+        esperar(cliente.put(f"/citas/citas/{id_cita}", headers=secretaria), 200)
+
+    # El orden importa: citas_cancelar cancela las citas creadas por citas_agendar
+    return {
+        "auth_login": (login, args.repeticiones),
+        "admin_usuario": (admin_usuario, args.repeticiones),
+        "admin_centros": (admin_centros, args.repeticiones),
+        "admin_doctores": (admin_doctores, args.repeticiones),
+        "admin_pacientes": (admin_pacientes, args.repeticiones),
+        "admin_bulk_pacientes": (admin_bulk_pacientes, max(1, args.repeticiones // 10)),
+        "admin_cache": (admin_cache, args.repeticiones),
+        "citas_agendar": (citas_agendar, args.repeticiones),
+        "citas_batch": (citas_batch, args.repeticiones),
+        "citas_listar_admin": (citas_listar_admin, args.repeticiones),
+        "citas_listar_secretaria": (citas_listar_secretaria, args.repeticiones),
+        "citas_listar_medico": (citas_listar_medico, args.repeticiones),
+        "citas_disponibilidad": (citas_disponibilidad, args.repeticiones),
+        "citas_cancelar": (citas_cancelar, args.repeticiones),
+    }
+
+
+"""Función para comparar los resultados con una línea base.
+    Devuelve la lista de regresiones: endpoints cuya métrica supera la de la línea base en más del umbral relativo
+    y de la tolerancia absoluta en milisegundos"""
+def comparar(resultados, baseline, metrica, umbral, tolerancia_ms):
+    regresiones = []
+    for nombre, actual in resultados["endpoints"].items():
+        anterior = baseline.get("endpoints", {}).get(nombre)
+        if not anterior or metrica not in anterior:
+            continue
+        limite = max(anterior[metrica] * (1 + umbral), anterior[metrica] + tolerancia_ms)
+        if actual[metrica] > limite:
+            regresiones.append({"endpoint": nombre, "metrica": metrica, "baseline": anterior[metrica],
+                                "actual": actual[metrica], "limite": round(limite, 3)})
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de todos los endpoints con comparación contra una línea base")
+    parser.add_argument("--centros", type=int, default=10, help="Centros del conjunto de datos sintético")
+    parser.add_argument("--doctores", type=int, default=50, help="Doctores del conjunto de datos sintético")
+    parser.add_argument("--pacientes", type=int, default=1000, help="Pacientes del conjunto de datos sintético")
+    parser.add_argument("--citas", type=int, default=50_000, help="Citas sembradas antes de medir")
+    parser.add_argument("--repeticiones", type=int, default=200, help="Peticiones por endpoint")
+    parser.add_argument("--lote", type=int, default=100, help="Pacientes por petición en admin_bulk_pacientes")
+    parser.add_argument("--hilos", type=int, default=1, help="Peticiones simultáneas por endpoint")
+    parser.add_argument("--servidor", action="store_true", help="Medir contra un servidor WSGI real por HTTP en lugar del cliente de pruebas")
+    parser.add_argument("--solo", default="", help="Medir solo los endpoints cuyo nombre empieza por este prefijo")
+    parser.add_argument("--hash", default="pbkdf2:sha256:1000", help="Método de hash de contraseñas (vacío = por defecto de Werkzeug)")
+    parser.add_argument("--guardar", help="Guardar los resultados como línea base en este fichero JSON")
+    parser.add_argument("--baseline", help="Línea base (JSON) con la que comparar")
+    parser.add_argument("--metrica", default="p95_ms", choices=["media_ms", "p50_ms", "p95_ms", "p99_ms"], help="Métrica que se compara")
+    parser.add_argument("--umbral", type=float, default=0.25, help="Empeoramiento relativo permitido (0.25 = 25%%)")
+    parser.add_argument("--tolerancia-ms", type=float, default=2.0, help="Empeoramiento absoluto permitido en milisegundos")
+    parser.add_argument("--rapido", action="store_true", help="Datos y repeticiones mínimos para comprobar que la suite funciona")
+    args = parser.parse_args()
+
+    # Con --rapido se cambian los valores por defecto y se vuelve a leer la línea de comandos (los valores explícitos mandan)
+    if args.rapido:
+        parser.set_defaults(**MODO_RAPIDO)
+        args = parser.parse_args()
+
+    # Base de datos temporal con el conjunto de datos sintético
+    app = crear_app_temporal({"PASSWORD_HASH_METHOD": args.hash or None})
+    with app.app_context():
+        id_admin = crear_admin().id_usuario
+        sembrar_desde_filas(generar_filas_datos(args.centros, args.doctores, args.pacientes))
+        sembrar_citas(args.citas, id_admin, args.centros, args.doctores, args.pacientes)
+
+    servidor = None
+    if args.servidor:
+        servidor, url = arrancar_servidor(app)
+        cliente = ClienteHTTP(url)
+    else:
+        cliente = app.test_client()
+
+    esperar(cliente.post("/admin/usuario", json={"username": "secretaria_bench", "password": "secretaria_bench", "rol": "secretaria"},
+                         headers=headers_login(cliente, ADMIN_USERNAME, ADMIN_PASSWORD)), 201)
+
+    resultados = {
+        "config": {clave: getattr(args, clave) for clave in ["centros", "doctores", "pacientes", "citas", "repeticiones", "lote", "hilos", "servidor", "hash"]},
+        "endpoints": {},
+    }
+    for nombre, (funcion, repeticiones) in escenarios(cliente, args).items():
+        if nombre.startswith(args.solo):
+            resultados["endpoints"][nombre] = medir_concurrente(funcion, repeticiones, args.hilos)
+            print(f"{nombre:28s} {json.dumps(resultados['endpoints'][nombre])}", file=sys.stderr)
+
+    if servidor:
+        servidor.shutdown()
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as fichero:
+            json.dump(resultados, fichero, indent=2)
+
+    codigo_salida = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fichero:
+            baseline = json.load(fichero)
+        if baseline.get("config") != resultados["config"]:
+            print("Aviso: la línea base se midió con otra configuración", file=sys.stderr)
+        resultados["regresiones"] = comparar(resultados, baseline, args.metrica, args.umbral, args.tolerancia_ms)
+        codigo_salida = 1 if resultados["regresiones"] else 0
+
+    print(json.dumps(resultados, indent=2))
+    sys.exit(codigo_salida)
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    main()
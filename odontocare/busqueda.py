@@ -0,0 +1,181 @@
+"""Búsqueda de pacientes y doctores por nombre, teléfono o especialidad (GET /admin/pacientes/buscar y /admin/doctores/buscar).
+
+En SQLite se usa un índice de texto completo FTS5 por tabla (pacientes_fts y doctores_fts):
+    - Tokenizador unicode61 con remove_diacritics 2: "maria" encuentra "María" y "nunez" encuentra "Núñez"
+    - Cada palabra buscada es un prefijo ("mar" encuentra "Martínez"). prefix='2 3' guarda en el índice los prefijos
+      de 2 y 3 letras, así las búsquedas mientras se escribe no recorren todos los términos
+    - Resultados ordenados por relevancia con un límite. No se usa bm25 (rank de FTS5): para calcularlo SQLite recorre
+      todas las filas que contienen cada palabra, y con nombres comunes ("maría", "garcía") en un millón de pacientes
+      son decenas de miles (cientos de ms). En su lugar se leen como mucho BUSQUEDA_CANDIDATOS coincidencias en orden
+      de id (la consulta se corta ahí) y se ordenan en Python: primero las que tienen más palabras completas iguales a
+      las buscadas, después las que empiezan por la primera palabra y después las más cortas
+    - Con nombres comunes, el nombre exacto buscado ("María García") puede tener un id alto y no estar entre esas
+      primeras coincidencias. Por eso, con dos palabras o más, antes se leen aparte los nombres iguales a lo buscado:
+      la frase al principio del nombre (^ de FTS5) y sin más letras (length). Cuesta unos 9 ms con la combinación más
+      común en un millón de pacientes; con una sola palabra ("maría") costaría más de 50 ms y no se hace
+    - Tablas de contenido externo: el índice no duplica los datos, solo guarda los términos y el id de la fila
+    - Triggers de SQLite mantienen el índice al insertar, modificar o borrar filas, así lo mantienen al día tanto
+      crear_paciente/crear_doctor como la carga masiva y la ingesta (INSERT masivos)
+    - Los teléfonos se indexan sin espacios, guiones, puntos ni paréntesis: "666 11 22 33" se encuentra con "6661122"
+Las bases de datos nuevas crean el índice con db.create_all(). Las existentes lo crean y lo rellenan con migrar_base_datos().
+Con otras bases de datos se busca con ILIKE (sin índice ni ranking)."""
+
+import re
+import unicodedata
+from functools import partial
+
+from flask import current_app
+
+from sqlalchemy import event, func, literal_column, or_, select, table, column, text
+
+from extensions import db
+from models.doctor import Doctor
+from models.paciente import Paciente
+
+# Expresión SQL que quita los separadores de un teléfono ({} es la columna)
+SIN_SEPARADORES = "replace(replace(replace(replace(replace({}, ' ', ''), '-', ''), '.', ''), '(', ''), ')', '')"
+
+# Índice de cada tipo: modelo, tabla FTS5 y columnas indexadas con la expresión que se guarda en el índice
+INDICES = {
+    "pacientes": {"modelo": Paciente, "fts": "pacientes_fts", "columnas": {"nombre": "{}", "telefono": SIN_SEPARADORES}},
+    "doctores": {"modelo": Doctor, "fts": "doctores_fts", "columnas": {"nombre": "{}", "especialidad": "{}"}},
+}
+
+# Opciones del índice: sin acentos y con prefijos de 2 y 3 letras precalculados
+OPCIONES_FTS = "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+
+# Búsquedas que son un teléfono (solo dígitos y separadores): se buscan como un único número
+PATRON_TELEFONO = re.compile(r"[\d\s+\-().]+")
+
+# Palabras y marcas diacríticas (acentos, tildes, diéresis) que quedan separadas de la letra con la normalización NFKD
+PATRON_PALABRA = re.compile(r"\w+")
+PATRON_ACENTOS = re.compile("[\u0300-\u036f]")
+
+
+"""Función para obtener los valores que se guardan en el índice para las columnas de una fila ('new', 'old' o la tabla)"""
+def valores_indice(indice, fila):
+    return ", ".join(expresion.format(f"{fila}.{columna}") for columna, expresion in indice["columnas"].items())
+
+
+"""Función para generar las sentencias que crean la tabla FTS5 de un índice y sus triggers.
+    Al borrar del índice hay que pasar los mismos valores que se indexaron, por eso los triggers usan las mismas expresiones"""
+def sentencias_indice(indice):
+    modelo, fts = indice["modelo"], indice["fts"]
+    tabla = modelo.__tablename__
+    id_fila = modelo.__table__.primary_key.columns[0].name
+    lista = ", ".join(indice["columnas"])
+    nuevos = valores_indice(indice, "new")
+    viejos = valores_indice(indice, "old")
+    borrar = f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.{id_fila}, {viejos});"
+    insertar = f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.{id_fila}, {nuevos});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({lista}, content='{tabla}', content_rowid='{id_fila}', {OPCIONES_FTS})",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN {insertar} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN {borrar} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {tabla} BEGIN {borrar} {insertar} END",
+    ]
+
+
+"""Función para crear el índice de búsqueda de una tabla si falta. Si es nuevo se rellena con las filas existentes
+    (con un INSERT ... SELECT y no con 'rebuild', que indexaría los teléfonos sin quitar los separadores).
+    Devuelve True si se ha creado"""
+def crear_indice(conexion, indice):
+    existe = conexion.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"), {"nombre": indice["fts"]}).first()
+    for sentencia in sentencias_indice(indice):
+        conexion.execute(text(sentencia))
+    if not existe:
+        tabla = indice["modelo"].__tablename__
+        id_fila = indice["modelo"].__table__.primary_key.columns[0].name
+        lista = ", ".join(indice["columnas"])
+        conexion.execute(text(f"INSERT INTO {indice['fts']}(rowid, {lista}) SELECT {id_fila}, {valores_indice(indice, tabla)} FROM {tabla}"))
+    return not existe
+
+
+"""Función para crear los índices de búsqueda que falten (solo SQLite). Devuelve los nombres de las tablas FTS5 creadas"""
+def crear_indices_busqueda(conexion):
+    if conexion.dialect.name != "sqlite":
+        return []
+    return [indice["fts"] for indice in INDICES.values() if crear_indice(conexion, indice)]
+
+
+"""Función que crea el índice de búsqueda de una tabla cuando db.create_all() crea la tabla"""
+def al_crear_tabla(indice, tabla, conexion, **kw):
+    if conexion.dialect.name == "sqlite":
+        crear_indice(conexion, indice)
+
+
+for _indice in INDICES.values():
+    event.listen(_indice["modelo"].__table__, "after_create", partial(al_crear_tabla, _indice))
+
+
+"""Función para separar un texto en palabras en minúsculas y sin acentos (como el tokenizador del índice).
+    Un teléfono con espacios o guiones es una única palabra"""
+def palabras(texto):
+    if texto is None:
+        return []
+    texto = str(texto)
+    if PATRON_TELEFONO.fullmatch(texto):
+        numero = "".join(re.findall(r"\d", texto))
+        return [numero] if numero else []
+    return PATRON_PALABRA.findall(PATRON_ACENTOS.sub("", unicodedata.normalize("NFKD", texto)).lower())
+
+
+"""Función para convertir las palabras buscadas en una consulta FTS5 (tienen que aparecer todas).
+    La última palabra siempre es un prefijo (se está escribiendo); las demás solo si todas_prefijo=True"""
+def consulta_fts(buscadas, todas_prefijo=True):
+    return " ".join(f'"{palabra}"*' if todas_prefijo or i == len(buscadas) - 1 else f'"{palabra}"' for i, palabra in enumerate(buscadas))
+
+
+"""Función para calcular la clave de orden de una fila candidata (menor = más relevante).
+    valores: los valores de las columnas indexadas, el primero es el nombre"""
+def relevancia(buscadas, valores):
+    terminos = [termino for valor in valores for termino in palabras(valor)]
+    completas = sum(1 for palabra in buscadas if palabra in terminos)
+    al_inicio = bool(terminos) and terminos[0].startswith(buscadas[0])
+    return (-completas, not al_inicio, len(terminos))
+
+
+"""Función para buscar pacientes o doctores ('pacientes' o 'doctores'). Devuelve como mucho 'limite' objetos del modelo,
+    los más relevantes primero"""
+def buscar(tipo, texto, limite):
+    indice = INDICES[tipo]
+    modelo = indice["modelo"]
+    id_fila = modelo.__table__.primary_key.columns[0]
+
+    # Sin SQLite no hay FTS5: buscar el texto en cualquier columna
+    if db.engine.dialect.name != "sqlite":
+        patron = f"%{texto.strip()}%"
+        condicion = or_(*[getattr(modelo, c).ilike(patron) for c in indice["columnas"]])
+        return db.session.scalars(select(modelo).where(condicion).order_by(modelo.nombre, id_fila).limit(limite)).all()
+
+    buscadas = palabras(texto)
+    if not buscadas:
+        return []
+
+    # Candidatos: id y columnas indexadas de las primeras coincidencias en orden de id (sin ordenar por rank)
+    fts = table(indice["fts"], column("rowid"))
+    columnas = [getattr(modelo, c) for c in indice["columnas"]]
+    candidatos_sql = select(id_fila, *columnas).join(fts, fts.c.rowid == id_fila)
+
+    def leer_candidatos(consulta, sql=candidatos_sql, maximo=current_app.config["BUSQUEDA_CANDIDATOS"]):
+        return db.session.execute(sql.where(literal_column(indice["fts"]).op("MATCH")(consulta)).limit(maximo)).all()
+
+    # Nombres iguales a lo buscado (con dos palabras o más): la frase al principio del nombre y como mucho 2 caracteres
+    # más (separadores repetidos o guiones). Van delante de las primeras coincidencias por id, que pueden no incluirlos
+    exactos = []
+    if len(buscadas) > 1:
+        frase = " ".join(buscadas)
+        exactos = leer_candidatos(f'nombre : ^ "{frase}"', candidatos_sql.where(func.length(modelo.nombre) <= len(frase) + 2), limite)
+
+    # Primero con las palabras completas exactas (sus listas del índice se recorren sin expandir prefijos, mucho más rápido
+    # con nombres comunes). Si no llega al límite, con todas las palabras como prefijo ("alv echev"), que incluye lo anterior
+    candidatos = leer_candidatos(consulta_fts(buscadas, todas_prefijo=False))
+    if len(candidatos) < limite and len(buscadas) > 1:
+        candidatos = leer_candidatos(consulta_fts(buscadas))
+    ids_exactos = {fila[0] for fila in exactos}
+    candidatos = exactos + [fila for fila in candidatos if fila[0] not in ids_exactos]
+
+    # Ordenar por relevancia (a igualdad, por id) y cargar solo los objetos que se devuelven
+    mejores = [fila[0] for fila in sorted(candidatos, key=lambda fila: (*relevancia(buscadas, fila[1:]), fila[0]))[:limite]]
+    objetos = {getattr(objeto, id_fila.key): objeto for objeto in db.session.scalars(select(modelo).where(id_fila.in_(mejores)))}
+    return [objetos[id_objeto] for id_objeto in mejores]
@@ -0,0 +1,222 @@
+"""Cachés para resultados de consultas que cambian poco.
+
+- CacheTTL: caché en memoria LRU con caducidad (TTL), local a cada proceso.
+- AlmacenCompartido: interfaz para un almacén compartido entre procesos (por ejemplo Redis).
+  AlmacenSQLite es una implementación local sobre un archivo SQLite que sirve como sustituto en desarrollo.
+- CacheDosNiveles: CacheTTL local delante de un AlmacenCompartido opcional.
+
+Se usan para no repetir la misma consulta a la base de datos en cada petición (por ejemplo si un usuario
+sigue existiendo con el mismo rol, o los datos de un doctor o centro)."""
+
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+
+# Valor que devuelve get() cuando la clave no está en la caché (permite guardar None como valor válido)
+NO_ENCONTRADO = object()
+
+
+class CacheTTL:
+    """
+    Caché LRU con caducidad:
+    - max_elementos: cuando se llena se elimina el elemento usado hace más tiempo
+    - ttl: segundos que un elemento es válido desde que se guarda
+    Es segura para usarla desde varios hilos a la vez (servidor con varios hilos)
+    """
+
+    def __init__(self, max_elementos=10000, ttl=60):
+        self.max_elementos = max_elementos
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    """Método para obtener un valor. Devuelve NO_ENCONTRADO si no existe o ha caducado"""
+    def get(self, clave):
+        with self._lock:
+            elemento = self._datos.get(clave)
+            if elemento is None or elemento[1] < time.monotonic():
+                if elemento is not None:
+                    del self._datos[clave]
+                self.fallos += 1
+                return NO_ENCONTRADO
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return elemento[0]
+
+    """Método para guardar un valor. Si la caché está llena se elimina el menos usado"""
+    def set(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_elementos:
+                self._datos.popitem(last=False)
+
+    """Método para guardar un valor solo si la clave no existe o ha caducado (en una sola operación).
+    Devuelve True si se ha guardado. Sirve para reservar una clave entre varios hilos"""
+    def set_si_no_existe(self, clave, valor):
+        with self._lock:
+            elemento = self._datos.get(clave)
+            if elemento is not None and elemento[1] >= time.monotonic():
+                return False
+            self._datos[clave] = (valor, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_elementos:
+                self._datos.popitem(last=False)
+            return True
+
+    """Método para eliminar una clave (invalidación)"""
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    """Método para vaciar la caché completa"""
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    """Método para devolver los contadores de uso de la caché"""
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "elementos": len(self._datos),
+                "max_elementos": self.max_elementos,
+                "ttl": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "ratio_aciertos": round(self.aciertos / total, 4) if total else None,
+            }
+
+
+class AlmacenCompartido(ABC):
+    """
+    Interfaz de un almacén de caché compartido entre procesos (varios workers de gunicorn).
+    Los valores deben poder convertirse a JSON. Para usar Redis u otro almacén hay que implementar todos estos métodos:
+    si falta alguno, la clase no se puede instanciar (TypeError al crear la app, no en la primera petición)
+    """
+
+    """Método para obtener el valor de una clave (NO_ENCONTRADO si no existe o ha caducado)"""
+    @abstractmethod
+    def get(self, clave):
+        ...
+
+    """Método para guardar un valor durante 'ttl' segundos"""
+    @abstractmethod
+    def set(self, clave, valor, ttl):
+        ...
+
+    """Método para guardar solo si la clave no existe o ha caducado, de forma atómica entre procesos. Devuelve True si se ha guardado"""
+    @abstractmethod
+    def set_si_no_existe(self, clave, valor, ttl):
+        ...
+
+    """Método para borrar una clave"""
+    @abstractmethod
+    def delete(self, clave):
+        ...
+
+    """Método para borrar todas las claves"""
+    @abstractmethod
+    def clear(self):
+        ...
+
+
+class AlmacenSQLite(AlmacenCompartido):
+    """
+    Almacén compartido sobre un archivo SQLite (sustituto local de Redis).
+    Todos los procesos que usan el mismo archivo comparten los valores y las invalidaciones
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        with self._conexion() as conexion:
+            conexion.execute("CREATE TABLE IF NOT EXISTS cache (clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)")
+
+    """Método para obtener la conexión del hilo actual (las conexiones de sqlite3 no se comparten entre hilos)"""
+    def _conexion(self):
+        if not hasattr(self._local, "conexion"):
+            self._local.conexion = sqlite3.connect(self.ruta, timeout=5)
+            self._local.conexion.execute("PRAGMA journal_mode = WAL")
+        return self._local.conexion
+
+    def get(self, clave):
+        fila = self._conexion().execute("SELECT valor FROM cache WHERE clave = ? AND expira > ?", (clave, time.time())).fetchone()
+        return NO_ENCONTRADO if fila is None else json.loads(fila[0])
+
+    def set(self, clave, valor, ttl):
+        with self._conexion() as conexion:
+            conexion.execute("INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)", (clave, json.dumps(valor), time.time() + ttl))
+
+    def set_si_no_existe(self, clave, valor, ttl):
+        # Borrar la clave si ha caducado e insertarla si no existe, en la misma transacción
+        ahora = time.time()
+        with self._conexion() as conexion:
+            conexion.execute("DELETE FROM cache WHERE clave = ? AND expira <= ?", (clave, ahora))
+            cursor = conexion.execute("INSERT OR IGNORE INTO cache (clave, valor, expira) VALUES (?, ?, ?)", (clave, json.dumps(valor), ahora + ttl))
+            return cursor.rowcount == 1
+
+    def delete(self, clave):
+        with self._conexion() as conexion:
+            conexion.execute("DELETE FROM cache WHERE clave = ?", (clave,))
+
+    def clear(self):
+        with self._conexion() as conexion:
+            conexion.execute("DELETE FROM cache")
+
+
+class CacheDosNiveles:
+    """
+    Caché de lectura en dos niveles:
+    - Nivel 1: CacheTTL local del proceso (muy rápida)
+    - Nivel 2 (opcional): AlmacenCompartido entre procesos
+    Si ninguno de los dos tiene el valor, se llama a la función de carga (consulta a la base de datos) y se guarda.
+    Las invalidaciones borran la clave en los dos niveles. Los otros procesos pueden seguir viendo su copia local
+    hasta que caduque, por eso el TTL local debe ser corto si se usa un almacén compartido
+    """
+
+    def __init__(self, local, compartido=None, ttl_compartido=300):
+        self.local = local
+        self.compartido = compartido
+        self.ttl_compartido = ttl_compartido
+        self.aciertos_compartido = 0
+
+    """Método para obtener un valor, cargándolo con la función 'cargar' si no está en caché"""
+    def obtener(self, clave, cargar):
+        valor = self.local.get(clave)
+        if valor is not NO_ENCONTRADO:
+            return valor
+
+        if self.compartido is not None:
+            valor = self.compartido.get(clave)
+            if valor is not NO_ENCONTRADO:
+                self.aciertos_compartido += 1
+                self.local.set(clave, valor)
+                return valor
+
+        valor = cargar()
+        self.local.set(clave, valor)
+        if self.compartido is not None:
+            self.compartido.set(clave, valor, self.ttl_compartido)
+        return valor
+
+    """Método para invalidar una clave en los dos niveles"""
+    def invalidar(self, clave):
+        self.local.delete(clave)
+        if self.compartido is not None:
+            self.compartido.delete(clave)
+
+    """Método para vaciar los dos niveles"""
+    def limpiar(self):
+        self.local.clear()
+        if self.compartido is not None:
+            self.compartido.clear()
+
+    """Método para devolver los contadores de uso"""
+    def estadisticas(self):
+        return {**self.local.estadisticas(), "compartida": self.compartido is not None, "aciertos_compartida": self.aciertos_compartido}
@@ -0,0 +1,86 @@
+"""Caché HTTP de los listados: ETag / peticiones condicionales y compresión de respuestas.
+
+- @condicional("citas"): genera un ETag a partir de la versión de la tabla (versiones.py), del usuario y de los filtros
+  de la petición. Si el cliente envía If-None-Match con ese ETag se responde 304 sin consultar ni serializar las citas.
+  Los paneles que consultan el listado cada pocos segundos solo descargan los datos cuando algo ha cambiado.
+- comprimir_respuesta: comprime con brotli (si está instalado) o gzip las respuestas de más de HTTP_COMPRESION_MIN_BYTES
+  cuando el cliente lo acepta (cabecera Accept-Encoding)."""
+
+import gzip
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from decoradores import usuario_actual
+from versiones import leer_version
+
+# brotli es opcional: si no está instalado solo se usa gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+"""Decorador para responder 304 Not Modified si los datos de la tabla no han cambiado desde la última petición del cliente.
+    Se debe poner DESPUÉS de @jwt_required() o @role_required() (el ETag depende del usuario del token)"""
+def condicional(tabla):
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            # El ETag depende de la versión de la tabla, del usuario (cada rol ve citas distintas) y de los filtros
+            etag = calcular_etag(leer_version(tabla), usuario_actual() or {}, request.path, request.args)
+
+            # Se usa un ETag débil porque la compresión cambia los bytes de la respuesta pero no su contenido
+            if request.if_none_match.contains_weak(etag):
+                respuesta = current_app.response_class(status=304)
+            else:
+                respuesta = make_response(funcion(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+
+            respuesta.set_etag(etag, weak=True)
+            # private: solo lo guarda el navegador del usuario; no-cache: debe revalidar siempre con If-None-Match
+            respuesta.headers["Cache-Control"] = "private, no-cache"
+            return respuesta
+        return envoltura
+    return decorador
+
+
+"""Función para calcular el ETag de un listado (el modo ASGI usa la misma función, así los ETag valen en los dos modos)"""
+def calcular_etag(version, usuario, ruta, args):
+    filtros = "&".join(f"{clave}={valor}" for clave, valor in sorted(args.items(multi=True)))
+    huella = f"{version}|{usuario.get('id_usuario')}|{usuario.get('rol')}|{ruta}|{filtros}"
+    return hashlib.sha1(huella.encode()).hexdigest()
+
+
+"""Función para comprimir una respuesta si es grande y el cliente acepta brotli o gzip (se registra con after_request)"""
+def comprimir_respuesta(respuesta):
+    config = current_app.config
+    if (not config["HTTP_COMPRESION"] or respuesta.status_code != 200 or respuesta.direct_passthrough
+            or respuesta.is_streamed or "Content-Encoding" in respuesta.headers):
+        return respuesta
+
+    respuesta.vary.add("Accept-Encoding")
+    comprimidos, codificacion = comprimir(respuesta.get_data(), request.accept_encodings, config)
+    if codificacion is None:
+        return respuesta
+
+    respuesta.set_data(comprimidos)
+    respuesta.headers["Content-Encoding"] = codificacion
+    return respuesta
+
+
+"""Función para comprimir unos datos con la mejor codificación aceptada por el cliente (también la usa el modo ASGI).
+    aceptadas: cabecera Accept-Encoding ya interpretada por werkzeug. Devuelve (datos, codificación) o (datos, None) si no se comprimen"""
+def comprimir(datos, aceptadas, config):
+    if not config["HTTP_COMPRESION"] or len(datos) < config["HTTP_COMPRESION_MIN_BYTES"]:
+        return datos, None
+
+    codificaciones = ["br", "gzip"] if brotli is not None else ["gzip"]
+    codificacion = aceptadas.best_match(codificaciones)
+    if codificacion == "br":
+        return brotli.compress(datos, quality=config["HTTP_COMPRESION_NIVEL_BROTLI"]), "br"
+    if codificacion == "gzip":
+        return gzip.compress(datos, compresslevel=config["HTTP_COMPRESION_NIVEL"]), "gzip"
+    return datos, None
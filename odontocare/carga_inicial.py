@@ -1,14 +1,38 @@
+import argparse
+import json
+import uuid
 import pandas as pd
 import requests
 import os
 from extensions import db
-from models.usuario import Usuario
 from app import create_app
+from servicios.carga_masiva import importar_centros, importar_doctores, importar_pacientes
+from servicios.usuarios import crear_usuario, UsernameEnUso
+from catalogo import invalidar_catalogo
 
 """Definición URL de la API"""
 
 BASE_URL = "http://127.0.0.1:5000"
 
+# Intentos de cada POST cuando el servidor no responde a tiempo y segundos de espera de cada intento
+INTENTOS_POST = 3
+TIMEOUT_POST = 10
+
+
+"""Función para hacer un POST a la API reintentando si no hay respuesta (timeout o conexión cortada).
+    Cada petición lleva una Idempotency-Key calculada a partir de la ruta y los datos: si la primera petición
+    llegó al servidor pero se perdió la respuesta, el reintento recibe la respuesta guardada y no crea el registro dos veces
+"""
+def enviar_post(ruta, data, headers):
+    clave = str(uuid.uuid5(uuid.NAMESPACE_URL, ruta + json.dumps(data, sort_keys=True, default=str)))
+    for intento in range(1, INTENTOS_POST + 1):
+        try:
+            return requests.post(f"{BASE_URL}{ruta}", json=data, headers={**headers, "Idempotency-Key": clave}, timeout=TIMEOUT_POST)
+        except (requests.Timeout, requests.ConnectionError):
+            if intento == INTENTOS_POST:
+                raise
+            print(f"Sin respuesta de {ruta}, reintentando ({intento}/{INTENTOS_POST - 1})...")
+
 
 """Función para hacer login como admin
     Esta función se encarga de:
@@ -35,6 +59,47 @@ def login_admin(username, password):
         return print("Error al hacer login:", response.json())
 
 
+"""Función de carga directa (modo --directo)
+    Esta función se encarga de:
+     - Leer el CSV con los datos iniciales
+     - Crear el admin si no existe
+     - Insertar centros, doctores y pacientes directamente en la base de datos con los servicios de carga masiva,
+       sin hacer peticiones HTTP ni login (todo en una única transacción)
+"""
+def carga_directa(csv_path):
+
+    # Leer el CSV como texto (dtype=str) para que los teléfonos no se conviertan a números decimales, y cambiar los NaN por None
+    df = pd.read_csv(csv_path, sep=";", dtype=str)
+    df = df.astype(object).where(df.notna(), None)
+
+    # Crear el admin si no existe (igual que en el modo HTTP). Cada admin se crea en un SAVEPOINT: si ya existe,
+    # el índice único de username hace fallar su INSERT y solo se deshace ese admin, no el resto de la carga
+    for admin_user in df[df["tipo"] == "admin"].to_dict("records"):
+        try:
+            with db.session.begin_nested():
+                crear_usuario(admin_user, "admin")
+        except UsernameEnUso:
+            pass
+
+    # Separar los registros por tipo quedándose solo con las columnas de cada uno
+    centros = df[df["tipo"] == "centro"][["nombre", "direccion"]].to_dict("records")
+    doctores = df[df["tipo"] == "doctor"][["nombre", "especialidad", "username", "password"]].to_dict("records")
+    pacientes = df[df["tipo"] == "paciente"][["nombre", "telefono", "username", "password", "estado"]].to_dict("records")
+
+    # Importar cada tipo con carga masiva. Con parcial=True los registros que ya existen se informan como error y se continúa con el resto
+    for tipo, importar, registros in [("centros", importar_centros, centros), ("doctores", importar_doctores, doctores), ("pacientes", importar_pacientes, pacientes)]:
+        resultado = importar(registros, parcial=True)
+        print(f"{tipo.capitalize()} creados: {resultado['creados']} de {resultado['recibidos']}")
+        for error in resultado["errores"]:
+            print(f"  Error en {tipo} (fila {error['indice']}):", error["error"])
+
+    # Guardar todo en la base de datos con un único commit
+    db.session.commit()
+
+    # Vaciar la caché del catálogo (si es compartida, los servidores en marcha dejan de ver los ids nuevos como inexistentes)
+    invalidar_catalogo()
+
+
 """Función principal del Script
     Esta función se encarga de:
      - Leer el archivo CSV con los datos iniciales (centros, doctores, pacientes).
@@ -44,7 +109,7 @@ def login_admin(username, password):
      - Crear una cita
      - Imprimir en consola el resultado de la cita creada
 """
-def main():
+def main(directo=False):
    
    # Crear app y contexto
         # create_app(): crea la aplicación Flask con DB, JWT y Blueprints
@@ -58,6 +123,11 @@ def main():
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     csv_path = os.path.join(BASE_DIR, "..", "data", "datos.csv")
 
+    # Modo directo: cargar los datos sin pasar por la API
+    if directo:
+        carga_directa(csv_path)
+        return
+
     df = pd.read_csv(csv_path, sep=";")
 
 
@@ -81,16 +151,13 @@ def main():
     if not token:
         print("El admin no existe en la base de datos. Intentando crearlo...")
 
-        # Asegurar que el admin no esté creado ya en la base de datos
-        existing = Usuario.query.filter_by(username=admin_user["username"]).first()
-
-        if not existing:
-
-            new_admin = Usuario(username=admin_user["username"], rol="admin")
-            new_admin.set_password(admin_user["password"])
-
-            db.session.add(new_admin)
+        # Crear el admin con el servicio de usuarios. Si ya está creado en la base de datos (por ejemplo con otra contraseña),
+        # el índice único de username hace fallar el INSERT y no se crea
+        try:
+            crear_usuario(admin_user, "admin")
             db.session.commit()
+        except UsernameEnUso:
+            db.session.rollback()
 
         print("Admin creado en BD. Reintentando login...")
         token = login_admin(admin_user["username"], admin_user["password"])
@@ -120,7 +187,7 @@ def main():
             # Diccionario con parámetros del centro
             data = {"nombre": row["nombre"], "direccion": row["direccion"]} 
             # Hacer petición POST a admin/centros para crear el centro. Los datos se envían en JSON y se envía el headers con el token para permitir la acción. 
-            response = requests.post(f"{BASE_URL}/admin/centros", json=data, headers=headers)
+            response = enviar_post("/admin/centros", data, headers)
             
             # Verificar si la petición fue exitosa
                 # Si el código de la respuesta es exitoso, añadir centro creado y su ID a la lista e imprimir confirmación
@@ -137,7 +204,7 @@ def main():
             # Diccionario con parámetros del doctor
             data = {"nombre": row["nombre"], "especialidad": row["especialidad"], "username": row["username"], "password": row["password"]}
             # Hacer petición POST a admin/doctores para crear el centro. Los datos se envían en JSON y se envía el headers con el token para permitir la acción.             
-            response = requests.post(f"{BASE_URL}/admin/doctores", json=data, headers=headers)
+            response = enviar_post("/admin/doctores", data, headers)
             
             # Verificar si la petición fue exitosa
                 # Si el código de la respuesta es exitoso, añadir doctor creado y su ID a la lista e imprimir confirmación
@@ -154,7 +221,7 @@ def main():
             # Diccionario con parámetros del paciente. Si el estado no está definido (se comprueba con función notna), se define por defecto Activo
             data = {"nombre": row["nombre"], "telefono": row["telefono"], "username": row["username"], "password": row["password"], "estado": row["estado"] if pd.notna(row["estado"]) else "ACTIVO"}
              # Hacer petición POST a admin/pacientes para crear el centro. Los datos se envían en JSON y se envía el headers con el token para permitir la acción.                        
-            response = requests.post(f"{BASE_URL}/admin/pacientes", json=data, headers=headers)
+            response = enviar_post("/admin/pacientes", data, headers)
 
             # Verificar si la petición fue exitosa
                 # Si el código de la respuesta es exitoso, añadir paciente creado y su ID a la lista e imprimir confirmación
@@ -185,7 +252,7 @@ def main():
     cita_data = {"fecha": "2025-09-10 10:00", "motivo": "Revisión dental", "id_doctor": created_doctors[0], "id_centro": created_centers[0], "id_paciente": created_patients[0]}
         
         # Hacer petición POST a admin/pacientes para crear la cita. Los datos se envían en JSON y se envía el headers con el token para permitir la acción.                        
-    response = requests.post(f"{BASE_URL}/citas/citas", json=cita_data, headers=headers)
+    response = enviar_post("/citas/citas", cita_data, headers)
 
     # Imprimir el JSON de la cita creada
         # Si la respuesta del servidor es exitosa, devolver mensaje json con la cita creada
@@ -199,4 +266,8 @@ def main():
 
 # Ejecutar script
 if __name__ == "__main__":
-    main()
+    # Con --directo los datos se insertan directamente en la base de datos (sin servidor ni peticiones HTTP)
+    parser = argparse.ArgumentParser(description="Carga inicial de datos de OdontoCare desde data/datos.csv")
+    parser.add_argument("--directo", action="store_true", help="Cargar los datos directamente en la base de datos sin usar la API")
+    args = parser.parse_args()
+    main(directo=args.directo)
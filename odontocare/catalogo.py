@@ -0,0 +1,60 @@
+"""Caché de lectura del catálogo (centros y doctores).
+
+Los centros y doctores cambian muy pocas veces al día, pero se consultan en cada reserva de cita.
+Este módulo guarda su to_dict() en una caché LRU con TTL (cache.CacheDosNiveles) para no consultar la base
+de datos cada vez. También se guarda cuando NO existen (valor None), para que un id inválido repetido no llegue a la base de datos.
+    - Los endpoints de creación (crear_centro, crear_doctor, carga masiva) invalidan la caché después del commit.
+    - Con CATALOGO_CACHE_COMPARTIDA (ruta de un archivo) la caché se comparte entre procesos con cache.AlmacenSQLite."""
+
+from flask import current_app
+
+from cache import CacheTTL, CacheDosNiveles, AlmacenSQLite
+from extensions import db
+from models.centro import Centro
+from models.doctor import Doctor
+
+
+"""Función para obtener la caché del catálogo de la app actual"""
+def cache_catalogo():
+    return current_app.extensions["cache_catalogo"]
+
+
+"""Función para obtener un registro del catálogo (to_dict() o None si no existe) pasando por la caché"""
+def _obtener(modelo, prefijo, id_registro):
+    def cargar():
+        registro = db.session.get(modelo, id_registro)
+        return registro.to_dict() if registro else None
+    return cache_catalogo().obtener(f"{prefijo}:{id_registro}", cargar)
+
+
+"""Funciones para obtener un doctor o un centro por su id (diccionario con sus datos o None si no existe)"""
+def obtener_doctor(id_doctor):
+    return _obtener(Doctor, "doctor", id_doctor)
+
+def obtener_centro(id_centro):
+    return _obtener(Centro, "centro", id_centro)
+
+
+"""Funciones para invalidar un doctor o un centro (se llaman después de guardar cambios en la base de datos)"""
+def invalidar_doctor(id_doctor):
+    cache_catalogo().invalidar(f"doctor:{id_doctor}")
+
+def invalidar_centro(id_centro):
+    cache_catalogo().invalidar(f"centro:{id_centro}")
+
+
+"""Función para vaciar toda la caché del catálogo (por ejemplo tras una carga masiva)"""
+def invalidar_catalogo():
+    cache_catalogo().limpiar()
+
+
+"""Función para crear la caché del catálogo de la app (se llama desde create_app)"""
+def init_catalogo(app):
+    ttl = app.config["CATALOGO_CACHE_TTL"]
+    ruta_compartida = app.config["CATALOGO_CACHE_COMPARTIDA"]
+    compartido = AlmacenSQLite(ruta_compartida) if ruta_compartida else None
+
+    # Con almacén compartido, la copia local de cada proceso dura poco para que las invalidaciones de otros procesos se vean pronto
+    ttl_local = min(ttl, app.config["CATALOGO_CACHE_TTL_LOCAL"]) if compartido else ttl
+    local = CacheTTL(max_elementos=app.config["CATALOGO_CACHE_SIZE"], ttl=ttl_local)
+    app.extensions["cache_catalogo"] = CacheDosNiveles(local, compartido, ttl_compartido=ttl)
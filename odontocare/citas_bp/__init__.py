@@ -4,4 +4,8 @@ from flask import Blueprint
 citas_bp = Blueprint('citas_bp', __name__)
 
 # Importar el archivo routes de esta carpeta
-from . import routes
\ No newline at end of file
+from . import routes
+
+# Comprimir las respuestas grandes de este Blueprint (gzip o brotli, ver cache_http.py)
+from cache_http import comprimir_respuesta
+citas_bp.after_request(comprimir_respuesta)
@@ -0,0 +1,172 @@
+"""Variante asíncrona del endpoint listar citas (GET /citas/citas) para el modo ASGI (asgi.py).
+
+Aplica exactamente las mismas reglas que listar_citas (routes.py): filtros por rol, histórico (incluir_historico), paginación por cursor,
+ETag con la versión de la tabla citas (304 si no ha cambiado nada) y compresión de las respuestas grandes.
+Las consultas se hacen con el motor asíncrono (asincrono.py), así que mientras una petición espera a la base de datos
+el servidor atiende otras conexiones sin ocupar un hilo por cliente.
+El formato NDJSON (streaming por lotes) lo sigue atendiendo la versión WSGI: el endpoint devuelve None y asgi.py
+pasa la petición a la app Flask.
+
+También está aquí la variante asíncrona de GET /citas/stream (Server-Sent Events): cada conexión abierta es una corrutina
+que espera eventos del bus sin ocupar uno de los ASGI_HILOS_WSGI hilos, y se cierra al recibir "http.disconnect"."""
+
+import asyncio
+
+from sqlalchemy import select
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+from asincrono import autenticar, base_datos_async, respuesta_json, ErrorAutenticacion, RespuestaASGI, RespuestaSSE
+from archivo import fuente_citas, leer_incluir_historico
+from cache_http import calcular_etag, comprimir
+from eventos import filtro_eventos, formatear_evento, leer_ultimo_id
+from fechas import rango_fecha
+from models.cita import Cita
+from models.version_tabla import VersionTabla
+from paginacion import leer_limite, codificar_cursor, aplicar_keyset
+from serializacion import serializacion_rapida, columnas_cita, filas_a_dto, clave_cursor, a_json
+
+# Nombre del endpoint WSGI equivalente (para SERIALIZACION_RAPIDA)
+ENDPOINT = "citas_bp.listar_citas"
+
+
+"""Función para construir las condiciones de la consulta de citas según el rol (mismas reglas que listar_citas)
+    modelo: Cita o la unión con el archivo (fuente_citas). Devuelve (lista de condiciones, None) o (None, (error, código))"""
+def condiciones_citas(usuario, args, modelo=Cita):
+    rol = usuario["rol"]
+
+    # Medico: SOLO sus propias citas
+    if rol == "medico":
+        if not usuario["id_doctor"]:
+            return None, ({"error": "Doctor no encontrado"}, 404)
+        return [modelo.id_doctor == usuario["id_doctor"]], None
+
+    # Secretaria: puede filtrar por fecha. Admin: por doctor, centro, paciente, fecha o estado
+    if rol == "secretaria":
+        filtros_permitidos = ["fecha"]
+    elif rol == "admin":
+        filtros_permitidos = ["id_doctor", "id_centro", "id_paciente", "fecha", "estado"]
+    else:
+        return None, ({"error": "No tiene permiso para ver citas"}, 403)
+
+    condiciones = []
+    for campo, columna in [("id_doctor", modelo.id_doctor), ("id_centro", modelo.id_centro), ("id_paciente", modelo.id_paciente)]:
+        valor = args.get(campo)
+        if valor and campo in filtros_permitidos:
+            try:
+                condiciones.append(columna == int(valor))
+            except ValueError:
+                return None, ({"error": f"{campo} debe ser numérico"}, 400)
+
+    fecha = args.get("fecha")
+    if fecha and "fecha" in filtros_permitidos:
+        try:
+            desde, hasta = rango_fecha(fecha)
+        except ValueError:
+            return None, ({"error": "Formato de fecha invalido", "formato": "YYYY-MM-DD o YYYY-MM-DD HH:MM"}, 400)
+        condiciones += [modelo.fecha >= desde, modelo.fecha < hasta]
+
+    estado = args.get("estado")
+    if estado and "estado" in filtros_permitidos:
+        condiciones.append(modelo.estado == estado)
+
+    return condiciones, None
+
+
+"""Endpoint listar citas asíncrono: GET /citas/citas en el modo ASGI
+    Devuelve un RespuestaASGI, o None si la petición la debe atender la versión WSGI (formato=ndjson o citas particionadas)"""
+async def listar_citas_async(app, peticion):
+    args = peticion.args
+    if args.get("formato") == "ndjson" or app.config["CITAS_PARTICIONES"]:
+        return None
+
+    # Comprobar el token (equivale a @jwt_required() + usuario_actual())
+    try:
+        usuario = await autenticar(app, peticion.cabeceras.get("Authorization"))
+    except ErrorAutenticacion as error:
+        return respuesta_json(app, error.cuerpo, error.codigo)
+
+    base = base_datos_async(app)
+    async with base.sesion() as sesion:
+
+        # ETag igual que @condicional("citas"): si el cliente ya tiene esta versión se responde 304 sin leer las citas
+        version = await sesion.scalar(select(VersionTabla.version).where(VersionTabla.nombre == "citas")) or 0
+        etag = calcular_etag(version, usuario or {}, peticion.ruta, args)
+        cabeceras_cache = {"ETag": quote_etag(etag, weak=True), "Cache-Control": "private, no-cache"}
+        if parse_etags(peticion.cabeceras.get("If-None-Match")).contains_weak(etag):
+            return RespuestaASGI(304, b"", cabeceras_cache)
+
+        if not usuario:
+            return respuesta_json(app, {"error": "Usuario no encontrado"}, 404)
+
+        modelo = fuente_citas(leer_incluir_historico(args.get("incluir_historico")))
+        condiciones, error = condiciones_citas(usuario, args, modelo)
+        if error:
+            return respuesta_json(app, *error)
+        consulta = select(modelo).where(*condiciones)
+
+        limit = args.get("limit")
+        cursor = args.get("cursor")
+
+        # Serialización rápida (serializacion.py): mismo ajuste SERIALIZACION_RAPIDA que la versión WSGI
+        rapida = serializacion_rapida(ENDPOINT, app.config)
+
+        # Sin paginación: la lista completa
+        if limit is None and cursor is None:
+            if rapida:
+                datos = filas_a_dto((await sesion.execute(consulta.with_only_columns(*columnas_cita(modelo)))).all())
+            else:
+                datos = [cita.to_dict() for cita in (await sesion.scalars(consulta)).all()]
+
+        # Paginación por cursor: se pide una cita más del límite para saber si existe página siguiente
+        else:
+            try:
+                consulta = aplicar_keyset(consulta, modelo.fecha, modelo.id_cita, cursor)
+                limite = leer_limite(limit)
+            except ValueError as error:
+                return respuesta_json(app, {"error": str(error)}, 400)
+            if rapida:
+                filas = (await sesion.execute(consulta.with_only_columns(*columnas_cita(modelo)).limit(limite + 1))).all()
+                next_cursor = codificar_cursor(*clave_cursor(filas[limite - 1])) if len(filas) > limite else None
+                datos = {"citas": filas_a_dto(filas[:limite]), "next_cursor": next_cursor, "limit": limite}
+            else:
+                citas = (await sesion.scalars(consulta.limit(limite + 1))).all()
+                next_cursor = None
+                if len(citas) > limite:
+                    citas = citas[:limite]
+                    next_cursor = codificar_cursor(citas[-1].fecha, citas[-1].id_cita)
+                datos = {"citas": [cita.to_dict() for cita in citas], "next_cursor": next_cursor, "limit": limite}
+
+    # Respuesta JSON con ETag y, si es grande, comprimida (igual que comprimir_respuesta en cache_http.py)
+    cabeceras = {**cabeceras_cache, "Vary": "Accept-Encoding"}
+    respuesta = RespuestaASGI(200, a_json(datos), {"Content-Type": "application/json", **cabeceras}) if rapida else respuesta_json(app, datos, 200, cabeceras)
+    respuesta.cuerpo, codificacion = comprimir(respuesta.cuerpo, parse_accept_header(peticion.cabeceras.get("Accept-Encoding")), app.config)
+    if codificacion:
+        respuesta.cabeceras["Content-Encoding"] = codificacion
+    return respuesta
+
+
+"""Endpoint cambios de citas en tiempo real asíncrono: GET /citas/stream en el modo ASGI
+    Mismas reglas que stream_citas (routes.py): roles, filtros, Last-Event-ID, límite de conexiones y latido.
+    Devuelve una RespuestaSSE (o una respuesta JSON de error)"""
+async def stream_citas_async(app, peticion):
+
+    # Comprobar el token (equivale a @jwt_required() + usuario_actual())
+    try:
+        usuario = await autenticar(app, peticion.cabeceras.get("Authorization"))
+    except ErrorAutenticacion as error:
+        return respuesta_json(app, error.cuerpo, error.codigo)
+    if not usuario:
+        return respuesta_json(app, {"error": "Usuario no encontrado"}, 404)
+
+    # Construir el filtro de eventos con las mismas reglas que listar_citas
+    filtro, error = filtro_eventos(usuario, peticion.args)
+    if error:
+        return respuesta_json(app, *error)
+
+    # La suscripción se crea con el bucle de eventos actual: cada evento publicado (desde cualquier hilo) la despierta
+    ultimo_id = leer_ultimo_id(peticion.cabeceras.get("Last-Event-ID"))
+    suscripcion = app.extensions["eventos"].suscribir(ultimo_id, asyncio.get_running_loop())
+    if suscripcion is None:
+        return respuesta_json(app, {"error": "Demasiadas conexiones abiertas. Intentalo de nuevo mas tarde"}, 503, {"Retry-After": "5"})
+
+    return RespuestaSSE(suscripcion, filtro, app.config["SSE_HEARTBEAT_SEGUNDOS"], formatear_evento)
@@ -1,12 +1,28 @@
-from flask import request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import json
+from datetime import datetime, timedelta
+from flask import request, jsonify, Response, stream_with_context, current_app
+from flask_jwt_extended import jwt_required
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
 from . import citas_bp
 from extensions import db
-from models.usuario import Usuario
+from decoradores import role_required, usuario_actual
 from models.paciente import Paciente
 from models.doctor import Doctor
-from models.centro import Centro
 from models.cita import Cita
+from fechas import parsear_fecha_hora, rango_fecha, formatear_fecha, fin_periodo
+from disponibilidad import calcular_disponibilidad
+from paginacion import leer_limite, codificar_cursor, aplicar_keyset
+from catalogo import obtener_doctor, obtener_centro
+from cache_http import condicional
+from idempotencia import idempotente
+from auditoria import registrar_evento
+from eventos import broker_eventos, publicar_cita, filtro_eventos, formatear_evento, leer_ultimo_id
+from archivo import fuente_citas, leer_incluir_historico, ocupados_en_archivo
+from serializacion import serializacion_rapida, columnas_cita, filas_a_dto, clave_cursor, respuesta_rapida
+from estadisticas import registrar_citas_nuevas, registrar_cancelacion, consultar_estadisticas, AGRUPACIONES
+from particiones import (particiones, sesion_doctor, asignar_ids, buscar_cita, en_todas,
+                         consultar_repartido, recorrer_repartido)
 
 
 """Endpoint agendar citas: POST /citas 
@@ -19,15 +35,12 @@ from models.cita import Cita
 """
 
 @citas_bp.route("/citas", methods=["POST"])
-@jwt_required() # Decorador de la librería flask_jwt_extended. Se coloca en el Endpoint para protegerlo pidiendo a los usuarios que quieran acceder un token JWT válido
+@role_required("admin", "paciente", mensaje="No tienes permisos para agendar citas") # Decorador definido en decoradores.py. Pide un token JWT válido y comprueba que el rol guardado en el token es admin o paciente, si no, devuelve error 403
+@idempotente  # Con cabecera Idempotency-Key, los reintentos reciben la respuesta guardada (idempotencia.py)
 def agendar_cita():
     
-    # Obtener la identidad del usuario desde el JWT (para verificar si es admin o paciente en la base de datos), si no existe o no tiene ese rol, devolver error 403
-    current_user_id = get_jwt_identity()
-    current_user = Usuario.query.get(current_user_id)
-
-    if not current_user or current_user.rol not in ["admin", "paciente"]:
-        return jsonify({"error": "No tienes permisos para agendar citas"}), 403
+    # Obtener los datos del usuario autenticado (id_usuario, rol, id_paciente...) desde el token JWT, sin consultar la base de datos
+    current_user = usuario_actual()
 
     # Leer el JSON del body de la petición HTTP que hace el cliente. request.get_json() convierte ese JSON en un diccionario de Python.
     data = request.get_json()
@@ -53,60 +66,247 @@ def agendar_cita():
     except ValueError:
         return jsonify({"error": "id_doctor e id_centro deben ser numericos"}), 400
 
-    # Validación obligatoria: paciente existe:
-        # - Si pide la cita el paciente: se deduce por id_usuario
-        # - Si pide la cita un admin: debe venir id_paciente en el JSON de la petición
-    if current_user.rol == "paciente":
-        paciente = Paciente.query.filter_by(id_usuario=current_user.id_usuario).first()
-        if not paciente:
-            return jsonify({"error": "No existe un Paciente asociado a este usuario"}), 400
-    else: # caso de admin
-        if id_paciente is None:
-            return jsonify({"error": "Un admin debe indicar id_paciente"}), 400
-        try:
-            id_paciente = int(id_paciente)
-        except ValueError:
-            return jsonify({"error": "id_paciente debe ser numérico"}), 400
-
-        paciente = Paciente.query.get(id_paciente)
-        if not paciente:
-            return jsonify({"error": "El paciente no existe"}), 404
+    # Convertir la fecha a datetime (en la base de datos se guarda como DateTime)
+    try:
+        fecha = parsear_fecha_hora(fecha)
+    except ValueError:
+        return jsonify({"error": "Formato de fecha invalido", "formato": "YYYY-MM-DD HH:MM"}), 400
 
-    # Validación obligatoria: paciente ACTIVO
-    if str(paciente.estado).upper() != "ACTIVO":
-        return jsonify({"error": "Paciente inactivo. No se puede agendar cita"}), 409
+    # Validación obligatoria: paciente existe y está ACTIVO (función validar_paciente, más abajo)
+        # - Si pide la cita el paciente: se deduce por el token
+        # - Si pide la cita un admin: debe venir id_paciente en el JSON de la petición
+    paciente, error = validar_paciente(current_user, id_paciente)
+    if error:
+        return error
 
-    # Validación obligatoria: doctor existe
-    doctor = Doctor.query.get(id_doctor)
+    # Validación obligatoria: doctor existe (se consulta la caché del catálogo, definida en catalogo.py)
+    doctor = obtener_doctor(id_doctor)
     if not doctor:
         return jsonify({"error": "El doctor no existe"}), 404
 
-    # Validación obligatoria: centro existe
-    centro = Centro.query.get(id_centro)
+    # Validación obligatoria: centro existe (también desde la caché del catálogo)
+    centro = obtener_centro(id_centro)
     if not centro:
         return jsonify({"error": "El centro medico no existe"}), 404
 
     # Validación obligatoria: evitar doble reserva para un doctor en misma fecha/hora
         # Si hay una cita del doctor en esa fecha/hora y NO está cancelada, hay conflicto.
-    conflicto = (Cita.query
+        # Esta consulta evita la mayoría de conflictos sin intentar el INSERT, pero la garantía real la da el índice único
+        # parcial de la tabla citas (dos peticiones simultáneas podrían pasar las dos esta comprobación)
+        # Con particiones de citas (particiones.py) todas las citas del doctor están en su partición (sesion_doctor)
+        # Las citas archivadas (archivo.py) también ocupan su hueco: si la fecha es pasada se busca además en citas_archivo
+    sesion = sesion_doctor(id_doctor)
+    conflicto = (sesion.query(Cita)
                  .filter(Cita.id_doctor == id_doctor)
                  .filter(Cita.fecha == fecha)
                  .filter(Cita.estado != "Cancelada")
-                 .first())
+                 .first()) or ocupados_en_archivo({(id_doctor, fecha)})
 
     if conflicto:
         return jsonify({"error": "Conflicto: el doctor ya tiene una cita en esa fecha/hora"}), 409
 
     # Crear cita. Se usa estado Activa por defecto
-    cita = Cita(fecha=fecha, motivo=motivo, estado="Activa", id_paciente=paciente.id_paciente, id_doctor=id_doctor, id_centro=id_centro, id_usuario_registra=current_user.id_usuario)
+    cita = Cita(fecha=fecha, motivo=motivo, estado="Activa", id_paciente=paciente.id_paciente, id_doctor=id_doctor, id_centro=id_centro, id_usuario_registra=current_user["id_usuario"])
 
-    # Guardar en base de datos
-    db.session.add(cita)
-    db.session.commit()
+    # Guardar en base de datos (con particiones, en la del doctor de la cita; sin particiones, sesion es db.session)
+    # Si otra petición ha reservado la misma fecha/hora entre la comprobación y el INSERT, el índice único lanza IntegrityError
+    # Los contadores de estadísticas (estadisticas.py) se actualizan en la misma transacción que la cita
+    sesion.add(cita)
+    try:
+        asignar_ids(sesion, [cita])
+        registrar_citas_nuevas([cita], sesion)
+        sesion.commit()
+    except IntegrityError:
+        sesion.rollback()
+        return jsonify({"error": "Conflicto: el doctor ya tiene una cita en esa fecha/hora"}), 409
+
+    # Avisar a las pantallas conectadas a GET /citas/stream y dejar constancia en la auditoría (auditoria.py, se escribe por lotes)
+    publicar_cita("cita_creada", cita)
+    registrar_evento("cita_creada", "cita", cita.id_cita, cita.to_dict())
 
     # Devolver mensaje en JSON para confirmar cita creada
     return jsonify({"msg": "Cita creada correctamente", "Cita": cita.to_dict()}), 201
 
+
+"""Endpoint agendar varias citas de un paciente a la vez: POST /citas/citas/batch
+        Pensado para tratamientos que necesitan muchas citas seguidas (por ejemplo revisiones de ortodoncia).
+        Roles permitidos: Admin y Paciente (los mismos que para agendar una cita)
+        Body: {"id_paciente": 1 (solo admin), "citas": [{"fecha": ..., "motivo": ..., "id_doctor": ..., "id_centro": ...}, ...]}
+        Se hacen las mismas validaciones que en agendar_cita, pero:
+            - El paciente se valida una sola vez, y cada doctor y centro distinto una sola vez (caché del catálogo)
+            - Los conflictos de todas las citas se buscan con una única consulta
+            - Todas las citas válidas se guardan en una única transacción
+        Devuelve el resultado de cada cita (en el mismo orden) con el mismo formato que agendar_cita y su código de estado:
+            - 201 si se han creado todas, 207 si solo algunas, y si no se ha creado ninguna el código común de los errores (o 400)
+"""
+
+@citas_bp.route("/citas/batch", methods=["POST"])
+@role_required("admin", "paciente", mensaje="No tienes permisos para agendar citas")
+@idempotente
+def agendar_citas_batch():
+
+    # Obtener los datos del usuario autenticado desde el token JWT
+    current_user = usuario_actual()
+
+    # Leer el JSON del body de la petición
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get("citas"), list) or not data["citas"]:
+        return jsonify({"error": "No se han enviado citas", "required": ["citas"], "conditional_required": ["id_paciente (si rol = admin)"]}), 400
+
+    # Limitar el número de citas por petición
+    maximo = current_app.config["CITAS_BATCH_MAX"]
+    if len(data["citas"]) > maximo:
+        return jsonify({"error": f"Demasiadas citas en una sola peticion (maximo {maximo})"}), 413
+
+    # Validación obligatoria: paciente existe y está ACTIVO (una sola vez para todas las citas)
+    paciente, error = validar_paciente(current_user, data.get("id_paciente"))
+    if error:
+        return error
+
+    # Validar cada cita por separado. resultados guarda la respuesta de cada una; pendientes las que pasan las validaciones
+    resultados = [None] * len(data["citas"])
+    pendientes = {}
+    claves_lote = set()
+    for indice, item in enumerate(data["citas"]):
+        cita_o_error = validar_item_batch(item)
+        if isinstance(cita_o_error, tuple):
+            resultados[indice] = cita_o_error
+            continue
+
+        # Dos citas del mismo lote con el mismo doctor y fecha/hora: la segunda es un conflicto
+        clave = (cita_o_error["id_doctor"], cita_o_error["fecha"])
+        if clave in claves_lote:
+            resultados[indice] = ({"error": "Conflicto: el doctor ya tiene una cita en esa fecha/hora"}, 409)
+            continue
+        claves_lote.add(clave)
+        pendientes[indice] = cita_o_error
+
+    # Validación obligatoria: evitar doble reserva. Se buscan todos los conflictos del lote con una única consulta
+    # (con particiones, una por partición), más las citas archivadas para las fechas pasadas
+    if pendientes:
+        consulta = (select(Cita.id_doctor, Cita.fecha)
+                    .where(tuple_(Cita.id_doctor, Cita.fecha).in_(claves_lote))
+                    .where(Cita.estado != "Cancelada"))
+        ocupados = {fila for filas in en_todas(lambda sesion: sesion.execute(consulta).all()) for fila in filas}
+        ocupados |= ocupados_en_archivo(claves_lote)
+        for indice in [i for i, p in pendientes.items() if (p["id_doctor"], p["fecha"]) in ocupados]:
+            resultados[indice] = ({"error": "Conflicto: el doctor ya tiene una cita en esa fecha/hora"}, 409)
+            del pendientes[indice]
+
+    # Crear todas las citas válidas en una única transacción (con particiones, una transacción por partición)
+    def nueva_cita(indice):
+        return Cita(**pendientes[indice], estado="Activa", id_paciente=paciente.id_paciente, id_usuario_registra=current_user["id_usuario"])
+
+    por_sesion = {}
+    for indice in pendientes:
+        por_sesion.setdefault(sesion_doctor(pendientes[indice]["id_doctor"]), []).append(indice)
+
+    citas = {}
+    for sesion, indices in por_sesion.items():
+        citas_sesion = {indice: nueva_cita(indice) for indice in indices}
+        sesion.add_all(citas_sesion.values())
+        try:
+            asignar_ids(sesion, list(citas_sesion.values()))
+            registrar_citas_nuevas(citas_sesion.values(), sesion)
+            sesion.commit()
+        except IntegrityError:
+            # Otra petición ha reservado alguna de las fechas entre la consulta y el INSERT.
+            # Se repite la transacción guardando cada cita en un SAVEPOINT para saber cuáles fallan
+            sesion.rollback()
+            for indice in list(citas_sesion):
+                citas_sesion[indice] = nueva_cita(indice)
+                try:
+                    with sesion.begin_nested():
+                        asignar_ids(sesion, [citas_sesion[indice]])
+                        sesion.add(citas_sesion[indice])
+                except IntegrityError:
+                    resultados[indice] = ({"error": "Conflicto: el doctor ya tiene una cita en esa fecha/hora"}, 409)
+                    del citas_sesion[indice]
+            registrar_citas_nuevas(citas_sesion.values(), sesion)
+            sesion.commit()
+        citas.update(citas_sesion)
+    citas = dict(sorted(citas.items()))
+
+    for indice, cita in citas.items():
+        resultados[indice] = ({"msg": "Cita creada correctamente", "Cita": cita.to_dict()}, 201)
+        publicar_cita("cita_creada", cita)
+        registrar_evento("cita_creada", "cita", cita.id_cita, cita.to_dict())
+
+    # Código de estado global de la respuesta
+    codigos = {codigo for _, codigo in resultados}
+    if codigos == {201}:
+        codigo = 201
+    elif 201 in codigos:
+        codigo = 207
+    else:
+        codigo = codigos.pop() if len(codigos) == 1 else 400
+
+    return jsonify({"creadas": len(citas), "recibidas": len(resultados),
+                    "resultados": [{"indice": indice, "status": codigo_item, **cuerpo} for indice, (cuerpo, codigo_item) in enumerate(resultados)]}), codigo
+
+
+"""Función para validar el paciente de una reserva (usada por agendar_cita y agendar_citas_batch)
+    - Si pide la cita el paciente: se usa el id de paciente guardado en su token
+    - Si pide la cita un admin: debe venir id_paciente en el JSON de la petición
+    Devuelve (paciente, None) si es válido o (None, respuesta de error)"""
+def validar_paciente(current_user, id_paciente):
+    if current_user["rol"] == "paciente":
+        # El id del paciente asociado al usuario viene en el token (se añade al hacer login)
+        paciente = db.session.get(Paciente, current_user["id_paciente"]) if current_user["id_paciente"] else None
+        if not paciente:
+            return None, (jsonify({"error": "No existe un Paciente asociado a este usuario"}), 400)
+    else: # caso de admin
+        if id_paciente is None:
+            return None, (jsonify({"error": "Un admin debe indicar id_paciente"}), 400)
+        try:
+            id_paciente = int(id_paciente)
+        except ValueError:
+            return None, (jsonify({"error": "id_paciente debe ser numérico"}), 400)
+
+        paciente = db.session.get(Paciente, id_paciente)
+        if not paciente:
+            return None, (jsonify({"error": "El paciente no existe"}), 404)
+
+    # Validación obligatoria: paciente ACTIVO
+    if str(paciente.estado).upper() != "ACTIVO":
+        return None, (jsonify({"error": "Paciente inactivo. No se puede agendar cita"}), 409)
+
+    return paciente, None
+
+
+"""Función para validar una cita de un lote (campos, fecha, doctor y centro)
+    Devuelve un diccionario con los datos de la cita o una tupla (error, código de estado)"""
+def validar_item_batch(item):
+    if not isinstance(item, dict):
+        return {"error": "Cada cita debe ser un objeto JSON"}, 400
+
+    fecha = item.get("fecha")
+    motivo = item.get("motivo")
+    id_doctor = item.get("id_doctor")
+    id_centro = item.get("id_centro")
+
+    if not fecha or not motivo or id_doctor is None or id_centro is None:
+        return {"error": "Faltan datos", "required": ["fecha", "motivo", "id_doctor", "id_centro"]}, 400
+
+    try:
+        id_doctor = int(id_doctor)
+        id_centro = int(id_centro)
+    except (TypeError, ValueError):
+        return {"error": "id_doctor e id_centro deben ser numericos"}, 400
+
+    try:
+        fecha = parsear_fecha_hora(fecha)
+    except (TypeError, ValueError):
+        return {"error": "Formato de fecha invalido", "formato": "YYYY-MM-DD HH:MM"}, 400
+
+    # Doctor y centro desde la caché del catálogo: cada id distinto se consulta como mucho una vez
+    if not obtener_doctor(id_doctor):
+        return {"error": "El doctor no existe"}, 404
+    if not obtener_centro(id_centro):
+        return {"error": "El centro medico no existe"}, 404
+
+    return {"fecha": fecha, "motivo": motivo, "id_doctor": id_doctor, "id_centro": id_centro}
+
 """Endpoint listar citas: GET /citas 
         Roles permitidos: Medico, Secretaria y Admin
         Validaciones obligatorias:
@@ -115,32 +315,46 @@ def agendar_cita():
             - Admin: puede filtrar por doctor, centro, fecha, estado o paciente.
             - Paciente: no puede obtener información de citas
             - Utilizar query params para aplicar los filtros.
+        Paginación y streaming (opcionales, para listados grandes):
+            - limit y cursor: paginación por cursor ordenada por fecha e id_cita. Devuelve {"citas": [...], "next_cursor": ...}
+            - formato=ndjson: devuelve las citas una por línea (NDJSON) leyéndolas de la base de datos por lotes
+            - Sin estos parámetros se devuelve la lista completa como antes
+        Histórico (archivo.py):
+            - incluir_historico=true: incluye las citas antiguas movidas a la tabla citas_archivo
+        Serialización rápida (serializacion.py): si el endpoint está en SERIALIZACION_RAPIDA se leen solo las columnas
+        y se serializa con DTO y orjson, con el mismo JSON como resultado
+        Caché HTTP (cache_http.py):
+            - La respuesta lleva un ETag. Si el cliente lo envía en If-None-Match y no ha cambiado ninguna cita, se responde 304
+            - Las respuestas grandes se comprimen con gzip o brotli si el cliente lo acepta
 """
 @citas_bp.route('/citas', methods=['GET'])
 @jwt_required()
+@condicional("citas")   # ETag con la versión de la tabla citas: si no ha cambiado nada se responde 304 sin consultar las citas
 def listar_citas():
     
-    # Obtener la identidad del usuario desde el JWT para comprobar si figura en la base de datos, si no, devolver error 404
-    id_usuario = get_jwt_identity()
-    usuario = Usuario.query.get(id_usuario)
+    # Obtener los datos del usuario autenticado desde el token JWT. Si el token es antiguo (sin rol) y el usuario ya no figura en la base de datos, devolver error 404
+    usuario = usuario_actual()
 
     if not usuario:
         return jsonify({"error": "Usuario no encontrado"}), 404
 
     # Obtener el rol del usuario (admin, medico, secretaria, paciente) para poder establecer los casos
-    rol = usuario.rol
+    rol = usuario["rol"]
+
+    # Con incluir_historico=true se consultan también las citas archivadas (citas_archivo). El resto de la consulta no cambia
+    modelo = fuente_citas(leer_incluir_historico(request.args.get("incluir_historico")))
 
     """Caso 1: Rol Medico"""
     
     if rol == "medico":
-        # Buscar el doctor asociado a este usuario filtrando en la base de datos. Si no existe, devolver error 404
-        doctor = Doctor.query.filter_by(id_usuario=usuario.id_usuario).first()
+        # El id del doctor asociado a este usuario viene en el token (se añade al hacer login). Si no existe, devolver error 404
+        id_doctor = usuario["id_doctor"]
 
-        if not doctor:
+        if not id_doctor:
             return jsonify({"error": "Doctor no encontrado"}), 404
 
         # Regla obligatoria: El doctor SOLO puede ver sus propias citas. Filtrar en la base de datos de Citas por el id del Doctor
-        citas = Cita.query.filter_by(id_doctor=doctor.id_doctor).all()
+        citas_query = db.session.query(modelo).filter_by(id_doctor=id_doctor)
 
 
         """Caso 2: Rol Secretaria"""
@@ -150,18 +364,23 @@ def listar_citas():
         fecha = request.args.get("fecha")
 
         # Si existe fecha, devolver las citas filtradas en la base de datos
+        # La fecha puede ser un día completo ("2025-09-10") o un día y hora ("2025-09-10 10:00"). Se filtra por rango para usar el índice de fecha
         if fecha:
-            citas = Cita.query.filter_by(fecha=fecha).all()
+            try:
+                desde, hasta = rango_fecha(fecha)
+            except ValueError:
+                return jsonify({"error": "Formato de fecha invalido", "formato": "YYYY-MM-DD o YYYY-MM-DD HH:MM"}), 400
+            citas_query = db.session.query(modelo).filter(modelo.fecha >= desde, modelo.fecha < hasta)
         # Si no existe fecha en la petición, devolver todas las citas existentes (se interpreta que la secretaria puede filtrar por fecha o no filtrar)
         else:
-            citas = Cita.query.all()
+            citas_query = db.session.query(modelo)
         
 
         """Caso 3: Rol Admin"""
         
     elif rol == "admin":
         # Se inicia la consulta en la base de datos de citas, pero no se listan aún las citas hasta filtrarla
-        citas_query = Cita.query
+        citas_query = db.session.query(modelo)
 
         # Regla obligatoria: El admin puede aplicar diferentes filtros (doctor, centro, paciente, fecha, estado)
         
@@ -199,17 +418,18 @@ def listar_citas():
                 return jsonify({"error": "id_paciente debe ser numérico"}), 400
             citas_query = citas_query.filter_by(id_paciente=id_paciente)
 
-        # Si viene fecha, filtrar citas_query por fecha
+        # Si viene fecha, filtrar citas_query por fecha (día completo o día y hora, igual que la secretaria)
         if fecha:
-            citas_query = citas_query.filter_by(fecha=fecha)
+            try:
+                desde, hasta = rango_fecha(fecha)
+            except ValueError:
+                return jsonify({"error": "Formato de fecha invalido", "formato": "YYYY-MM-DD o YYYY-MM-DD HH:MM"}), 400
+            citas_query = citas_query.filter(modelo.fecha >= desde, modelo.fecha < hasta)
 
         # Si viene estado, filtrar citas_query por estado
         if estado:
             citas_query = citas_query.filter_by(estado=estado)
 
-        # Ejecutar la consulta final con todos los filtros que se hayan aplicado
-        citas = citas_query.all()
-
 
         """Caso 4: Rol Paciente o ningún Rol"""
 
@@ -217,8 +437,100 @@ def listar_citas():
         # Devolver error porque no está permitido consultar citas
         return jsonify({"error": "No tiene permiso para ver citas"}), 403
 
-    # Convertir las citas a diccionario y devolver JSON
-    return jsonify([cita.to_dict() for cita in citas]), 200
+    # Leer los parámetros opcionales de paginación y formato
+    formato = request.args.get("formato")
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor")
+
+    # Serialización rápida (SERIALIZACION_RAPIDA, serializacion.py): solo las columnas necesarias, DTO y orjson en lugar de objetos del ORM
+    rapida = serializacion_rapida()
+
+    # Con particiones de citas (particiones.py) la consulta se ejecuta en todas las particiones y se mezclan los resultados
+    if particiones() is not None:
+        return listar_repartido(citas_query, modelo, formato, limit, cursor, rapida)
+
+    # Sin paginación ni streaming: ejecutar la consulta final con todos los filtros, convertir las citas a diccionario y devolver JSON
+    if formato != "ndjson" and limit is None and cursor is None:
+        if rapida:
+            return respuesta_rapida(filas_a_dto(citas_query.with_entities(*columnas_cita(modelo)).all()))
+        citas = citas_query.all()
+        return jsonify([cita.to_dict() for cita in citas]), 200
+
+    # Paginación por cursor: ordenar por (fecha, id_cita) y empezar después de la última cita de la página anterior
+    try:
+        citas_query = aplicar_keyset(citas_query, modelo.fecha, modelo.id_cita, cursor)
+        limite = leer_limite(limit) if (limit is not None or formato != "ndjson") else None
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    # Modo streaming NDJSON: se genera la respuesta línea a línea mientras se leen las citas por lotes (yield_per),
+    # así la memoria usada por la petición no depende del tamaño de la tabla
+    if formato == "ndjson":
+        if limite is not None:
+            citas_query = citas_query.limit(limite)
+
+        def generar():
+            for cita in citas_query.yield_per(500):
+                yield json.dumps(cita.to_dict(), ensure_ascii=False) + "\n"
+
+        return Response(stream_with_context(generar()), mimetype="application/x-ndjson"), 200
+
+    # Modo paginado: se pide una cita más del límite para saber si existe página siguiente
+    if rapida:
+        filas = citas_query.with_entities(*columnas_cita(modelo)).limit(limite + 1).all()
+        next_cursor = codificar_cursor(*clave_cursor(filas[limite - 1])) if len(filas) > limite else None
+        return respuesta_rapida({"citas": filas_a_dto(filas[:limite]), "next_cursor": next_cursor, "limit": limite})
+
+    citas = citas_query.limit(limite + 1).all()
+    next_cursor = None
+    if len(citas) > limite:
+        citas = citas[:limite]
+        next_cursor = codificar_cursor(citas[-1].fecha, citas[-1].id_cita)
+
+    return jsonify({"citas": [cita.to_dict() for cita in citas], "next_cursor": next_cursor, "limit": limite}), 200
+
+
+"""Función para responder a listar_citas con particiones: la misma consulta (ya filtrada según el rol) en todas las
+    particiones. Sin paginación se devuelven las citas de una partición detrás de otra (sin orden, como sin particiones);
+    con paginación o streaming cada partición devuelve sus citas ordenadas por (fecha, id_cita) y se mezclan en ese orden"""
+def listar_repartido(citas_query, modelo, formato, limit, cursor, rapida):
+    if formato != "ndjson" and limit is None and cursor is None:
+        consulta = citas_query.with_entities(*columnas_cita(modelo)) if rapida else citas_query
+        filas = [fila for filas_particion in en_todas(lambda sesion: consulta.with_session(sesion).all()) for fila in filas_particion]
+        if rapida:
+            return respuesta_rapida(filas_a_dto(filas))
+        return jsonify([cita.to_dict() for cita in filas]), 200
+
+    try:
+        citas_query = aplicar_keyset(citas_query, modelo.fecha, modelo.id_cita, cursor)
+        limite = leer_limite(limit) if (limit is not None or formato != "ndjson") else None
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    def clave_cita(cita):
+        return (cita.fecha, cita.id_cita)
+
+    # Streaming NDJSON: cada partición se lee por lotes y se mezclan sin cargar ninguna entera en memoria
+    if formato == "ndjson":
+        def generar():
+            for cita in recorrer_repartido(citas_query, clave_cita, limite=limite):
+                yield json.dumps(cita.to_dict(), ensure_ascii=False) + "\n"
+
+        return Response(stream_with_context(generar()), mimetype="application/x-ndjson"), 200
+
+    # Paginado: limite + 1 citas de cada partición bastan para la página y para saber si hay página siguiente
+    if rapida:
+        filas = consultar_repartido(citas_query.with_entities(*columnas_cita(modelo)), clave_cursor, limite + 1)
+        next_cursor = codificar_cursor(*clave_cursor(filas[limite - 1])) if len(filas) > limite else None
+        return respuesta_rapida({"citas": filas_a_dto(filas[:limite]), "next_cursor": next_cursor, "limit": limite})
+
+    citas = consultar_repartido(citas_query, clave_cita, limite + 1)
+    next_cursor = None
+    if len(citas) > limite:
+        citas = citas[:limite]
+        next_cursor = codificar_cursor(citas[-1].fecha, citas[-1].id_cita)
+
+    return jsonify({"citas": [cita.to_dict() for cita in citas], "next_cursor": next_cursor, "limit": limite}), 200
 
 
 """Endpoint cancelar citas: PUT /citas 
@@ -229,18 +541,11 @@ def listar_citas():
             - Se cambia el estado a "Cancelada" y se devuelve un mensaje JSON confirmando la acción.
 """
 @citas_bp.route('/citas/<int:id_cita>', methods=['PUT'])
-@jwt_required()
+@role_required("admin", "secretaria", mensaje="No tienes permisos para cancelar citas") # Comprueba con el rol del token que el usuario es admin o secretaria, si no, devuelve error 403
 def cancelar_cita(id_cita):
 
-    # Obtener la identidad del usuario desde el JWT (para verificar si es admin o secretaria en la base de datos), si no existe o no tiene ese rol devolver error 403
-    id_usuario = get_jwt_identity()
-    usuario = Usuario.query.get(id_usuario)
-
-    if not usuario or usuario.rol not in ["admin", "secretaria"]:
-        return jsonify({"error": "No tienes permisos para cancelar citas"}), 403
-
-    # Buscar la cita por ID de cita filtrando en la base de datos
-    cita = Cita.query.get(id_cita)
+    # Buscar la cita por ID de cita filtrando en la base de datos (con particiones, en la partición donde está)
+    cita, sesion = buscar_cita(id_cita)
 
     # Validaciones obligatorias: Existencia de cita
     if not cita:
@@ -252,11 +557,187 @@ def cancelar_cita(id_cita):
 
     # Cambiar estado a "Cancelada"
     cita.estado = "Cancelada"
+
+    # Actualizar los contadores de estadísticas en la misma transacción
+    registrar_cancelacion(cita, sesion)
     
     # Guardar la edición en la base de datos
-    db.session.commit()
+    sesion.commit()
+
+    # Avisar a las pantallas conectadas a GET /citas/stream y dejar constancia en la auditoría (quién la cancela y cuándo)
+    publicar_cita("cita_cancelada", cita)
+    registrar_evento("cita_cancelada", "cita", cita.id_cita, cita.to_dict())
 
     # Devolver mensaje en JSON para confirmar cita cancelada
     return jsonify({"msg": "Cita cancelada correctamente"}), 200
-    
 
+
+"""Endpoint cambios de citas en tiempo real: GET /citas/stream (Server-Sent Events)
+        Roles permitidos: Medico, Secretaria y Admin (los mismos que listar_citas y con los mismos filtros)
+            - Medico: solo recibe los eventos de sus propias citas
+            - Secretaria: puede filtrar por fecha
+            - Admin: puede filtrar por id_doctor, id_centro, id_paciente, fecha o estado
+        Mantiene la conexión abierta y envía un evento "cita_creada" o "cita_cancelada" (con la cita en JSON) cada vez que
+        se agenda o cancela una cita, en lugar de consultar el listado cada pocos segundos.
+        Cada SSE_HEARTBEAT_SEGUNDOS se envía un comentario para mantener viva la conexión.
+        Si el cliente se reconecta con la cabecera Last-Event-ID recibe los eventos que se ha perdido (eventos.py)
+"""
+
+@citas_bp.route('/stream', methods=['GET'])
+@jwt_required()
+def stream_citas():
+
+    usuario = usuario_actual()
+    if not usuario:
+        return jsonify({"error": "Usuario no encontrado"}), 404
+
+    # Construir el filtro de eventos con las mismas reglas que listar_citas
+    filtro, error = filtro_eventos(usuario, request.args)
+    if error:
+        return jsonify(error[0]), error[1]
+
+    # Id del último evento recibido por el cliente (reconexión)
+    ultimo_id = leer_ultimo_id(request.headers.get("Last-Event-ID"))
+
+    suscripcion = broker_eventos().suscribir(ultimo_id)
+    if suscripcion is None:
+        return jsonify({"error": "Demasiadas conexiones abiertas. Intentalo de nuevo mas tarde"}), 503, {"Retry-After": "5"}
+
+    latido = current_app.config["SSE_HEARTBEAT_SEGUNDOS"]
+
+    # El generador no usa el contexto de la petición ni la base de datos: la conexión abierta no ocupa ninguna conexión del pool
+    def generar():
+        try:
+            yield "retry: 3000\n\n"
+            while not suscripcion.desbordada:
+                evento = suscripcion.siguiente(timeout=latido)
+                if evento is None:
+                    yield ": ping\n\n"
+                elif filtro(evento["datos"]):
+                    yield formatear_evento(evento)
+        finally:
+            # Al desconectarse el cliente (o si su cola se ha llenado) se quita la suscripción
+            suscripcion.cerrar()
+
+    return Response(generar(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+"""Endpoint disponibilidad: GET /citas/disponibilidad?id_doctor=&id_centro=&desde=&hasta=&duracion=
+        Roles permitidos: Admin, Secretaria y Paciente
+        Devuelve los huecos libres de cada doctor: horario de trabajo menos las citas no canceladas.
+        Query params:
+            - desde (obligatorio): día ("2030-01-07") o día y hora ("2030-01-07 10:00")
+            - hasta (opcional): día (incluido completo) o día y hora. Por defecto, el final del día de desde
+            - id_doctor (opcional): si no se indica se calcula para todos los doctores
+            - id_centro (opcional): se valida que el centro exista. Los doctores no están asociados a un centro, así que no cambia los huecos
+            - duracion (opcional): minutos del hueco buscado. Por defecto DURACION_CITA_MINUTOS
+        El horario de trabajo se configura con HORARIO_INICIO, HORARIO_FIN y DIAS_LABORABLES
+"""
+@citas_bp.route('/disponibilidad', methods=['GET'])
+@role_required("admin", "secretaria", "paciente", mensaje="No tienes permisos para consultar la disponibilidad")
+def consultar_disponibilidad():
+
+    config = current_app.config
+    duracion_cita = timedelta(minutes=config["DURACION_CITA_MINUTOS"])
+
+    # Leer y validar el periodo de búsqueda
+    desde = request.args.get("desde")
+    hasta = request.args.get("hasta")
+    if not desde:
+        return jsonify({"error": "Faltan datos", "required": ["desde"], "optional": ["hasta", "id_doctor", "id_centro", "duracion"]}), 400
+    try:
+        desde = rango_fecha(desde)[0]
+        hasta = fin_periodo(hasta) if hasta else fin_periodo(desde.strftime("%Y-%m-%d"))
+    except ValueError:
+        return jsonify({"error": "Formato de fecha invalido", "formato": "YYYY-MM-DD o YYYY-MM-DD HH:MM"}), 400
+
+    max_dias = config["DISPONIBILIDAD_MAX_DIAS"]
+    if hasta <= desde or hasta - desde > timedelta(days=max_dias):
+        return jsonify({"error": f"Periodo invalido: hasta debe ser posterior a desde y el periodo no puede superar {max_dias} dias"}), 400
+
+    # Leer la duración del hueco buscado
+    try:
+        duracion = timedelta(minutes=int(request.args.get("duracion", duracion_cita.total_seconds() // 60)))
+    except ValueError:
+        return jsonify({"error": "duracion debe ser numerico (minutos)"}), 400
+    if duracion <= timedelta(0):
+        return jsonify({"error": "duracion debe ser mayor que 0"}), 400
+
+    # Validar el doctor (si se indica) o tomar todos los doctores
+    id_doctor = request.args.get("id_doctor")
+    if id_doctor:
+        try:
+            id_doctor = int(id_doctor)
+        except ValueError:
+            return jsonify({"error": "id_doctor debe ser numérico"}), 400
+        if not obtener_doctor(id_doctor):
+            return jsonify({"error": "El doctor no existe"}), 404
+        ids_doctores = [id_doctor]
+    else:
+        ids_doctores = [id_doctor for (id_doctor,) in db.session.query(Doctor.id_doctor).order_by(Doctor.id_doctor)]
+
+    # Validar el centro (si se indica)
+    id_centro = request.args.get("id_centro")
+    if id_centro:
+        try:
+            id_centro = int(id_centro)
+        except ValueError:
+            return jsonify({"error": "id_centro debe ser numérico"}), 400
+        if not obtener_centro(id_centro):
+            return jsonify({"error": "El centro medico no existe"}), 404
+
+    # Horario de trabajo configurado
+    horario = (datetime.strptime(config["HORARIO_INICIO"], "%H:%M").time(),
+               datetime.strptime(config["HORARIO_FIN"], "%H:%M").time())
+    dias_laborables = config["DIAS_LABORABLES"]
+
+    # Calcular los huecos libres con una única consulta a la base de datos
+    huecos = calcular_disponibilidad(ids_doctores, desde, hasta, duracion, duracion_cita, horario, dias_laborables)
+
+    return jsonify({
+        "desde": formatear_fecha(desde),
+        "hasta": formatear_fecha(hasta),
+        "duracion": int(duracion.total_seconds() // 60),
+        "id_centro": id_centro or None,
+        "doctores": [{"id_doctor": id_doctor, "huecos": [formatear_fecha(h) for h in libres]} for id_doctor, libres in huecos.items()],
+    }), 200
+
+
+"""Endpoint estadísticas de citas: GET /citas/estadisticas?desde=&hasta=&id_doctor=&id_centro=&agrupar=
+        Roles permitidos: Admin
+        Devuelve el número de citas activas y canceladas leyendo la tabla agregada estadisticas_citas (no cuenta las citas una a una)
+        Parámetros opcionales:
+            - desde, hasta: días "YYYY-MM-DD" (ambos incluidos)
+            - id_doctor, id_centro: filtrar por doctor o centro
+            - agrupar: columnas separadas por comas entre fecha, id_doctor e id_centro (por defecto las tres). Vacío = solo el total
+"""
+
+@citas_bp.route('/estadisticas', methods=['GET'])
+@role_required("admin", mensaje="No tienes permisos para consultar estadisticas")
+@condicional("citas")
+def estadisticas_citas():
+
+    # Columnas de agrupación
+    agrupar = [nombre.strip() for nombre in request.args.get("agrupar", ",".join(AGRUPACIONES)).split(",") if nombre.strip()]
+    invalidas = [nombre for nombre in agrupar if nombre not in AGRUPACIONES]
+    if invalidas:
+        return jsonify({"error": "agrupar invalido", "valores_validos": list(AGRUPACIONES)}), 400
+
+    # Filtros de fecha (días completos)
+    try:
+        desde = datetime.strptime(request.args["desde"], "%Y-%m-%d").date() if request.args.get("desde") else None
+        hasta = datetime.strptime(request.args["hasta"], "%Y-%m-%d").date() if request.args.get("hasta") else None
+    except ValueError:
+        return jsonify({"error": "Formato de fecha invalido", "formato": "YYYY-MM-DD"}), 400
+
+    # Filtros de doctor y centro
+    try:
+        id_doctor = int(request.args["id_doctor"]) if request.args.get("id_doctor") else None
+        id_centro = int(request.args["id_centro"]) if request.args.get("id_centro") else None
+    except ValueError:
+        return jsonify({"error": "id_doctor e id_centro deben ser numericos"}), 400
+
+    filas = consultar_estadisticas(agrupar, desde, hasta, id_doctor, id_centro)
+    total = {"activas": sum(f["activas"] for f in filas), "canceladas": sum(f["canceladas"] for f in filas)}
+    return jsonify({"estadisticas": filas, "total": total}), 200
@@ -0,0 +1,79 @@
+"""Comandos de línea de órdenes de la app (Flask CLI).
+
+Uso (desde la carpeta odontocare):
+    flask --app run reconstruir-estadisticas
+    flask --app run archivar-citas --dias 365
+    flask --app run ingestar ../data/datos.csv
+    flask --app run particionar-citas
+"""
+
+import click
+from flask import current_app
+
+from archivo import archivar_citas, limite_archivo
+from extensions import db
+from estadisticas import reconstruir_estadisticas
+from ingesta import ingestar, FormatoNoSoportadoError
+from particiones import crear_tablas_particiones, particiones, repartir_citas_existentes, sesiones_citas
+
+
+"""Función para registrar los comandos en la app (se llama desde create_app)"""
+def init_comandos(app):
+
+    # Volver a calcular la tabla agregada estadisticas_citas desde la tabla citas (un único GROUP BY)
+    @app.cli.command("reconstruir-estadisticas", help="Recalcula los contadores de citas activas y canceladas por dia, doctor y centro")
+    def comando_reconstruir_estadisticas():
+        # Crear la tabla agregada si la base de datos es anterior a ella (en la principal y en las particiones).
+        # bind_key=None: ver migrar_base_datos
+        db.create_all(bind_key=None)
+        crear_tablas_particiones()
+        filas = 0
+        for sesion in sesiones_citas():  # Con particiones de citas, cada una tiene su tabla agregada
+            filas += reconstruir_estadisticas(sesion)
+            sesion.commit()
+        click.echo(f"Estadisticas reconstruidas: {filas} filas")
+
+    # Mover las citas antiguas a la tabla citas_archivo por lotes (para ejecutar periódicamente, por ejemplo con cron)
+    @app.cli.command("archivar-citas", help="Mueve las citas anteriores al horizonte a la tabla citas_archivo por lotes")
+    @click.option("--dias", type=click.IntRange(min=0), default=None, help="Archivar citas de hace mas de estos dias (por defecto ARCHIVO_HORIZONTE_DIAS)")
+    @click.option("--lote", type=int, default=None, help="Citas por transaccion (por defecto ARCHIVO_LOTE)")
+    def comando_archivar_citas(dias, lote):
+        config = current_app.config
+        # Crear la tabla citas_archivo si la base de datos es anterior a ella (en la principal y en las particiones)
+        db.create_all(bind_key=None)
+        crear_tablas_particiones()
+        antes_de = limite_archivo(dias if dias is not None else config["ARCHIVO_HORIZONTE_DIAS"])
+        total = sum(archivar_citas(antes_de, lote or config["ARCHIVO_LOTE"], config["ARCHIVO_PAUSA_SEGUNDOS"], sesion)
+                    for sesion in sesiones_citas())
+        click.echo(f"Citas archivadas: {total} (anteriores a {antes_de:%Y-%m-%d %H:%M})")
+
+    # Cargar una exportación CSV o XLSX grande por trozos, con validación en paralelo y las filas rechazadas en un archivo aparte
+    @app.cli.command("ingestar", help="Carga centros, doctores y pacientes de un CSV o XLSX grande por trozos")
+    @click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--rechazos", default=None, help="Archivo JSON Lines con las filas rechazadas (por defecto <archivo>.rechazos.jsonl)")
+    @click.option("--trozo", type=int, default=None, help="Filas por trozo (por defecto INGESTA_TROZO)")
+    @click.option("--procesos", type=int, default=None, help="Procesos de validacion (por defecto INGESTA_PROCESOS)")
+    def comando_ingestar(archivo, rechazos, trozo, procesos):
+        db.create_all(bind_key=None)  # Crear las tablas si la base de datos está vacía
+        rechazos = rechazos or archivo + ".rechazos.jsonl"
+        try:
+            resumen = ingestar(archivo, rechazos, trozo, procesos)
+        except FormatoNoSoportadoError as error:
+            raise click.ClickException(str(error))
+        creados = ", ".join(f"{tipo}: {n}" for tipo, n in resumen["creados"].items())
+        click.echo(f"Filas leidas: {resumen['filas']}. Creados ({creados}). Rechazadas: {resumen['rechazados']} (ver {rechazos})")
+
+    # Mover las citas de la base de datos principal a sus particiones (después de activar CITAS_PARTICIONES) y
+    # recalcular las estadísticas de cada partición
+    @app.cli.command("particionar-citas", help="Mueve las citas de la base de datos principal a las particiones de CITAS_PARTICIONES")
+    @click.option("--lote", type=int, default=5000, help="Citas copiadas por transaccion")
+    def comando_particionar_citas(lote):
+        if particiones() is None:
+            raise click.ClickException("CITAS_PARTICIONES es 0: no hay particiones")
+        db.create_all(bind_key=None)
+        crear_tablas_particiones()
+        movidas = repartir_citas_existentes(lote)
+        for sesion in sesiones_citas():
+            reconstruir_estadisticas(sesion)
+            sesion.commit()
+        click.echo("Citas movidas: " + ", ".join(f"{tabla}: {n}" for tabla, n in movidas.items()))
@@ -0,0 +1,200 @@
+"""Configuración de la aplicación.
+
+Todos los valores se pueden cambiar con variables de entorno (o con un archivo .env, que se carga con python-dotenv).
+Así el mismo código sirve para desarrollo (SQLite en un archivo) y para producción (otra base de datos,
+claves secretas propias, tamaño del pool de conexiones...)."""
+
+import os
+from dotenv import load_dotenv
+
+# Cargar las variables del archivo .env si existe
+load_dotenv()
+
+
+"""Funciones para leer variables de entorno con su tipo"""
+def env_str(nombre, defecto=None):
+    return os.environ.get(nombre, defecto)
+
+def env_int(nombre, defecto):
+    return int(os.environ.get(nombre, defecto))
+
+def env_bool(nombre, defecto):
+    valor = os.environ.get(nombre)
+    if valor is None:
+        return defecto
+    return valor.strip().lower() in ["1", "true", "si", "yes", "on"]
+
+def env_lista_int(nombre, defecto):
+    valor = os.environ.get(nombre)
+    if not valor:
+        return defecto
+    return [int(x) for x in valor.split(",")]
+
+
+class Config:
+    """
+    Configuración por defecto. create_app() la carga con app.config.from_object(Config)
+    """
+
+    """Base de datos"""
+
+    # URL de la base de datos. Por defecto SQLite en el archivo odontocare.db (carpeta instance)
+    SQLALCHEMY_DATABASE_URI = env_str("DATABASE_URL", "sqlite:///odontocare.db")
+
+    # Pool de conexiones (se ignoran en SQLite en memoria)
+    DB_POOL_SIZE = env_int("DB_POOL_SIZE", 5)            # Conexiones abiertas de forma permanente
+    DB_MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW", 10)     # Conexiones extra permitidas en picos de carga
+    DB_POOL_TIMEOUT = env_int("DB_POOL_TIMEOUT", 30)     # Segundos de espera por una conexión libre
+    DB_POOL_RECYCLE = env_int("DB_POOL_RECYCLE", 1800)   # Segundos tras los que se renueva una conexión
+    DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)  # Comprobar que la conexión sigue viva antes de usarla
+
+    # Opciones de SQLite (se aplican con PRAGMA en cada conexión nueva)
+    # WAL permite que varios procesos lean mientras otro escribe; synchronous=NORMAL es seguro con WAL y hace menos fsync
+    SQLITE_JOURNAL_MODE = env_str("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = env_str("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)  # Espera ante un bloqueo de escritura antes de fallar
+
+    """Claves secretas (en producción se deben definir siempre por variable de entorno)"""
+
+    SECRET_KEY = env_str("SECRET_KEY", "secret")              # Clave secreta de Flask para firmar sesiones
+    JWT_SECRET_KEY = env_str("JWT_SECRET_KEY", "jwtsecretkey")  # Clave secreta para firmar tokens JWT
+
+    """Autenticación"""
+
+    # Comprobación de tokens revocados (usuario borrado o con otro rol) y su caché
+    JWT_REVOCATION_CHECK = env_bool("JWT_REVOCATION_CHECK", False)
+    JWT_REVOCATION_CACHE_TTL = env_int("JWT_REVOCATION_CACHE_TTL", 60)
+    JWT_REVOCATION_CACHE_SIZE = env_int("JWT_REVOCATION_CACHE_SIZE", 10000)
+
+    # Método de hash de contraseñas de Werkzeug (por ejemplo "scrypt" o "pbkdf2:sha256:600000"). None = el de Werkzeug por defecto
+    # Cada hash guardado incluye sus parámetros; si se cambia este valor, los hashes antiguos se recalculan al hacer login
+    PASSWORD_HASH_METHOD = env_str("PASSWORD_HASH_METHOD")
+
+    # Servicio de hash (hashing.py): procesos del pool (0 = en el propio hilo), tamaño de la cola,
+    # comprobaciones simultáneas por username y por IP, y segundos máximos de espera por un hash
+    HASH_WORKERS = env_int("HASH_WORKERS", 2)
+    HASH_COLA_MAX = env_int("HASH_COLA_MAX", 32)
+    HASH_MAX_POR_USUARIO = env_int("HASH_MAX_POR_USUARIO", 2)
+    HASH_MAX_POR_IP = env_int("HASH_MAX_POR_IP", 8)
+    HASH_TIMEOUT = env_int("HASH_TIMEOUT", 10)
+
+    """Caché del catálogo (centros y doctores, catalogo.py)"""
+
+    CATALOGO_CACHE_TTL = env_int("CATALOGO_CACHE_TTL", 300)        # Segundos que se guarda cada centro/doctor
+    CATALOGO_CACHE_SIZE = env_int("CATALOGO_CACHE_SIZE", 10000)    # Máximo de elementos en la caché local de cada proceso
+    # Ruta de un archivo SQLite para compartir la caché entre procesos (None = solo caché local)
+    CATALOGO_CACHE_COMPARTIDA = env_str("CATALOGO_CACHE_COMPARTIDA")
+    CATALOGO_CACHE_TTL_LOCAL = env_int("CATALOGO_CACHE_TTL_LOCAL", 5)  # TTL de la copia local cuando hay caché compartida
+
+    """Compresión de respuestas (cache_http.py)"""
+
+    HTTP_COMPRESION = env_bool("HTTP_COMPRESION", True)
+    HTTP_COMPRESION_MIN_BYTES = env_int("HTTP_COMPRESION_MIN_BYTES", 1024)  # Las respuestas más pequeñas no se comprimen
+    HTTP_COMPRESION_NIVEL = env_int("HTTP_COMPRESION_NIVEL", 6)             # Nivel de gzip (1-9)
+    HTTP_COMPRESION_NIVEL_BROTLI = env_int("HTTP_COMPRESION_NIVEL_BROTLI", 5)  # Calidad de brotli (0-11), solo si está instalado
+
+    """Instrumentación (instrumentacion.py): tiempos por endpoint, consultas SQL, GET /metrics y cabecera Server-Timing"""
+
+    INSTRUMENTACION = env_bool("INSTRUMENTACION", False)
+    INSTRUMENTACION_N1_UMBRAL = env_int("INSTRUMENTACION_N1_UMBRAL", 10)  # Repeticiones de una misma sentencia SQL para avisar de un posible N+1
+    INSTRUMENTACION_PERFIL_MUESTREO = float(env_str("INSTRUMENTACION_PERFIL_MUESTREO", "0"))  # Fracción de peticiones con cProfile (0 = nunca)
+    INSTRUMENTACION_PERFIL_DIR = env_str("INSTRUMENTACION_PERFIL_DIR")  # Carpeta para los .prof (None = se escriben en el log)
+
+    """Carga masiva"""
+
+    BULK_MAX_REGISTROS = env_int("BULK_MAX_REGISTROS", 100000)
+    INGESTA_TROZO = env_int("INGESTA_TROZO", 5000)      # Filas por trozo en la ingesta de archivos grandes (ingesta.py)
+    INGESTA_PROCESOS = env_int("INGESTA_PROCESOS", 0)   # Procesos que validan y calculan hashes (0 = uno por núcleo)
+
+    """Idempotencia de los POST (idempotencia.py, cabecera Idempotency-Key)"""
+
+    IDEMPOTENCIA_TTL = env_int("IDEMPOTENCIA_TTL", 86400)    # Segundos que se guarda la respuesta de cada clave
+    IDEMPOTENCIA_MAX = env_int("IDEMPOTENCIA_MAX", 10000)    # Máximo de claves en la caché local de cada proceso
+    IDEMPOTENCIA_EN_CURSO_SEGUNDOS = env_int("IDEMPOTENCIA_EN_CURSO_SEGUNDOS", 60)  # Después se considera abandonada una petición en curso
+    # Ruta de un archivo SQLite para compartir las claves entre procesos (None = solo caché local)
+    IDEMPOTENCIA_COMPARTIDA = env_str("IDEMPOTENCIA_COMPARTIDA")
+
+    """Citas"""
+
+    CITAS_BATCH_MAX = env_int("CITAS_BATCH_MAX", 100)  # Máximo de citas en una petición POST /citas/batch
+
+    """Particionado de las citas por doctor (particiones.py)"""
+
+    # Número de particiones (bases de datos de citas). 0 = todas las citas en la base de datos principal
+    CITAS_PARTICIONES = env_int("CITAS_PARTICIONES", 0)
+    # URL de cada partición con {particion} (None = archivos SQLite junto al principal: odontocare_citas_0.db, ...)
+    CITAS_PARTICIONES_URL = env_str("CITAS_PARTICIONES_URL")
+    # Doctores asignados a mano a una partición ("1:0,2:0,3:1"). Los demás van a la partición id_doctor % CITAS_PARTICIONES
+    CITAS_PARTICIONES_MAPA = env_str("CITAS_PARTICIONES_MAPA")
+
+    """Búsqueda de pacientes y doctores (busqueda.py)"""
+
+    BUSQUEDA_LIMITE = env_int("BUSQUEDA_LIMITE", 20)          # Resultados por defecto de /admin/pacientes/buscar y /admin/doctores/buscar
+    BUSQUEDA_LIMITE_MAX = env_int("BUSQUEDA_LIMITE_MAX", 100)  # Máximo de resultados que se pueden pedir con limit
+    BUSQUEDA_CANDIDATOS = env_int("BUSQUEDA_CANDIDATOS", 200)  # Coincidencias que se leen del índice (en orden de id, más los nombres exactos) y se ordenan por relevancia
+
+    """Serialización rápida de listados (serializacion.py)"""
+
+    # Endpoints que leen solo las columnas y serializan con DTO + orjson (separados por comas; vacío = ninguno)
+    # orjson está en requirements.txt; si falta se serializa con json, con el mismo resultado pero más lento
+    SERIALIZACION_RAPIDA = env_str("SERIALIZACION_RAPIDA", "citas_bp.listar_citas")
+
+    """Archivo de citas antiguas (archivo.py y flask --app run archivar-citas)"""
+
+    ARCHIVO_HORIZONTE_DIAS = env_int("ARCHIVO_HORIZONTE_DIAS", 365)  # Se archivan las citas de hace más de estos días
+    ARCHIVO_LOTE = env_int("ARCHIVO_LOTE", 1000)                     # Citas movidas en cada transacción
+    ARCHIVO_PAUSA_SEGUNDOS = float(env_str("ARCHIVO_PAUSA_SEGUNDOS", "0.05"))  # Espera entre lotes para no bloquear las reservas
+
+    """Modo ASGI (asgi.py)"""
+
+    ASGI_HILOS_WSGI = env_int("ASGI_HILOS_WSGI", 32)   # Hilos para los endpoints de Flask que no tienen variante asíncrona
+
+    """Eventos de citas en tiempo real (eventos.py y GET /citas/stream)"""
+
+    # "local" = bus en memoria del proceso; una ruta de archivo = eventos compartidos entre varios procesos (BrokerFichero)
+    EVENTOS_BROKER = env_str("EVENTOS_BROKER", "local")
+    # Tamaño del archivo de eventos compartido a partir del cual se rota. El historial para reenviar está en memoria:
+    # el archivo solo guarda lo que los otros procesos aún no han leído (lo leen cada 0,2 s). 0 = sin rotar
+    EVENTOS_BROKER_MAX_BYTES = env_int("EVENTOS_BROKER_MAX_BYTES", 1024 * 1024)
+    EVENTOS_HISTORIAL = env_int("EVENTOS_HISTORIAL", 1000)        # Eventos guardados para reenviar al reconectar (Last-Event-ID)
+    SSE_COLA_MAX = env_int("SSE_COLA_MAX", 100)                   # Eventos pendientes por conexión antes de cerrarla
+    SSE_MAX_SUSCRIPTORES = env_int("SSE_MAX_SUSCRIPTORES", 100)   # Conexiones abiertas a la vez por proceso
+    SSE_HEARTBEAT_SEGUNDOS = env_int("SSE_HEARTBEAT_SEGUNDOS", 15)
+
+    """Auditoría (auditoria.py)"""
+
+    # "tabla" = tabla auditoria de la base de datos; una ruta .jsonl = archivo JSON Lines con rotación; "" u "off" = desactivada
+    AUDITORIA_DESTINO = env_str("AUDITORIA_DESTINO", "tabla")
+    AUDITORIA_COLA_MAX = env_int("AUDITORIA_COLA_MAX", 10000)   # Eventos pendientes en memoria (0 = se escriben en la propia petición)
+    AUDITORIA_LOTE = env_int("AUDITORIA_LOTE", 500)             # Eventos escritos con un solo INSERT / fsync
+    AUDITORIA_INTERVALO_SEGUNDOS = float(env_str("AUDITORIA_INTERVALO_SEGUNDOS", "1"))  # Espera máxima para completar un lote
+    AUDITORIA_ESPERA_SEGUNDOS = float(env_str("AUDITORIA_ESPERA_SEGUNDOS", "0.5"))      # Espera de una petición con la cola llena
+    AUDITORIA_ROTAR_BYTES = env_int("AUDITORIA_ROTAR_BYTES", 50 * 1024 * 1024)  # Tamaño del archivo .jsonl antes de rotarlo
+    AUDITORIA_COPIAS = env_int("AUDITORIA_COPIAS", 10)                         # Archivos rotados que se conservan
+    AUDITORIA_CIERRE_SEGUNDOS = env_int("AUDITORIA_CIERRE_SEGUNDOS", 10)       # Espera máxima al parar para escribir la cola
+
+    """Disponibilidad y horario de trabajo"""
+
+    HORARIO_INICIO = env_str("HORARIO_INICIO", "09:00")
+    HORARIO_FIN = env_str("HORARIO_FIN", "18:00")
+    DIAS_LABORABLES = env_lista_int("DIAS_LABORABLES", [0, 1, 2, 3, 4])  # 0 = lunes
+    DURACION_CITA_MINUTOS = env_int("DURACION_CITA_MINUTOS", 30)
+    DISPONIBILIDAD_MAX_DIAS = env_int("DISPONIBILIDAD_MAX_DIAS", 31)
+
+
+"""Función para construir las opciones del motor de SQLAlchemy (SQLALCHEMY_ENGINE_OPTIONS) a partir de la configuración"""
+def opciones_motor(config):
+    uri = config["SQLALCHEMY_DATABASE_URI"]
+    opciones = {"pool_pre_ping": config["DB_POOL_PRE_PING"]}
+
+    # SQLite en memoria usa un pool especial sin tamaño configurable
+    if uri.startswith("sqlite") and (uri in ["sqlite://", "sqlite:///:memory:"] or "mode=memory" in uri):
+        return opciones
+
+    opciones.update({
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+    })
+    return opciones
@@ -0,0 +1,96 @@
+"""Decoradores y funciones de autenticación comunes a todos los Blueprints.
+
+Al hacer login se guardan en el token JWT (additional claims) el rol del usuario y los IDs del doctor
+o paciente asociados. Así los endpoints pueden comprobar los permisos leyendo el token, sin tener que
+buscar el usuario en la base de datos en cada petición."""
+
+from functools import wraps
+
+from flask import current_app, g, jsonify
+from flask_jwt_extended import verify_jwt_in_request, get_jwt, get_jwt_identity
+
+from cache import CacheTTL, NO_ENCONTRADO
+from extensions import db, jwt
+from instrumentacion import tramo
+from models.usuario import Usuario
+from models.doctor import Doctor
+from models.paciente import Paciente
+
+
+"""Función para construir los claims que se añaden al token al hacer login"""
+def claims_usuario(usuario):
+    claims = {"rol": usuario.rol, "id_doctor": None, "id_paciente": None}
+
+    # Solo se busca el perfil asociado al rol del usuario (una consulta como mucho)
+    if usuario.rol == "medico":
+        doctor = Doctor.query.filter_by(id_usuario=usuario.id_usuario).first()
+        claims["id_doctor"] = doctor.id_doctor if doctor else None
+    elif usuario.rol == "paciente":
+        paciente = Paciente.query.filter_by(id_usuario=usuario.id_usuario).first()
+        claims["id_paciente"] = paciente.id_paciente if paciente else None
+
+    return claims
+
+
+"""Función para obtener los datos del usuario autenticado (id_usuario, rol, id_doctor, id_paciente) desde el token.
+    Los tokens emitidos antes de añadir los claims no tienen rol: en ese caso se buscan en la base de datos (una vez por petición).
+    Devuelve None si el usuario del token ya no existe"""
+def usuario_actual():
+    if "usuario_actual" in g:
+        return g.usuario_actual
+
+    id_usuario = int(get_jwt_identity())
+    claims = get_jwt()
+
+    if "rol" in claims:
+        usuario = {"id_usuario": id_usuario, "rol": claims["rol"], "id_doctor": claims.get("id_doctor"), "id_paciente": claims.get("id_paciente")}
+    else:
+        registro = db.session.get(Usuario, id_usuario)
+        usuario = {"id_usuario": id_usuario, **claims_usuario(registro)} if registro else None
+
+    g.usuario_actual = usuario
+    return usuario
+
+
+"""Decorador para proteger un endpoint por rol
+    Uso: @role_required("admin", mensaje="No tienes permisos para crear centros medicos")
+    - Comprueba que la petición trae un token JWT válido (igual que @jwt_required())
+    - Comprueba que el rol del token es uno de los roles permitidos, si no, devuelve error 403 con el mensaje indicado"""
+def role_required(*roles, mensaje="No tienes permisos para realizar esta accion"):
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            # Verificar el token igual que @jwt_required(). Se mide como tramo "jwt" si la instrumentación está activa
+            with tramo("jwt"):
+                verify_jwt_in_request()
+                usuario = usuario_actual()
+            if not usuario or usuario["rol"] not in roles:
+                return jsonify({"error": mensaje}), 403
+            return current_app.ensure_sync(funcion)(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+"""Comprobación de revocación de tokens (opcional, se activa con JWT_REVOCATION_CHECK = True)
+    Un token se considera revocado si su usuario ya no existe o si ha cambiado de rol.
+    El resultado se guarda en una caché LRU con TTL (JWT_REVOCATION_CACHE_TTL segundos) para no consultar
+    la base de datos en cada petición"""
+@jwt.token_in_blocklist_loader
+def token_revocado(jwt_header, jwt_payload):
+    if not current_app.config["JWT_REVOCATION_CHECK"]:
+        return False
+
+    cache = current_app.extensions["cache_revocacion"]
+    clave = (jwt_payload["sub"], jwt_payload.get("rol"))
+    revocado = cache.get(clave)
+    if revocado is NO_ENCONTRADO:
+        usuario = db.session.get(Usuario, int(jwt_payload["sub"]))
+        revocado = usuario is None or ("rol" in jwt_payload and usuario.rol != jwt_payload["rol"])
+        cache.set(clave, revocado)
+    return revocado
+
+
+"""Función para preparar la comprobación de revocación en la app (se llama desde create_app)"""
+def init_revocacion(app):
+    app.extensions["cache_revocacion"] = CacheTTL(max_elementos=app.config["JWT_REVOCATION_CACHE_SIZE"],
+                                                  ttl=app.config["JWT_REVOCATION_CACHE_TTL"])
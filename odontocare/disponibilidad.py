@@ -0,0 +1,84 @@
+"""Motor de búsqueda de huecos libres (disponibilidad) de los doctores.
+
+Los huecos se calculan como el horario de trabajo menos las citas ya reservadas:
+    1. Se leen con UNA sola consulta por rango todas las citas no canceladas del periodo.
+    2. Con ellas se construye una agenda ordenada por doctor (intervalos [inicio, fin) ordenados por inicio
+       y el máximo acumulado de los finales), que permite saber con una búsqueda binaria si un hueco se solapa.
+    3. Se recorren los huecos candidatos del horario de trabajo y se devuelven los que quedan libres.
+Así no se lanza una consulta por cada hueco candidato."""
+
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from models.cita import Cita
+from particiones import en_todas
+
+
+class Agenda:
+    """
+    Agenda ordenada de un doctor:
+    - inicios: inicio de cada cita ordenado de menor a mayor
+    - max_fin: para cada posición, el mayor fin de las citas hasta esa posición
+    Un hueco [inicio, fin) está ocupado si alguna cita que empieza antes de 'fin' termina después de 'inicio'
+    """
+
+    def __init__(self, intervalos):
+        intervalos = sorted(intervalos)
+        self.inicios = [inicio for inicio, _ in intervalos]
+        self.max_fin = []
+        maximo = None
+        for _, fin in intervalos:
+            maximo = fin if maximo is None or fin > maximo else maximo
+            self.max_fin.append(maximo)
+
+    """Método para comprobar si el intervalo [inicio, fin) está libre. Coste O(log n)"""
+    def libre(self, inicio, fin):
+        posicion = bisect_left(self.inicios, fin)  # número de citas que empiezan antes de 'fin'
+        return posicion == 0 or self.max_fin[posicion - 1] <= inicio
+
+
+"""Función para generar los huecos candidatos del horario de trabajo entre desde y hasta.
+    horario: (hora_inicio, hora_fin) como objetos time; dias_laborables: números de día de la semana (0 = lunes)"""
+def huecos_candidatos(desde, hasta, duracion, horario, dias_laborables):
+    hora_inicio, hora_fin = horario
+    dia = desde.date()
+    while dia <= hasta.date():
+        if dia.weekday() in dias_laborables:
+            hueco = datetime.combine(dia, hora_inicio)
+            fin_jornada = datetime.combine(dia, hora_fin)
+            while hueco + duracion <= fin_jornada:
+                if hueco >= desde and hueco + duracion <= hasta:
+                    yield hueco
+                hueco += duracion
+        dia += timedelta(days=1)
+
+
+"""Función para construir la agenda de cada doctor con una única consulta por rango.
+    duracion_cita: tiempo que ocupa cada cita reservada (las citas solo guardan la hora de inicio)"""
+def construir_agendas(ids_doctores, desde, hasta, duracion_cita):
+    consulta = (select(Cita.id_doctor, Cita.fecha)
+                .where(Cita.fecha > desde - duracion_cita, Cita.fecha < hasta, Cita.estado != "Cancelada"))
+
+    # Con un solo doctor se filtra también por doctor para usar el índice (id_doctor, fecha, estado)
+    if len(ids_doctores) == 1:
+        consulta = consulta.where(Cita.id_doctor == ids_doctores[0])
+
+    # Con particiones de citas (particiones.py) se consultan todas: cada doctor está en una, pero se pueden pedir varios
+    intervalos = {id_doctor: [] for id_doctor in ids_doctores}
+    for filas in en_todas(lambda sesion: sesion.execute(consulta).all()):
+        for id_doctor, fecha in filas:
+            if id_doctor in intervalos:
+                intervalos[id_doctor].append((fecha, fecha + duracion_cita))
+
+    return {id_doctor: Agenda(citas) for id_doctor, citas in intervalos.items()}
+
+
+"""Función principal: devolver los huecos libres de cada doctor en el periodo [desde, hasta)"""
+def calcular_disponibilidad(ids_doctores, desde, hasta, duracion, duracion_cita, horario, dias_laborables):
+    agendas = construir_agendas(ids_doctores, desde, hasta, duracion_cita)
+    candidatos = list(huecos_candidatos(desde, hasta, duracion, horario, dias_laborables))
+
+    return {id_doctor: [hueco for hueco in candidatos if agenda.libre(hueco, hueco + duracion)]
+            for id_doctor, agenda in agendas.items()}
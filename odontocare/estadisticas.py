@@ -0,0 +1,120 @@
+"""Estadísticas de citas por día, doctor y centro (tabla agregada estadisticas_citas).
+
+En lugar de contar las citas cada vez que se piden las estadísticas, se mantienen contadores de citas activas
+y canceladas por (día, doctor, centro):
+    - agendar_cita / agendar_citas_batch suman 1 a "activas"
+    - cancelar_cita resta 1 a "activas" y suma 1 a "canceladas"
+Los contadores se actualizan con un UPSERT (INSERT ... ON CONFLICT DO UPDATE) en la MISMA transacción que la cita,
+así que si la cita no se guarda tampoco cambian los contadores. Leer las estadísticas cuesta lo mismo
+con mil citas que con millones (depende del número de filas de la tabla agregada, no del de citas).
+reconstruir_estadisticas() vuelve a calcular todos los contadores desde cero con un único GROUP BY.
+Archivar citas (archivo.py) no cambia los contadores: las estadísticas incluyen el histórico.
+Con particiones de citas (particiones.py) cada partición tiene sus contadores (se actualizan en la transacción de sus citas)
+y consultar_estadisticas suma los de todas."""
+
+from collections import Counter
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from archivo import fuente_citas
+from extensions import db
+from models.estadistica_cita import EstadisticaCita
+from particiones import en_todas
+
+# Columnas por las que se pueden agrupar las estadísticas
+AGRUPACIONES = {"fecha": EstadisticaCita.fecha, "id_doctor": EstadisticaCita.id_doctor, "id_centro": EstadisticaCita.id_centro}
+
+
+"""Función para sumar cambios a los contadores dentro de la transacción actual (sin commit).
+    cambios: diccionario (fecha, id_doctor, id_centro) -> (cambio en activas, cambio en canceladas)
+    sesion: la sesión de las citas (por defecto db.session; con particiones, la de su partición)"""
+def sumar_contadores(cambios, sesion=None):
+    sesion = sesion or db.session
+    filas = [{"fecha": fecha, "id_doctor": id_doctor, "id_centro": id_centro, "activas": activas, "canceladas": canceladas}
+             for (fecha, id_doctor, id_centro), (activas, canceladas) in cambios.items() if activas or canceladas]
+    if not filas:
+        return
+
+    dialecto = sesion.get_bind().dialect.name
+    if dialecto in ["sqlite", "postgresql"]:
+        insertar = (sqlite.insert if dialecto == "sqlite" else postgresql.insert)(EstadisticaCita)
+        sentencia = insertar.on_conflict_do_update(
+            index_elements=[EstadisticaCita.fecha, EstadisticaCita.id_doctor, EstadisticaCita.id_centro],
+            set_={"activas": EstadisticaCita.activas + insertar.excluded.activas,
+                  "canceladas": EstadisticaCita.canceladas + insertar.excluded.canceladas})
+        sesion.execute(sentencia, filas)
+        return
+
+    # Otras bases de datos: leer y actualizar cada contador con el ORM
+    for fila in filas:
+        clave = (fila["fecha"], fila["id_doctor"], fila["id_centro"])
+        contador = sesion.get(EstadisticaCita, clave, with_for_update=True)
+        if contador is None:
+            sesion.add(EstadisticaCita(**fila))
+        else:
+            contador.activas += fila["activas"]
+            contador.canceladas += fila["canceladas"]
+
+
+"""Función para registrar citas nuevas (activas) en los contadores"""
+def registrar_citas_nuevas(citas, sesion=None):
+    cambios = Counter((cita.fecha.date(), cita.id_doctor, cita.id_centro) for cita in citas)
+    sumar_contadores({clave: (n, 0) for clave, n in cambios.items()}, sesion)
+
+
+"""Función para registrar la cancelación de una cita en los contadores"""
+def registrar_cancelacion(cita, sesion=None):
+    sumar_contadores({(cita.fecha.date(), cita.id_doctor, cita.id_centro): (-1, 1)}, sesion)
+
+
+"""Función para volver a calcular todos los contadores desde las tablas citas y citas_archivo con un único GROUP BY (sin commit).
+    Las citas archivadas se siguen contando. Devuelve el número de filas de la tabla agregada.
+    Con particiones se llama una vez con la sesión de cada partición"""
+def reconstruir_estadisticas(sesion=None):
+    sesion = sesion or db.session
+    citas = fuente_citas(incluir_historico=True)
+    dia = func.date(citas.fecha)
+    agregado = (select(dia, citas.id_doctor, citas.id_centro,
+                       func.sum(case((citas.estado != "Cancelada", 1), else_=0)),
+                       func.sum(case((citas.estado == "Cancelada", 1), else_=0)))
+                .group_by(dia, citas.id_doctor, citas.id_centro))
+
+    sesion.execute(delete(EstadisticaCita))
+    sesion.execute(insert(EstadisticaCita).from_select(
+        ["fecha", "id_doctor", "id_centro", "activas", "canceladas"], agregado))
+    return sesion.scalar(select(func.count()).select_from(EstadisticaCita))
+
+
+"""Función para consultar las estadísticas con filtros y agrupadas por las columnas indicadas
+    (por defecto por día, doctor y centro). desde y hasta son objetos date (hasta incluido)"""
+def consultar_estadisticas(agrupar, desde=None, hasta=None, id_doctor=None, id_centro=None):
+    columnas = [AGRUPACIONES[nombre] for nombre in agrupar]
+    consulta = select(*columnas, func.sum(EstadisticaCita.activas), func.sum(EstadisticaCita.canceladas))
+
+    if desde is not None:
+        consulta = consulta.where(EstadisticaCita.fecha >= desde)
+    if hasta is not None:
+        consulta = consulta.where(EstadisticaCita.fecha <= hasta)
+    if id_doctor is not None:
+        consulta = consulta.where(EstadisticaCita.id_doctor == id_doctor)
+    if id_centro is not None:
+        consulta = consulta.where(EstadisticaCita.id_centro == id_centro)
+    if columnas:
+        consulta = consulta.group_by(*columnas).order_by(*columnas)
+
+    # Con particiones se consulta cada una y se suman los contadores de cada grupo
+    totales = {}
+    for resultado in en_todas(lambda sesion: sesion.execute(consulta).all()):
+        for fila in resultado:
+            grupo = tuple(fila[:len(agrupar)])
+            activas, canceladas = totales.get(grupo, (0, 0))
+            totales[grupo] = (activas + int(fila[-2] or 0), canceladas + int(fila[-1] or 0))
+
+    filas = []
+    for grupo in sorted(totales):
+        valores = dict(zip(agrupar, grupo))
+        if "fecha" in valores:
+            valores["fecha"] = valores["fecha"].isoformat()
+        filas.append({**valores, "activas": totales[grupo][0], "canceladas": totales[grupo][1]})
+    return filas
@@ -0,0 +1,382 @@
+"""Bus de eventos de citas (publicar / suscribirse) para GET /citas/stream (Server-Sent Events).
+
+agendar_cita, agendar_citas_batch y cancelar_cita publican un evento DESPUÉS del commit ("cita_creada" o "cita_cancelada"
+con los datos de la cita). Cada conexión SSE abierta es un suscriptor con su propia cola limitada.
+
+Brokers:
+    - BusLocal: en memoria, dentro del proceso. Suficiente con un solo proceso (varios hilos).
+    - BrokerFichero: sustituto local para varios workers de gunicorn. Cada evento se añade como una línea JSON a un archivo
+      compartido y cada proceso lo lee con un hilo y reparte los eventos a sus suscriptores (a través de su BusLocal).
+      El archivo se rota al pasar de EVENTOS_BROKER_MAX_BYTES, así no crece mientras el servidor siga en marcha.
+      Para producción se puede implementar la misma interfaz (Broker) con Redis pub/sub u otro sistema.
+Cada evento tiene un id creciente. Si el cliente se reconecta con la cabecera Last-Event-ID se le reenvían los eventos
+que se ha perdido (mientras sigan en el historial de EVENTOS_HISTORIAL eventos).
+En el modo ASGI (asgi.py) el stream lo atiende una corrutina: la suscripción se crea con el bucle de eventos y cada
+evento entregado la despierta, así que una conexión abierta no ocupa ningún hilo mientras espera."""
+
+import asyncio
+import atexit
+import json
+import os
+import queue
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+
+from flask import current_app
+
+from fechas import parsear_fecha_hora, rango_fecha
+
+try:
+    import fcntl
+except ImportError:  # Windows: BrokerFichero solo bloquea entre los hilos del proceso
+    fcntl = None
+
+
+class Broker(ABC):
+    """
+    Interfaz de un broker de eventos. Un broker nuevo (Redis pub/sub...) tiene que implementar publicar y suscribir:
+    si falta alguno, la clase no se puede instanciar (TypeError al crear la app, no en la primera petición)
+    """
+
+    """Método para publicar un evento a todos los suscriptores (de todos los procesos si el broker es compartido)"""
+    @abstractmethod
+    def publicar(self, tipo, datos):
+        ...
+
+    """Método para crear una suscripción (ver BusLocal.suscribir). Devuelve None si no se aceptan más suscriptores"""
+    @abstractmethod
+    def suscribir(self, desde_id=None, bucle=None):
+        ...
+
+    """Método para liberar los recursos del broker al parar el proceso (por defecto no hace nada)"""
+    def cerrar(self):
+        pass
+
+
+class Suscripcion:
+    """
+    Suscriptor del bus: cola limitada de eventos pendientes de enviar.
+    Si la cola se llena (cliente demasiado lento) se marca como desbordada y se cierra la conexión para que el cliente
+    se reconecte con Last-Event-ID.
+    Con 'bucle' (modo ASGI) cada entrega avisa a la corrutina que espera en siguiente_async desde el hilo que publica
+    """
+
+    def __init__(self, bus, tamano_cola, bucle=None):
+        self.bus = bus
+        self.cola = queue.Queue(maxsize=tamano_cola)
+        self.desbordada = False
+        self.bucle = bucle
+        self.aviso = asyncio.Event() if bucle is not None else None
+
+    """Método para entregar un evento al suscriptor sin bloquear al que publica"""
+    def entregar(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except queue.Full:
+            self.desbordada = True
+        if self.bucle is not None and not self.bucle.is_closed():
+            self.bucle.call_soon_threadsafe(self.aviso.set)
+
+    """Método para esperar el siguiente evento. Devuelve None si no llega ninguno en 'timeout' segundos"""
+    def siguiente(self, timeout):
+        try:
+            return self.cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    """Método para esperar el siguiente evento sin bloquear el bucle de eventos (solo si se ha creado con 'bucle').
+        Devuelve None si no llega ninguno en 'timeout' segundos"""
+    async def siguiente_async(self, timeout):
+        self.aviso.clear()
+        try:
+            return self.cola.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            await asyncio.wait_for(self.aviso.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        try:
+            return self.cola.get_nowait()
+        except queue.Empty:
+            return None
+
+    def cerrar(self):
+        self.bus.cancelar(self)
+
+
+class BusLocal(Broker):
+    """
+    Bus de eventos en memoria del proceso, con historial de los últimos eventos para reenviarlos al reconectar
+    """
+
+    def __init__(self, tamano_cola=100, tamano_historial=1000, max_suscriptores=100):
+        self.tamano_cola = tamano_cola
+        self.max_suscriptores = max_suscriptores
+        self._suscriptores = set()
+        self._historial = deque(maxlen=tamano_historial)
+        self._ultimo_id = 0
+        self._lock = threading.Lock()
+
+    """Método para publicar un evento con id propio del proceso"""
+    def publicar(self, tipo, datos):
+        with self._lock:
+            self._ultimo_id += 1
+            id_evento = self._ultimo_id
+        self.repartir({"id": id_evento, "tipo": tipo, "datos": datos})
+
+    """Método para entregar un evento (ya con id) a todos los suscriptores y guardarlo en el historial"""
+    def repartir(self, evento):
+        with self._lock:
+            self._ultimo_id = max(self._ultimo_id, evento["id"])
+            self._historial.append(evento)
+            suscriptores = list(self._suscriptores)
+        for suscripcion in suscriptores:
+            suscripcion.entregar(evento)
+
+    """Método para crear una suscripción. Con desde_id se encolan antes los eventos del historial posteriores a ese id.
+        bucle: bucle de eventos de la corrutina que va a leer la suscripción (modo ASGI).
+        Devuelve None si ya se ha alcanzado el máximo de suscriptores"""
+    def suscribir(self, desde_id=None, bucle=None):
+        suscripcion = Suscripcion(self, self.tamano_cola, bucle)
+        with self._lock:
+            if len(self._suscriptores) >= self.max_suscriptores:
+                return None
+            if desde_id is not None:
+                for evento in self._historial:
+                    if evento["id"] > desde_id:
+                        suscripcion.entregar(evento)
+            self._suscriptores.add(suscripcion)
+        return suscripcion
+
+    """Método para quitar una suscripción (cuando el cliente se desconecta)"""
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    """Método para saber cuántas conexiones hay abiertas"""
+    def suscriptores(self):
+        with self._lock:
+            return len(self._suscriptores)
+
+
+class BrokerFichero(Broker):
+    """
+    Broker compartido entre procesos sobre un archivo de eventos (una línea JSON por evento).
+    El id de cada evento es la base de ids del archivo más la posición donde termina su línea, así que es creciente y
+    común a todos los procesos. Un hilo de cada proceso lee las líneas nuevas cada 'intervalo' segundos y las reparte con
+    un BusLocal, que guarda el historial para reenviar eventos al reconectar (Last-Event-ID).
+    Como el historial está en memoria, el archivo solo tiene que guardar las líneas que los lectores de los otros
+    procesos aún no han leído: al pasar de 'max_bytes' se rota (archivo -> archivo.1) y se empieza uno nuevo cuya
+    primera línea guarda la base de ids ({"base": ...}), para que los ids sigan creciendo.
+    Las escrituras y la rotación se hacen con un bloqueo entre procesos (fcntl.flock sobre archivo.lock; sin fcntl,
+    en Windows, solo entre los hilos del proceso). Un lector que tarda más que dos rotaciones seguidas pierde los eventos
+    del archivo intermedio
+    """
+
+    def __init__(self, ruta, bus, intervalo=0.2, max_bytes=1024 * 1024):
+        self.ruta = ruta
+        self.bus = bus
+        self.intervalo = intervalo
+        self.max_bytes = max_bytes
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+
+        # Se empieza a leer desde el final actual del archivo (los eventos anteriores no se reenvían)
+        open(self.ruta, "ab").close()
+        self._archivo = open(self.ruta, "rb")
+        self._base = leer_base(self._archivo)
+        self._archivo.seek(0, os.SEEK_END)
+        self._hilo = threading.Thread(target=self._leer, daemon=True)
+        self._hilo.start()
+
+    """Método para tener el bloqueo de escritura del archivo de eventos mientras dura el bloque with"""
+    @contextmanager
+    def _bloqueo(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.ruta}.lock", "ab") as candado:
+                fcntl.flock(candado, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(candado, fcntl.LOCK_UN)
+
+    """Método para rotar el archivo si ha llegado a max_bytes (0 = sin rotar): el actual pasa a archivo.1 y el nuevo empieza con la base
+        de ids siguiente (base del actual + su tamaño). Se llama con el bloqueo de escritura"""
+    def _rotar(self):
+        tamano = os.path.getsize(self.ruta)
+        if not self.max_bytes or tamano < self.max_bytes:
+            return
+        with open(self.ruta, "rb") as actual:
+            base = leer_base(actual) + tamano
+        nuevo = f"{self.ruta}.nuevo"
+        with open(nuevo, "wb") as archivo:
+            archivo.write((json.dumps({"base": base}) + "\n").encode())
+        try:
+            os.replace(self.ruta, f"{self.ruta}.1")
+        except OSError:
+            # Windows no deja renombrar un archivo abierto por los lectores: se sigue con el actual
+            os.remove(nuevo)
+            return
+        os.replace(nuevo, self.ruta)
+
+    """Método para publicar: añadir una línea al archivo (rotándolo antes si está lleno)"""
+    def publicar(self, tipo, datos):
+        linea = (json.dumps({"tipo": tipo, "datos": datos}, separators=(",", ":")) + "\n").encode()
+        with self._bloqueo():
+            self._rotar()
+            descriptor = os.open(self.ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+            try:
+                os.write(descriptor, linea)
+            finally:
+                os.close(descriptor)
+
+    """Método para repartir las líneas completas del archivo que se está leyendo a partir de la posición actual"""
+    def _repartir_nuevas(self):
+        # Si el archivo se ha vaciado a mano, volver a leer desde el principio
+        if os.fstat(self._archivo.fileno()).st_size < self._archivo.tell():
+            self._archivo.seek(0)
+        for linea in iter(self._archivo.readline, b""):
+            if not linea.endswith(b"\n"):
+                self._archivo.seek(-len(linea), os.SEEK_CUR)  # línea a medio escribir: se lee en la siguiente vuelta
+                break
+            evento = json.loads(linea)
+            if "tipo" in evento:  # la primera línea de un archivo rotado es la base de ids
+                self.bus.repartir({"id": self._base + self._archivo.tell(), **evento})
+
+    """Método del hilo lector: repartir las líneas nuevas del archivo y, si se ha rotado, terminar de leer el anterior
+        (nadie escribe ya en él) y pasar al nuevo"""
+    def _leer(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                rotado = os.stat(self.ruta).st_ino != os.fstat(self._archivo.fileno()).st_ino
+                self._repartir_nuevas()
+                if rotado:
+                    self._archivo.close()
+                    self._archivo = open(self.ruta, "rb")
+                    self._base = leer_base(self._archivo)
+                    self._repartir_nuevas()
+            except (OSError, ValueError):
+                continue
+
+    def suscribir(self, desde_id=None, bucle=None):
+        return self.bus.suscribir(desde_id, bucle)
+
+    def cerrar(self):
+        self._parar.set()
+
+
+"""Función para leer la base de ids de un archivo de eventos (primera línea {"base": ...} de los archivos rotados;
+    0 si no la tiene). Deja el archivo al principio"""
+def leer_base(archivo):
+    archivo.seek(0)
+    primera = archivo.readline()
+    archivo.seek(0)
+    try:
+        return int(json.loads(primera).get("base", 0)) if primera.endswith(b"\n") else 0
+    except (ValueError, AttributeError):
+        return 0
+
+
+"""Brokers creados en el proceso (uno por app). Al parar el proceso se cierran todos con un solo atexit, registrado una
+    vez al importar el módulo: crear muchas apps (pruebas, benchmarks) no acumula manejadores"""
+brokers_abiertos = weakref.WeakSet()
+
+
+"""Función para cerrar todos los brokers del proceso (se ejecuta al salir)"""
+def cerrar_brokers():
+    for broker in list(brokers_abiertos):
+        broker.cerrar()
+
+
+atexit.register(cerrar_brokers)
+
+
+"""Función para obtener el broker de eventos de la app actual"""
+def broker_eventos():
+    return current_app.extensions["eventos"]
+
+
+"""Función para publicar un evento de una cita (se llama después del commit)"""
+def publicar_cita(tipo, cita):
+    broker_eventos().publicar(tipo, cita.to_dict())
+
+
+"""Función para convertir un evento al formato de Server-Sent Events (id, tipo y la cita en JSON)"""
+def formatear_evento(evento):
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento['datos'])}\n\n"
+
+
+"""Función para leer la cabecera Last-Event-ID (id del último evento recibido por el cliente al reconectarse).
+    Devuelve None si no viene o no es un número"""
+def leer_ultimo_id(valor):
+    try:
+        return int(valor) if valor else None
+    except ValueError:
+        return None
+
+
+"""Función para construir el filtro de eventos de GET /citas/stream según el rol (mismas reglas que listar_citas)
+    Se usa en la versión WSGI (citas_bp/routes.py) y en la asíncrona (citas_bp/asincrono.py).
+    args: query params de la petición.
+    Devuelve (función que recibe la cita en diccionario y devuelve True si se envía, None) o (None, (error, código))"""
+def filtro_eventos(usuario, args):
+    rol = usuario["rol"]
+    condiciones = []
+
+    if rol == "medico":
+        # El doctor SOLO recibe sus propias citas
+        if not usuario["id_doctor"]:
+            return None, ({"error": "Doctor no encontrado"}, 404)
+        condiciones.append(("id_doctor", usuario["id_doctor"]))
+        filtros_permitidos = []
+    elif rol == "secretaria":
+        filtros_permitidos = ["fecha"]
+    elif rol == "admin":
+        filtros_permitidos = ["id_doctor", "id_centro", "id_paciente", "fecha", "estado"]
+    else:
+        return None, ({"error": "No tiene permiso para ver citas"}, 403)
+
+    for campo in ["id_doctor", "id_centro", "id_paciente"]:
+        valor = args.get(campo)
+        if valor and campo in filtros_permitidos:
+            try:
+                condiciones.append((campo, int(valor)))
+            except ValueError:
+                return None, ({"error": f"{campo} debe ser numérico"}, 400)
+
+    estado = args.get("estado")
+    if estado and "estado" in filtros_permitidos:
+        condiciones.append(("estado", estado))
+
+    rango = None
+    fecha = args.get("fecha")
+    if fecha and "fecha" in filtros_permitidos:
+        try:
+            rango = rango_fecha(fecha)
+        except ValueError:
+            return None, ({"error": "Formato de fecha invalido", "formato": "YYYY-MM-DD o YYYY-MM-DD HH:MM"}, 400)
+
+    def filtro(cita):
+        if any(cita.get(campo) != valor for campo, valor in condiciones):
+            return False
+        return rango is None or rango[0] <= parsear_fecha_hora(cita["fecha"]) < rango[1]
+
+    return filtro, None
+
+
+"""Función para crear el broker de eventos de la app (se llama desde create_app)
+    EVENTOS_BROKER: "local" (en memoria) o la ruta de un archivo para compartir los eventos entre procesos"""
+def init_eventos(app):
+    bus = BusLocal(tamano_cola=app.config["SSE_COLA_MAX"], tamano_historial=app.config["EVENTOS_HISTORIAL"],
+                   max_suscriptores=app.config["SSE_MAX_SUSCRIPTORES"])
+    destino = app.config["EVENTOS_BROKER"]
+    broker = bus if destino in [None, "", "local"] else BrokerFichero(destino, bus, max_bytes=app.config["EVENTOS_BROKER_MAX_BYTES"])
+    app.extensions["eventos"] = broker
+    brokers_abiertos.add(broker)
@@ -1,6 +1,33 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from flask_jwt_extended import JWTManager
 
 # Inicializar las extensiones, pero sin asociarlas a la app
 db = SQLAlchemy()
-jwt = JWTManager()
\ No newline at end of file
+jwt = JWTManager()
+
+
+"""Función para configurar SQLite en cada conexión nueva mediante PRAGMA (se llama desde create_app)
+    - journal_mode=WAL: los lectores no bloquean al escritor ni al revés (varios workers de gunicorn pueden leer a la vez)
+    - synchronous=NORMAL: con WAL es seguro y evita un fsync en cada commit
+    - busy_timeout: si la base de datos está bloqueada por otra escritura, esperar en lugar de fallar"""
+def init_sqlite_pragmas(app):
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        return
+
+    with app.app_context():
+        escuchar_pragmas_sqlite(db.engine, app.config)
+
+
+"""Función para aplicar los PRAGMA de SQLite a cada conexión nueva de un motor (también el motor asíncrono de asincrono.py)"""
+def escuchar_pragmas_sqlite(motor, config):
+    def configurar_conexion(conexion_dbapi, registro_conexion):
+        cursor = conexion_dbapi.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        if config["SQLITE_JOURNAL_MODE"]:
+            cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+        if config["SQLITE_SYNCHRONOUS"]:
+            cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+        cursor.close()
+
+    event.listen(motor, "connect", configurar_conexion)
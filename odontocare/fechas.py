@@ -0,0 +1,58 @@
+"""Funciones auxiliares para trabajar con las fechas de las citas.
+
+La API recibe y devuelve las fechas como texto ("2025-09-10 10:00"), pero en la base de datos
+se guardan como DateTime para poder ordenarlas, compararlas y usar índices sobre ellas."""
+
+from datetime import datetime, timedelta
+
+# Formato con el que la API devuelve las fechas (el mismo que se usaba cuando la columna era texto)
+FORMATO_FECHA_HORA = "%Y-%m-%d %H:%M"
+
+# Formatos aceptados al recibir una fecha con hora. El primero es el formato habitual de la API
+FORMATOS_FECHA_HORA = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S")
+
+# Formato aceptado al recibir solo un día (por ejemplo en los filtros de listar citas)
+FORMATO_FECHA = "%Y-%m-%d"
+
+
+"""Función para convertir el texto de una fecha con hora en un objeto datetime.
+    Si el texto no tiene un formato válido se lanza ValueError (igual que int() con los IDs)"""
+def parsear_fecha_hora(texto):
+    texto = str(texto).strip()
+    for formato in FORMATOS_FECHA_HORA:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    raise ValueError(f"Formato de fecha invalido: {texto}")
+
+
+"""Función para convertir el filtro de fecha de un query param en un rango [desde, hasta).
+    - Si solo viene el día ("2025-09-10") el rango es el día completo.
+    - Si viene día y hora ("2025-09-10 10:00") el rango es ese minuto exacto.
+    Filtrar por rango (y no por igualdad de texto) permite usar los índices sobre la columna fecha"""
+def rango_fecha(texto):
+    texto = str(texto).strip()
+    try:
+        desde = datetime.strptime(texto, FORMATO_FECHA)
+        return desde, desde + timedelta(days=1)
+    except ValueError:
+        desde = parsear_fecha_hora(texto)
+        return desde, desde + timedelta(minutes=1)
+
+
+"""Función para convertir un datetime al texto que devuelve la API"""
+def formatear_fecha(fecha):
+    if fecha is None:
+        return None
+    return fecha.strftime(FORMATO_FECHA_HORA)
+
+
+"""Función para convertir el final de un periodo en un datetime.
+    - Si solo viene el día ("2025-09-10") el periodo incluye el día completo (termina a las 00:00 del día siguiente).
+    - Si viene día y hora ("2025-09-10 12:00") el periodo termina exactamente a esa hora"""
+def fin_periodo(texto):
+    try:
+        return datetime.strptime(str(texto).strip(), FORMATO_FECHA) + timedelta(days=1)
+    except ValueError:
+        return parsear_fecha_hora(texto)
@@ -0,0 +1,222 @@
+"""Servicio de hash de contraseñas fuera del hilo de la petición.
+
+Calcular o comprobar un hash (scrypt/pbkdf2) cuesta decenas de milisegundos de CPU. Si se hace dentro del
+hilo de la petición, una avalancha de logins deja sin CPU al resto de endpoints (por ejemplo agendar citas).
+Este servicio:
+    - Ejecuta los hashes en un pool de procesos acotado (HASH_WORKERS), con su propia cola limitada (HASH_COLA_MAX).
+    - Limita cuántas comprobaciones simultáneas puede tener cada username (HASH_MAX_POR_USUARIO) y cada IP (HASH_MAX_POR_IP).
+    - Si la cola o algún límite está lleno, no espera: lanza HashSaturadoError y el endpoint responde 429.
+    - Si el pool no devuelve el hash en HASH_TIMEOUT segundos lanza HashTimeoutError y el endpoint responde 503.
+    - Las cargas masivas (generar_lote) ocupan un solo hueco de la cola y de su IP, y reparten sus contraseñas entre
+      los mismos procesos por trozos, dejando pasar entre trozo y trozo los hashes de los logins.
+Con HASH_WORKERS = 0 el hash se calcula en el propio hilo, pero se siguen aplicando los límites."""
+
+import atexit
+import threading
+import weakref
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeout
+from functools import lru_cache
+
+from flask import current_app, jsonify
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+# Contraseñas de cada tarea que generar_lote manda al pool (cada tarea tarda TROZO_LOTE hashes)
+TROZO_LOTE = 8
+
+
+"""Función que calcula en un proceso del pool los hashes de un trozo de contraseñas (metodo None = el de Werkzeug)"""
+def generar_hashes(passwords, metodo=None):
+    if metodo:
+        return [generate_password_hash(password, metodo) for password in passwords]
+    return [generate_password_hash(password) for password in passwords]
+
+
+class HashSaturadoError(Exception):
+    """Error que se lanza cuando no se acepta un cálculo de hash más (cola llena o límite por usuario/IP)"""
+
+
+class HashTimeoutError(Exception):
+    """Error que se lanza cuando el pool de procesos no devuelve el hash en el tiempo máximo (HASH_TIMEOUT)"""
+
+
+class LimiteConcurrencia:
+    """
+    Contador de operaciones en curso por clave (username o IP) con un máximo por clave
+    """
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._en_curso = defaultdict(int)
+        self._lock = threading.Lock()
+
+    """Método para ocupar un hueco para la clave. Devuelve False si la clave ya está en el máximo"""
+    def adquirir(self, clave):
+        with self._lock:
+            if self._en_curso[clave] >= self.maximo:
+                return False
+            self._en_curso[clave] += 1
+            return True
+
+    """Método para liberar el hueco ocupado por la clave"""
+    def liberar(self, clave):
+        with self._lock:
+            self._en_curso[clave] -= 1
+            if self._en_curso[clave] <= 0:
+                del self._en_curso[clave]
+
+
+class ServicioHash:
+    """
+    Pool de procesos para calcular y comprobar hashes de contraseñas con límites de concurrencia
+    """
+
+    def __init__(self, workers, cola_max, max_por_usuario, max_por_ip, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._cola = threading.BoundedSemaphore(cola_max)
+        self._por_usuario = LimiteConcurrencia(max_por_usuario)
+        self._por_ip = LimiteConcurrencia(max_por_ip)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    """Método para crear el pool de procesos la primera vez que se usa"""
+    def _obtener_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    """Método para ocupar un hueco de la cola y de los límites por username e IP mientras dura el bloque with.
+        Lanza HashSaturadoError sin esperar si no hay hueco"""
+    @contextmanager
+    def _hueco(self, username=None, ip=None):
+        if not self._cola.acquire(blocking=False):
+            raise HashSaturadoError("Cola de hash llena")
+        usuario_ok = ip_ok = False
+        try:
+            usuario_ok = username is None or self._por_usuario.adquirir(username)
+            ip_ok = ip is None or self._por_ip.adquirir(ip)
+            if not usuario_ok or not ip_ok:
+                raise HashSaturadoError("Demasiados intentos simultaneos")
+            yield
+        finally:
+            if usuario_ok and username is not None:
+                self._por_usuario.liberar(username)
+            if ip_ok and ip is not None:
+                self._por_ip.liberar(ip)
+            self._cola.release()
+
+    """Método para esperar el resultado de una tarea del pool como mucho 'timeout' segundos"""
+    def _esperar(self, futuro):
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturoTimeout:
+            # Si todavía no ha empezado se quita de la cola del pool (si ya está en marcha termina, pero nadie lo espera)
+            futuro.cancel()
+            raise HashTimeoutError(f"El hash no ha terminado en {self.timeout} s")
+
+    """Método para ejecutar una función de hash respetando la cola y los límites por username e IP"""
+    def _ejecutar(self, funcion, *args, username=None, ip=None):
+        with self._hueco(username, ip):
+            if self.workers <= 0:
+                return funcion(*args)
+            return self._esperar(self._obtener_pool().submit(funcion, *args))
+
+    """Método para comprobar una contraseña contra su hash"""
+    def verificar(self, password_hash, password, username=None, ip=None):
+        return self._ejecutar(check_password_hash, password_hash, password, username=username, ip=ip)
+
+    """Método para generar el hash de una contraseña con el método indicado (None = el de Werkzeug por defecto)"""
+    def generar(self, password, metodo=None, ip=None):
+        if metodo:
+            return self._ejecutar(generate_password_hash, password, metodo, ip=ip)
+        return self._ejecutar(generate_password_hash, password, ip=ip)
+
+    """Método para generar los hashes de una lista de contraseñas (cargas masivas) con el método indicado.
+        Ocupa un solo hueco de la cola y de la IP durante toda la carga. Las contraseñas se mandan al pool en trozos de
+        TROZO_LOTE con como mucho un trozo en marcha por proceso: los logins que llegan mientras tanto entran en la cola
+        del pool por delante de los trozos siguientes, en lugar de esperar a que termine toda la carga.
+        Cada trozo tiene HASH_TIMEOUT segundos para terminar (si no, HashTimeoutError y no se guarda nada)"""
+    def generar_lote(self, passwords, metodo=None, ip=None):
+        with self._hueco(ip=ip):
+            if self.workers <= 0:
+                return generar_hashes(passwords, metodo)
+
+            pool = self._obtener_pool()
+            hashes = []
+            en_marcha = deque()
+            try:
+                for inicio in range(0, len(passwords), TROZO_LOTE):
+                    if len(en_marcha) >= self.workers:
+                        hashes += self._esperar(en_marcha.popleft())
+                    en_marcha.append(pool.submit(generar_hashes, passwords[inicio:inicio + TROZO_LOTE], metodo))
+                while en_marcha:
+                    hashes += self._esperar(en_marcha.popleft())
+            finally:
+                # Si un trozo ha fallado, los que aún no han empezado no se calculan
+                for futuro in en_marcha:
+                    futuro.cancel()
+            return hashes
+
+    """Método para cerrar el pool de procesos"""
+    def cerrar(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+"""Función para obtener los parámetros (método y factor de trabajo) que genera un método de hash,
+    por ejemplo "scrypt" -> "scrypt:32768:8:1". Se calcula una vez por método"""
+@lru_cache(maxsize=None)
+def parametros_metodo(metodo):
+    muestra = generate_password_hash("x", method=metodo) if metodo else generate_password_hash("x")
+    return muestra.split("$", 1)[0]
+
+
+"""Función para saber si un hash guardado se generó con parámetros distintos a los configurados actualmente
+    (en ese caso se vuelve a calcular al hacer login, cuando se conoce la contraseña en claro)"""
+def necesita_rehash(password_hash):
+    return password_hash.split("$", 1)[0] != parametros_metodo(current_app.config.get("PASSWORD_HASH_METHOD"))
+
+
+"""Servicios de hash creados en el proceso (uno por app). Al parar el proceso se cierran todos con un solo atexit,
+    registrado una vez al importar el módulo: crear muchas apps (pruebas, benchmarks) no acumula manejadores, y los
+    servicios de las apps que ya no existen desaparecen solos del conjunto"""
+servicios_abiertos = weakref.WeakSet()
+
+
+"""Función para cerrar los pools de todos los servicios de hash del proceso (se ejecuta al salir)"""
+def cerrar_servicios():
+    for servicio in list(servicios_abiertos):
+        servicio.cerrar()
+
+
+atexit.register(cerrar_servicios)
+
+
+"""Función para obtener el servicio de hash de la app actual"""
+def servicio_hash():
+    return current_app.extensions["servicio_hash"]
+
+
+"""Función para crear el servicio de hash de la app (se llama desde create_app)"""
+def init_hashing(app):
+    servicio = ServicioHash(workers=app.config["HASH_WORKERS"], cola_max=app.config["HASH_COLA_MAX"],
+                            max_por_usuario=app.config["HASH_MAX_POR_USUARIO"], max_por_ip=app.config["HASH_MAX_POR_IP"],
+                            timeout=app.config["HASH_TIMEOUT"])
+    app.extensions["servicio_hash"] = servicio
+    servicios_abiertos.add(servicio)
+
+    # Si el servicio está saturado se responde 429 (Too Many Requests) para que el cliente reintente más tarde
+    @app.errorhandler(HashSaturadoError)
+    def hash_saturado(error):
+        return jsonify({"error": "Demasiadas peticiones de autenticacion. Intentalo de nuevo en unos segundos"}), 429, {"Retry-After": "1"}
+
+    # Si el pool no responde a tiempo (procesos sobrecargados) se responde 503 (Service Unavailable) para que el cliente reintente
+    @app.errorhandler(HashTimeoutError)
+    def hash_timeout(error):
+        return jsonify({"error": "El servicio de autenticacion no responde. Intentalo de nuevo en unos segundos"}), 503, {"Retry-After": "5"}
@@ -0,0 +1,177 @@
+"""Claves de idempotencia (cabecera Idempotency-Key) para los POST de admin_bp y citas_bp.
+
+carga_inicial.py y los clientes de integración reintentan las peticiones cuando no reciben respuesta a tiempo.
+Sin idempotencia un POST /citas/citas reintentado puede crear la cita dos veces, y un POST /admin/doctores
+reintentado calcula otra vez el hash de la contraseña y hace los commits solo para devolver 409.
+
+Con @idempotente, si el cliente envía Idempotency-Key:
+    - La primera petición con esa clave se ejecuta normalmente y su respuesta (código, cuerpo y tipo) se guarda
+      IDEMPOTENCIA_TTL segundos junto con la huella de la petición (método, ruta y cuerpo)
+    - Las repeticiones con la misma clave y la misma huella reciben la respuesta guardada (con la cabecera
+      Idempotent-Replayed: true) sin validar, calcular hashes ni escribir en la base de datos
+    - La misma clave con otra petición distinta devuelve 422
+    - Si la primera petición todavía se está ejecutando, las repeticiones reciben 409 con Retry-After
+    - Las respuestas 429 y 5xx no se guardan (son errores transitorios: el reintento se vuelve a ejecutar)
+Las claves son de cada usuario (dos usuarios pueden usar la misma clave sin verse). Sin la cabecera no cambia nada.
+
+Las respuestas se guardan en una caché LRU local con caducidad (IDEMPOTENCIA_MAX elementos). Con varios procesos
+(varios workers de gunicorn) un reintento puede llegar a otro proceso: IDEMPOTENCIA_COMPARTIDA indica un archivo
+SQLite compartido (AlmacenSQLite de cache.py, o cualquier AlmacenCompartido, por ejemplo Redis)."""
+
+import hashlib
+import json
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+
+from cache import AlmacenSQLite, CacheTTL, NO_ENCONTRADO
+from decoradores import usuario_actual
+
+# Longitud máxima de la clave que envía el cliente
+MAX_LONGITUD_CLAVE = 255
+
+# Códigos de respuesta que no se guardan: el reintento se vuelve a ejecutar
+CODIGOS_TRANSITORIOS = {429}
+
+# Cabeceras de la respuesta original que se repiten al devolver la respuesta guardada
+CABECERAS_GUARDADAS = ["Location"]
+
+
+class RegistroIdempotencia:
+    """
+    Respuestas guardadas por clave de idempotencia, en una CacheTTL local o en un AlmacenCompartido entre procesos.
+    Cada valor es un diccionario con la huella de la petición y, cuando ha terminado, la respuesta
+    """
+
+    def __init__(self, ttl, max_elementos, compartido=None):
+        self.ttl = ttl
+        self.compartido = compartido
+        self.local = None if compartido is not None else CacheTTL(max_elementos=max_elementos, ttl=ttl)
+        self.repeticiones = 0
+
+    """Método para obtener el registro de una clave (NO_ENCONTRADO si no existe o ha caducado)"""
+    def obtener(self, clave):
+        return self.local.get(clave) if self.local is not None else self.compartido.get(clave)
+
+    """Método para reservar una clave mientras se ejecuta la primera petición. Devuelve False si ya existe"""
+    def reservar(self, clave, valor):
+        if self.local is not None:
+            return self.local.set_si_no_existe(clave, valor)
+        return self.compartido.set_si_no_existe(clave, valor, self.ttl)
+
+    """Método para guardar (o sustituir) el registro de una clave"""
+    def guardar(self, clave, valor):
+        if self.local is not None:
+            self.local.set(clave, valor)
+        else:
+            self.compartido.set(clave, valor, self.ttl)
+
+    """Método para liberar una clave reservada (la petición ha fallado y el reintento debe ejecutarse)"""
+    def liberar(self, clave):
+        if self.local is not None:
+            self.local.delete(clave)
+        else:
+            self.compartido.delete(clave)
+
+    """Método para devolver los contadores de uso"""
+    def estadisticas(self):
+        datos = self.local.estadisticas() if self.local is not None else {"ttl": self.ttl}
+        return {**datos, "compartida": self.compartido is not None, "repeticiones": self.repeticiones}
+
+
+"""Función para crear el registro de idempotencia de la app (se llama desde create_app)"""
+def init_idempotencia(app):
+    ruta_compartida = app.config["IDEMPOTENCIA_COMPARTIDA"]
+    compartido = AlmacenSQLite(ruta_compartida) if ruta_compartida else None
+    app.extensions["idempotencia"] = RegistroIdempotencia(app.config["IDEMPOTENCIA_TTL"], app.config["IDEMPOTENCIA_MAX"], compartido)
+
+
+"""Función para obtener el registro de idempotencia de la app actual"""
+def registro_idempotencia():
+    return current_app.extensions["idempotencia"]
+
+
+"""Función para calcular la huella de la petición actual: método, ruta con query string y cuerpo.
+    Un cuerpo JSON se normaliza (claves ordenadas, sin espacios): un cliente que lo vuelve a serializar al reintentar
+    puede cambiar el orden de las claves o los espacios sin que sea otra petición"""
+def huella_peticion():
+    resumen = hashlib.sha256()
+    resumen.update(f"{request.method} {request.full_path}\n".encode())
+    datos = request.get_json(silent=True)  # Se guarda en caché: el endpoint puede volver a leer el cuerpo
+    if datos is not None:
+        resumen.update(json.dumps(datos, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode())
+    else:
+        resumen.update(request.get_data())
+    return resumen.hexdigest()
+
+
+"""Función para construir la respuesta guardada para repetirla"""
+def respuesta_guardada(registro):
+    respuesta = current_app.response_class(registro["cuerpo"], status=registro["codigo"], mimetype=registro["tipo"])
+    for nombre, valor in registro["cabeceras"].items():
+        respuesta.headers[nombre] = valor
+    respuesta.headers["Idempotent-Replayed"] = "true"
+    return respuesta
+
+
+"""Función para responder a una petición cuya clave ya está registrada (respuesta guardada, 422 o 409)"""
+def responder_registrada(registro, huella):
+    if registro["huella"] != huella:
+        return jsonify({"error": "La Idempotency-Key ya se ha usado con otra peticion distinta"}), 422
+    if "codigo" not in registro:
+        respuesta = make_response(jsonify({"error": "Hay una peticion con esta Idempotency-Key en curso"}), 409)
+        respuesta.headers["Retry-After"] = "1"
+        return respuesta
+    registro_idempotencia().repeticiones += 1
+    return respuesta_guardada(registro)
+
+
+"""Decorador para que un endpoint POST acepte la cabecera Idempotency-Key.
+    Se debe poner DESPUÉS de @role_required() (las claves son de cada usuario)"""
+def idempotente(funcion):
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        clave_cliente = request.headers.get("Idempotency-Key")
+        if clave_cliente is None:
+            return funcion(*args, **kwargs)
+
+        clave_cliente = clave_cliente.strip()
+        if not clave_cliente or len(clave_cliente) > MAX_LONGITUD_CLAVE:
+            return jsonify({"error": f"Idempotency-Key debe tener entre 1 y {MAX_LONGITUD_CLAVE} caracteres"}), 400
+
+        registro = registro_idempotencia()
+        usuario = usuario_actual() or {}
+        clave = f"idempotencia:{usuario.get('id_usuario')}:{clave_cliente}"
+        huella = huella_peticion()
+
+        # Reservar la clave. Si ya existe: devolver la respuesta guardada, o 409 si sigue en curso.
+        # Una reserva más antigua que IDEMPOTENCIA_EN_CURSO_SEGUNDOS es de una petición que no terminó (proceso caído): se sustituye
+        en_curso = {"huella": huella, "inicio": time.time()}
+        if not registro.reservar(clave, en_curso):
+            existente = registro.obtener(clave)
+            abandonada = (existente is not NO_ENCONTRADO and "codigo" not in existente
+                          and time.time() - existente["inicio"] > current_app.config["IDEMPOTENCIA_EN_CURSO_SEGUNDOS"])
+            if existente is not NO_ENCONTRADO and not abandonada:
+                return responder_registrada(existente, huella)
+            registro.guardar(clave, en_curso)
+
+        try:
+            respuesta = make_response(funcion(*args, **kwargs))
+        except Exception:
+            registro.liberar(clave)
+            raise
+
+        # Guardar la respuesta para las repeticiones (salvo errores transitorios, que se vuelven a ejecutar)
+        if respuesta.status_code >= 500 or respuesta.status_code in CODIGOS_TRANSITORIOS:
+            registro.liberar(clave)
+        else:
+            registro.guardar(clave, {
+                "huella": huella,
+                "codigo": respuesta.status_code,
+                "cuerpo": respuesta.get_data(as_text=True),
+                "tipo": respuesta.mimetype,
+                "cabeceras": {nombre: respuesta.headers[nombre] for nombre in CABECERAS_GUARDADAS if nombre in respuesta.headers},
+            })
+        return respuesta
+    return envoltura
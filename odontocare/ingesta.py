@@ -0,0 +1,248 @@
+"""Ingesta de exportaciones grandes (CSV o XLSX con las columnas de data/datos.csv) con memoria acotada.
+
+carga_inicial.py --directo lee el archivo entero con pandas y lo carga en una sola transacción: con exportaciones
+de millones de filas la memoria crece con el archivo. La ingesta lo procesa por trozos de INGESTA_TROZO filas:
+    - Lee el CSV con pandas (chunksize) o el XLSX con openpyxl en modo read_only, sin cargar el archivo entero
+    - Valida cada trozo con los esquemas de la carga masiva y calcula los hashes de las contraseñas en un pool de
+      procesos (INGESTA_PROCESOS). Como mucho hay dos trozos por proceso en vuelo
+    - Descarta en memoria los usernames y nombres de centro repetidos en el archivo o que ya existen en la base de datos
+      (se leen una vez al empezar), así al insertar no hace falta consultar la base de datos fila a fila
+    - Inserta cada trozo con INSERT masivos y hace commit por trozo
+    - Escribe las filas rechazadas en un archivo JSON Lines: número de fila, tipo, error y datos (sin la contraseña)
+Lo único que crece con el archivo son los conjuntos de usernames y nombres de centro.
+Si se interrumpe se puede volver a lanzar con el mismo archivo: las filas ya cargadas se rechazan como duplicadas.
+
+Uso (desde la carpeta odontocare):
+    flask --app run ingestar ../data/datos.csv
+    flask --app run ingestar exportacion.xlsx --trozo 10000 --procesos 4 --rechazos rechazos.jsonl
+"""
+
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+import pandas as pd
+from flask import current_app
+from sqlalchemy import select
+from werkzeug.security import generate_password_hash
+
+from catalogo import invalidar_catalogo
+from extensions import db
+from models.usuario import Usuario
+from models.centro import Centro
+from servicios.carga_masiva import ESQUEMA_CENTRO, ESQUEMA_DOCTOR, ESQUEMA_PACIENTE, validar_registros, insertar_centros
+from servicios.usuarios import insertar_usuarios_con_perfil
+
+# openpyxl está en requirements.txt, pero solo hace falta para leer archivos XLSX: sin él se pueden seguir cargando CSV
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+class FormatoNoSoportadoError(Exception):
+    """
+    El archivo no se puede leer: extensión distinta de .csv/.xlsx, o un XLSX sin openpyxl instalado.
+    Se lanza antes de empezar la ingesta (el comando lo muestra como un error normal, sin traza)
+    """
+
+"""Esquema de las filas de tipo admin (solo usuario, sin perfil)"""
+
+ESQUEMA_ADMIN = {
+    "type": "object",
+    "required": ["username", "password"],
+    "properties": {
+        "username": {"type": "string", "minLength": 1, "maxLength": 80},
+        "password": {"type": "string", "minLength": 1},
+    },
+}
+
+# Esquema y columnas del archivo que se usan para cada tipo de fila
+TIPOS = {
+    "centro": (ESQUEMA_CENTRO, ["nombre", "direccion"]),
+    "doctor": (ESQUEMA_DOCTOR, ["nombre", "especialidad", "username", "password"]),
+    "paciente": (ESQUEMA_PACIENTE, ["nombre", "telefono", "username", "password", "estado"]),
+    "admin": (ESQUEMA_ADMIN, ["username", "password"]),
+}
+
+# Trozos en vuelo por proceso: uno validándose y otro esperando, así el pool no se queda parado ni se acumulan trozos
+TROZOS_POR_PROCESO = 2
+
+
+"""Función para leer un CSV (separado por ;) por trozos de 'tamano' filas.
+    Devuelve listas de (numero_fila, datos). La fila 1 es la cabecera; las celdas vacías son None"""
+def leer_csv(ruta, tamano):
+    with pd.read_csv(ruta, sep=";", dtype=str, chunksize=tamano) as lector:
+        for df in lector:
+            df = df.astype(object).where(df.notna(), None)
+            yield [(int(indice) + 2, datos) for indice, datos in zip(df.index, df.to_dict("records"))]
+
+
+"""Función para convertir una celda de XLSX en texto (como el CSV leído con dtype=str). Los números enteros se escriben sin decimales"""
+def celda_a_texto(valor):
+    if valor is None or valor == "":
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+"""Función para leer la primera hoja de un XLSX por trozos de 'tamano' filas, en modo read_only (por filas, sin cargar el libro).
+    Devuelve listas de (numero_fila, datos) igual que leer_csv. Las filas completamente vacías se saltan"""
+def leer_xlsx(ruta, tamano):
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        cabecera = [celda_a_texto(nombre) for nombre in next(filas, ())]
+        trozo = []
+        for numero, valores in enumerate(filas, start=2):
+            datos = {columna: celda_a_texto(valor) for columna, valor in zip(cabecera, valores) if columna}
+            if not any(datos.values()):
+                continue
+            trozo.append((numero, datos))
+            if len(trozo) >= tamano:
+                yield trozo
+                trozo = []
+        if trozo:
+            yield trozo
+    finally:
+        libro.close()
+
+
+"""Función para leer un archivo CSV o XLSX por trozos según su extensión.
+    El formato se comprueba al llamarla (no al empezar a leer): lanza FormatoNoSoportadoError antes de procesar nada"""
+def leer_trozos(ruta, tamano):
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == ".csv":
+        return leer_csv(ruta, tamano)
+    if extension in [".xlsx", ".xlsm"]:
+        if openpyxl is None:
+            raise FormatoNoSoportadoError("Para leer archivos XLSX hace falta openpyxl (pip install openpyxl), o exporta el archivo a CSV")
+        return leer_xlsx(ruta, tamano)
+    raise FormatoNoSoportadoError(f"Formato de archivo no soportado: {extension or ruta} (se admite .csv y .xlsx)")
+
+
+"""Función para construir una fila rechazada. Los datos se guardan sin la contraseña"""
+def rechazo(fila, tipo, error, datos):
+    return {"fila": fila, "tipo": tipo, "error": error, "datos": {campo: valor for campo, valor in datos.items() if campo != "password"}}
+
+
+"""Función que valida un trozo y calcula los hashes de las contraseñas. Se ejecuta en los procesos del pool (no usa la base de datos).
+    Devuelve {"validos": {tipo: [(fila, registro, hash)]}, "rechazos": [...]}. Los registros válidos ya no llevan la contraseña"""
+def preparar_trozo(trozo, metodo_hash=None):
+    hashear = partial(generate_password_hash, method=metodo_hash) if metodo_hash else generate_password_hash
+    por_tipo = {tipo: [] for tipo in TIPOS}
+    rechazos = []
+
+    for fila, datos in trozo:
+        tipo = (datos.get("tipo") or "").strip().lower()
+        if tipo not in TIPOS:
+            rechazos.append(rechazo(fila, datos.get("tipo"), f"Tipo de registro desconocido: {datos.get('tipo')}", datos))
+        else:
+            por_tipo[tipo].append((fila, {campo: datos.get(campo) for campo in TIPOS[tipo][1]}))
+
+    validos = {}
+    for tipo, filas in por_tipo.items():
+        correctos, errores = validar_registros([registro for _, registro in filas], TIPOS[tipo][0])
+        rechazos += [rechazo(filas[e["indice"]][0], tipo, e["error"], filas[e["indice"]][1]) for e in errores]
+
+        validos[tipo] = []
+        for indice, registro in correctos:
+            password = registro.pop("password", None)
+            validos[tipo].append((filas[indice][0], registro, hashear(password) if password is not None else None))
+
+    return {"validos": validos, "rechazos": rechazos}
+
+
+"""Función para validar los trozos en un pool de procesos. Devuelve los trozos preparados en el mismo orden en que se leen,
+    con como mucho TROZOS_POR_PROCESO trozos por proceso en vuelo (la lectura se detiene hasta que se consume un resultado)"""
+def preparar_trozos(trozos, procesos, metodo_hash=None):
+    # Con un solo proceso el pool solo añadiría el coste de copiar los trozos entre procesos
+    if procesos < 2:
+        for trozo in trozos:
+            yield preparar_trozo(trozo, metodo_hash)
+        return
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        en_vuelo = deque()
+        for trozo in trozos:
+            en_vuelo.append(pool.submit(preparar_trozo, trozo, metodo_hash))
+            if len(en_vuelo) >= procesos * TROZOS_POR_PROCESO:
+                yield en_vuelo.popleft().result()
+        while en_vuelo:
+            yield en_vuelo.popleft().result()
+
+
+"""Función para quedarse con los registros cuyo valor en 'campo' no se ha visto antes (en el archivo o en la base de datos).
+    Añade los valores nuevos a 'vistos' y los repetidos a 'rechazos'"""
+def descartar_vistos(validos, tipo, campo, vistos, mensaje, rechazos):
+    unicos = []
+    for fila, registro, hash_password in validos:
+        if registro[campo] in vistos:
+            rechazos.append(rechazo(fila, tipo, mensaje, registro))
+        else:
+            vistos.add(registro[campo])
+            unicos.append((fila, registro, hash_password))
+    return unicos
+
+
+"""Función para insertar los registros válidos y sin duplicados de un trozo. Devuelve el número de registros creados por tipo"""
+def insertar_trozo(validos):
+    creados = {}
+    if validos["centro"]:
+        creados["centro"] = len(insertar_centros([registro for _, registro, _ in validos["centro"]]))
+
+    for tipo, rol in [("doctor", "medico"), ("paciente", "paciente"), ("admin", "admin")]:
+        if not validos[tipo]:
+            continue
+        registros = [registro for _, registro, _ in validos[tipo]]
+        ids_usuarios, _ = insertar_usuarios_con_perfil(registros, [hash_password for _, _, hash_password in validos[tipo]], rol)
+        creados[tipo] = len(ids_usuarios)
+    return creados
+
+
+"""Función para cargar un archivo CSV o XLSX por trozos.
+    - rechazos: ruta del archivo JSON Lines con las filas rechazadas (None = no se escriben)
+    - trozo / procesos: por defecto INGESTA_TROZO / INGESTA_PROCESOS (0 = un proceso por núcleo)
+    Hace commit después de cada trozo. Devuelve un resumen con las filas leídas, creadas por tipo y rechazadas"""
+def ingestar(ruta, rechazos=None, trozo=None, procesos=None):
+    config = current_app.config
+    trozo = trozo or config["INGESTA_TROZO"]
+    procesos = procesos or config["INGESTA_PROCESOS"] or os.cpu_count() or 1
+    metodo_hash = config.get("PASSWORD_HASH_METHOD")
+
+    # Comprobar el formato antes de leer la base de datos o crear el archivo de rechazos
+    trozos = leer_trozos(ruta, trozo)
+
+    # Usernames y nombres de centro que ya existen (una consulta por tabla, leída por bloques)
+    usernames = set(db.session.scalars(select(Usuario.username).execution_options(yield_per=10000)))
+    centros = set(db.session.scalars(select(Centro.nombre).execution_options(yield_per=10000)))
+
+    resumen = {"filas": 0, "creados": {tipo: 0 for tipo in TIPOS}, "rechazados": 0}
+    with (open(rechazos, "w", encoding="utf-8") if rechazos else nullcontext()) as salida:
+        for preparado in preparar_trozos(trozos, procesos, metodo_hash):
+            validos, rechazados = preparado["validos"], preparado["rechazos"]
+
+            validos["centro"] = descartar_vistos(validos["centro"], "centro", "nombre", centros, "Ya existe un centro con ese nombre", rechazados)
+            for tipo in ["doctor", "paciente", "admin"]:
+                validos[tipo] = descartar_vistos(validos[tipo], tipo, "username", usernames, "El nombre de usuario ya esta en uso", rechazados)
+
+            creados = insertar_trozo(validos)
+            db.session.commit()
+
+            # Vaciar la caché del catálogo si hay centros o doctores nuevos (los servidores en marcha los ven al momento)
+            if creados.get("centro") or creados.get("doctor"):
+                invalidar_catalogo()
+
+            for tipo, n in creados.items():
+                resumen["creados"][tipo] += n
+            resumen["rechazados"] += len(rechazados)
+            resumen["filas"] += sum(len(v) for v in validos.values()) + len(rechazados)
+            if salida is not None:
+                for registro in sorted(rechazados, key=lambda r: r["fila"]):
+                    salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    return resumen
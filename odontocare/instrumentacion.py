@@ -0,0 +1,207 @@
+"""Instrumentación de peticiones (opcional, se activa con INSTRUMENTACION = True).
+
+Para cada petición se mide:
+    - El tiempo total por endpoint (histograma)
+    - El número de consultas SQL y su tiempo total (eventos del motor de SQLAlchemy)
+    - Tramos con nombre dentro de la petición (por ejemplo "jwt", medido en decoradores.role_required)
+    - Posibles N+1: la misma sentencia SQL repetida INSTRUMENTACION_N1_UMBRAL veces o más en una petición
+    - Opcionalmente, cProfile en una muestra de peticiones (INSTRUMENTACION_PERFIL_MUESTREO)
+Los resultados se publican en GET /metrics (formato de texto de Prometheus) y en la cabecera Server-Timing de cada respuesta."""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (segundos) de los buckets del histograma de duración de las peticiones
+BUCKETS_SEGUNDOS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+
+class Metricas:
+    """
+    Acumulador de métricas por endpoint (seguro entre hilos) que se exporta en formato Prometheus
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.peticiones = Counter()            # (metodo, endpoint, estado) -> número de peticiones
+        self.buckets = defaultdict(lambda: [0] * len(BUCKETS_SEGUNDOS))  # (metodo, endpoint) -> peticiones por bucket
+        self.duracion_total = Counter()        # (metodo, endpoint) -> segundos
+        self.duracion_n = Counter()            # (metodo, endpoint) -> peticiones medidas
+        self.sql_consultas = Counter()         # (metodo, endpoint) -> consultas SQL
+        self.sql_segundos = Counter()          # (metodo, endpoint) -> segundos en consultas SQL
+        self.tramos = Counter()                # (metodo, endpoint, tramo) -> segundos
+        self.n_mas_1 = Counter()               # (metodo, endpoint) -> peticiones con posible N+1
+
+    """Método para registrar una petición terminada"""
+    def registrar(self, metodo, endpoint, estado, duracion, sql_consultas, sql_segundos, tramos, n_mas_1):
+        clave = (metodo, endpoint)
+        with self._lock:
+            self.peticiones[(metodo, endpoint, estado)] += 1
+            self.duracion_total[clave] += duracion
+            self.duracion_n[clave] += 1
+            buckets = self.buckets[clave]
+            for i, limite in enumerate(BUCKETS_SEGUNDOS):
+                if duracion <= limite:
+                    buckets[i] += 1
+            self.sql_consultas[clave] += sql_consultas
+            self.sql_segundos[clave] += sql_segundos
+            for nombre, segundos in tramos.items():
+                self.tramos[(metodo, endpoint, nombre)] += segundos
+            if n_mas_1:
+                self.n_mas_1[clave] += 1
+
+    """Método para exportar las métricas en el formato de texto de Prometheus"""
+    def prometheus(self):
+        def etiquetas(**valores):
+            return "{" + ",".join(f'{nombre}="{valor}"' for nombre, valor in valores.items()) + "}"
+
+        lineas = []
+        with self._lock:
+            lineas += ["# HELP odontocare_peticiones_total Peticiones HTTP atendidas", "# TYPE odontocare_peticiones_total counter"]
+            for (metodo, endpoint, estado), n in sorted(self.peticiones.items()):
+                lineas.append(f"odontocare_peticiones_total{etiquetas(metodo=metodo, endpoint=endpoint, estado=estado)} {n}")
+
+            lineas += ["# HELP odontocare_peticion_segundos Duración de las peticiones HTTP", "# TYPE odontocare_peticion_segundos histogram"]
+            for (metodo, endpoint), buckets in sorted(self.buckets.items()):
+                for limite, n in zip(BUCKETS_SEGUNDOS, buckets):
+                    lineas.append(f"odontocare_peticion_segundos_bucket{etiquetas(metodo=metodo, endpoint=endpoint, le=limite)} {n}")
+                total = self.duracion_n[(metodo, endpoint)]
+                lineas.append(f"odontocare_peticion_segundos_bucket{etiquetas(metodo=metodo, endpoint=endpoint, le='+Inf')} {total}")
+                lineas.append(f"odontocare_peticion_segundos_sum{etiquetas(metodo=metodo, endpoint=endpoint)} {self.duracion_total[(metodo, endpoint)]:.6f}")
+                lineas.append(f"odontocare_peticion_segundos_count{etiquetas(metodo=metodo, endpoint=endpoint)} {total}")
+
+            lineas += ["# HELP odontocare_sql_consultas_total Consultas SQL ejecutadas", "# TYPE odontocare_sql_consultas_total counter"]
+            for (metodo, endpoint), n in sorted(self.sql_consultas.items()):
+                lineas.append(f"odontocare_sql_consultas_total{etiquetas(metodo=metodo, endpoint=endpoint)} {n}")
+
+            lineas += ["# HELP odontocare_sql_segundos_total Tiempo total en consultas SQL", "# TYPE odontocare_sql_segundos_total counter"]
+            for (metodo, endpoint), segundos in sorted(self.sql_segundos.items()):
+                lineas.append(f"odontocare_sql_segundos_total{etiquetas(metodo=metodo, endpoint=endpoint)} {segundos:.6f}")
+
+            lineas += ["# HELP odontocare_tramo_segundos_total Tiempo total en cada tramo medido de la petición", "# TYPE odontocare_tramo_segundos_total counter"]
+            for (metodo, endpoint, nombre), segundos in sorted(self.tramos.items()):
+                lineas.append(f"odontocare_tramo_segundos_total{etiquetas(metodo=metodo, endpoint=endpoint, tramo=nombre)} {segundos:.6f}")
+
+            lineas += ["# HELP odontocare_n_mas_1_total Peticiones con la misma consulta SQL repetida muchas veces (posible N+1)", "# TYPE odontocare_n_mas_1_total counter"]
+            for (metodo, endpoint), n in sorted(self.n_mas_1.items()):
+                lineas.append(f"odontocare_n_mas_1_total{etiquetas(metodo=metodo, endpoint=endpoint)} {n}")
+
+        return "\n".join(lineas) + "\n"
+
+
+"""Función para medir un tramo con nombre dentro de la petición actual (no hace nada si la instrumentación está desactivada)
+    Uso: with tramo("jwt"): verify_jwt_in_request()"""
+@contextmanager
+def tramo(nombre):
+    datos = g.get("instrumentacion") if has_request_context() else None
+    if datos is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        datos["tramos"][nombre] += time.perf_counter() - inicio
+
+
+"""Función para activar la instrumentación en la app (se llama desde create_app)"""
+def init_instrumentacion(app):
+    if not app.config["INSTRUMENTACION"]:
+        return
+
+    metricas = Metricas()
+    app.extensions["metricas"] = metricas
+    umbral_n1 = app.config["INSTRUMENTACION_N1_UMBRAL"]
+    muestreo = app.config["INSTRUMENTACION_PERFIL_MUESTREO"]
+    carpeta_perfiles = app.config["INSTRUMENTACION_PERFIL_DIR"]
+    # Solo puede haber un cProfile activo a la vez en el proceso
+    lock_perfil = threading.Lock()
+
+    # Contar cada sentencia SQL de la petición y su tiempo
+    def antes_sql(conexion, cursor, sentencia, parametros, contexto, executemany):
+        if has_request_context() and "instrumentacion" in g:
+            conexion.info.setdefault("inicio_sql", []).append(time.perf_counter())
+
+    def despues_sql(conexion, cursor, sentencia, parametros, contexto, executemany):
+        if has_request_context() and "instrumentacion" in g and conexion.info.get("inicio_sql"):
+            datos = g.instrumentacion
+            datos["sql_segundos"] += time.perf_counter() - conexion.info["inicio_sql"].pop()
+            datos["sentencias"][sentencia] += 1
+
+    # En todos los motores de la app: el principal y los binds (con CITAS_PARTICIONES las citas van a citas_0...citas_N-1)
+    with app.app_context():
+        for motor in db.engines.values():
+            event.listen(motor, "before_cursor_execute", antes_sql)
+            event.listen(motor, "after_cursor_execute", despues_sql)
+
+    @app.before_request
+    def iniciar_medicion():
+        g.instrumentacion = {"inicio": time.perf_counter(), "sql_segundos": 0.0, "sentencias": Counter(),
+                             "tramos": Counter(), "perfil": None}
+        if muestreo > 0 and random.random() < muestreo and lock_perfil.acquire(blocking=False):
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:  # otro profiler activo en el proceso
+                lock_perfil.release()
+            else:
+                g.instrumentacion["perfil"] = perfil
+
+    @app.after_request
+    def terminar_medicion(respuesta):
+        datos = g.pop("instrumentacion", None)
+        if datos is None:
+            return respuesta
+        duracion = time.perf_counter() - datos["inicio"]
+        endpoint = request.endpoint or "desconocido"
+
+        if datos["perfil"] is not None:
+            datos["perfil"].disable()
+            lock_perfil.release()
+            guardar_perfil(datos["perfil"], endpoint, carpeta_perfiles)
+
+        # Posible N+1: la misma sentencia (con parámetros distintos) repetida muchas veces
+        repetidas = [(sentencia, n) for sentencia, n in datos["sentencias"].items() if n >= umbral_n1]
+        for sentencia, n in repetidas:
+            logger.warning("Posible N+1 en %s %s: %d ejecuciones de %s", request.method, endpoint, n, " ".join(sentencia.split())[:200])
+
+        sql_consultas = sum(datos["sentencias"].values())
+        metricas.registrar(request.method, endpoint, respuesta.status_code, duracion, sql_consultas, datos["sql_segundos"],
+                           datos["tramos"], bool(repetidas))
+
+        # Cabecera Server-Timing (se ve en las herramientas de desarrollo del navegador). Duraciones en milisegundos
+        partes = [f"total;dur={duracion * 1000:.2f}", f'sql;dur={datos["sql_segundos"] * 1000:.2f};desc="{sql_consultas} consultas"']
+        partes += [f"{nombre};dur={segundos * 1000:.2f}" for nombre, segundos in datos["tramos"].items()]
+        respuesta.headers["Server-Timing"] = ", ".join(partes)
+        return respuesta
+
+    # Endpoint de métricas para Prometheus
+    def exportar_metricas():
+        return Response(metricas.prometheus(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metricas", exportar_metricas, methods=["GET"])
+
+
+"""Función para guardar el resultado de cProfile: en un archivo .prof (si hay carpeta configurada) o en el log (las 20 funciones más costosas)"""
+def guardar_perfil(perfil, endpoint, carpeta):
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+        perfil.dump_stats(os.path.join(carpeta, f"{endpoint}_{time.time_ns()}.prof"))
+        return
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(20)
+    logger.info("Perfil de %s:\n%s", endpoint, salida.getvalue())
@@ -0,0 +1,105 @@
+"""Migraciones de la base de datos.
+
+db.create_all() solo crea las tablas que no existen, pero no modifica las que ya están creadas.
+Este archivo contiene los pasos necesarios para actualizar una base de datos existente
+(por ejemplo instance/odontocare.db) a la versión actual de los modelos.
+Todos los pasos se pueden ejecutar varias veces sin problema (son idempotentes)."""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from busqueda import crear_indices_busqueda
+from particiones import crear_tablas_particiones
+import models
+
+
+"""Migración: columna citas.fecha de texto a DateTime
+    En SQLite las columnas no tienen tipo estricto, así que basta con reescribir los valores antiguos
+    ("2025-09-10 10:00") al formato que usa SQLAlchemy para DateTime ("2025-09-10 10:00:00.000000").
+    Si no se hiciera, SQLAlchemy leería esas fechas ignorando la hora"""
+def migrar_fechas_citas():
+    dialecto = db.engine.dialect.name
+
+    if dialecto == "sqlite":
+        resultado = db.session.execute(text(
+            "UPDATE citas "
+            "SET fecha = strftime('%Y-%m-%d %H:%M:%S', fecha) || '.000000' "
+            "WHERE length(fecha) < 26 AND strftime('%Y-%m-%d %H:%M:%S', fecha) IS NOT NULL"
+        ))
+        db.session.commit()
+        return resultado.rowcount
+
+    # En PostgreSQL sí hay que cambiar el tipo de la columna
+    if dialecto == "postgresql":
+        columnas = {c["name"]: c for c in inspect(db.engine).get_columns("citas")}
+        if "fecha" in columnas and "CHAR" in str(columnas["fecha"]["type"]).upper():
+            db.session.execute(text("ALTER TABLE citas ALTER COLUMN fecha TYPE TIMESTAMP USING fecha::timestamp"))
+            db.session.commit()
+    return 0
+
+
+"""Migración: crear los índices definidos en los modelos que todavía no existan en la base de datos
+    (db.create_all() solo crea los índices cuando crea la tabla).
+    Si un índice único no se puede crear porque ya hay datos duplicados, se avisa y se continúa:
+    hay que revisar esos datos a mano antes de volver a ejecutar la migración"""
+def crear_indices_faltantes():
+    creados = []
+    for tabla in db.metadata.sorted_tables:
+        existentes = {i["name"] for i in inspect(db.engine).get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name not in existentes:
+                try:
+                    indice.create(db.engine)
+                except IntegrityError:
+                    print(f"Aviso: no se pudo crear el indice unico {indice.name} porque hay filas duplicadas en {tabla.name}")
+                    continue
+                creados.append(indice.name)
+    return creados
+
+
+"""Migración: calcular las estadísticas de citas (tabla estadisticas_citas) si la tabla está vacía pero ya hay citas
+    (base de datos creada antes de existir la tabla agregada)"""
+def migrar_estadisticas_citas():
+    from estadisticas import reconstruir_estadisticas
+    from models.cita import Cita
+    from models.estadistica_cita import EstadisticaCita
+
+    if db.session.query(EstadisticaCita).first() is None and db.session.query(Cita).first() is not None:
+        filas = reconstruir_estadisticas()
+        db.session.commit()
+        return filas
+    return 0
+
+
+"""Migración: crear y rellenar los índices de búsqueda de texto de pacientes y doctores (FTS5, solo SQLite)
+    si la base de datos es anterior a ellos (db.create_all() solo los crea junto con las tablas)"""
+def migrar_indices_busqueda():
+    creados = crear_indices_busqueda(db.session.connection())
+    db.session.commit()
+    return creados
+
+
+"""Función principal: aplicar todas las migraciones en orden. Se debe llamar dentro del contexto de la app"""
+def migrar_base_datos():
+    # Solo la base de datos principal: las tablas de las particiones las crea crear_tablas_particiones. Con "__all__"
+    # (por defecto) fallaría en un proceso que ya ha creado otra app con CITAS_PARTICIONES (benchmarks y pruebas):
+    # db es global y guarda un metadata por cada bind "citas_k" que ha visto, aunque esta app no lo tenga
+    db.create_all(bind_key=None)
+    migrar_fechas_citas()
+    indices = crear_indices_faltantes()
+    migrar_estadisticas_citas()
+    indices += migrar_indices_busqueda()
+    crear_tablas_particiones()
+    return indices
+
+
+# Ejecutar script
+if __name__ == "__main__":
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        print("Migrando base de datos...")
+        indices = migrar_base_datos()
+        print("Indices creados:", indices if indices else "ninguno")
+        print("Migracion completada")
@@ -7,4 +7,8 @@ from .usuario import Usuario
 from .paciente import Paciente
 from .doctor import Doctor
 from .centro import Centro
-from .cita import Cita
\ No newline at end of file
+from .cita import Cita
+from .estadistica_cita import EstadisticaCita
+from .version_tabla import VersionTabla
+from .cita_archivada import CitaArchivada
+from .evento_auditoria import EventoAuditoria
\ No newline at end of file
@@ -3,6 +3,7 @@ SQLAlchemy permite trabajar con bases de datos usando clases Python en vez de us
 
 # Importar la instancia de SQLAlchemy desde extensions.py: db = SQLAlchemy() 
 from extensions import db 
+from fechas import formatear_fecha
 
 class Cita(db.Model):
     """
@@ -20,13 +21,28 @@ class Cita(db.Model):
     # Definición nombre de la tabla en la base de datos
     __tablename__ = "citas"
 
+    """Índices de la tabla
+    Las consultas más frecuentes sobre citas filtran por doctor y fecha (comprobar conflictos al agendar),
+    por centro y fecha o por paciente y fecha (listar citas). Con estos índices compuestos la base de datos
+    no tiene que recorrer toda la tabla en cada consulta.
+    El índice único parcial uq_citas_doctor_fecha_activa garantiza en la propia base de datos que un doctor
+    no tenga dos citas no canceladas en la misma fecha y hora, aunque lleguen dos peticiones a la vez"""
+    __table_args__ = (
+        db.Index("uq_citas_doctor_fecha_activa", "id_doctor", "fecha", unique=True,
+                 sqlite_where=db.text("estado != 'Cancelada'"), postgresql_where=db.text("estado != 'Cancelada'")),
+        db.Index("ix_citas_doctor_fecha_estado", "id_doctor", "fecha", "estado"),
+        db.Index("ix_citas_centro_fecha", "id_centro", "fecha"),
+        db.Index("ix_citas_paciente_fecha", "id_paciente", "fecha"),
+        db.Index("ix_citas_fecha", "fecha"),
+    )
+
     """Columnas de la tabla en la base de datos"""
     
     # Identificador único de la cita (primary_key=True)
     id_cita = db.Column(db.Integer, primary_key=True)
 
-    # Fecha y hora de la cita
-    fecha = db.Column(db.String(25), nullable=False)
+    # Fecha y hora de la cita. Se guarda como DateTime (y no como texto) para poder comparar y ordenar usando índices
+    fecha = db.Column(db.DateTime, nullable=False)
 
     # Motivo de la cita
     motivo = db.Column(db.String(200), nullable=False)
@@ -54,7 +70,7 @@ class Cita(db.Model):
     def to_dict(self):
         return {
             "id_cita": self.id_cita,
-            "fecha": self.fecha,
+            "fecha": formatear_fecha(self.fecha),
             "motivo": self.motivo,
             "estado": self.estado,
             "id_paciente": self.id_paciente,
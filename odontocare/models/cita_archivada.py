@@ -0,0 +1,52 @@
+"""Este archivo define la tabla "citas_archivo" usando SQLAlchemy.
+SQLAlchemy permite trabajar con bases de datos usando clases Python en vez de usar SQL"""
+
+# Importar la instancia de SQLAlchemy desde extensions.py: db = SQLAlchemy() 
+from extensions import db
+from fechas import formatear_fecha
+
+class CitaArchivada(db.Model):
+    """
+    Citas antiguas movidas desde la tabla citas (archivo.py). Mismas columnas que Cita y además:
+    - archivada_en: fecha y hora en que se movió al archivo
+    Se conserva el mismo id_cita, así una cita archivada se sigue identificando igual en los listados con histórico.
+    No tiene el índice único de conflictos: en el archivo solo hay citas pasadas que ya no se pueden reservar
+    """
+
+    # Definición nombre de la tabla en la base de datos
+    __tablename__ = "citas_archivo"
+
+    """Índices de la tabla: los mismos filtros que listar_citas (doctor, centro o paciente y fecha)"""
+    __table_args__ = (
+        db.Index("ix_citas_archivo_doctor_fecha", "id_doctor", "fecha"),
+        db.Index("ix_citas_archivo_centro_fecha", "id_centro", "fecha"),
+        db.Index("ix_citas_archivo_paciente_fecha", "id_paciente", "fecha"),
+        db.Index("ix_citas_archivo_fecha", "fecha"),
+    )
+
+    """Columnas de la tabla en la base de datos (iguales que en citas)"""
+
+    id_cita = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    fecha = db.Column(db.DateTime, nullable=False)
+    motivo = db.Column(db.String(200), nullable=False)
+    estado = db.Column(db.String(20), nullable=False)
+    id_paciente = db.Column(db.Integer, db.ForeignKey("pacientes.id_paciente"), nullable=False)
+    id_doctor = db.Column(db.Integer, db.ForeignKey("doctores.id_doctor"), nullable=False)
+    id_centro = db.Column(db.Integer, db.ForeignKey("centros.id_centro"), nullable=False)
+    id_usuario_registra = db.Column(db.Integer, db.ForeignKey("usuarios.id_usuario"), nullable=False)
+
+    # Momento en que la cita se movió al archivo
+    archivada_en = db.Column(db.DateTime, nullable=False)
+
+    """Método para devolver los datos de la cita en formato diccionario (el mismo formato que Cita.to_dict)"""
+    def to_dict(self):
+        return {
+            "id_cita": self.id_cita,
+            "fecha": formatear_fecha(self.fecha),
+            "motivo": self.motivo,
+            "estado": self.estado,
+            "id_paciente": self.id_paciente,
+            "id_doctor": self.id_doctor,
+            "id_centro": self.id_centro,
+            "id_usuario_registra": self.id_usuario_registra,
+        }
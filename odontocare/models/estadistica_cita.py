@@ -0,0 +1,42 @@
+"""Este archivo define la tabla "estadisticas_citas" usando SQLAlchemy.
+SQLAlchemy permite trabajar con bases de datos usando clases Python en vez de usar SQL"""
+
+# Importar la instancia de SQLAlchemy desde extensions.py: db = SQLAlchemy() 
+from extensions import db
+
+class EstadisticaCita(db.Model):
+    """
+    Contadores de citas por día, doctor y centro (tabla agregada):
+    - fecha (PK): día de la cita
+    - id_doctor (PK)
+    - id_centro (PK)
+    - activas: citas no canceladas
+    - canceladas: citas canceladas
+    Se actualiza en la misma transacción que agendar_cita y cancelar_cita (estadisticas.py), así las estadísticas
+    se leen de esta tabla (una fila por día, doctor y centro) en lugar de contar todas las citas
+    """
+
+    # Definición nombre de la tabla en la base de datos
+    __tablename__ = "estadisticas_citas"
+
+    """Columnas de la tabla en la base de datos"""
+
+    # Clave primaria compuesta: un contador por día, doctor y centro
+    fecha = db.Column(db.Date, primary_key=True)
+    id_doctor = db.Column(db.Integer, db.ForeignKey("doctores.id_doctor"), primary_key=True)
+    id_centro = db.Column(db.Integer, db.ForeignKey("centros.id_centro"), primary_key=True)
+
+    # Contadores
+    activas = db.Column(db.Integer, nullable=False, default=0)
+    canceladas = db.Column(db.Integer, nullable=False, default=0)
+
+    """Método para devolver los datos del contador en formato diccionario.
+    Permite que en los endpoints se pueda utilizar jsonify para obtener los datos en JSON"""
+    def to_dict(self):
+        return {
+            "fecha": self.fecha.isoformat(),
+            "id_doctor": self.id_doctor,
+            "id_centro": self.id_centro,
+            "activas": self.activas,
+            "canceladas": self.canceladas,
+        }
@@ -0,0 +1,39 @@
+"""Este archivo define la tabla "auditoria" usando SQLAlchemy.
+SQLAlchemy permite trabajar con bases de datos usando clases Python en vez de usar SQL"""
+
+# Importar la instancia de SQLAlchemy desde extensions.py: db = SQLAlchemy()
+from extensions import db
+
+class EventoAuditoria(db.Model):
+    """
+    Registro de auditoría (auditoria.py): una fila por acción (cita creada o cancelada, usuario creado...):
+    - fecha: momento de la acción (UTC)
+    - tipo: "cita_creada", "cita_cancelada", "usuario_creado" o "carga_masiva"
+    - id_usuario y rol: quién hizo la acción (del token JWT; None si no hay usuario autenticado)
+    - ip: dirección desde la que se hizo la petición
+    - objeto e id_objeto: sobre qué se hizo ("cita" y su id, "usuario" y su id...)
+    - datos: JSON con el detalle (la cita, el username creado...)
+    La tabla es de solo escritura: no tiene claves foráneas (el registro se conserva aunque se borre el usuario o la cita)
+    y en SQLite unos triggers impiden modificar o borrar filas
+    """
+
+    # Definición nombre de la tabla en la base de datos
+    __tablename__ = "auditoria"
+
+    """Índices de la tabla: consultas por usuario o por objeto en un periodo"""
+    __table_args__ = (
+        db.Index("ix_auditoria_usuario_fecha", "id_usuario", "fecha"),
+        db.Index("ix_auditoria_objeto", "objeto", "id_objeto"),
+    )
+
+    """Columnas de la tabla en la base de datos"""
+
+    id_evento = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.DateTime, nullable=False)
+    tipo = db.Column(db.String(50), nullable=False)
+    id_usuario = db.Column(db.Integer)
+    rol = db.Column(db.String(20))
+    ip = db.Column(db.String(45))
+    objeto = db.Column(db.String(20), nullable=False)
+    id_objeto = db.Column(db.BigInteger)
+    datos = db.Column(db.Text)
@@ -3,9 +3,23 @@ SQLAlchemy permite trabajar con bases de datos usando clases Python en vez de us
 
 # Importar funciones de Werkzeug para manejar contraseñas de manera segura
 # Importar la instancia de SQLAlchemy desde extensions.py: db = SQLAlchemy() 
+from flask import current_app, has_app_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from extensions import db
 
+
+"""Función para generar el hash de una contraseña con el método configurado en la app (PASSWORD_HASH_METHOD).
+    Si no está configurado se usa el método por defecto de Werkzeug.
+    Dentro de la app el cálculo se hace en el pool de procesos del servicio de hash (hashing.py), fuera del hilo de la petición"""
+def generar_hash(password):
+    metodo = current_app.config.get("PASSWORD_HASH_METHOD") if has_app_context() else None
+    if has_app_context() and "servicio_hash" in current_app.extensions:
+        return current_app.extensions["servicio_hash"].generar(password, metodo)
+    if metodo:
+        return generate_password_hash(password, method=metodo)
+    return generate_password_hash(password)
+
+
 # Definir la clase Usuario, que será la tabla "usuarios" en la base de datos
 class Usuario(db.Model):
     """
@@ -34,7 +48,7 @@ class Usuario(db.Model):
 
     """Método para generar el hash de la contraseña antes de guardarla"""
     def set_password(self, password):
-        self.password = generate_password_hash(password)  # Convertir la contraseña en un hash seguro
+        self.password = generar_hash(password)  # Convertir la contraseña en un hash seguro
 
     """Método para comprobar si la contraseña ingresada coincide con el hash guardado"""
     def check_password(self, password):
@@ -0,0 +1,21 @@
+"""Este archivo define la tabla "versiones" usando SQLAlchemy.
+SQLAlchemy permite trabajar con bases de datos usando clases Python en vez de usar SQL"""
+
+# Importar la instancia de SQLAlchemy desde extensions.py: db = SQLAlchemy() 
+from extensions import db
+
+class VersionTabla(db.Model):
+    """
+    Contador de versión de una tabla:
+    - nombre (PK): nombre de la tabla (por ejemplo "citas")
+    - version: se incrementa en cada transacción que modifica la tabla (versiones.py)
+    Se usa para generar el ETag de los listados sin tener que leer las filas
+    """
+
+    # Definición nombre de la tabla en la base de datos
+    __tablename__ = "versiones"
+
+    """Columnas de la tabla en la base de datos"""
+
+    nombre = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
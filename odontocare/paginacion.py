@@ -0,0 +1,51 @@
+"""Funciones auxiliares para la paginación por cursor (keyset) de los listados.
+
+En lugar de usar OFFSET (que obliga a la base de datos a recorrer todas las filas anteriores),
+el cursor guarda la clave de la última fila devuelta (fecha e id_cita) y la siguiente página
+empieza justo después de ella usando el índice."""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+# Tamaño de página por defecto y máximo permitido
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+
+"""Función para leer el parámetro limit de la petición. Lanza ValueError si no es un entero positivo"""
+def leer_limite(valor, defecto=LIMITE_POR_DEFECTO, maximo=LIMITE_MAXIMO):
+    if valor is None or valor == "":
+        return defecto
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise ValueError("limit debe ser numerico") from None
+    if limite <= 0:
+        raise ValueError("limit debe ser mayor que 0")
+    return min(limite, maximo)
+
+
+"""Función para codificar la clave (fecha, id) de la última fila en un texto opaco para el cliente"""
+def codificar_cursor(fecha, id_fila):
+    clave = json.dumps([fecha.isoformat(), id_fila])
+    return base64.urlsafe_b64encode(clave.encode()).decode()
+
+
+"""Función para decodificar el cursor recibido. Lanza ValueError si el cursor no es válido"""
+def decodificar_cursor(cursor):
+    try:
+        fecha, id_fila = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return datetime.fromisoformat(fecha), int(id_fila)
+    except (TypeError, ValueError, UnicodeDecodeError) as error:
+        raise ValueError("cursor invalido") from error
+
+
+"""Función para aplicar el orden (fecha, id) y, si hay cursor, la condición de "filas posteriores al cursor" a una consulta"""
+def aplicar_keyset(query, columna_fecha, columna_id, cursor=None):
+    if cursor:
+        fecha, id_fila = decodificar_cursor(cursor)
+        query = query.filter(or_(columna_fecha > fecha, and_(columna_fecha == fecha, columna_id > id_fila)))
+    return query.order_by(columna_fecha, columna_id)
@@ -0,0 +1,290 @@
+"""Particionado de las citas por doctor (CITAS_PARTICIONES).
+
+Con todas las citas en un único archivo SQLite, cada reserva o cancelación toma el bloqueo de escritura de toda la base
+de datos: las reservas de todos los doctores se esperan unas a otras. Con CITAS_PARTICIONES = N > 0 las citas se reparten
+en N bases de datos (binds de Flask-SQLAlchemy "citas_0" ... "citas_N-1"), cada una con su propio bloqueo de escritura:
+    - Cada doctor pertenece a una partición: la indicada en CITAS_PARTICIONES_MAPA ("1:0,2:0,3:1") o id_doctor % N.
+      Todas las citas de un doctor (en cualquier centro) están en su partición, así que el índice único de conflictos
+      (doctor, fecha) de esa partición impide la doble reserva igual que sin particiones, también con reservas simultáneas
+    - Cada partición guarda sus tablas citas, citas_archivo, estadisticas_citas y versiones. Usuarios, pacientes, doctores
+      y centros siguen en la base de datos principal
+    - agendar_cita, agendar_citas_batch y cancelar_cita escriben solo en la partición del doctor de la cita (sesion_doctor)
+    - Los ids de las citas son únicos entre particiones: la partición k los reparte desde k * RANGO_IDS (tabla
+      secuencia_citas), así cancelar_cita sabe en qué partición buscar a partir del id
+    - listar_citas, la disponibilidad y las estadísticas consultan todas las particiones, una detrás de otra en el hilo
+      de la petición, y mezclan los resultados manteniendo el orden por (fecha, id_cita) con heapq.merge
+      (consultar_repartido y recorrer_repartido). Son lecturas por índice de milisegundos: un pool de hilos común a
+      todo el proceso haría esperar a las peticiones unas a otras, y uno por petición costaría más que las consultas
+    - La versión de "citas" (ETag de los listados) es la suma de las versiones de las particiones
+Cambiar CITAS_PARTICIONES o CITAS_PARTICIONES_MAPA con citas ya repartidas deja las citas de algunos doctores en otra
+partición: hay que hacerlo con las citas en la base de datos principal (antes de particionar-citas).
+La exportación analítica (analitica.py) lee las citas de la principal y de todas las particiones (en_todas). En el
+modo ASGI listar_citas lo atiende la versión WSGI cuando hay particiones.
+Las tablas de las particiones se crean con migrar_base_datos(). Las citas que ya estaban en la base de datos principal
+se mueven a sus particiones con: flask --app run particionar-citas"""
+
+import heapq
+import os
+from itertools import islice
+
+from flask import current_app, g
+from sqlalchemy import BigInteger, Column, Integer, MetaData, Table, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from extensions import db, escuchar_pragmas_sqlite
+from models.cita import Cita
+from models.cita_archivada import CitaArchivada
+from models.estadistica_cita import EstadisticaCita
+from models.version_tabla import VersionTabla
+
+# Ids de cita reservados para cada partición: la partición k usa los ids de k * RANGO_IDS en adelante
+# (los ids siguen siendo enteros seguros para JSON/JavaScript con miles de particiones)
+RANGO_IDS = 10**12
+
+# Tablas de los modelos que se guardan en cada partición
+TABLAS_PARTICION = [Cita.__table__, CitaArchivada.__table__, EstadisticaCita.__table__, VersionTabla.__table__]
+
+"""Tabla con el último id de cita repartido por la partición (una sola fila). Solo existe en las particiones"""
+
+metadata_particiones = MetaData()
+
+secuencia_citas = Table(
+    "secuencia_citas", metadata_particiones,
+    Column("id", Integer, primary_key=True),
+    Column("ultimo", BigInteger, nullable=False),
+)
+
+
+class Particiones:
+    """
+    Configuración de las particiones de la app: número y doctores asignados a mano
+    """
+
+    def __init__(self, numero, mapa):
+        self.numero = numero
+        self.mapa = mapa
+
+    """Método para obtener la partición de un doctor"""
+    def de_doctor(self, id_doctor):
+        return self.mapa.get(id_doctor, id_doctor % self.numero)
+
+    """Método para obtener la partición que repartió el id de una cita (None si el id no es de ninguna)"""
+    def de_cita(self, id_cita):
+        particion = id_cita // RANGO_IDS
+        return particion if 0 <= particion < self.numero else None
+
+
+"""Función para leer CITAS_PARTICIONES_MAPA ("id_doctor:particion,...") como diccionario"""
+def leer_mapa(texto, numero):
+    mapa = {}
+    for par in (texto or "").split(","):
+        if not par.strip():
+            continue
+        id_doctor, particion = (int(valor) for valor in par.split(":"))
+        if not 0 <= particion < numero:
+            raise ValueError(f"CITAS_PARTICIONES_MAPA: la particion {particion} no existe (hay {numero})")
+        mapa[id_doctor] = particion
+    return mapa
+
+
+"""Función para obtener la URL de la base de datos de una partición.
+    Con CITAS_PARTICIONES_URL se sustituye {particion}; si no, con SQLite se usa un archivo junto al principal
+    (odontocare.db -> odontocare_citas_0.db, odontocare_citas_1.db...)"""
+def url_particion(config, particion):
+    if config["CITAS_PARTICIONES_URL"]:
+        return config["CITAS_PARTICIONES_URL"].format(particion=particion)
+
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:" or "mode=memory" in str(url):
+        raise RuntimeError("Con CITAS_PARTICIONES hay que indicar CITAS_PARTICIONES_URL (por ejemplo sqlite:///citas_{particion}.db)")
+    base, extension = os.path.splitext(url.database)
+    return url.set(database=f"{base}_citas_{particion}{extension or '.db'}").render_as_string(hide_password=False)
+
+
+"""Función para añadir los binds de las particiones a SQLALCHEMY_BINDS. Se llama desde create_app ANTES de db.init_app"""
+def configurar_particiones(app):
+    numero = app.config["CITAS_PARTICIONES"]
+    if numero <= 0:
+        return
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    for particion in range(numero):
+        binds.setdefault(f"citas_{particion}", url_particion(app.config, particion))
+    app.config["SQLALCHEMY_BINDS"] = binds
+
+
+"""Función para preparar las particiones de la app (se llama desde create_app, después de db.init_app)"""
+def init_particiones(app):
+    numero = app.config["CITAS_PARTICIONES"]
+    if numero <= 0:
+        app.extensions["particiones"] = None
+        return
+
+    app.extensions["particiones"] = Particiones(numero, leer_mapa(app.config["CITAS_PARTICIONES_MAPA"], numero))
+
+    # Los mismos PRAGMA de SQLite que la base de datos principal (WAL, synchronous y busy_timeout)
+    with app.app_context():
+        for particion in range(numero):
+            motor = db.engines[f"citas_{particion}"]
+            if motor.dialect.name == "sqlite":
+                escuchar_pragmas_sqlite(motor, app.config)
+
+    # Cerrar las sesiones de las particiones al terminar cada petición (como db.session)
+    app.teardown_appcontext(cerrar_sesiones)
+
+
+"""Función para obtener las particiones de la app actual (None si no hay particionado)"""
+def particiones():
+    return current_app.extensions.get("particiones")
+
+
+"""Función para obtener la sesión de una partición en la petición actual (se abre la primera vez y se reutiliza).
+    Sin particionado es db.session"""
+def sesion_particion(particion):
+    if particiones() is None:
+        return db.session
+    sesiones = g.setdefault("sesiones_particiones", {})
+    if particion not in sesiones:
+        sesiones[particion] = Session(bind=db.engines[f"citas_{particion}"])
+    return sesiones[particion]
+
+
+"""Función para obtener la sesión de la partición a la que pertenece un doctor (donde están todas sus citas)"""
+def sesion_doctor(id_doctor):
+    actuales = particiones()
+    return sesion_particion(actuales.de_doctor(id_doctor) if actuales is not None else 0)
+
+
+"""Función para obtener las sesiones de todas las particiones (sin particionado, [db.session])"""
+def sesiones_citas():
+    actuales = particiones()
+    if actuales is None:
+        return [db.session]
+    return [sesion_particion(particion) for particion in range(actuales.numero)]
+
+
+"""Función para cerrar las sesiones de las particiones abiertas en la petición"""
+def cerrar_sesiones(excepcion=None):
+    for sesion in g.pop("sesiones_particiones", {}).values():
+        sesion.close()
+
+
+"""Función para asignar ids a citas nuevas antes de guardarlas en su partición (sin particionado no hace nada:
+    el id lo pone la base de datos). Se reservan todos los ids con una sola sentencia en la transacción de las citas"""
+def asignar_ids(sesion, citas):
+    if particiones() is None or not citas:
+        return
+    ultimo = sesion.execute(update(secuencia_citas).values(ultimo=secuencia_citas.c.ultimo + len(citas))
+                            .returning(secuencia_citas.c.ultimo)).scalar_one()
+    for id_cita, cita in zip(range(ultimo - len(citas) + 1, ultimo + 1), citas):
+        cita.id_cita = id_cita
+
+
+"""Función para buscar una cita por id. Devuelve (cita o None, sesión de la partición donde está).
+    Primero se busca en la partición que repartió el id; las citas movidas con particionar-citas conservan su id
+    original, así que si no está ahí se busca en el resto"""
+def buscar_cita(id_cita):
+    actuales = particiones()
+    if actuales is None:
+        return db.session.get(Cita, id_cita), db.session
+
+    propia = actuales.de_cita(id_cita)
+    orden = ([propia] if propia is not None else []) + [p for p in range(actuales.numero) if p != propia]
+    for particion in orden:
+        sesion = sesion_particion(particion)
+        cita = sesion.get(Cita, id_cita)
+        if cita is not None:
+            return cita, sesion
+    return None, sesion_particion(orden[0])
+
+
+"""Función para ejecutar una consulta en todas las particiones (en el hilo de la petición, cada una con su sesión).
+    Devuelve una lista con el resultado de cada una.
+    ejecutar: función que recibe la sesión de una partición y devuelve su resultado"""
+def en_todas(ejecutar):
+    return [ejecutar(sesion) for sesion in sesiones_citas()]
+
+
+"""Función para ejecutar una consulta del ORM (Query) en todas las particiones y mezclar los resultados ya ordenados.
+    La consulta debe estar ordenada por la misma clave que 'clave'. Con limite se leen como mucho 'limite' filas de cada
+    partición y se devuelven las 'limite' primeras de la mezcla"""
+def consultar_repartido(consulta, clave, limite=None):
+    if limite is not None:
+        consulta = consulta.limit(limite)
+    resultados = en_todas(lambda sesion: consulta.with_session(sesion).all())
+    return list(islice(heapq.merge(*resultados, key=clave), limite))
+
+
+"""Función para recorrer una consulta del ORM en todas las particiones leyendo por lotes (yield_per), mezclando las filas
+    en orden sin tener ninguna partición entera en memoria (para el streaming NDJSON)"""
+def recorrer_repartido(consulta, clave, lote=500, limite=None):
+    flujos = [consulta.with_session(sesion).yield_per(lote) for sesion in sesiones_citas()]
+    return islice(heapq.merge(*flujos, key=clave), limite)
+
+
+"""Función para crear las tablas de las particiones que falten y su secuencia de ids (se llama desde migrar_base_datos).
+    La secuencia de una partición nueva empieza después del id más alto de la base de datos principal, así las citas
+    que se muevan después con particionar-citas no coinciden con las nuevas"""
+def crear_tablas_particiones():
+    actuales = particiones()
+    if actuales is None:
+        return
+    base = max(db.session.scalar(select(func.max(Cita.id_cita))) or 0,
+               db.session.scalar(select(func.max(CitaArchivada.id_cita))) or 0)
+
+    for particion in range(actuales.numero):
+        with db.engines[f"citas_{particion}"].begin() as conexion:
+            for tabla in TABLAS_PARTICION:
+                tabla.create(conexion, checkfirst=True)
+            secuencia_citas.create(conexion, checkfirst=True)
+            if conexion.execute(select(secuencia_citas.c.id)).first() is None:
+                conexion.execute(insert(secuencia_citas).values(id=1, ultimo=particion * RANGO_IDS + base))
+
+
+"""Función para copiar filas de citas a una partición sin repetir las que ya tiene (mismo id_cita)"""
+def insertar_sin_repetir(sesion, tabla, filas):
+    dialecto = sesion.get_bind().dialect.name
+    if dialecto in ["sqlite", "postgresql"]:
+        insertar = (sqlite.insert if dialecto == "sqlite" else postgresql.insert)(tabla)
+        sesion.execute(insertar.on_conflict_do_nothing(index_elements=[tabla.c.id_cita]), filas)
+        return
+
+    # Otras bases de datos: leer qué ids ya están e insertar el resto
+    existentes = set(sesion.scalars(select(tabla.c.id_cita).where(tabla.c.id_cita.in_([fila["id_cita"] for fila in filas]))))
+    nuevas = [fila for fila in filas if fila["id_cita"] not in existentes]
+    if nuevas:
+        sesion.execute(insert(tabla), nuevas)
+
+
+"""Función para mover a sus particiones las citas (y las archivadas) que están en la base de datos principal, por lotes
+    de 'lote' citas en orden de id_cita. Cada lote se copia a sus particiones (commit en cada una) y después se borra de
+    la principal (commit), así la principal solo guarda las citas que faltan por mover:
+    - Se puede interrumpir y volver a lanzar: continúa por el primer lote que queda en la principal
+    - Si se interrumpe entre la copia y el borrado de un lote, al repetirlo las citas que ya están en la partición no se
+      vuelven a insertar (insertar_sin_repetir) y el lote se borra de la principal
+    Devuelve el número de citas movidas por tabla.
+    Después hay que reconstruir las estadísticas de las particiones (el comando particionar-citas lo hace)"""
+def repartir_citas_existentes(lote=5000):
+    actuales = particiones()
+    movidas = {}
+    for tabla in [Cita.__table__, CitaArchivada.__table__]:
+        id_tabla = tabla.c.id_cita
+        movidas[tabla.name] = 0
+        while True:
+            filas = db.session.execute(select(tabla).order_by(id_tabla).limit(lote)).mappings().all()
+            if not filas:
+                break
+            por_particion = {}
+            for fila in filas:
+                por_particion.setdefault(actuales.de_doctor(fila["id_doctor"]), []).append(dict(fila))
+            for particion, filas_particion in por_particion.items():
+                sesion = sesion_particion(particion)
+                insertar_sin_repetir(sesion, tabla, filas_particion)
+                sesion.commit()
+
+            # Borrar de la principal exactamente el lote copiado (los ids hasta el último leído, en orden)
+            db.session.execute(delete(tabla).where(id_tabla <= filas[-1]["id_cita"]))
+            db.session.commit()
+            movidas[tabla.name] += len(filas)
+    return movidas
@@ -1,5 +1,6 @@
 from app import create_app
 from extensions import db
+from migraciones import migrar_base_datos
 import models
 
 """Creación de la API y la base de datos"""
@@ -12,4 +13,6 @@ if __name__ == "__main__":
         print("Creando tablas...")
         db.create_all()  # Crear las tablas
         print("Tablas creadas")
+        migrar_base_datos()  # Actualizar las tablas ya existentes (tipos de columna e índices)
+        print("Migraciones aplicadas")
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""Serialización rápida de listados grandes (DTO con __slots__ + orjson).
+
+El camino normal de listar_citas carga cada cita como objeto del ORM (identity map, estado de la sesión...),
+la convierte a diccionario con to_dict() y la serializa con jsonify. Con decenas de miles de citas la mayor parte
+del tiempo de CPU se va en construir esos objetos y diccionarios.
+
+El camino rápido:
+    - Selecciona solo las columnas necesarias (tuplas, sin objetos del ORM)
+    - Guarda cada fila en un CitaDTO (dataclass con __slots__): poca memoria y construcción barata
+    - La fecha se lee tal como la devuelve el driver (sin convertirla a datetime) y se recorta al formato de la API
+    - Serializa a bytes con orjson, que convierte los dataclass directamente en C. Si orjson no está instalado se usa json
+El JSON resultante tiene las mismas claves, valores y orden que jsonify (con orjson los caracteres no ASCII van en UTF-8
+en lugar de escaparse con \\uXXXX).
+
+Se activa por endpoint con SERIALIZACION_RAPIDA (lista de endpoints separados por comas, por ejemplo "citas_bp.listar_citas")."""
+
+import json
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import String, type_coerce
+
+# orjson es opcional: si no está instalado se serializa con json (más lento, pero se sigue evitando el ORM)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass(slots=True)
+class CitaDTO:
+    """
+    Datos de una cita para los listados. Los campos están en orden alfabético, el mismo orden de claves que jsonify
+    """
+    estado: str
+    fecha: str
+    id_centro: int
+    id_cita: int
+    id_doctor: int
+    id_paciente: int
+    id_usuario_registra: int
+    motivo: str
+
+
+# Nombres de los campos del DTO (en el mismo orden que las columnas seleccionadas)
+CAMPOS_CITA = [campo.name for campo in fields(CitaDTO)]
+
+
+"""Función para saber si un endpoint usa la serialización rápida (SERIALIZACION_RAPIDA). Por defecto el de la petición actual"""
+def serializacion_rapida(endpoint=None, config=None):
+    config = config or current_app.config
+    activos = {nombre.strip() for nombre in (config["SERIALIZACION_RAPIDA"] or "").split(",") if nombre.strip()}
+    return (endpoint or request.endpoint) in activos
+
+
+"""Función para obtener las columnas de las citas en el orden de CitaDTO.
+    modelo: Cita o la unión con el archivo (archivo.fuente_citas). La fecha se lee sin convertir a datetime (type_coerce)"""
+def columnas_cita(modelo):
+    return [type_coerce(modelo.fecha, String) if campo == "fecha" else getattr(modelo, campo) for campo in CAMPOS_CITA]
+
+
+"""Función para convertir las filas (tuplas en el orden de CitaDTO) en DTO.
+    str(fecha)[:16] da "YYYY-MM-DD HH:MM" tanto con el texto de SQLite como con el datetime de otros drivers"""
+def filas_a_dto(filas):
+    return [CitaDTO(estado, str(fecha)[:16], id_centro, id_cita, id_doctor, id_paciente, id_usuario_registra, motivo)
+            for estado, fecha, id_centro, id_cita, id_doctor, id_paciente, id_usuario_registra, motivo in filas]
+
+
+"""Función para obtener la clave (fecha, id_cita) de una fila para el cursor de paginación"""
+def clave_cursor(fila):
+    fecha = fila[CAMPOS_CITA.index("fecha")]
+    return (fecha if isinstance(fecha, datetime) else datetime.fromisoformat(str(fecha))), fila[CAMPOS_CITA.index("id_cita")]
+
+
+"""Función para serializar a bytes JSON (con salto de línea final, igual que jsonify) datos que pueden contener CitaDTO"""
+def a_json(datos):
+    if orjson is not None:
+        return orjson.dumps(datos, option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(datos, default=dto_a_dict, separators=(",", ":"), sort_keys=True) + "\n").encode()
+
+
+"""Función para convertir un DTO en diccionario (solo se usa sin orjson)"""
+def dto_a_dict(dto):
+    if isinstance(dto, CitaDTO):
+        return {campo: getattr(dto, campo) for campo in CAMPOS_CITA}
+    raise TypeError(f"No se puede serializar {type(dto).__name__}")
+
+
+"""Función para crear la respuesta JSON de Flask con los bytes ya serializados"""
+def respuesta_rapida(datos, estado=200):
+    return current_app.response_class(a_json(datos), status=estado, mimetype="application/json")
@@ -0,0 +1,4 @@
+"""Capa de servicios de OdontoCare.
+
+Contiene la lógica de negocio que se comparte entre los endpoints HTTP de los Blueprints
+y los scripts que trabajan directamente con la base de datos (por ejemplo carga_inicial.py)."""
@@ -0,0 +1,156 @@
+"""Servicio de carga masiva de centros, doctores y pacientes.
+
+En lugar de crear los registros uno a uno (una petición HTTP, dos commits y un hash por fila),
+se validan todos los registros del lote de una vez, se descartan los duplicados en memoria,
+se calculan los hashes de las contraseñas en el pool del servicio de hash y se insertan con INSERT masivos
+dentro de una única transacción."""
+
+from flask import current_app, has_request_context, request
+from jsonschema import Draft7Validator
+from sqlalchemy import insert, select
+
+from extensions import db
+from hashing import servicio_hash
+from models.usuario import Usuario
+from models.centro import Centro
+from servicios.usuarios import insertar_usuarios_con_perfil
+
+"""Esquemas JSON (jsonschema) de cada tipo de registro"""
+
+ESQUEMA_CENTRO = {
+    "type": "object",
+    "required": ["nombre", "direccion"],
+    "properties": {
+        "nombre": {"type": "string", "minLength": 1, "maxLength": 120},
+        "direccion": {"type": "string", "minLength": 1, "maxLength": 200},
+    },
+}
+
+ESQUEMA_DOCTOR = {
+    "type": "object",
+    "required": ["nombre", "especialidad", "username", "password"],
+    "properties": {
+        "nombre": {"type": "string", "minLength": 1, "maxLength": 120},
+        "especialidad": {"type": "string", "minLength": 1, "maxLength": 120},
+        "username": {"type": "string", "minLength": 1, "maxLength": 80},
+        "password": {"type": "string", "minLength": 1},
+    },
+}
+
+ESQUEMA_PACIENTE = {
+    "type": "object",
+    "required": ["nombre", "telefono", "username", "password"],
+    "properties": {
+        "nombre": {"type": "string", "minLength": 1, "maxLength": 120},
+        "telefono": {"type": ["string", "integer"], "minLength": 1, "maxLength": 30},
+        "username": {"type": "string", "minLength": 1, "maxLength": 80},
+        "password": {"type": "string", "minLength": 1},
+        "estado": {"enum": ["ACTIVO", "INACTIVO", "activo", "inactivo", "Activo", "Inactivo", None]},
+    },
+}
+
+# Tamaño de los bloques para las consultas con IN (SQLite limita el número de parámetros por consulta)
+TAMANO_BLOQUE_IN = 500
+
+
+"""Función para validar un lote de registros con un esquema.
+    Devuelve la lista de registros válidos como (indice, registro) y la lista de errores con el índice de la fila"""
+def validar_registros(registros, esquema):
+    validador = Draft7Validator(esquema)
+    validos, errores = [], []
+
+    for indice, registro in enumerate(registros):
+        error = next(validador.iter_errors(registro), None)
+        if error is None:
+            validos.append((indice, registro))
+        else:
+            campo = ".".join(str(p) for p in error.path)
+            errores.append({"indice": indice, "error": f"{campo}: {error.message}" if campo else error.message})
+
+    return validos, errores
+
+
+"""Función para descartar los registros cuyo valor en 'campo' está repetido dentro del lote o ya existe en la base de datos.
+    La comprobación en la base de datos se hace con consultas IN por bloques (no una consulta por fila)"""
+def descartar_duplicados(validos, campo, columna, mensaje):
+    vistos = set()
+    unicos, errores = [], []
+
+    for indice, registro in validos:
+        if registro[campo] in vistos:
+            errores.append({"indice": indice, "error": f"{mensaje} (repetido en el lote)"})
+        else:
+            vistos.add(registro[campo])
+            unicos.append((indice, registro))
+
+    existentes = set()
+    valores = list(vistos)
+    for inicio in range(0, len(valores), TAMANO_BLOQUE_IN):
+        bloque = valores[inicio:inicio + TAMANO_BLOQUE_IN]
+        existentes.update(db.session.execute(select(columna).where(columna.in_(bloque))).scalars())
+
+    if existentes:
+        errores.extend({"indice": indice, "error": mensaje} for indice, registro in unicos if registro[campo] in existentes)
+        unicos = [(indice, registro) for indice, registro in unicos if registro[campo] not in existentes]
+
+    return unicos, errores
+
+
+"""Función para calcular los hashes de las contraseñas en el pool de procesos del servicio de hash (hashing.py).
+    Comparte los procesos, la cola y el límite por IP con los logins: si el servicio está saturado lanza
+    HashSaturadoError (429) o HashTimeoutError (503) en lugar de ocupar más CPU"""
+def hashear_passwords(passwords):
+    ip = request.remote_addr if has_request_context() else None
+    return servicio_hash().generar_lote(passwords, current_app.config.get("PASSWORD_HASH_METHOD"), ip=ip)
+
+
+"""Función para construir el resultado de una carga"""
+def resultado(recibidos, ids, errores):
+    return {"recibidos": recibidos, "creados": len(ids), "ids": ids, "errores": sorted(errores, key=lambda e: e["indice"])}
+
+
+"""Función para importar centros
+    - parcial=False: si hay algún error no se inserta nada (todo o nada)
+    - parcial=True: se insertan los registros válidos y se devuelven los errores del resto
+    No hace commit: quien llama decide cuándo confirmar la transacción"""
+def importar_centros(registros, parcial=False):
+    validos, errores = validar_registros(registros, ESQUEMA_CENTRO)
+    validos, duplicados = descartar_duplicados(validos, "nombre", Centro.nombre, "Ya existe un centro con ese nombre")
+    errores += duplicados
+
+    if (errores and not parcial) or not validos:
+        return resultado(len(registros), [], errores)
+
+    return resultado(len(registros), insertar_centros([r for _, r in validos]), errores)
+
+
+"""Función para insertar centros ya validados y sin duplicados con un INSERT masivo. Devuelve sus IDs en el mismo orden"""
+def insertar_centros(registros):
+    filas = [{"nombre": r["nombre"], "direccion": r["direccion"]} for r in registros]
+    return list(db.session.execute(insert(Centro).returning(Centro.id_centro, sort_by_parameter_order=True), filas).scalars())
+
+
+"""Función común para importar perfiles que llevan un usuario asociado (doctores y pacientes).
+    Se insertan primero todos los usuarios (obteniendo sus IDs con RETURNING) y después todos los perfiles (servicios/usuarios.py)"""
+def importar_con_usuario(registros, esquema, rol, parcial):
+    validos, errores = validar_registros(registros, esquema)
+    validos, duplicados = descartar_duplicados(validos, "username", Usuario.username, "El nombre de usuario ya esta en uso")
+    errores += duplicados
+
+    if (errores and not parcial) or not validos:
+        return resultado(len(registros), [], errores)
+
+    registros_validos = [r for _, r in validos]
+    hashes = hashear_passwords([r["password"] for r in registros_validos])
+    _, ids_perfiles = insertar_usuarios_con_perfil(registros_validos, hashes, rol)
+    return resultado(len(registros), ids_perfiles, errores)
+
+
+"""Función para importar doctores (cada uno con su usuario de rol medico)"""
+def importar_doctores(registros, parcial=False):
+    return importar_con_usuario(registros, ESQUEMA_DOCTOR, "medico", parcial)
+
+
+"""Función para importar pacientes (cada uno con su usuario de rol paciente). Si no se indica estado se usa ACTIVO"""
+def importar_pacientes(registros, parcial=False):
+    return importar_con_usuario(registros, ESQUEMA_PACIENTE, "paciente", parcial)
@@ -0,0 +1,98 @@
+"""Servicio de creación de usuarios y de sus perfiles (doctor o paciente).
+
+Antes crear_doctor y crear_paciente consultaban si el username existía y hacían dos commits, uno para el usuario y otro
+para el perfil: dos escrituras a disco por alta y, si fallaba la segunda, un usuario sin perfil. Ahora:
+    - El usuario y su perfil se crean en una única transacción: flush() del usuario para obtener su ID, el perfil con
+      ese ID y un solo commit, que hace quien llama
+    - No se consulta antes si el username existe: lo garantiza el índice único de usuarios.username. Si el INSERT
+      falla se lanza UsernameEnUso (los endpoints devuelven 409)
+Las cargas masivas (carga_masiva.py e ingesta.py) crean los usuarios y los perfiles con insertar_usuarios_con_perfil,
+que hace lo mismo por lotes con INSERT masivos."""
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.usuario import Usuario
+from models.doctor import Doctor
+from models.paciente import Paciente
+
+
+class UsernameEnUso(Exception):
+    """Error que se lanza cuando el INSERT del usuario falla porque ya existe otro con el mismo username"""
+
+
+"""Funciones para obtener las columnas del perfil de un doctor y de un paciente. Si no se indica estado se usa ACTIVO"""
+def campos_doctor(registro):
+    return {"nombre": registro["nombre"], "especialidad": registro["especialidad"]}
+
+def campos_paciente(registro):
+    return {"nombre": registro["nombre"], "telefono": str(registro["telefono"]), "estado": str(registro.get("estado") or "ACTIVO").upper()}
+
+
+# Perfil de cada rol: modelo, columna del ID y función que obtiene sus columnas. Los demás roles no tienen perfil
+PERFILES = {
+    "medico": (Doctor, Doctor.id_doctor, campos_doctor),
+    "paciente": (Paciente, Paciente.id_paciente, campos_paciente),
+}
+
+
+"""Función para saber si un IntegrityError lo ha causado el índice único de usuarios.username.
+    El mensaje lo da la base de datos: "UNIQUE constraint failed: usuarios.username" en SQLite,
+    "usuarios_username_key" en PostgreSQL y "usuarios.username" en MySQL"""
+def es_username_repetido(error):
+    return "username" in str(error.orig)
+
+
+"""Función para crear un usuario y, si su rol lo tiene, su perfil (doctor o paciente) en la transacción actual.
+    - datos: diccionario con username, password y las columnas del perfil
+    - hash_password: hash ya calculado (si es None se calcula con set_password)
+    Hace flush() para obtener los IDs pero no hace commit: quien llama confirma la transacción con un solo commit.
+    Si el username ya existe lanza UsernameEnUso y quien llama debe hacer rollback. Devuelve (usuario, perfil o None)"""
+def crear_usuario(datos, rol, hash_password=None):
+    usuario = Usuario(username=datos["username"], rol=rol)
+    if hash_password is None:
+        usuario.set_password(datos["password"])
+    else:
+        usuario.password = hash_password
+
+    perfil = None
+    try:
+        # INSERT del usuario para tener su ID (el índice único de username lo comprueba aquí, sin consulta previa)
+        db.session.add(usuario)
+        db.session.flush()
+
+        if rol in PERFILES:
+            modelo, _, campos_perfil = PERFILES[rol]
+            perfil = modelo(**campos_perfil(datos), id_usuario=usuario.id_usuario)
+            db.session.add(perfil)
+            db.session.flush()
+    except IntegrityError as error:
+        if es_username_repetido(error):
+            raise UsernameEnUso(datos["username"]) from error
+        raise
+
+    return usuario, perfil
+
+
+"""Función para insertar usuarios ya validados y sin duplicados con los hashes de sus contraseñas ya calculados.
+    Devuelve sus IDs en el mismo orden"""
+def insertar_usuarios(registros, hashes, rol):
+    filas = [{"username": r["username"], "password": h, "rol": rol} for r, h in zip(registros, hashes)]
+    return list(db.session.execute(insert(Usuario).returning(Usuario.id_usuario, sort_by_parameter_order=True), filas).scalars())
+
+
+"""Función para insertar los perfiles (doctores o pacientes) de los usuarios recién insertados. Devuelve sus IDs en el mismo orden"""
+def insertar_perfiles(registros, ids_usuarios, rol):
+    modelo, columna_id, campos_perfil = PERFILES[rol]
+    filas = [{**campos_perfil(r), "id_usuario": id_usuario} for r, id_usuario in zip(registros, ids_usuarios)]
+    return list(db.session.execute(insert(modelo).returning(columna_id, sort_by_parameter_order=True), filas).scalars())
+
+
+"""Función para crear por lotes usuarios y sus perfiles (la versión masiva de crear_usuario) con dos INSERT masivos.
+    Los registros ya están validados y sin usernames repetidos. No hace commit.
+    Devuelve los IDs de los usuarios y los de los perfiles (None si el rol no tiene perfil), en el mismo orden"""
+def insertar_usuarios_con_perfil(registros, hashes, rol):
+    ids_usuarios = insertar_usuarios(registros, hashes, rol)
+    ids_perfiles = insertar_perfiles(registros, ids_usuarios, rol) if rol in PERFILES else None
+    return ids_usuarios, ids_perfiles
@@ -0,0 +1,39 @@
+"""Configuración común de las pruebas con pytest.
+
+Los módulos de la app se importan por su nombre (app, extensions, benchmarks.comun...) como cuando se ejecuta
+desde la carpeta odontocare, así que se añade esa carpeta al path aunque pytest se lance desde la raíz del repositorio.
+
+Uso:
+    python -m pytest -q odontocare/tests
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+CARPETA_ODONTOCARE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if CARPETA_ODONTOCARE not in sys.path:
+    sys.path.insert(0, CARPETA_ODONTOCARE)
+
+
+"""Fixture para crear apps con base de datos temporal (benchmarks.comun.crear_app_temporal) y borrarlas al terminar.
+    HASH_WORKERS=0: sin pool de procesos para el hash, que retendría el proceso de pytest al terminar"""
+@pytest.fixture
+def crear_app():
+    from benchmarks.comun import crear_app_temporal
+
+    apps = []
+
+    def crear(config_extra=None):
+        app = crear_app_temporal({"HASH_WORKERS": 0, **(config_extra or {})})
+        apps.append(app)
+        return app
+
+    yield crear
+    for app in apps:
+        # Escribir los eventos de auditoría pendientes antes de borrar la base de datos temporal
+        if app.extensions.get("auditoria") is not None:
+            app.extensions["auditoria"].cerrar()
+        shutil.rmtree(os.path.dirname(app.config["SQLALCHEMY_DATABASE_URI"].removeprefix("sqlite:///")), ignore_errors=True)
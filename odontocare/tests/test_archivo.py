@@ -0,0 +1,32 @@
+"""Pruebas del archivo de citas (archivo.py): un hueco de una cita archivada no se puede volver a reservar."""
+
+from datetime import datetime
+
+from extensions import db
+from archivo import archivar_citas
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+CITA_PASADA = {"fecha": "2024-01-01 10:00", "motivo": "Archivo", "id_doctor": 1, "id_centro": 1, "id_paciente": 1}
+
+
+def test_hueco_archivado_no_se_puede_reservar(crear_app):
+    app = crear_app()
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+
+    # Dos citas pasadas: la primera se archiva (la de id_cita más alto nunca se archiva)
+    assert cliente.post("/citas/citas", json=CITA_PASADA, headers=headers).status_code == 201
+    assert cliente.post("/citas/citas", json={**CITA_PASADA, "fecha": "2024-01-01 10:30"}, headers=headers).status_code == 201
+    with app.app_context():
+        assert archivar_citas(datetime(2024, 1, 1, 10, 15)) == 1
+        db.session.remove()
+
+    # Reserva individual y por lotes del hueco archivado: conflicto
+    respuesta = cliente.post("/citas/citas", json=CITA_PASADA, headers=headers)
+    assert respuesta.status_code == 409
+    lote = {"id_paciente": 1, "citas": [{**CITA_PASADA}, {**CITA_PASADA, "fecha": "2024-01-01 11:00"}]}
+    respuesta = cliente.post("/citas/citas/batch", json=lote, headers=headers)
+    assert respuesta.status_code == 207
+    assert [resultado["status"] for resultado in respuesta.get_json()["resultados"]] == [409, 201]
@@ -0,0 +1,90 @@
+"""Pruebas de la cola de auditoría (auditoria.py): al cerrar se escriben los eventos pendientes, con la cola llena
+las peticiones escriben su propio evento (contrapresión) y un fallo del destino no hace fallar la petición."""
+
+import threading
+import time
+
+from auditoria import ColaAuditoria
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+
+class DestinoLista:
+    """
+    Destino de prueba: guarda los eventos en una lista, esperando 'retardo' segundos en cada escritura
+    """
+
+    def __init__(self, retardo=0):
+        self.retardo = retardo
+        self.eventos = []
+
+    def escribir(self, eventos):
+        time.sleep(self.retardo)
+        self.eventos.extend(eventos)
+
+
+class DestinoRoto:
+    """
+    Destino de prueba que siempre falla (base de datos bloqueada, disco lleno...)
+    """
+
+    def escribir(self, eventos):
+        raise OSError("Disco lleno")
+
+
+"""Función para construir un evento de prueba"""
+def evento(numero):
+    return {"fecha": "2030-01-01T10:00:00", "tipo": "prueba", "id_usuario": None, "rol": None, "ip": None,
+            "objeto": "prueba", "id_objeto": numero, "datos": None}
+
+
+def test_cerrar_escribe_los_eventos_pendientes():
+    destino = DestinoLista()
+    # Intervalo largo: sin el aviso de cierre el hilo esperaría para completar el último lote
+    cola = ColaAuditoria(destino, cola_max=100, lote=10, intervalo=30, espera=1, cierre=5)
+    for numero in range(25):
+        cola.registrar(evento(numero))
+
+    inicio = time.monotonic()
+    cola.cerrar()
+    assert time.monotonic() - inicio < 5
+    assert [e["id_objeto"] for e in destino.eventos] == list(range(25))
+    assert cola.estadisticas() == {"pendientes": 0, "escritos": 25, "lotes": 3, "sincronos": 0, "perdidos": 0}
+
+    # Después del cierre los eventos se escriben directamente
+    cola.registrar(evento(25))
+    assert len(destino.eventos) == 26
+    assert cola.sincronos == 1
+
+
+def test_contrapresion_con_la_cola_llena():
+    destino = DestinoLista(retardo=0.05)
+    cola = ColaAuditoria(destino, cola_max=2, lote=1, intervalo=0.01, espera=0.01, cierre=5)
+    hilos = [threading.Thread(target=cola.registrar, args=(evento(numero),)) for numero in range(20)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    # Con la cola llena las peticiones escriben su evento ellas mismas: la cola no pasa de cola_max y no se pierde nada
+    assert cola.sincronos > 0
+    cola.cerrar()
+    assert sorted(e["id_objeto"] for e in destino.eventos) == list(range(20))
+    assert cola.escritos + cola.sincronos == 20
+    assert cola.perdidos == 0
+
+
+def test_fallo_del_destino_no_falla_la_peticion(crear_app):
+    # Sin cola: cada petición escribe su propio evento después del commit
+    app = crear_app({"AUDITORIA_DESTINO": "tabla", "AUDITORIA_COLA_MAX": 0})
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+    cola = app.extensions["auditoria"]
+    cola.destino = DestinoRoto()
+
+    cita = {"fecha": "2030-01-01 10:00", "motivo": "Auditoria", "id_doctor": 1, "id_centro": 1, "id_paciente": 1}
+    respuesta = cliente.post("/citas/citas", json=cita, headers=headers)
+    assert respuesta.status_code == 201
+    assert cola.estadisticas()["perdidos"] == 1
+    assert len(cliente.get("/citas/citas?limit=10", headers=headers).get_json()["citas"]) == 1
@@ -0,0 +1,50 @@
+"""Pruebas de POST /citas/citas/batch: 201 si se crean todas las citas, 207 si alguna tiene conflicto (con una cita
+ya guardada o con otra del mismo lote) y el código común de los errores si no se crea ninguna."""
+
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+
+"""Función para construir una cita del lote con el doctor 1 en el centro 1"""
+def cita(fecha):
+    return {"fecha": fecha, "motivo": "Batch", "id_doctor": 1, "id_centro": 1}
+
+
+"""Función para preparar una app con catálogo y devolver (cliente, headers del admin)"""
+def preparar(crear_app):
+    app = crear_app()
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+    return cliente, headers_admin(cliente)
+
+
+def test_batch_todas_creadas(crear_app):
+    cliente, headers = preparar(crear_app)
+    respuesta = cliente.post("/citas/citas/batch", headers=headers,
+                             json={"id_paciente": 1, "citas": [cita("2030-01-01 10:00"), cita("2030-01-01 10:30")]})
+
+    assert respuesta.status_code == 201
+    cuerpo = respuesta.get_json()
+    assert cuerpo["creadas"] == 2
+    assert [item["status"] for item in cuerpo["resultados"]] == [201, 201]
+
+
+def test_batch_con_conflictos(crear_app):
+    cliente, headers = preparar(crear_app)
+    ocupada = {**cita("2030-01-01 10:00"), "id_paciente": 1}
+    assert cliente.post("/citas/citas", json=ocupada, headers=headers).status_code == 201
+
+    # La primera choca con la cita guardada y la tercera con la segunda del mismo lote
+    lote = [cita("2030-01-01 10:00"), cita("2030-01-01 11:00"), cita("2030-01-01 11:00")]
+    respuesta = cliente.post("/citas/citas/batch", json={"id_paciente": 1, "citas": lote}, headers=headers)
+
+    assert respuesta.status_code == 207
+    cuerpo = respuesta.get_json()
+    assert cuerpo["creadas"] == 1
+    assert [(item["indice"], item["status"]) for item in cuerpo["resultados"]] == [(0, 409), (1, 201), (2, 409)]
+    assert cuerpo["resultados"][1]["Cita"]["fecha"].startswith("2030-01-01")
+
+    # Todas en conflicto: ninguna creada y el código común (409)
+    respuesta = cliente.post("/citas/citas/batch", json={"id_paciente": 1, "citas": lote[:2]}, headers=headers)
+    assert respuesta.status_code == 409
+    assert respuesta.get_json()["creadas"] == 0
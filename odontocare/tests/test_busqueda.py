@@ -0,0 +1,25 @@
+"""Pruebas de la búsqueda de pacientes (busqueda.py): con un nombre común, el nombre exacto aparece el primero aunque
+tenga un id alto y no esté entre las primeras BUSQUEDA_CANDIDATOS coincidencias en orden de id."""
+
+from sqlalchemy import insert
+
+from extensions import db
+from models.paciente import Paciente
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+
+def test_nombre_exacto_con_id_alto(crear_app):
+    app = crear_app({"BUSQUEDA_CANDIDATOS": 5})
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+        parecidos = [{"id_paciente": i, "nombre": f"María García Apellido{i}", "telefono": "600000000", "estado": "ACTIVO"}
+                     for i in range(2, 30)]
+        db.session.execute(insert(Paciente), parecidos + [{"id_paciente": 30, "nombre": "María García", "telefono": "600000000", "estado": "ACTIVO"}])
+        db.session.commit()
+    cliente = app.test_client()
+
+    respuesta = cliente.get("/admin/pacientes/buscar?q=maria garcia&limit=3", headers=headers_admin(cliente))
+    assert respuesta.status_code == 200
+    nombres = [paciente["nombre"] for paciente in respuesta.get_json()]
+    assert len(nombres) == 3
+    assert nombres[0] == "María García"
@@ -0,0 +1,37 @@
+"""Pruebas de la caché del catálogo (cache.py): un almacén compartido incompleto falla al crearlo y AlmacenSQLite
+comparte los valores entre instancias sobre el mismo archivo."""
+
+import os
+
+import pytest
+
+from cache import AlmacenCompartido, AlmacenSQLite, NO_ENCONTRADO
+
+
+class AlmacenSinBorrado(AlmacenCompartido):
+    """Almacén al que le faltan delete y clear"""
+
+    def get(self, clave):
+        return NO_ENCONTRADO
+
+    def set(self, clave, valor, ttl):
+        pass
+
+    def set_si_no_existe(self, clave, valor, ttl):
+        return True
+
+
+def test_almacen_incompleto_falla_al_crearlo():
+    with pytest.raises(TypeError):
+        AlmacenSinBorrado()
+
+
+def test_almacen_sqlite_compartido(tmp_path):
+    ruta = os.path.join(tmp_path, "cache.db")
+    uno, otro = AlmacenSQLite(ruta), AlmacenSQLite(ruta)
+
+    uno.set("doctor:1", {"nombre": "Ana"}, 60)
+    assert otro.get("doctor:1") == {"nombre": "Ana"}
+    assert not otro.set_si_no_existe("doctor:1", {"nombre": "Otra"}, 60)
+    otro.delete("doctor:1")
+    assert uno.get("doctor:1") is NO_ENCONTRADO
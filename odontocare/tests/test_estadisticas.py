@@ -0,0 +1,46 @@
+"""Pruebas de los contadores de estadisticas_citas (estadisticas.py): después de agendar (una a una y por lotes) y cancelar
+citas, los contadores mantenidos en cada transacción son los mismos que calcula reconstruir_estadisticas desde cero,
+también con particiones de citas."""
+
+import pytest
+
+from particiones import sesiones_citas
+from estadisticas import reconstruir_estadisticas
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+
+"""Función para leer las estadísticas por día, doctor y centro con GET /citas/estadisticas"""
+def leer_estadisticas(cliente, headers):
+    respuesta = cliente.get("/citas/estadisticas", headers=headers)
+    assert respuesta.status_code == 200
+    return respuesta.get_json()
+
+
+@pytest.mark.parametrize("particiones", [0, 2])
+def test_contadores_iguales_a_la_reconstruccion(crear_app, particiones):
+    app = crear_app({"CITAS_PARTICIONES": particiones})
+    with app.app_context():
+        sembrar_catalogo(2, 2, 1)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+
+    ids = []
+    for fecha, id_doctor, id_centro in [("2030-01-01 10:00", 1, 1), ("2030-01-01 10:30", 1, 2), ("2030-01-02 10:00", 2, 1)]:
+        cita = {"fecha": fecha, "motivo": "Estadisticas", "id_doctor": id_doctor, "id_centro": id_centro, "id_paciente": 1}
+        respuesta = cliente.post("/citas/citas", json=cita, headers=headers)
+        assert respuesta.status_code == 201
+        ids.append(respuesta.get_json()["Cita"]["id_cita"])
+    lote = [{"fecha": "2030-01-01 11:00", "motivo": "Lote", "id_doctor": 2, "id_centro": 2},
+            {"fecha": "2030-01-01 11:30", "motivo": "Lote", "id_doctor": 2, "id_centro": 2}]
+    assert cliente.post("/citas/citas/batch", json={"id_paciente": 1, "citas": lote}, headers=headers).status_code == 201
+    for id_cita in ids[:2]:
+        assert cliente.put(f"/citas/citas/{id_cita}", headers=headers).status_code == 200
+
+    mantenidas = leer_estadisticas(cliente, headers)
+    assert mantenidas["total"] == {"activas": 3, "canceladas": 2}
+
+    with app.app_context():
+        for sesion in sesiones_citas():
+            reconstruir_estadisticas(sesion)
+            sesion.commit()
+    assert leer_estadisticas(cliente, headers) == mantenidas
@@ -0,0 +1,53 @@
+"""Pruebas de los brokers de eventos de GET /citas/stream (eventos.py): la interfaz Broker y la rotación del archivo
+compartido de BrokerFichero sin perder eventos ni repetir ids."""
+
+import os
+import time
+
+import pytest
+
+from eventos import Broker, BrokerFichero, BusLocal
+
+
+class BrokerSinSuscribir(Broker):
+    """Broker al que le falta suscribir"""
+
+    def publicar(self, tipo, datos):
+        pass
+
+
+def test_broker_incompleto_falla_al_crearlo():
+    with pytest.raises(TypeError):
+        BrokerSinSuscribir()
+
+
+def test_broker_fichero_rota_sin_perder_eventos(tmp_path):
+    ruta = os.path.join(tmp_path, "eventos.jsonl")
+    # Dos brokers sobre el mismo archivo, como dos workers de gunicorn
+    brokers = [BrokerFichero(ruta, BusLocal(tamano_cola=1000), intervalo=0.01, max_bytes=300) for _ in range(2)]
+    suscripciones = [broker.suscribir() for broker in brokers]
+    try:
+        for i in range(60):
+            brokers[i % 2].publicar("cita_creada", {"id_cita": i})
+            time.sleep(0.01)
+        time.sleep(0.3)
+
+        for suscripcion in suscripciones:
+            eventos = []
+            while (evento := suscripcion.siguiente(0.05)) is not None:
+                eventos.append(evento)
+            # Cada proceso recibe todos los eventos, en orden y con ids crecientes aunque el archivo se haya rotado
+            assert [evento["datos"]["id_cita"] for evento in eventos] == list(range(60))
+            ids = [evento["id"] for evento in eventos]
+            assert ids == sorted(set(ids))
+
+        # El archivo no crece más allá del tamaño de rotación (más la última línea)
+        assert os.path.exists(f"{ruta}.1")
+        assert os.path.getsize(ruta) < 300 + 100
+
+        # Al reconectar se reenvían los eventos posteriores al último recibido
+        reconexion = brokers[0].suscribir(desde_id=ids[49])
+        assert [reconexion.siguiente(0.05)["datos"]["id_cita"] for _ in range(10)] == list(range(50, 60))
+    finally:
+        for broker in brokers:
+            broker.cerrar()
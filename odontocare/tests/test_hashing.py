@@ -0,0 +1,43 @@
+"""Pruebas del servicio de hash (hashing.py) en las cargas masivas: los hashes del lote se calculan en el pool de procesos
+del servicio y, si el servicio está saturado, POST /admin/bulk responde 429 sin crear nada."""
+
+from werkzeug.security import check_password_hash
+
+from hashing import ServicioHash, TROZO_LOTE
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+METODO = "pbkdf2:sha256:1000"
+
+
+def test_generar_lote_en_el_pool():
+    servicio = ServicioHash(workers=2, cola_max=4, max_por_usuario=2, max_por_ip=1, timeout=30)
+    passwords = [f"clave{i}" for i in range(TROZO_LOTE * 3 + 1)]
+    try:
+        hashes = servicio.generar_lote(passwords, METODO, ip="10.0.0.1")
+    finally:
+        servicio.cerrar()
+
+    assert len(hashes) == len(passwords)
+    assert all(h.startswith(METODO) and check_password_hash(h, p) for h, p in zip(hashes, passwords))
+
+
+def test_carga_masiva_con_el_servicio_saturado(crear_app):
+    app = crear_app({"PASSWORD_HASH_METHOD": METODO})
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+    doctores = [{"nombre": f"Doctor {i}", "especialidad": "General", "username": f"bulk{i}", "password": "secreto"} for i in range(3)]
+
+    # Sin hueco en la cola del servicio: la carga no calcula los hashes por su cuenta
+    app.extensions["servicio_hash"] = ServicioHash(workers=0, cola_max=0, max_por_usuario=1, max_por_ip=1, timeout=1)
+    respuesta = cliente.post("/admin/bulk/doctores", json=doctores, headers=headers)
+    assert respuesta.status_code == 429
+
+    # Con hueco se crean todos con hashes del método configurado
+    app.extensions["servicio_hash"] = ServicioHash(workers=0, cola_max=1, max_por_usuario=1, max_por_ip=1, timeout=1)
+    respuesta = cliente.post("/admin/bulk/doctores", json=doctores, headers=headers)
+    assert respuesta.status_code == 201
+    assert respuesta.get_json()["creados"] == 3
+    login = cliente.post("/auth/login", json={"username": "bulk2", "password": "secreto"})
+    assert login.status_code == 200
@@ -0,0 +1,89 @@
+"""Pruebas de la cabecera Idempotency-Key (idempotencia.py): la repetición recibe la respuesta guardada sin volver a
+ejecutar el endpoint, la misma clave con otra petición devuelve 422 y una clave en curso devuelve 409, con la caché
+local y con el almacén compartido entre procesos. Las respuestas 429 no se guardan."""
+
+import time
+
+import pytest
+
+from hashing import ServicioHash
+from idempotencia import huella_peticion, registro_idempotencia
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+CITA = {"fecha": "2030-01-01 10:00", "motivo": "Idempotencia", "id_doctor": 1, "id_centro": 1, "id_paciente": 1}
+
+
+"""Función para preparar una app (con la caché local o con un almacén compartido) y devolver (app, cliente, id_admin, headers)"""
+def preparar(crear_app, compartida, tmp_path):
+    app = crear_app({"IDEMPOTENCIA_COMPARTIDA": str(tmp_path / "idempotencia.db") if compartida else ""})
+    with app.app_context():
+        id_admin = sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+    return app, cliente, id_admin, headers_admin(cliente)
+
+
+@pytest.mark.parametrize("compartida", [False, True])
+def test_repeticion_con_la_respuesta_guardada(crear_app, compartida, tmp_path):
+    app, cliente, _, headers = preparar(crear_app, compartida, tmp_path)
+    headers = {**headers, "Idempotency-Key": "reserva-1"}
+
+    primera = cliente.post("/citas/citas", json=CITA, headers=headers)
+    assert primera.status_code == 201
+    assert "Idempotent-Replayed" not in primera.headers
+
+    # Mismo cuerpo con otro orden de claves: es la misma petición. Sin idempotencia sería un 409 por la cita ya guardada
+    repetida = cliente.post("/citas/citas", json=dict(reversed(list(CITA.items()))), headers=headers)
+    assert repetida.status_code == 201
+    assert repetida.headers["Idempotent-Replayed"] == "true"
+    assert repetida.get_json() == primera.get_json()
+    with app.app_context():
+        assert registro_idempotencia().repeticiones == 1
+
+    assert len(cliente.get("/citas/citas?limit=10", headers=headers).get_json()["citas"]) == 1
+
+    # Otra clave ejecuta la petición: la franja ya está ocupada
+    otra = cliente.post("/citas/citas", json=CITA, headers={**headers, "Idempotency-Key": "reserva-2"})
+    assert otra.status_code == 409
+
+
+@pytest.mark.parametrize("compartida", [False, True])
+def test_misma_clave_con_otra_peticion(crear_app, compartida, tmp_path):
+    _, cliente, _, headers = preparar(crear_app, compartida, tmp_path)
+    headers = {**headers, "Idempotency-Key": "reserva-1"}
+
+    assert cliente.post("/citas/citas", json=CITA, headers=headers).status_code == 201
+    respuesta = cliente.post("/citas/citas", json={**CITA, "fecha": "2030-01-01 11:00"}, headers=headers)
+    assert respuesta.status_code == 422
+    assert "error" in respuesta.get_json()
+
+
+@pytest.mark.parametrize("compartida", [False, True])
+def test_clave_en_curso(crear_app, compartida, tmp_path):
+    app, cliente, id_admin, headers = preparar(crear_app, compartida, tmp_path)
+    headers = {**headers, "Idempotency-Key": "reserva-1"}
+
+    # Reserva de una primera petición que todavía se está ejecutando (en otro hilo o en otro proceso)
+    with app.test_request_context("/citas/citas", method="POST", json=CITA):
+        registro_idempotencia().reservar(f"idempotencia:{id_admin}:reserva-1", {"huella": huella_peticion(), "inicio": time.time()})
+
+    respuesta = cliente.post("/citas/citas", json=CITA, headers=headers)
+    assert respuesta.status_code == 409
+    assert respuesta.headers["Retry-After"] == "1"
+    assert cliente.get("/citas/citas?limit=10", headers=headers).get_json()["citas"] == []
+
+
+def test_respuestas_transitorias_no_se_guardan(crear_app, tmp_path):
+    app, cliente, _, headers = preparar(crear_app, False, tmp_path)
+    headers = {**headers, "Idempotency-Key": "carga-1"}
+    doctores = [{"nombre": "Doctor Carga", "especialidad": "General", "username": "carga1", "password": "secreto"}]
+
+    # 429 con el servicio de hash saturado: no se guarda y el reintento con la misma clave se ejecuta
+    app.extensions["servicio_hash"] = ServicioHash(workers=0, cola_max=0, max_por_usuario=1, max_por_ip=1, timeout=1)
+    assert cliente.post("/admin/bulk/doctores", json=doctores, headers=headers).status_code == 429
+    app.extensions["servicio_hash"] = ServicioHash(workers=0, cola_max=1, max_por_usuario=1, max_por_ip=1, timeout=1)
+    respuesta = cliente.post("/admin/bulk/doctores", json=doctores, headers=headers)
+    assert respuesta.status_code == 201
+    assert "Idempotent-Replayed" not in respuesta.headers
+
+    # El 201 sí se guarda
+    assert cliente.post("/admin/bulk/doctores", json=doctores, headers=headers).headers["Idempotent-Replayed"] == "true"
@@ -0,0 +1,26 @@
+"""Pruebas del comando flask ingestar (ingesta.py) con archivos que no se pueden leer: error claro y nada procesado."""
+
+import os
+
+import pytest
+
+import ingesta
+
+
+@pytest.mark.parametrize("nombre, sin_openpyxl, mensaje", [
+    ("exportacion.txt", False, "Formato de archivo no soportado: .txt"),
+    ("exportacion.xlsx", True, "Para leer archivos XLSX hace falta openpyxl"),
+])
+def test_ingestar_formato_no_soportado(crear_app, tmp_path, monkeypatch, nombre, sin_openpyxl, mensaje):
+    app = crear_app()
+    if sin_openpyxl:
+        monkeypatch.setattr(ingesta, "openpyxl", None)
+    archivo = tmp_path / nombre
+    archivo.write_bytes(b"tipo;nombre\n")
+
+    resultado = app.test_cli_runner().invoke(args=["ingestar", str(archivo)])
+
+    assert resultado.exit_code == 1
+    assert mensaje in resultado.output
+    assert resultado.exception is None or isinstance(resultado.exception, SystemExit)
+    assert not os.path.exists(str(archivo) + ".rechazos.jsonl")
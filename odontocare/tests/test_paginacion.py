@@ -0,0 +1,59 @@
+"""Pruebas de la paginación por cursor (keyset) de GET /citas/citas (paginacion.py): recorrer todas las páginas
+devuelve cada cita una sola vez en orden (fecha, id_cita), y un cursor o un limit inválidos responden 400."""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from paginacion import codificar_cursor, decodificar_cursor
+from benchmarks.comun import sembrar_catalogo, sembrar_citas, headers_admin
+
+
+def test_cursor_ida_y_vuelta():
+    fecha = datetime(2030, 1, 1, 10, 30)
+    assert decodificar_cursor(codificar_cursor(fecha, 42)) == (fecha, 42)
+
+
+def test_recorrer_todas_las_paginas(crear_app):
+    # 4 doctores: cada franja de 30 minutos tiene 4 citas con la misma fecha, el orden lo decide id_cita
+    app = crear_app()
+    with app.app_context():
+        id_admin = sembrar_catalogo(2, 4, 10)
+        sembrar_citas(25, id_admin, 2, 4, 10)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+
+    vistas = []
+    cursor = None
+    while True:
+        url = "/citas/citas?limit=7" + (f"&cursor={cursor}" if cursor else "")
+        respuesta = cliente.get(url, headers=headers)
+        assert respuesta.status_code == 200
+        pagina = respuesta.get_json()
+        assert len(pagina["citas"]) <= 7
+        vistas += [(cita["fecha"], cita["id_cita"]) for cita in pagina["citas"]]
+        cursor = pagina["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(vistas) == 25
+    assert len({id_cita for _, id_cita in vistas}) == 25
+    assert vistas == sorted(vistas)
+
+    # El streaming NDJSON devuelve las mismas citas en el mismo orden
+    respuesta = cliente.get("/citas/citas?formato=ndjson", headers=headers)
+    lineas = [json.loads(linea) for linea in respuesta.get_data(as_text=True).splitlines()]
+    assert [cita["id_cita"] for cita in lineas] == [id_cita for _, id_cita in vistas]
+
+
+@pytest.mark.parametrize("parametros", ["cursor=no-es-un-cursor", "cursor=W10=", "limit=0", "limit=abc"])
+def test_cursor_o_limit_invalido(crear_app, parametros):
+    app = crear_app()
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+
+    respuesta = cliente.get(f"/citas/citas?{parametros}", headers=headers_admin(cliente))
+    assert respuesta.status_code == 400
+    assert "error" in respuesta.get_json()
@@ -0,0 +1,118 @@
+"""Pruebas del particionado de citas (particiones.py, CITAS_PARTICIONES): reservas simultáneas del mismo doctor desde
+centros distintos, el movimiento de las citas de la base de datos principal a sus particiones, la exportación analítica
+con las citas repartidas y la instrumentación de las consultas a las particiones."""
+
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, insert, select
+
+from app import create_app
+from extensions import db
+from migraciones import migrar_base_datos
+from models.cita import Cita
+from particiones import RANGO_IDS, particiones, repartir_citas_existentes, sesion_particion, sesiones_citas
+from analitica import leer_snapshot
+from benchmarks.comun import sembrar_catalogo, sembrar_citas, headers_admin
+
+HILOS = 8
+
+
+def test_reservas_simultaneas_mismo_doctor_en_varios_centros(crear_app):
+    # Con 2 particiones los centros 1 y 2 caerían en particiones distintas si se repartiera por centro
+    app = crear_app({"CITAS_PARTICIONES": 2, "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 60}}})
+    with app.app_context():
+        sembrar_catalogo(2, 1, 1)
+    headers = headers_admin(app.test_client())
+    barrera = threading.Barrier(HILOS)
+
+    def reservar(i):
+        cliente = app.test_client()
+        cita = {"fecha": "2030-01-01 10:00", "motivo": "Particiones", "id_doctor": 1, "id_centro": i % 2 + 1, "id_paciente": 1}
+        barrera.wait()
+        return cliente.post("/citas/citas", json=cita, headers=headers).status_code
+
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        codigos = Counter(pool.map(reservar, range(HILOS)))
+
+    assert codigos == {201: 1, 409: HILOS - 1}
+    with app.app_context():
+        assert particiones().de_doctor(1) == 1
+
+
+def test_particionar_citas_reanudable(crear_app):
+    # Citas en la base de datos principal (sin particiones)
+    app = crear_app()
+    with app.app_context():
+        id_admin = sembrar_catalogo(2, 4, 10)
+        sembrar_citas(50, id_admin, 2, 4, 10)
+
+    # La misma base de datos con 2 particiones
+    app_particiones = create_app({"SQLALCHEMY_DATABASE_URI": app.config["SQLALCHEMY_DATABASE_URI"], "CITAS_PARTICIONES": 2,
+                                  "HASH_WORKERS": 0, "AUDITORIA_DESTINO": ""})
+    with app_particiones.app_context():
+        migrar_base_datos()
+
+        # Una ejecución anterior interrumpida: el primer lote ya se copió a su partición pero no se borró de la principal
+        primeras = db.session.execute(select(Cita.__table__).order_by(Cita.id_cita).limit(10)).mappings().all()
+        for fila in primeras:
+            sesion = sesion_particion(particiones().de_doctor(fila["id_doctor"]))
+            sesion.execute(insert(Cita.__table__), [dict(fila)])
+            sesion.commit()
+
+        assert repartir_citas_existentes(lote=7) == {"citas": 50, "citas_archivo": 0}
+
+        # Cada cita está una sola vez, en la partición de su doctor, y la principal queda vacía
+        assert db.session.scalar(select(func.count()).select_from(Cita)) == 0
+        ids = []
+        for particion, sesion in enumerate(sesiones_citas()):
+            for id_cita, id_doctor in sesion.execute(select(Cita.id_cita, Cita.id_doctor)).all():
+                assert particiones().de_doctor(id_doctor) == particion
+                ids.append(id_cita)
+        assert sorted(ids) == list(range(1, 51))
+
+
+def test_snapshot_analitico_lee_todas_las_particiones(crear_app):
+    # 4 citas en la base de datos principal de antes de particionar, que aún no se han movido con particionar-citas
+    app_principal = crear_app()
+    with app_principal.app_context():
+        id_admin = sembrar_catalogo(1, 2, 2)
+        sembrar_citas(4, id_admin, 1, 2, 2)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": app_principal.config["SQLALCHEMY_DATABASE_URI"], "CITAS_PARTICIONES": 2,
+                      "HASH_WORKERS": 0, "AUDITORIA_DESTINO": ""})
+    with app.app_context():
+        migrar_base_datos()
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+    ids_particiones = []
+    for id_doctor in [1, 2]:
+        cita = {"fecha": "2030-01-01 10:00", "motivo": "Analitica", "id_doctor": id_doctor, "id_centro": 1, "id_paciente": 1}
+        respuesta = cliente.post("/citas/citas", json=cita, headers=headers)
+        assert respuesta.status_code == 201
+        ids_particiones.append(respuesta.get_json()["Cita"]["id_cita"])
+
+    with app.app_context(), db.engine.connect() as conexion:
+        citas = leer_snapshot(conexion)["citas"]
+
+    # Las citas de la principal y las de ambas particiones, con los ids de las particiones intactos (int64)
+    assert len(citas) == 6
+    assert str(citas["id_cita"].dtype) == "int64"
+    assert max(ids_particiones) >= RANGO_IDS
+    assert set(ids_particiones) <= set(citas["id_cita"])
+
+
+def test_instrumentacion_cuenta_las_consultas_de_las_particiones(crear_app, caplog):
+    # Umbral de N+1 en 2: la misma consulta de listar_citas en las 2 particiones solo avisa si se cuentan ambas
+    app = crear_app({"CITAS_PARTICIONES": 2, "INSTRUMENTACION": True, "INSTRUMENTACION_N1_UMBRAL": 2})
+    with app.app_context():
+        sembrar_catalogo(1, 2, 1)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+
+    with caplog.at_level(logging.WARNING, logger="instrumentacion"):
+        respuesta = cliente.get("/citas/citas?limit=5", headers=headers)
+    assert respuesta.status_code == 200
+    assert any("Posible N+1" in mensaje and "citas.id_cita" in mensaje for mensaje in caplog.messages)
+    assert 'desc="0 consultas"' not in respuesta.headers["Server-Timing"]
@@ -0,0 +1,78 @@
+"""Pruebas de los claims del token y de @role_required (decoradores.py): el login guarda en el token el rol y los ids
+del perfil, los permisos se comprueban con el token sin consultar la base de datos y un rol no permitido recibe 403."""
+
+from flask_jwt_extended import create_access_token, decode_token
+from sqlalchemy import event
+
+from extensions import db
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+DOCTOR = {"nombre": "Doctor Roles", "especialidad": "Ortodoncia", "username": "doctor_roles", "password": "secreto"}
+
+
+"""Función para crear un doctor con el admin y devolver (id_usuario, id_doctor, headers del doctor)"""
+def crear_doctor(cliente):
+    respuesta = cliente.post("/admin/doctores", json=DOCTOR, headers=headers_admin(cliente))
+    assert respuesta.status_code == 201
+    datos = respuesta.get_json()
+    login = cliente.post("/auth/login", json={"username": DOCTOR["username"], "password": DOCTOR["password"]})
+    token = login.get_json()["access_token"]
+    return datos["usuario"]["id_usuario"], datos["doctor"]["id_doctor"], token
+
+
+def test_claims_del_token(crear_app):
+    app = crear_app()
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    id_usuario, id_doctor, token = crear_doctor(app.test_client())
+
+    with app.app_context():
+        claims = decode_token(token)
+    assert claims["sub"] == str(id_usuario)
+    assert claims["rol"] == "medico"
+    assert claims["id_doctor"] == id_doctor
+    assert claims["id_paciente"] is None
+
+
+def test_role_required_con_el_rol_del_token(crear_app):
+    app = crear_app()
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+    _, _, token = crear_doctor(cliente)
+
+    # Contar las sentencias SQL de la petición: el rol se lee del token
+    sentencias = []
+    with app.app_context():
+        motor = db.engine
+
+    def escuchar(conexion, cursor, sentencia, *args):
+        sentencias.append(sentencia)
+
+    event.listen(motor, "before_cursor_execute", escuchar)
+    try:
+        respuesta = cliente.post("/admin/centros", json={"nombre": "Centro", "direccion": "Calle"},
+                                 headers={"Authorization": f"Bearer {token}"})
+    finally:
+        event.remove(motor, "before_cursor_execute", escuchar)
+    assert respuesta.status_code == 403
+    assert respuesta.get_json() == {"error": "No tienes permisos para crear centros medicos"}
+    assert sentencias == []
+
+    # El admin sí puede
+    respuesta = cliente.post("/admin/centros", json={"nombre": "Centro", "direccion": "Calle"}, headers=headers_admin(cliente))
+    assert respuesta.status_code == 201
+
+
+def test_token_sin_claims_lee_el_rol_de_la_base_de_datos(crear_app):
+    app = crear_app()
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+    id_usuario, _, _ = crear_doctor(cliente)
+
+    # Token emitido antes de añadir los claims: solo la identidad
+    with app.app_context():
+        token = create_access_token(identity=str(id_usuario))
+    respuesta = cliente.get("/admin/cache", headers={"Authorization": f"Bearer {token}"})
+    assert respuesta.status_code == 403
@@ -0,0 +1,52 @@
+"""Pruebas de los PRAGMA de SQLite (extensions.init_sqlite_pragmas) con cada journal_mode soportado:
+que cada conexión nueva recibe la configuración y que la doble reserva sigue impidiéndose con reservas concurrentes."""
+
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import text
+
+from extensions import db
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+MODOS = [("WAL", "NORMAL", 1), ("DELETE", "FULL", 2)]  # (journal_mode, synchronous, valor numérico de synchronous)
+HILOS = 8
+
+
+@pytest.mark.parametrize("journal_mode, synchronous, valor_synchronous", MODOS)
+def test_pragmas_en_cada_conexion(crear_app, journal_mode, synchronous, valor_synchronous):
+    app = crear_app({"SQLITE_JOURNAL_MODE": journal_mode, "SQLITE_SYNCHRONOUS": synchronous, "SQLITE_BUSY_TIMEOUT_MS": 7000})
+
+    with app.app_context():
+        # Dos conexiones distintas del pool: los PRAGMA se aplican en el evento "connect" de cada una
+        with db.engine.connect() as primera, db.engine.connect() as segunda:
+            for conexion in (primera, segunda):
+                assert conexion.execute(text("PRAGMA journal_mode")).scalar().upper() == journal_mode
+                assert conexion.execute(text("PRAGMA synchronous")).scalar() == valor_synchronous
+                assert conexion.execute(text("PRAGMA busy_timeout")).scalar() == 7000
+
+
+@pytest.mark.parametrize("journal_mode, synchronous, valor_synchronous", MODOS)
+def test_reservas_concurrentes_mismo_hueco(crear_app, journal_mode, synchronous, valor_synchronous):
+    # timeout de SQLite alto para que los hilos esperen el bloqueo de escritura en lugar de fallar con "database is locked"
+    app = crear_app({"SQLITE_JOURNAL_MODE": journal_mode, "SQLITE_SYNCHRONOUS": synchronous,
+                     "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 60}}})
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    headers = headers_admin(app.test_client())
+    cita = {"fecha": "2030-01-01 10:00", "motivo": "Concurrencia", "id_doctor": 1, "id_centro": 1, "id_paciente": 1}
+
+    # Barrera para que todos los hilos reserven a la vez
+    barrera = threading.Barrier(HILOS)
+
+    def reservar(i):
+        cliente = app.test_client()
+        barrera.wait()
+        return cliente.post("/citas/citas", json=cita, headers=headers).status_code
+
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        codigos = Counter(pool.map(reservar, range(HILOS)))
+
+    assert codigos == {201: 1, 409: HILOS - 1}
@@ -0,0 +1,77 @@
+"""Pruebas de GET /citas/stream en el modo ASGI (citas_bp/asincrono.py): los eventos llegan a la corrutina sin ocupar
+un hilo y la suscripción se cierra en cuanto el cliente se desconecta (mensaje "http.disconnect")."""
+
+import asyncio
+
+from asincrono import init_asincrono, PeticionASGI
+from citas_bp.asincrono import stream_citas_async
+from benchmarks.comun import sembrar_catalogo, headers_admin
+
+
+"""Función para crear el scope ASGI de GET /citas/stream con las cabeceras indicadas"""
+def scope_stream(headers, query=b""):
+    return {"type": "http", "method": "GET", "path": "/citas/stream", "query_string": query,
+            "headers": [(nombre.lower().encode(), valor.encode()) for nombre, valor in headers.items()]}
+
+
+def test_stream_asgi_eventos_y_desconexion(crear_app):
+    app = crear_app()
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    cliente = app.test_client()
+    headers = headers_admin(cliente)
+    broker = app.extensions["eventos"]
+    cita = {"fecha": "2030-01-01 10:00", "motivo": "Stream", "id_doctor": 1, "id_centro": 1, "id_paciente": 1}
+
+    async def probar():
+        init_asincrono(app)
+        recibido = []
+        mensajes = asyncio.Queue()
+
+        async def send(mensaje):
+            recibido.append(mensaje)
+
+        respuesta = await stream_citas_async(app, PeticionASGI(scope_stream(headers, b"id_centro=1")))
+        tarea = asyncio.ensure_future(respuesta.enviar(send, mensajes.get))
+        await asyncio.sleep(0.05)
+        assert broker.suscriptores() == 1
+
+        # La reserva se hace en otro hilo (como la app Flask en el pool WSGI) y publica el evento en el bus
+        assert (await asyncio.to_thread(cliente.post, "/citas/citas", json=cita, headers=headers)).status_code == 201
+        await asyncio.sleep(0.05)
+
+        # El cliente se desconecta: la respuesta termina y la suscripción se quita del bus
+        await mensajes.put({"type": "http.disconnect"})
+        await asyncio.wait_for(tarea, 1)
+        await app.extensions["asincrono"].cerrar()
+        return recibido
+
+    recibido = asyncio.run(probar())
+
+    assert recibido[0]["status"] == 200
+    assert dict(recibido[0]["headers"])[b"content-type"].startswith(b"text/event-stream")
+    cuerpo = b"".join(mensaje.get("body", b"") for mensaje in recibido[1:])
+    assert cuerpo.startswith(b"retry: 3000\n\n")
+    assert b"event: cita_creada" in cuerpo and b'"motivo": "Stream"' in cuerpo
+    assert broker.suscriptores() == 0
+
+
+def test_stream_asgi_errores(crear_app):
+    app = crear_app({"SSE_MAX_SUSCRIPTORES": 0})
+    with app.app_context():
+        sembrar_catalogo(1, 1, 1)
+    headers = headers_admin(app.test_client())
+
+    async def probar():
+        init_asincrono(app)
+        sin_token = await stream_citas_async(app, PeticionASGI(scope_stream({})))
+        filtro_invalido = await stream_citas_async(app, PeticionASGI(scope_stream(headers, b"id_doctor=abc")))
+        demasiadas = await stream_citas_async(app, PeticionASGI(scope_stream(headers)))
+        await app.extensions["asincrono"].cerrar()
+        return sin_token, filtro_invalido, demasiadas
+
+    sin_token, filtro_invalido, demasiadas = asyncio.run(probar())
+
+    assert sin_token.estado == 401
+    assert filtro_invalido.estado == 400
+    assert demasiadas.estado == 503 and demasiadas.cabeceras["Retry-After"] == "5"
@@ -0,0 +1,54 @@
+"""Prueba de humo de la suite de benchmarks (benchmarks/suite.py) con --rapido: que todos los escenarios se ejecutan
+sin errores y que la salida JSON (y la línea base guardada) tienen el formato que usa --baseline."""
+
+import json
+import os
+import subprocess
+import sys
+
+from conftest import CARPETA_ODONTOCARE
+
+ESCENARIOS = ["auth_login", "admin_usuario", "admin_centros", "admin_doctores", "admin_pacientes", "admin_bulk_pacientes",
+              "admin_cache", "citas_agendar", "citas_batch", "citas_listar_admin", "citas_listar_secretaria",
+              "citas_listar_medico", "citas_disponibilidad", "citas_cancelar"]
+METRICAS = {"n", "media_ms", "p50_ms", "p95_ms", "p99_ms", "peticiones_por_segundo"}
+
+
+"""Función para ejecutar la suite en un proceso aparte (como desde la línea de comandos). Las bases de datos temporales
+    se crean dentro de 'carpeta' para que pytest las borre. Devuelve el código de salida y el JSON de la salida estándar"""
+def ejecutar_suite(carpeta, *argumentos):
+    entorno = {**os.environ, "TMPDIR": str(carpeta)}
+    proceso = subprocess.run([sys.executable, "-m", "benchmarks.suite", "--rapido", *argumentos], cwd=CARPETA_ODONTOCARE,
+                             env=entorno, capture_output=True, text=True, timeout=300)
+    assert proceso.stdout, proceso.stderr
+    return proceso.returncode, json.loads(proceso.stdout)
+
+
+def test_suite_rapida_formato_salida(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    codigo, resultados = ejecutar_suite(tmp_path, "--guardar", str(baseline))
+
+    assert codigo == 0
+    assert resultados["config"] == {"centros": 2, "doctores": 4, "pacientes": 20, "citas": 200, "repeticiones": 5,
+                                    "lote": 5, "hilos": 1, "servidor": False, "hash": "pbkdf2:sha256:1000"}
+    assert list(resultados["endpoints"]) == ESCENARIOS
+    for nombre, metricas in resultados["endpoints"].items():
+        assert set(metricas) == METRICAS, nombre
+        assert metricas["n"] == (1 if nombre == "admin_bulk_pacientes" else 5)
+        assert 0 < metricas["p50_ms"] <= metricas["p95_ms"] <= metricas["p99_ms"]
+    assert json.loads(baseline.read_text(encoding="utf-8")) == resultados
+
+
+def test_suite_rapida_compara_con_baseline(tmp_path):
+    # Línea base con p95 enorme (nada empeora) salvo en auth_login (p95 = 0: siempre es una regresión)
+    endpoints = {nombre: {"p95_ms": 60_000.0} for nombre in ESCENARIOS}
+    endpoints["auth_login"] = {"p95_ms": 0.0}
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"config": {}, "endpoints": endpoints}), encoding="utf-8")
+
+    codigo, resultados = ejecutar_suite(tmp_path, "--solo", "auth_", "--baseline", str(baseline), "--tolerancia-ms", "0")
+
+    assert codigo == 1
+    assert list(resultados["endpoints"]) == ["auth_login"]
+    assert [regresion["endpoint"] for regresion in resultados["regresiones"]] == ["auth_login"]
+    assert set(resultados["regresiones"][0]) == {"endpoint", "metrica", "baseline", "actual", "limite"}
@@ -0,0 +1,40 @@
+"""Pruebas de la versión de "citas" (versiones.py): se incrementa una vez por transacción confirmada que cambia citas
+y no cambia si la transacción se deshace."""
+
+from extensions import db
+from models.cita import Cita
+from versiones import leer_version
+from benchmarks.comun import sembrar_catalogo, FECHA_INICIO
+
+
+"""Función para crear una cita en la sesión (sin commit)"""
+def nueva_cita(id_admin):
+    cita = Cita(fecha=FECHA_INICIO, motivo="Version", id_paciente=1, id_doctor=1, id_centro=1, id_usuario_registra=id_admin)
+    db.session.add(cita)
+    return cita
+
+
+def test_version_tras_commit_y_no_tras_rollback(crear_app):
+    app = crear_app()
+    with app.app_context():
+        id_admin = sembrar_catalogo(1, 1, 1)
+        inicial = leer_version("citas")
+
+        # Flush dentro de una transacción que se deshace: la versión no cambia
+        nueva_cita(id_admin)
+        db.session.flush()
+        db.session.rollback()
+        assert leer_version("citas") == inicial
+
+        # Varios flush en la misma transacción: un solo incremento tras el commit
+        cita = nueva_cita(id_admin)
+        db.session.flush()
+        cita.motivo = "Version cambiada"
+        db.session.flush()
+        assert leer_version("citas") == inicial  # Dentro de la transacción todavía no se ha incrementado
+        db.session.commit()
+        assert leer_version("citas") == inicial + 1
+
+        # Una transacción sin citas no cambia la versión
+        db.session.commit()
+        assert leer_version("citas") == inicial + 1
@@ -0,0 +1,77 @@
+"""Contadores de versión de las tablas (tabla "versiones").
+
+Cada vez que una transacción crea, modifica o borra citas con el ORM, se incrementa la versión de "citas"
+DESPUÉS del commit, en una transacción propia de una sola sentencia:
+    - el flush (evento after_flush) solo anota en la sesión qué motores tienen citas cambiadas
+    - tras el commit (evento after_commit) se incrementa la versión en cada uno de esos motores
+    - si la transacción se deshace (rollback) se olvida lo anotado y la versión no cambia
+Así la fila "citas" de la tabla versiones (la misma para todas las reservas) solo se bloquea durante ese UPDATE y no
+durante toda la transacción de la reserva. Entre el commit y el incremento hay un instante en el que un listado puede
+devolver datos nuevos con el ETag anterior; el siguiente listado ya lleva la versión nueva.
+Leer la versión es una consulta por clave primaria, así que sirve para saber si los listados han cambiado sin leer las
+citas (ETag en cache_http.py).
+Las modificaciones hechas con sentencias masivas (update/delete de Core) deben llamar a incrementar_version a mano.
+Con particiones de citas el contador se guarda en la partición donde se escribe (el motor de la sesión que hace el flush)."""
+
+import logging
+from itertools import chain
+
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.cita import Cita
+from models.version_tabla import VersionTabla
+from particiones import sesiones_citas
+
+logger = logging.getLogger(__name__)
+
+
+"""Función para incrementar la versión de una tabla con la conexión de la transacción actual"""
+def incrementar_version(conexion, nombre):
+    dialecto = conexion.dialect.name
+    if dialecto in ["sqlite", "postgresql"]:
+        insertar = (sqlite.insert if dialecto == "sqlite" else postgresql.insert)(VersionTabla)
+        conexion.execute(insertar.values(nombre=nombre, version=1).on_conflict_do_update(
+            index_elements=[VersionTabla.nombre], set_={"version": VersionTabla.version + 1}))
+        return
+
+    # Otras bases de datos: UPDATE y, si la fila todavía no existe, INSERT
+    resultado = conexion.execute(update(VersionTabla).where(VersionTabla.nombre == nombre).values(version=VersionTabla.version + 1))
+    if resultado.rowcount == 0:
+        conexion.execute(VersionTabla.__table__.insert().values(nombre=nombre, version=1))
+
+
+"""Función para leer la versión actual de una tabla (0 si nunca se ha modificado).
+    Con particiones de citas (particiones.py) cada partición lleva su versión de "citas" y se devuelve la suma:
+    cambia siempre que cambia alguna"""
+def leer_version(nombre):
+    consulta = select(VersionTabla.version).where(VersionTabla.nombre == nombre)
+    sesiones = sesiones_citas() if nombre == "citas" else [db.session]
+    return sum(sesion.scalar(consulta) or 0 for sesion in sesiones)
+
+
+# Anotar el motor de cada flush que incluya citas nuevas, modificadas o borradas (la versión se incrementa tras el commit)
+@event.listens_for(Session, "after_flush")
+def anotar_citas_cambiadas(sesion, contexto):
+    if any(isinstance(objeto, Cita) for objeto in chain(sesion.new, sesion.dirty, sesion.deleted)):
+        sesion.info.setdefault("versionar_citas", set()).add(sesion.connection().engine)
+
+
+# Tras el commit, incrementar la versión de "citas" en cada motor anotado (una transacción corta por motor)
+@event.listens_for(Session, "after_commit")
+def versionar_citas(sesion):
+    for motor in sesion.info.pop("versionar_citas", ()):
+        try:
+            with motor.begin() as conexion:
+                incrementar_version(conexion, "citas")
+        except Exception:
+            # Las citas ya están guardadas: solo se pierde la invalidación del ETag hasta el siguiente cambio
+            logger.exception("No se ha podido incrementar la versión de citas")
+
+
+# Si la transacción se deshace, las citas anotadas no se han guardado y la versión no cambia
+@event.listens_for(Session, "after_rollback")
+def descartar_citas_cambiadas(sesion):
+    sesion.info.pop("versionar_citas", None)